@@ -69,14 +69,14 @@ class Agent(models.Model):
         """Marcar agente como conectado"""
         self.status = 'available'
         self.logged_in_at = timezone.now()
-        self.save()
+        self.save(update_fields=['status', 'logged_in_at', 'last_status_change', 'updated_at'])
     
     def logout(self):
         """Marcar agente como desconectado"""
         self.status = 'offline'
         self.logged_in_at = None
         self.current_calls = 0
-        self.save()
+        self.save(update_fields=['status', 'logged_in_at', 'current_calls', 'last_status_change', 'updated_at'])
     
     @property
     def is_available(self):
@@ -59,31 +59,9 @@ def sync_agent_sip_extension(sender, instance, created, update_fields=None, **kw
         elif was_created:
             logger.info(f"Extension {instance.sip_extension} creada → type={ext_type}, transport={transport}")
 
-        # Regenerar configuración Asterisk y recargar PJSIP
-        if was_created or needs_update:
-            _reload_asterisk_pjsip()
+        # La config de Asterisk (o las filas PJSIP Realtime) la actualizan las
+        # señales de Extension vía config_sync: no se regenera ni recarga aquí.
 
     except Exception as e:
         logger.error(f"Error sincronizando extensión del agente {instance.sip_extension}: {e}")
 
-
-def _reload_asterisk_pjsip():
-    """Regenera pjsip_extensions.conf y recarga PJSIP en Asterisk via AMI."""
-    try:
-        from apps.telephony.asterisk_config import AsteriskConfigGenerator
-        generator = AsteriskConfigGenerator()
-        generator.write_all_configs()
-        logger.info("Configuración Asterisk regenerada por cambio de agente")
-    except Exception as e:
-        logger.error(f"Error regenerando configuración Asterisk: {e}")
-        return
-
-    try:
-        from apps.telephony.asterisk_ami import AsteriskAMI
-        ami = AsteriskAMI()
-        if ami.connect():
-            ami.reload_module('res_pjsip.so')
-            ami.disconnect()
-            logger.info("PJSIP recargado en Asterisk")
-    except Exception as e:
-        logger.warning(f"No se pudo recargar PJSIP en Asterisk (no crítico): {e}")
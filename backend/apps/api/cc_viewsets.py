@@ -220,7 +220,7 @@ class ScreenPopView(APIView):
         last_calls = Call.objects.filter(
             Q(caller_id__endswith=phone_clean[-10:]) |
             Q(called_number__endswith=phone_clean[-10:])
-        ).select_related('agent', 'campaign', 'disposition').order_by('-start_time')[:5]
+        ).select_related('campaign', 'disposition').order_by('-start_time')[:5]
 
         contact_data = None
         if contact:
@@ -244,15 +244,21 @@ class ScreenPopView(APIView):
                 )[:3]),
             }
 
-        call_history = [{
-            'call_id': c.call_id,
-            'direction': c.direction,
-            'start_time': c.start_time,
-            'duration': c.duration,
-            'disposition': c.disposition.name if c.disposition else None,
-            'agent': c.agent.user.get_full_name() if c.agent and c.agent.user else None,
-            'campaign': c.campaign.name if c.campaign else None,
-        } for c in last_calls]
+        # Nombre del agente desde la caché de referencia (sin join a agents/users)
+        from apps.telephony.reference_cache import reference_cache
+
+        call_history = []
+        for c in last_calls:
+            agent = reference_cache.agent_by_pk(c.agent_id)
+            call_history.append({
+                'call_id': c.call_id,
+                'direction': c.direction,
+                'start_time': c.start_time,
+                'duration': c.duration,
+                'disposition': c.disposition.name if c.disposition else None,
+                'agent': agent.user.get_full_name() if agent and agent.user else None,
+                'campaign': c.campaign.name if c.campaign else None,
+            })
 
         return Response({
             'phone': phone,
@@ -342,29 +348,27 @@ class ConferenceView(APIView):
                                 status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
             # 1) Mover el canal actual al ConfBridge
-            ami._send_command(
-                f"Action: Redirect\r\n"
-                f"Channel: {channel}\r\n"
-                f"Context: confbridge\r\n"
-                f"Exten: {conf_bridge_id}\r\n"
-                f"Priority: 1\r\n"
-                f"\r\n"
-            )
-            ami._read_command_response(timeout=5)
-
             # 2) Originar llamada al tercero y meterlo al mismo ConfBridge
-            ami._send_command(
-                f"Action: Originate\r\n"
-                f"Channel: Local/{third_party}@from-internal\r\n"
-                f"Context: confbridge\r\n"
-                f"Exten: {conf_bridge_id}\r\n"
-                f"Priority: 1\r\n"
-                f"CallerID: {caller_id}\r\n"
-                f"Timeout: 30000\r\n"
-                f"Async: true\r\n"
-                f"\r\n"
-            )
-            ami._read_command_response(timeout=5)
+            # Se envían juntas: Asterisk las ejecuta en orden dentro de la sesión
+            ami.pipeline([
+                {
+                    'Action': 'Redirect',
+                    'Channel': channel,
+                    'Context': 'confbridge',
+                    'Exten': conf_bridge_id,
+                    'Priority': 1,
+                },
+                {
+                    'Action': 'Originate',
+                    'Channel': f'Local/{third_party}@from-internal',
+                    'Context': 'confbridge',
+                    'Exten': conf_bridge_id,
+                    'Priority': 1,
+                    'CallerID': caller_id,
+                    'Timeout': 30000,
+                    'Async': 'true',
+                },
+            ], retry=False)
             ami.disconnect()
 
             return Response({
@@ -394,18 +398,21 @@ class DNCCheckView(APIView):
         if not phone:
             return Response({'error': 'phone requerido'}, status=status.HTTP_400_BAD_REQUEST)
 
-        phone_clean = phone.replace('+', '').replace(' ', '').replace('-', '')
-
+        from apps.contacts.dnc import normalize_dnc_number
         from apps.contacts.models import Blacklist, Contact
-        from django.db.models import Q
+
+        number = normalize_dnc_number(phone)
+        # Sin dígitos, phone__endswith='' coincidiría con toda la lista
+        if not number:
+            return Response({'error': 'phone sin dígitos'}, status=status.HTTP_400_BAD_REQUEST)
 
         in_blacklist = Blacklist.objects.filter(
-            phone__endswith=phone_clean[-10:],
+            phone__endswith=number,
             is_active=True,
         ).exists()
 
         dnc_contact = Contact.objects.filter(
-            Q(phone__endswith=phone_clean[-10:]),
+            phone__endswith=number,
             dnc_opt_out=True,
         ).exists()
 
@@ -418,6 +425,35 @@ class DNCCheckView(APIView):
         })
 
 
+class DNCSnapshotView(APIView):
+    """
+    GET /api/cc/dnc-snapshot/
+    Lista completa de números bloqueados (lista negra activa + opt-out),
+    normalizados a 10 dígitos, uno por línea. Header X-DNC-Version con la
+    versión de la lista; los cambios posteriores se publican en 'dnc:updates'.
+    Usado por el Dialer Engine para su filtro DNC en memoria.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        from django.http import StreamingHttpResponse
+        from apps.contacts.dnc import current_dnc_version, iter_dnc_numbers
+
+        # La versión se lee antes del snapshot: los deltas posteriores se reaplican
+        try:
+            version = current_dnc_version()
+        except Exception as e:
+            logger.warning(f"No se pudo leer la versión DNC: {e}")
+            version = 0
+
+        response = StreamingHttpResponse(
+            (f'{number}\n' for number in iter_dnc_numbers()),
+            content_type='text/plain; charset=utf-8',
+        )
+        response['X-DNC-Version'] = str(version)
+        return response
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Bulk Import de Contactos
 # ──────────────────────────────────────────────────────────────────────────────
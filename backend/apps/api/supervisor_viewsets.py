@@ -33,7 +33,7 @@ class SupervisorViewSet(viewsets.ViewSet):
         from apps.agents.models import Agent
         from apps.campaigns.models import Campaign
         from apps.telephony.models import Call
-        from apps.queues.models import Queue
+        from apps.telephony.reference_cache import reference_cache
 
         now = timezone.now()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -72,7 +72,7 @@ class SupervisorViewSet(viewsets.ViewSet):
 
         # Colas activas
         queue_summary = []
-        for q in Queue.objects.filter(is_active=True):
+        for q in reference_cache.active_queues():
             waiting = calls_today.filter(queue=q, status='ringing').count()
             queue_summary.append({
                 'id': q.id,
@@ -9,7 +9,7 @@ from apps.api.extra_viewsets import AgentBreakReasonViewSet, AgentGroupViewSet,
 from apps.api.cc_viewsets import (
     CallbackViewSet, WebhookViewSet,
     ScreenPopView, ConsultiveTransferView, ConferenceView,
-    DNCCheckView, BulkContactImportView, QualityStatsView,
+    DNCCheckView, DNCSnapshotView, BulkContactImportView, QualityStatsView,
 )
 from apps.telephony.views import SIPTrunkViewSet
 from apps.reports.views import ReportViewSet as ReportViewSetFull
@@ -56,6 +56,7 @@ urlpatterns = [
     path('cc/consultive-transfer/', ConsultiveTransferView.as_view(), name='consultive-transfer'),
     path('cc/conference/', ConferenceView.as_view(), name='conference'),
     path('cc/dnc-check/', DNCCheckView.as_view(), name='dnc-check'),
+    path('cc/dnc-snapshot/', DNCSnapshotView.as_view(), name='dnc-snapshot'),
     path('cc/bulk-import/', BulkContactImportView.as_view(), name='bulk-import'),
     path('cc/quality-stats/', QualityStatsView.as_view(), name='quality-stats'),
 ]
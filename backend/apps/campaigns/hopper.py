@@ -0,0 +1,465 @@
+"""
+Alimentador del hopper de contactos del Dialer Engine
+
+Mantiene en Redis las claves que lee el dialer para cada campaña activa:
+    campaign:{id}:config              JSON de configuración de la campaña
+    campaign:{id}:agents:available    SET de agentes disponibles (+ agent:{id} JSON)
+    campaign:{id}:hopper:*            Sorted sets de contactos por zona horaria
+                                      (ver dialer_engine/hopper.py)
+
+Los cambios de disponibilidad se publican además en 'dialer:agents' para que
+el dialer actualice su roster local sin consultar Redis en cada ciclo.
+
+Los contactos se leen de Postgres con paginación keyset (prioridad, id) y se
+escriben con pipelines, manteniendo el hopper entre una marca baja y una alta.
+Así una lista de 1M contactos nunca se carga completa en memoria.
+
+Example:
+    >>> from apps.campaigns.hopper import CampaignHopperFeeder
+    >>> feeder = CampaignHopperFeeder()
+    >>> feeder.sync_campaign(campaign)
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from config.dialer_config import CALLING_HOURS_CONFIG, DIALER_CONFIG, HOPPER_CONFIG, LIMITS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Debe coincidir con dialer_engine/hopper.py
+RANK_PRIORITY_FACTOR = 1e10
+
+FEEDABLE_CONTACT_STATUSES = ('new', 'pending')
+
+# Contactos en el hopper o en llamada: no se vuelven a leer hasta su cierre
+QUEUED_CONTACT_STATUS = 'queued'
+
+# Cierres de llamada que escribe el dialer (ver dialer_engine/calls.py)
+COMPLETED_KEY = 'calls:completed'
+
+# Contactos descartados por el dialer sin marcar: estado final, sin reintento
+SKIPPED_CONTACT_STATUSES = {'dnc': 'blacklisted', 'no_phone': 'failed'}
+
+# Canal de cambios de disponibilidad (ver dialer_engine/roster.py)
+AGENTS_CHANNEL = 'dialer:agents'
+
+_redis_client = None
+
+
+def get_redis():
+    """Cliente Redis compartido del proceso"""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        redis_url = getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0')
+        _redis_client = redis.from_url(redis_url, decode_responses=True)
+    return _redis_client
+
+
+def hopper_keys(campaign_id) -> Dict[str, str]:
+    base = f'campaign:{campaign_id}:hopper'
+    return {
+        'ready': f'{base}:ready',
+        'zones': f'{base}:zones',
+        'scheduled': f'{base}:scheduled',
+        'data': f'{base}:data',
+        'rank': f'{base}:rank',
+        'zone': f'{base}:zone',
+        'cursor': f'{base}:cursor',
+    }
+
+
+def ready_key(campaign_id, zone: str) -> str:
+    """Bucket de contactos elegibles de una zona horaria"""
+    return f'campaign:{campaign_id}:hopper:ready:{zone}'
+
+
+def contact_rank(priority: int, is_vip: bool, eligible_at: float, vip_boost: int = 0) -> float:
+    """Rank del contacto en el hopper: mayor prioridad primero, luego FIFO"""
+    priority = priority or 0
+    if is_vip:
+        priority += vip_boost
+    return -priority * RANK_PRIORITY_FACTOR + eligible_at
+
+
+def contact_payload(contact) -> Dict:
+    """Representación del contacto que consume el dialer"""
+    return {
+        'id': contact.id,
+        'phone_number': contact.phone,
+        'phone_2': contact.phone2,
+        'phone_3': contact.phone3,
+        'name': contact.full_name,
+        'timezone': contact.timezone,
+        'is_vip': contact.is_vip,
+        'priority': contact.priority,
+        'attempts': contact.attempts,
+    }
+
+
+def campaign_dialer_config(campaign) -> Dict:
+    """Configuración de la campaña publicada en campaign:{id}:config"""
+    return {
+        'campaign_id': campaign.id,
+        'name': campaign.name,
+        'dialer_type': campaign.dialer_type,
+        'queue_name': campaign.queue.name if campaign.queue else '',
+        'max_calls_per_agent': campaign.max_calls_per_agent,
+        'max_retries': campaign.max_retries,
+        'retry_delay': campaign.retry_delay,
+        'call_timeout': campaign.call_timeout,
+        'dnc_enabled': campaign.dnc_enabled,
+        'preview_timeout': campaign.preview_timeout,
+        'timezone': campaign.timezone,
+        'vip_priority_boost': campaign.vip_priority_boost,
+        'schedule_start_time': campaign.schedule_start_time.isoformat() if campaign.schedule_start_time else None,
+        'schedule_end_time': campaign.schedule_end_time.isoformat() if campaign.schedule_end_time else None,
+        # Ventana de llamada en hora local del contacto (ver dialer_engine/schedule.py)
+        'calling_start': (
+            campaign.schedule_start_time.strftime('%H:%M') if campaign.schedule_start_time
+            else CALLING_HOURS_CONFIG['START']
+        ),
+        'calling_end': (
+            campaign.schedule_end_time.strftime('%H:%M') if campaign.schedule_end_time
+            else CALLING_HOURS_CONFIG['END']
+        ),
+        'calling_days': CALLING_HOURS_CONFIG['DAYS'],
+        # Límites de pacing por defecto (el dialer los usa si la campaña no los define)
+        'predictive_ratio': DIALER_CONFIG['PREDICTIVE_INITIAL_RATIO'],
+        'abandon_rate_target': DIALER_CONFIG['ABANDON_RATE_TARGET'],
+        'max_ratio': DIALER_CONFIG['MAX_RATIO'],
+        'min_ratio': DIALER_CONFIG['MIN_RATIO'],
+        'ratio_step': DIALER_CONFIG['RATIO_ADJUSTMENT_STEP'],
+        'pacing_window': DIALER_CONFIG['PACING_WINDOW'],
+        'pacing_min_samples': DIALER_CONFIG['PACING_MIN_SAMPLES'],
+        # Límites de originación (token bucket y canales por troncal)
+        'calls_per_second': LIMITS_CONFIG['CALLS_PER_SECOND'],
+        'trunk_max_channels': LIMITS_CONFIG['TRUNK_MAX_CHANNELS'],
+    }
+
+
+def agent_payload(agent) -> Dict:
+    """Representación del agente que consume el dialer (agent:{id})"""
+    return {
+        'id': agent.id,
+        'agent_id': agent.agent_id,
+        'extension': agent.sip_extension,
+        'name': agent.user.get_full_name() or agent.user.username,
+    }
+
+
+class CampaignHopperFeeder:
+    """
+    Publica configuración, agentes y contactos de campañas activas en Redis.
+
+    Todos los métodos son idempotentes: pueden ejecutarse desde la tarea
+    periódica, desde signals o al iniciar la campaña sin duplicar contactos
+    (el hopper usa el id del contacto como miembro).
+    """
+
+    def __init__(self, redis_client=None, low_watermark: int = None,
+                 high_watermark: int = None, batch_size: int = None,
+                 rescan_interval: int = None):
+        self.redis = redis_client or get_redis()
+        self.low_watermark = low_watermark or HOPPER_CONFIG['LOW_WATERMARK']
+        self.high_watermark = high_watermark or HOPPER_CONFIG['HIGH_WATERMARK']
+        self.batch_size = batch_size or HOPPER_CONFIG['BATCH_SIZE']
+        self.rescan_interval = rescan_interval or HOPPER_CONFIG['RESCAN_INTERVAL']
+
+    # ============= CONFIGURACIÓN =============
+
+    def push_config(self, campaign, force: bool = False) -> bool:
+        """Publicar campaign:{id}:config sólo si cambió (hash de contenido)"""
+        data = json.dumps(campaign_dialer_config(campaign), sort_keys=True, default=str)
+        digest = hashlib.sha1(data.encode()).hexdigest()
+        hash_key = f'campaign:{campaign.id}:config:hash'
+        if not force and self.redis.get(hash_key) == digest:
+            return False
+        pipe = self.redis.pipeline()
+        pipe.set(f'campaign:{campaign.id}:config', data)
+        pipe.set(hash_key, digest)
+        pipe.execute()
+        return True
+
+    # ============= AGENTES =============
+
+    def campaign_agents(self, campaign):
+        from apps.agents.models import Agent
+        return Agent.objects.filter(
+            Q(current_campaign=campaign) | Q(campaigns=campaign)
+        ).select_related('user').distinct()
+
+    def push_agents(self, campaign) -> int:
+        """Reemplazar el set de agentes disponibles de la campaña"""
+        available = [a for a in self.campaign_agents(campaign) if a.is_available]
+        set_key = f'campaign:{campaign.id}:agents:available'
+        previous = self.redis.smembers(set_key)
+        pipe = self.redis.pipeline()
+        pipe.delete(set_key)
+        for agent in available:
+            pipe.set(f'agent:{agent.id}', json.dumps(agent_payload(agent)))
+            pipe.sadd(set_key, agent.id)
+        if set(previous) != {str(a.id) for a in available}:
+            # Avisar al dialer sólo si cambió el conjunto
+            pipe.publish(AGENTS_CHANNEL, json.dumps({'type': 'roster', 'campaign_id': campaign.id}))
+        pipe.execute()
+        return len(available)
+
+    def sync_agent(self, agent, campaign_ids: Iterable[int]):
+        """Actualizar la disponibilidad de un agente en las campañas indicadas"""
+        campaign_ids = list(campaign_ids)
+        if not campaign_ids:
+            return
+        available = agent.is_available
+        payload = agent_payload(agent)
+        pipe = self.redis.pipeline(transaction=False)
+        if available:
+            pipe.set(f'agent:{agent.id}', json.dumps(payload))
+            for campaign_id in campaign_ids:
+                pipe.sadd(f'campaign:{campaign_id}:agents:available', agent.id)
+        else:
+            for campaign_id in campaign_ids:
+                pipe.srem(f'campaign:{campaign_id}:agents:available', agent.id)
+        pipe.publish(AGENTS_CHANNEL, json.dumps({
+            'type': 'agent',
+            'agent_id': agent.id,
+            'available': available,
+            'campaign_ids': campaign_ids,
+            'agent': payload if available else None,
+        }))
+        pipe.execute()
+
+    def sync_agents(self, agents: Iterable):
+        """Actualizar la disponibilidad de varios agentes en sus campañas activas (2 queries)"""
+        from apps.agents.models import Agent
+
+        agents = {agent.pk: agent for agent in agents}
+        if not agents:
+            return
+        campaign_ids = {pk: set() for pk in agents}
+        assigned = Agent.campaigns.through.objects.filter(
+            agent_id__in=agents, campaign__status='active',
+        ).values_list('agent_id', 'campaign_id')
+        current = Agent.objects.filter(
+            pk__in=agents, current_campaign__status='active',
+        ).values_list('pk', 'current_campaign_id')
+        for pk, campaign_id in [*assigned, *current]:
+            campaign_ids[pk].add(campaign_id)
+        for pk, agent in agents.items():
+            self.sync_agent(agent, sorted(campaign_ids[pk]))
+
+    # ============= CONTACTOS =============
+
+    def hopper_size(self, campaign_id) -> int:
+        """Contactos en el hopper (todas las zonas, elegibles y programados)"""
+        return self.redis.hlen(hopper_keys(campaign_id)['data'])
+
+    @staticmethod
+    def _parse_cursor(raw: Optional[str]) -> Optional[Tuple[int, int]]:
+        if not raw:
+            return None
+        priority, contact_id = raw.split(':')
+        return int(priority), int(contact_id)
+
+    def reset_cursor(self, campaign_id):
+        """Volver a recorrer la lista desde el inicio (p. ej. al agregar contactos)"""
+        self.redis.delete(hopper_keys(campaign_id)['cursor'])
+
+    def fetch_batch(self, campaign, cursor: Optional[Tuple[int, int]], limit: int) -> List:
+        """
+        Siguiente página de contactos en orden (prioridad desc, id asc).
+        Paginación keyset: no usa OFFSET, por lo que el costo es constante.
+        """
+        from apps.contacts.models import Contact
+        qs = Contact.objects.filter(
+            contact_list_id=campaign.contact_list_id,
+            status__in=FEEDABLE_CONTACT_STATUSES,
+            dnc_opt_out=False,
+        )
+        if campaign.max_retries:
+            qs = qs.filter(attempts__lt=campaign.max_retries)
+        if cursor:
+            priority, contact_id = cursor
+            qs = qs.filter(Q(priority__lt=priority) | Q(priority=priority, id__gt=contact_id))
+        return list(qs.order_by('-priority', 'id').only(
+            'id', 'phone', 'phone2', 'phone3', 'first_name', 'last_name',
+            'timezone', 'is_vip', 'priority', 'attempts', 'next_attempt',
+        )[:limit])
+
+    def top_up(self, campaign) -> int:
+        """
+        Rellenar el hopper hasta la marca alta si bajó de la marca baja.
+
+        Los contactos agregados pasan a 'queued' para que ningún recorrido
+        posterior los vuelva a leer; apply_completions los saca de ese estado.
+        Al agotarse la lista el cursor queda en 'exhausted' por
+        `rescan_interval` segundos y luego se recorre de nuevo desde el inicio
+        para tomar los reintentos vencidos.
+
+        Returns:
+            int: Contactos agregados
+        """
+        if not campaign.contact_list_id:
+            return 0
+        size = self.hopper_size(campaign.id)
+        if size >= self.low_watermark:
+            return 0
+
+        from apps.contacts.models import Contact
+        keys = hopper_keys(campaign.id)
+        raw_cursor = self.redis.get(keys['cursor'])
+        if raw_cursor == 'exhausted':
+            return 0
+        cursor = self._parse_cursor(raw_cursor)
+
+        now = timezone.now().timestamp()
+        vip_boost = campaign.vip_priority_boost
+        default_zone = campaign.timezone or 'America/Bogota'
+        missing = self.high_watermark - size
+        added = 0
+
+        while added < missing:
+            batch = self.fetch_batch(campaign, cursor, min(self.batch_size, missing - added))
+            if not batch:
+                self.redis.set(keys['cursor'], 'exhausted', ex=self.rescan_interval)
+                logger.info(f"Hopper campaña {campaign.id}: lista de contactos agotada")
+                break
+
+            pipe = self.redis.pipeline(transaction=False)
+            zones = set()
+            for contact in batch:
+                member = str(contact.id)
+                zone = contact.timezone or default_zone
+                eligible_at = contact.next_attempt.timestamp() if contact.next_attempt else now
+                rank = contact_rank(contact.priority, contact.is_vip, eligible_at, vip_boost)
+                pipe.hset(keys['data'], member, json.dumps(contact_payload(contact)))
+                pipe.hset(keys['rank'], member, rank)
+                pipe.hset(keys['zone'], member, zone)
+                if eligible_at > now:
+                    pipe.zadd(keys['scheduled'], {member: eligible_at})
+                else:
+                    pipe.zadd(ready_key(campaign.id, zone), {member: rank})
+                zones.add(zone)
+            pipe.sadd(keys['zones'], *zones)
+            last = batch[-1]
+            cursor = (last.priority, last.id)
+            pipe.set(keys['cursor'], f'{cursor[0]}:{cursor[1]}')
+            pipe.execute()
+            Contact.objects.filter(id__in=[c.id for c in batch]).update(status=QUEUED_CONTACT_STATUS)
+            added += len(batch)
+
+        if added:
+            logger.debug(f"Hopper campaña {campaign.id}: +{added} contactos (tenía {size})")
+        return added
+
+    def clear(self, campaign_id):
+        """Eliminar hopper, cursor y agentes de la campaña; lo no marcado vuelve a 'pending'"""
+        from apps.contacts.models import Contact
+        keys = hopper_keys(campaign_id)
+        zones = self.redis.smembers(keys['zones'])
+        queued = self.redis.hkeys(keys['data'])
+        if queued:
+            Contact.objects.filter(id__in=queued, status=QUEUED_CONTACT_STATUS).update(status='pending')
+        self.redis.delete(
+            *(key for name, key in keys.items() if name != 'ready'),
+            *(ready_key(campaign_id, zone) for zone in zones),
+            f'campaign:{campaign_id}:agents:available',
+        )
+
+    def apply_completions(self, limit: int = 1000) -> int:
+        """
+        Aplicar a los contactos los cierres de llamada del dialer (calls:completed).
+
+        Contestada: 'contacted'. Descartado sin marcar (DNC, sin números): su
+        estado final de SKIPPED_CONTACT_STATUSES. Si no: 'pending' con
+        next_attempt según el retry_delay de la campaña, o 'failed' al llegar
+        a max_retries (también los que fallaron al originarse, los rechazados
+        en preview, etc.). Se consume un bloque de `limit` registros con pocas
+        queries por campaña.
+
+        Returns:
+            int: Registros consumidos
+        """
+        from apps.campaigns.models import Campaign
+        from apps.contacts.models import Contact
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrange(COMPLETED_KEY, 0, limit - 1)
+        pipe.ltrim(COMPLETED_KEY, limit, -1)
+        items, _ = pipe.execute()
+        if not items:
+            return 0
+
+        answered = set()
+        skipped: Dict[str, set] = {}
+        unanswered: Dict[int, set] = {}
+        for item in items:
+            record = json.loads(item)
+            contact_id = (record.get('contact') or {}).get('id')
+            if contact_id is None:
+                continue
+            if record.get('status') == 'answered':
+                answered.add(contact_id)
+            elif record.get('status') in SKIPPED_CONTACT_STATUSES:
+                skipped.setdefault(SKIPPED_CONTACT_STATUSES[record['status']], set()).add(contact_id)
+            else:
+                unanswered.setdefault(record.get('campaign_id'), set()).add(contact_id)
+
+        now = timezone.now()
+        if answered:
+            Contact.objects.filter(id__in=answered).update(
+                status='contacted', attempts=F('attempts') + 1, last_attempt=now, next_attempt=None,
+            )
+        for status, contact_ids in skipped.items():
+            Contact.objects.filter(id__in=contact_ids - answered).update(status=status, next_attempt=None)
+        campaigns = Campaign.objects.filter(id__in=[c for c in unanswered if c is not None]).only(
+            'id', 'max_retries', 'retry_delay',
+        ).in_bulk()
+        for campaign_id, contact_ids in unanswered.items():
+            campaign = campaigns.get(campaign_id)
+            retry_delay = campaign.retry_delay if campaign else 0
+            qs = Contact.objects.filter(id__in=contact_ids - answered)
+            qs.update(
+                status='pending', attempts=F('attempts') + 1, last_attempt=now,
+                next_attempt=now + timedelta(seconds=retry_delay),
+            )
+            if campaign and campaign.max_retries:
+                qs.filter(attempts__gte=campaign.max_retries).update(status='failed', next_attempt=None)
+
+        logger.debug(f"Cierres aplicados: {len(items)} ({len(answered)} contestadas)")
+        return len(items)
+
+    # ============= ORQUESTACIÓN =============
+
+    def sync_campaign(self, campaign) -> Dict:
+        """Publicar configuración, agentes y rellenar contactos de una campaña"""
+        return {
+            'config_updated': self.push_config(campaign),
+            'agents_available': self.push_agents(campaign),
+            'contacts_added': self.top_up(campaign),
+        }
+
+    def publish_command(self, action: str, campaign):
+        """
+        Enviar comando start/stop al Dialer Engine.
+        dialer:campaigns registra las campañas que deben discar, para que las
+        instancias del dialer se las repartan aunque ninguna reciba el comando.
+        """
+        pipe = self.redis.pipeline()
+        if action == 'start':
+            pipe.hset('dialer:campaigns', campaign.id, campaign.dialer_type)
+        elif action == 'stop':
+            pipe.hdel('dialer:campaigns', campaign.id)
+        pipe.publish('dialer:commands', json.dumps({
+            'action': action,
+            'campaign_id': campaign.id,
+            'campaign_type': campaign.dialer_type,
+        }))
+        pipe.execute()
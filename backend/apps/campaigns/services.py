@@ -29,6 +29,24 @@ from core.events import emit_event, campaign_started, campaign_stopped, campaign
 logger = logging.getLogger(__name__)
 
 
+def _queue_in_dialer(campaign_id: int):
+    """Queue campaign config, agents and contacts in the dialer engine"""
+    from apps.campaigns.tasks import queue_campaign_in_dialer
+    try:
+        queue_campaign_in_dialer.delay(campaign_id)
+    except Exception as e:
+        logger.error(f"Error queueing campaign {campaign_id} in dialer: {e}")
+
+
+def _remove_from_dialer(campaign_id: int, clear_hopper: bool = False):
+    """Tell the dialer engine to stop dialing a campaign"""
+    from apps.campaigns.tasks import remove_campaign_from_dialer
+    try:
+        remove_campaign_from_dialer.delay(campaign_id, clear_hopper=clear_hopper)
+    except Exception as e:
+        logger.error(f"Error removing campaign {campaign_id} from dialer: {e}")
+
+
 class CampaignService:
     """
     Service class for campaign business logic operations.
@@ -105,6 +123,9 @@ class CampaignService:
             dialer_type=campaign.dialer_type or 'none'
         ).inc()
         
+        # Queue in dialer engine once the status change is committed
+        transaction.on_commit(lambda: _queue_in_dialer(campaign.id))
+        
         # Emit event for cross-module communication
         emit_event(campaign_started, sender=Campaign, campaign=campaign, user=user)
         
@@ -174,6 +195,9 @@ class CampaignService:
             dialer_type=campaign.dialer_type or 'none'
         ).dec()
         
+        # Stop dialing; the hopper is kept so the campaign can resume
+        transaction.on_commit(lambda: _remove_from_dialer(campaign.id))
+        
         # Emit event
         emit_event(campaign_paused, sender=Campaign, campaign=campaign, user=user)
         
@@ -239,6 +263,9 @@ class CampaignService:
                 dialer_type=campaign.dialer_type or 'none'
             ).dec()
         
+        # Stop dialing and drop the campaign's hopper
+        transaction.on_commit(lambda: _remove_from_dialer(campaign.id, clear_hopper=True))
+        
         # Emit event
         emit_event(campaign_stopped, sender=Campaign, campaign=campaign, user=user, reason='Manual stop')
         
@@ -354,6 +381,10 @@ class CampaignService:
         campaign.total_contacts += added_count
         campaign.save()
         
+        # Re-walk the contact list so the dialer hopper picks up the new contacts
+        from apps.campaigns.hopper import CampaignHopperFeeder
+        transaction.on_commit(lambda: CampaignHopperFeeder().reset_cursor(campaign.id))
+        
         logger.info(
             "Contacts added to campaign",
             extra={
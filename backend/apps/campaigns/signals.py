@@ -0,0 +1,38 @@
+"""
+Signals que mantienen actualizadas en Redis la configuración y los agentes
+disponibles de las campañas activas que consume el Dialer Engine.
+"""
+import logging
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender='campaigns.Campaign')
+def push_campaign_config(sender, instance, created, **kwargs):
+    """Republicar campaign:{id}:config cuando cambia una campaña activa"""
+    if instance.status != 'active':
+        return
+    try:
+        from apps.campaigns.hopper import CampaignHopperFeeder
+        CampaignHopperFeeder().push_config(instance)
+    except Exception as e:
+        logger.warning(f"No se pudo publicar la configuración de la campaña {instance.id}: {e}")
+
+
+@receiver(post_save, sender='agents.Agent')
+def push_agent_availability(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Agregar/quitar al agente de campaign:{id}:agents:available en sus campañas activas.
+    Los cambios de estado del listener AMI se guardan con update() (sin post_save):
+    los publica el listener al aplicar su write-behind.
+    """
+    availability_fields = {'status', 'current_calls', 'max_concurrent_calls', 'current_campaign'}
+    if update_fields is not None and not availability_fields.intersection(set(update_fields)):
+        return
+    try:
+        from apps.campaigns.hopper import CampaignHopperFeeder
+        CampaignHopperFeeder().sync_agents([instance])
+    except Exception as e:
+        logger.warning(f"No se pudo sincronizar la disponibilidad del agente {instance.id}: {e}")
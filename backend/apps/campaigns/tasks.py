@@ -79,3 +79,107 @@ def update_campaign_statistics(self, campaign_id):
     except Exception as e:
         logger.error(f"Error updating campaign {campaign_id} statistics: {e}")
         raise  # Permitir retry
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(ConnectionError, TimeoutError),
+    retry_kwargs={'max_retries': 3, 'countdown': 5},
+    retry_backoff=True
+)
+def queue_campaign_in_dialer(self, campaign_id):
+    """
+    Publicar una campaña en el Dialer Engine: configuración, agentes,
+    primer llenado del hopper y comando de inicio.
+    """
+    from apps.campaigns.models import Campaign
+    from apps.campaigns.hopper import CampaignHopperFeeder
+    
+    try:
+        campaign = Campaign.objects.select_related('queue').get(id=campaign_id)
+    except Campaign.DoesNotExist:
+        logger.error(f"Campaign {campaign_id} not found")
+        return f"Campaign {campaign_id} not found"
+    
+    feeder = CampaignHopperFeeder()
+    # El cursor se conserva: al reanudar tras una pausa se sigue donde quedó
+    feeder.push_config(campaign, force=True)
+    result = feeder.sync_campaign(campaign)
+    feeder.publish_command('start', campaign)
+    
+    return (
+        f"Queued campaign {campaign.name} in dialer: "
+        f"{result['agents_available']} agents, {result['contacts_added']} contacts"
+    )
+
+
+@shared_task
+def remove_campaign_from_dialer(campaign_id, clear_hopper=False):
+    """Detener la campaña en el Dialer Engine (pausa o fin)"""
+    from apps.campaigns.models import Campaign
+    from apps.campaigns.hopper import CampaignHopperFeeder
+    
+    try:
+        campaign = Campaign.objects.get(id=campaign_id)
+    except Campaign.DoesNotExist:
+        logger.error(f"Campaign {campaign_id} not found")
+        return f"Campaign {campaign_id} not found"
+    
+    feeder = CampaignHopperFeeder()
+    feeder.publish_command('stop', campaign)
+    if clear_hopper:
+        feeder.clear(campaign.id)
+    
+    return f"Removed campaign {campaign.name} from dialer"
+
+
+@shared_task(autoretry_for=(ConnectionError,), retry_kwargs={'max_retries': 2, 'countdown': 5})
+def feed_campaign_hoppers():
+    """
+    Tarea periódica: mantener el hopper de cada campaña activa entre las
+    marcas baja/alta y republicar su configuración si cambió.
+    """
+    from apps.campaigns.models import Campaign
+    from apps.campaigns.hopper import CampaignHopperFeeder
+    
+    active_campaigns = Campaign.objects.filter(
+        status='active',
+        start_date__lte=timezone.now(),
+        contact_list__isnull=False,
+    ).exclude(end_date__lt=timezone.now()).select_related('queue')
+    
+    feeder = CampaignHopperFeeder()
+    fed = 0
+    added = 0
+    
+    for campaign in active_campaigns:
+        try:
+            feeder.push_config(campaign)
+            added += feeder.top_up(campaign)
+            fed += 1
+        except ConnectionError:
+            raise
+        except Exception as e:
+            logger.error(f"Error feeding hopper for campaign {campaign.id}: {e}")
+    
+    return f"Fed {fed} campaigns, {added} contacts added"
+
+
+@shared_task(autoretry_for=(ConnectionError,), retry_kwargs={'max_retries': 2, 'countdown': 5})
+def apply_call_completions():
+    """
+    Tarea periódica: consumir calls:completed del dialer y actualizar estado,
+    intentos y próximo intento de cada contacto.
+    """
+    from apps.campaigns.hopper import CampaignHopperFeeder
+    
+    feeder = CampaignHopperFeeder()
+    batch = 1000
+    applied = 0
+    while True:
+        consumed = feeder.apply_completions(limit=batch)
+        applied += consumed
+        if consumed < batch:
+            break
+    
+    return f"Applied {applied} call completions"
@@ -0,0 +1,195 @@
+"""
+Tests for the dialer hopper feeder
+"""
+import json
+
+from django.test import TestCase, SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from unittest.mock import MagicMock
+
+from apps.campaigns.models import Campaign
+from apps.campaigns.hopper import CampaignHopperFeeder, contact_rank, hopper_keys, ready_key
+from apps.contacts.models import Contact, ContactList
+
+User = get_user_model()
+
+
+class ContactRankTest(SimpleTestCase):
+    """Test hopper rank ordering"""
+
+    def test_higher_priority_first(self):
+        """Higher priority gets a lower (earlier) rank"""
+        self.assertLess(
+            contact_rank(5, False, 2_000_000_000),
+            contact_rank(0, False, 1_000_000_000)
+        )
+
+    def test_vip_boost(self):
+        """VIP boost moves the contact ahead of equal priority"""
+        self.assertLess(
+            contact_rank(0, True, 1_700_000_000, vip_boost=10),
+            contact_rank(5, False, 1_700_000_000, vip_boost=10)
+        )
+
+    def test_fifo_within_priority(self):
+        """Same priority is ordered by eligibility time"""
+        self.assertLess(
+            contact_rank(1, False, 1_700_000_000),
+            contact_rank(1, False, 1_700_000_100)
+        )
+
+
+class CampaignHopperFeederTest(TestCase):
+    """Test CampaignHopperFeeder"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+        self.contact_list = ContactList.objects.create(
+            name='Test Contacts',
+            created_by=self.user
+        )
+
+        for i in range(5):
+            Contact.objects.create(
+                contact_list=self.contact_list,
+                first_name=f'Contact {i}',
+                phone=f'300000000{i}',
+                priority=i % 2
+            )
+        Contact.objects.create(
+            contact_list=self.contact_list,
+            first_name='Opted out',
+            phone='3009999999',
+            dnc_opt_out=True
+        )
+
+        self.campaign = Campaign.objects.create(
+            name='Hopper Campaign',
+            campaign_type='outbound',
+            dialer_type='predictive',
+            status='draft',
+            start_date=timezone.now(),
+            contact_list=self.contact_list,
+            created_by=self.user
+        )
+
+        self.redis = MagicMock()
+        self.redis.get.return_value = None
+        self.redis.hlen.return_value = 0
+        self.pipe = MagicMock()
+        self.redis.pipeline.return_value = self.pipe
+
+    def test_fetch_batch_keyset_order(self):
+        """Batches follow (priority desc, id) and skip DNC contacts"""
+        feeder = CampaignHopperFeeder(redis_client=self.redis)
+
+        first = feeder.fetch_batch(self.campaign, None, 3)
+        last = first[-1]
+        second = feeder.fetch_batch(self.campaign, (last.priority, last.id), 10)
+
+        ids = [c.id for c in first + second]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertEqual([c.priority for c in first + second], [1, 1, 0, 0, 0])
+
+    def test_top_up_fills_to_high_watermark(self):
+        """Empty hopper is filled in batches and the cursor is stored"""
+        feeder = CampaignHopperFeeder(
+            redis_client=self.redis, low_watermark=2, high_watermark=4, batch_size=3
+        )
+
+        added = feeder.top_up(self.campaign)
+
+        self.assertEqual(added, 4)
+        keys = hopper_keys(self.campaign.id)
+        cursor_writes = [c for c in self.pipe.set.call_args_list if c.args[0] == keys['cursor']]
+        self.assertEqual(len(cursor_writes), 2)
+        self.assertEqual(Contact.objects.filter(status='queued').count(), 4)
+
+    def test_exhausted_list_is_rescanned(self):
+        """Queued contacts are never re-read; the exhausted marker expires for a later rescan"""
+        feeder = CampaignHopperFeeder(redis_client=self.redis, high_watermark=10, rescan_interval=30)
+
+        self.assertEqual(feeder.top_up(self.campaign), 5)
+        self.redis.set.assert_called_once_with(
+            hopper_keys(self.campaign.id)['cursor'], 'exhausted', ex=30
+        )
+        self.assertEqual(feeder.fetch_batch(self.campaign, None, 10), [])
+
+    def test_apply_completions(self):
+        """Completions mark answered contacts, schedule retries and fail exhausted ones"""
+        self.campaign.max_retries = 2
+        self.campaign.save()
+        answered, retry, last = Contact.objects.filter(dnc_opt_out=False)[:3]
+        Contact.objects.filter(id=last.id).update(attempts=1)
+        records = [
+            {'campaign_id': self.campaign.id, 'contact': {'id': answered.id}, 'status': 'answered'},
+            {'campaign_id': self.campaign.id, 'contact': {'id': retry.id}, 'status': 'no_answer'},
+            {'campaign_id': self.campaign.id, 'contact': {'id': last.id}, 'status': 'busy'},
+        ]
+        self.pipe.execute.return_value = [[json.dumps(r) for r in records], True]
+        feeder = CampaignHopperFeeder(redis_client=self.redis)
+
+        self.assertEqual(feeder.apply_completions(), 3)
+
+        answered.refresh_from_db()
+        retry.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((answered.status, answered.attempts), ('contacted', 1))
+        self.assertEqual((retry.status, retry.attempts), ('pending', 1))
+        self.assertGreater(retry.next_attempt, retry.last_attempt)
+        self.assertEqual((last.status, last.attempts), ('failed', 2))
+
+    def test_apply_completions_for_dropped_contacts(self):
+        """Contacts the dialer claimed but never dialed leave 'queued'"""
+        dnc, no_phone, failed = Contact.objects.filter(dnc_opt_out=False)[:3]
+        Contact.objects.filter(id__in=[dnc.id, no_phone.id, failed.id]).update(status='queued')
+        records = [
+            {'campaign_id': self.campaign.id, 'call_id': None, 'contact': {'id': dnc.id}, 'status': 'dnc'},
+            {'campaign_id': self.campaign.id, 'call_id': None, 'contact': {'id': no_phone.id}, 'status': 'no_phone'},
+            {'campaign_id': self.campaign.id, 'call_id': None, 'contact': {'id': failed.id}, 'status': 'failed'},
+        ]
+        self.pipe.execute.return_value = [[json.dumps(r) for r in records], True]
+
+        CampaignHopperFeeder(redis_client=self.redis).apply_completions()
+
+        statuses = dict(Contact.objects.filter(id__in=[dnc.id, no_phone.id, failed.id]).values_list('id', 'status'))
+        self.assertEqual(statuses, {dnc.id: 'blacklisted', no_phone.id: 'failed', failed.id: 'pending'})
+
+    def test_top_up_buckets_by_timezone(self):
+        """Contacts go to their timezone bucket, defaulting to the campaign's"""
+        Contact.objects.filter(phone='3000000001').update(timezone='America/Mexico_City')
+        feeder = CampaignHopperFeeder(redis_client=self.redis, high_watermark=10)
+
+        feeder.top_up(self.campaign)
+
+        buckets = {c.args[0] for c in self.pipe.zadd.call_args_list}
+        self.assertEqual(buckets, {
+            ready_key(self.campaign.id, 'America/Bogota'),
+            ready_key(self.campaign.id, 'America/Mexico_City'),
+        })
+
+    def test_top_up_skips_above_low_watermark(self):
+        """No database reads when the hopper is above the low watermark"""
+        self.redis.hlen.return_value = 50
+        feeder = CampaignHopperFeeder(redis_client=self.redis, low_watermark=10)
+
+        self.assertEqual(feeder.top_up(self.campaign), 0)
+        self.pipe.hset.assert_not_called()
+
+    def test_push_config_only_on_change(self):
+        """Config is written once and skipped when the hash matches"""
+        feeder = CampaignHopperFeeder(redis_client=self.redis)
+
+        self.assertTrue(feeder.push_config(self.campaign))
+        digest = self.pipe.set.call_args_list[-1].args[1]
+        self.redis.get.return_value = digest
+
+        self.assertFalse(feeder.push_config(self.campaign))
@@ -0,0 +1,89 @@
+"""
+Lista DNC (No Llamar) para el Dialer Engine
+
+El dialer mantiene en memoria el conjunto de números bloqueados:
+- Carga inicial desde GET /api/cc/dnc-snapshot/ (texto plano, un número por línea)
+- Actualizaciones incrementales publicadas en Redis (canal 'dnc:updates')
+
+Los números se normalizan a sus últimos 10 dígitos, igual que DNCCheckView.
+"""
+import json
+import logging
+import re
+from typing import Iterator, Optional
+
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+DNC_UPDATES_CHANNEL = 'dnc:updates'
+DNC_VERSION_KEY = 'dnc:version'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_dnc_number(phone: Optional[str]) -> str:
+    """Últimos 10 dígitos del número, sin símbolos ni espacios"""
+    return _NON_DIGITS.sub('', phone or '')[-10:]
+
+
+def is_number_blocked(number: str) -> bool:
+    """Verificar en la base de datos si un número normalizado sigue bloqueado"""
+    from apps.contacts.models import Blacklist, Contact
+
+    if not number:
+        return False
+    return (
+        Blacklist.objects.filter(phone__endswith=number, is_active=True).exists()
+        or Contact.objects.filter(phone__endswith=number, dnc_opt_out=True).exists()
+    )
+
+
+def iter_dnc_numbers(chunk_size: int = 5000) -> Iterator[str]:
+    """Números bloqueados normalizados (lista negra activa + opt-out), sin duplicados"""
+    from apps.contacts.models import Blacklist, Contact
+
+    seen = set()
+    sources = (
+        Blacklist.objects.filter(is_active=True).values_list('phone', flat=True),
+        Contact.objects.filter(dnc_opt_out=True).exclude(Q(phone='')).values_list('phone', flat=True),
+    )
+    for queryset in sources:
+        for phone in queryset.iterator(chunk_size=chunk_size):
+            number = normalize_dnc_number(phone)
+            if number and number not in seen:
+                seen.add(number)
+                yield number
+
+
+def current_dnc_version(redis_client=None) -> int:
+    from apps.campaigns.hopper import get_redis
+
+    redis_client = redis_client or get_redis()
+    return int(redis_client.get(DNC_VERSION_KEY) or 0)
+
+
+def publish_dnc_change(phone: str, blocked: bool, redis_client=None) -> Optional[int]:
+    """
+    Publicar un cambio incremental de la lista DNC.
+
+    Returns:
+        int: Nueva versión de la lista, o None si no se pudo publicar
+    """
+    from apps.campaigns.hopper import get_redis
+
+    number = normalize_dnc_number(phone)
+    if not number:
+        return None
+    try:
+        redis_client = redis_client or get_redis()
+        version = redis_client.incr(DNC_VERSION_KEY)
+        redis_client.publish(DNC_UPDATES_CHANNEL, json.dumps({
+            'op': 'add' if blocked else 'remove',
+            'number': number,
+            'version': version,
+        }))
+        return version
+    except Exception as e:
+        logger.warning(f"No se pudo publicar el cambio DNC de {number}: {e}")
+        return None
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0004_alter_contact_dnc_opt_out_alter_contact_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['contact_list', '-priority', 'id'], name='contacts_list_prio_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0005_contact_list_priority_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='status',
+            field=models.CharField(choices=[('new', 'Nuevo'), ('pending', 'Pendiente'), ('queued', 'En marcación'), ('contacted', 'Contactado'), ('success', 'Exitoso'), ('failed', 'Fallido'), ('blacklisted', 'Lista Negra')], default='new', max_length=20, verbose_name='Estado'),
+        ),
+    ]
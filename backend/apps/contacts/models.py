@@ -32,6 +32,7 @@ class Contact(models.Model):
     STATUS_CHOICES = [
         ('new', 'Nuevo'),
         ('pending', 'Pendiente'),
+        ('queued', 'En marcación'),
         ('contacted', 'Contactado'),
         ('success', 'Exitoso'),
         ('failed', 'Fallido'),
@@ -85,6 +86,8 @@ class Contact(models.Model):
         indexes = [
             models.Index(fields=['contact_list', 'status']),
             models.Index(fields=['phone']),
+            # Paginación keyset del hopper del dialer (prioridad desc, id)
+            models.Index(fields=['contact_list', '-priority', 'id'], name='contacts_list_prio_id_idx'),
         ]
     
     def __str__(self):
@@ -0,0 +1,49 @@
+"""
+Signals que publican cambios de la lista DNC para el filtro en memoria
+del Dialer Engine (ver apps/contacts/dnc.py).
+"""
+import logging
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.contacts.dnc import is_number_blocked, normalize_dnc_number, publish_dnc_change
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender='contacts.Blacklist')
+def blacklist_saved(sender, instance, created, **kwargs):
+    """Número agregado o (des)activado en la lista negra"""
+    if instance.is_active:
+        publish_dnc_change(instance.phone, blocked=True)
+    else:
+        number = normalize_dnc_number(instance.phone)
+        publish_dnc_change(number, blocked=is_number_blocked(number))
+
+
+@receiver(post_delete, sender='contacts.Blacklist')
+def blacklist_deleted(sender, instance, **kwargs):
+    """Número eliminado de la lista negra (puede seguir bloqueado por opt-out)"""
+    number = normalize_dnc_number(instance.phone)
+    publish_dnc_change(number, blocked=is_number_blocked(number))
+
+
+@receiver(post_init, sender='contacts.Contact')
+def contact_loaded(sender, instance, **kwargs):
+    """Recordar el opt-out con el que se cargó el contacto (sin forzar campos diferidos)"""
+    instance._loaded_dnc_opt_out = instance.__dict__.get('dnc_opt_out')
+
+
+@receiver(post_save, sender='contacts.Contact')
+def contact_dnc_changed(sender, instance, created, **kwargs):
+    """Contacto con opt-out nuevo o retirado"""
+    previous = getattr(instance, '_loaded_dnc_opt_out', None)
+    current = instance.dnc_opt_out
+    instance._loaded_dnc_opt_out = current
+    if current and (created or not previous):
+        publish_dnc_change(instance.phone, blocked=True)
+    elif not current and previous and not created:
+        # El número puede seguir bloqueado por la lista negra u otro contacto
+        number = normalize_dnc_number(instance.phone)
+        if number and not is_number_blocked(number):
+            publish_dnc_change(number, blocked=False)
@@ -0,0 +1,137 @@
+"""
+Tests for the DNC snapshot and delta publishing
+"""
+import json
+from django.test import TestCase, SimpleTestCase
+from django.contrib.auth import get_user_model
+from unittest.mock import MagicMock, patch
+from rest_framework.test import APIClient
+
+from apps.contacts.dnc import normalize_dnc_number, iter_dnc_numbers, DNC_UPDATES_CHANNEL
+from apps.contacts.models import Contact, ContactList, Blacklist
+
+User = get_user_model()
+
+
+class NormalizeDNCNumberTest(SimpleTestCase):
+    """Test number normalization"""
+
+    def test_strips_symbols_and_keeps_last_ten(self):
+        """Country code and separators are removed"""
+        self.assertEqual(normalize_dnc_number('+57 (300) 123-4567'), '3001234567')
+
+    def test_empty(self):
+        """Empty or missing numbers normalize to an empty string"""
+        self.assertEqual(normalize_dnc_number(None), '')
+        self.assertEqual(normalize_dnc_number(' - '), '')
+
+
+class DNCSnapshotTest(TestCase):
+    """Test DNC snapshot and incremental updates"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.redis = MagicMock()
+        self.redis.incr.side_effect = range(1, 100)
+        patcher = patch('apps.campaigns.hopper.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.contact_list = ContactList.objects.create(
+            name='DNC List',
+            created_by=self.user
+        )
+
+    def published(self):
+        return [
+            json.loads(c.args[1]) for c in self.redis.publish.call_args_list
+            if c.args[0] == DNC_UPDATES_CHANNEL
+        ]
+
+    def test_snapshot_deduplicates_sources(self):
+        """Blacklist and opted-out contacts are merged without duplicates"""
+        Blacklist.objects.create(phone='+573001112233')
+        Blacklist.objects.create(phone='3009998877', is_active=False)
+        Contact.objects.create(
+            contact_list=self.contact_list, first_name='A',
+            phone='3001112233', dnc_opt_out=True
+        )
+        Contact.objects.create(
+            contact_list=self.contact_list, first_name='B',
+            phone='3004445566', dnc_opt_out=True
+        )
+        Contact.objects.create(
+            contact_list=self.contact_list, first_name='C', phone='3007778899'
+        )
+
+        self.assertEqual(sorted(iter_dnc_numbers()), ['3001112233', '3004445566'])
+
+    def test_opt_out_publishes_add_and_remove(self):
+        """Toggling opt-out publishes add then remove"""
+        contact = Contact.objects.create(
+            contact_list=self.contact_list, first_name='A', phone='3001112233'
+        )
+        self.assertEqual(self.published(), [])
+
+        contact.dnc_opt_out = True
+        contact.save()
+        contact = Contact.objects.get(pk=contact.pk)
+        contact.dnc_opt_out = False
+        contact.save()
+
+        self.assertEqual(
+            [(d['op'], d['number']) for d in self.published()],
+            [('add', '3001112233'), ('remove', '3001112233')]
+        )
+
+    def test_unrelated_save_does_not_publish(self):
+        """Saving a contact without opt-out changes publishes nothing"""
+        contact = Contact.objects.create(
+            contact_list=self.contact_list, first_name='A', phone='3001112233'
+        )
+        contact.status = 'contacted'
+        contact.save()
+
+        self.assertEqual(self.published(), [])
+
+    def test_blacklist_removal_keeps_opted_out_number(self):
+        """Deleting a blacklist entry does not unblock an opted-out contact"""
+        Contact.objects.create(
+            contact_list=self.contact_list, first_name='A',
+            phone='3001112233', dnc_opt_out=True
+        )
+        entry = Blacklist.objects.create(phone='3001112233')
+        entry.delete()
+
+        self.assertEqual(self.published()[-1]['op'], 'add')
+
+
+class DNCCheckViewTest(TestCase):
+    """Test the DNC check endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        patcher = patch('apps.campaigns.hopper.get_redis', return_value=MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Blacklist.objects.create(phone='3001112233')
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(username='testuser', password='testpass123')
+        )
+
+    def test_blocked_number(self):
+        """A blacklisted number is reported as blocked"""
+        response = self.client.post('/api/cc/dnc-check/', {'phone': '+57 300 111 2233'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['blocked'])
+
+    def test_number_without_digits_is_rejected(self):
+        """Input with no digits does not match the whole list"""
+        response = self.client.post('/api/cc/dnc-check/', {'phone': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -29,8 +29,9 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 from apps.telephony.models import Call
+from apps.telephony.reference_cache import reference_cache
 from apps.agents.models import Agent, AgentStatusHistory
-from apps.queues.models import Queue, QueueStats
+from apps.queues.models import QueueStats
 from apps.reports.models import Report
 from apps.api.serializers import ReportSerializer
 
@@ -605,7 +606,7 @@ class ReportViewSet(viewsets.ModelViewSet):
         Detalle por cola incluyendo abandono, SLA, hold time.
         """
         start, end = _parse_date_range(request)
-        queues = Queue.objects.filter(is_active=True)
+        queues = reference_cache.active_queues()
         result = []
 
         for queue in queues:
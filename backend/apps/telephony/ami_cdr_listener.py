@@ -11,20 +11,52 @@ Eventos capturados:
   Voicemail: VoicemailUserEntry
   Agentes:   QueueMemberStatus, QueueMemberPause, QueueMemberAdded,
              QueueMemberRemoved, AgentLogin, AgentLogoff
-
-Se ejecuta como hilo daemon dentro del worker Celery.
+  Troncales: ContactStatus, Registry (ver trunk_status.py)
+
+Se ejecuta como hilo daemon dentro del worker Celery: un event loop asyncio
+lee el socket y corta los eventos en bytes (ver ami_protocol.py); los
+handlers corren en orden en un único hilo aparte y no escriben en la base de
+datos directamente: encolan sus mutaciones en un write-behind (ver
+ami_writer.py) que las aplica por lotes, así una base de datos lenta no frena
+la lectura del socket ni el procesamiento de eventos.
+
+Con el journal activo (ver ami_journal.py) cada evento se guarda primero en
+un Redis Stream y los handlers lo consumen desde ahí con checkpoint: un
+reinicio del worker no pierde eventos, y al arrancar se reconstruye el estado
+de las llamadas en curso con los eventos previos al checkpoint.
+
+Con AMI_LISTENER_WORKERS > 1 este hilo sólo lee y journaliza: los handlers
+corren en procesos aparte, uno por shard de llamadas/agentes (ver
+ami_shards.py).
+
+Al conectar se instala un Filter en la sesión AMI para recibir sólo los
+eventos con handler (AMI_EVENT_FILTER). Los eventos recibidos, procesados,
+con error y la duración de cada handler se exportan a Prometheus por tipo de
+evento en AMI_METRICS_PORT.
 """
+import asyncio
 import os
 import re
-import socket
 import time
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from django.utils import timezone
 
+from apps.telephony.ami_journal import (
+    JOURNAL_ENABLED, AMIJournal, entry_time, journal_key, next_id, time_id,
+)
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser, frame_event_name
+from apps.telephony.ami_shards import SHARDS, ShardPool, route, shard_consumer
+from apps.telephony.ami_writer import WriteBehind
+from apps.telephony.call_state import CallState, CallStateStore
+from apps.telephony.reference_cache import reference_cache
+from apps.telephony.trunk_status import trunk_status_cache
+from core import metrics
+
 logger = logging.getLogger(__name__)
 
 # ─────────────────────────────────────────────────────────────────
@@ -38,97 +70,89 @@ AMI_SECRET = os.environ.get('ASTERISK_AMI_PASSWORD', 'vozipomni_ami_2026')
 RECONNECT_DELAY = 5
 MAX_RECONNECT_DELAY = 60
 PING_INTERVAL = 30
+READ_SIZE = 65536
+# Eventos leídos y aún no procesados; al llenarse se deja de leer el socket
+EVENT_QUEUE_SIZE = int(os.environ.get('AMI_LISTENER_QUEUE_SIZE', '10000'))
+# Eventos que el hilo de handlers procesa por cada salto desde el event loop
+DISPATCH_BATCH = 200
+# Pedir a Asterisk (acción Filter) sólo los eventos que tienen handler
+EVENT_FILTER = os.environ.get('AMI_EVENT_FILTER', 'true').lower() in ('1', 'true', 'yes')
+# Puerto de /metrics del listener (los shards usan los siguientes); 0 = sin servidor
+METRICS_PORT = int(os.environ.get('AMI_METRICS_PORT', '9105'))
 
 _listener_thread = None
 _stop_event = threading.Event()
+_listener_loop_ref = None
+_listener_task = None
+_metrics_port = None
+
+# Segundos de eventos previos al checkpoint que se reprocesan al arrancar
+# para reconstruir el estado de las llamadas en curso
+JOURNAL_WARMUP = int(os.environ.get('AMI_JOURNAL_WARMUP', '1800'))
+
+# Mutaciones pendientes de los handlers (sólo se usa desde el hilo de handlers)
+_writer = WriteBehind()
+
+# Instante del evento en proceso (del ID del journal); None = ahora
+_event_ts: float | None = None
+
+# Offsets del journal: último evento procesado y último ya aplicado en la BD
+_processed_id = None
+_applied_id = None
+
+# Agentes con valores encolados desde el último flush
+_dirty_agents = set()
 
 # ─────────────────────────────────────────────────────────────────
 # Estado en memoria para correlacionar eventos por canal/uniqueid
 # ─────────────────────────────────────────────────────────────────
-# Estructura: { uniqueid: { campo: valor, ... } }
-_call_state: dict[str, dict] = {}
-_call_state_lock = threading.Lock()
+# Un CallState por uniqueid, con expiración por timer wheel (ver call_state.py).
+# Sólo se usa desde el hilo de handlers.
+_call_states = CallStateStore()
+_evicted_logged = 0
 
-# Limpieza de estados viejos (>2h) para evitar memory leak
-_STATE_TTL = 7200  # 2 horas en segundos
+
+def _event_time() -> float:
+    """Epoch del evento en proceso (el actual si no viene del journal)."""
+    return _event_ts if _event_ts is not None else time.time()
+
+
+def _event_now() -> datetime:
+    """Instante del evento en proceso como datetime aware."""
+    if _event_ts is None:
+        return timezone.now()
+    return datetime.fromtimestamp(_event_ts, tz=dt_timezone.utc)
 
 
 def _cleanup_stale_state():
-    """Elimina estados de llamadas que llevan más de _STATE_TTL sin actualización."""
-    now = time.time()
-    with _call_state_lock:
-        stale = [uid for uid, s in _call_state.items()
-                 if now - s.get('_ts', 0) > _STATE_TTL]
-        for uid in stale:
-            del _call_state[uid]
-        if stale:
-            logger.debug(f"[AMI] Limpiados {len(stale)} estados de llamada stale")
-
-
-def _get_state(uniqueid: str) -> dict:
+    """Elimina los estados de llamadas sin actualización en más de AMI_CALL_STATE_TTL."""
+    global _evicted_logged
+    expired = _call_states.expire(time.time())
+    stats = _call_states.stats()
+    if stats['evicted'] > _evicted_logged:
+        logger.warning(
+            f"[AMI] Límite de estados de llamada alcanzado (AMI_CALL_STATE_MAX={_call_states.max_states}): "
+            f"{stats['evicted'] - _evicted_logged} descartados ({stats})"
+        )
+        _evicted_logged = stats['evicted']
+    elif expired:
+        logger.debug(f"[AMI] Limpiados {expired} estados de llamada stale ({stats})")
+
+
+def _get_state(uniqueid: str) -> CallState:
     """Obtiene o crea el estado en memoria de una llamada."""
-    with _call_state_lock:
-        if uniqueid not in _call_state:
-            _call_state[uniqueid] = {'_ts': time.time()}
-        else:
-            _call_state[uniqueid]['_ts'] = time.time()
-        return _call_state[uniqueid]
+    return _call_states.get(uniqueid, _event_time())
 
 
-def _pop_state(uniqueid: str) -> dict:
+def _pop_state(uniqueid: str) -> CallState:
     """Obtiene y elimina el estado en memoria de una llamada."""
-    with _call_state_lock:
-        return _call_state.pop(uniqueid, {})
+    return _call_states.pop(uniqueid)
 
 
 # ─────────────────────────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────────────────────────
 
-def _parse_ami_event(raw: str) -> dict:
-    """Convierte un bloque AMI (líneas 'Key: Value') en un dict."""
-    data = {}
-    for line in raw.strip().splitlines():
-        if ':' in line:
-            key, _, value = line.partition(':')
-            data[key.strip()] = value.strip()
-    return data
-
-
-def _ami_login(sock: socket.socket) -> bool:
-    """Autenticación AMI con suscripción a TODOS los eventos necesarios."""
-    _read_until_blank(sock)
-    # Events: system,call,agent,cdr,dialplan,user — cubrir todo lo relevante
-    # 'user' es necesario para VoicemailUserEntry
-    cmd = (
-        f"Action: Login\r\n"
-        f"Username: {AMI_USER}\r\n"
-        f"Secret: {AMI_SECRET}\r\n"
-        f"Events: system,call,agent,cdr,dialplan,user\r\n"
-        f"\r\n"
-    )
-    sock.sendall(cmd.encode())
-    resp = _read_until_blank(sock)
-    return 'Success' in resp
-
-
-def _read_until_blank(sock: socket.socket, timeout: float = 10.0) -> str:
-    """Lee del socket hasta encontrar \\r\\n\\r\\n o timeout."""
-    sock.settimeout(timeout)
-    buf = b''
-    while True:
-        try:
-            chunk = sock.recv(4096)
-            if not chunk:
-                break
-            buf += chunk
-            if b'\r\n\r\n' in buf:
-                break
-        except socket.timeout:
-            break
-    return buf.decode('utf-8', errors='ignore')
-
-
 def _determine_direction(src: str, dst: str, channel: str, dcontext: str) -> str:
     """Determina si la llamada es inbound u outbound."""
     if dcontext in ('from-pstn', 'from-trunk', 'from-external'):
@@ -175,95 +199,60 @@ def _extract_extension(channel: str) -> str | None:
 
 
 def _find_agent_by_extension(ext: str):
-    """Busca un Agent por extensión SIP."""
-    if not ext:
-        return None
-    from apps.agents.models import Agent
-    try:
-        return Agent.objects.get(sip_extension=ext)
-    except Agent.DoesNotExist:
-        return None
+    """Busca un Agent por extensión SIP (caché de referencia)."""
+    agent = reference_cache.agent_by_extension(ext)
+    # Con los cambios aún no aplicados por el write-behind
+    return _writer.overlay(agent) if agent is not None else None
 
 
 def _find_queue_by_name(queue_name: str):
-    """Busca una Queue por nombre."""
-    if not queue_name:
-        return None
-    from apps.queues.models import Queue
-    try:
-        return Queue.objects.get(name=queue_name)
-    except Queue.DoesNotExist:
-        # Intentar por extensión
-        try:
-            return Queue.objects.get(extension=queue_name)
-        except Queue.DoesNotExist:
-            return None
+    """Busca una Queue por nombre o extensión (caché de referencia)."""
+    return reference_cache.queue_by_name(queue_name)
+
+
+def _save_agent(agent, **values):
+    """Asigna campos del agente y encola su UPDATE en el write-behind."""
+    from apps.agents.models import Agent
+
+    # La instancia es la de la caché: queda con los valores nuevos
+    for field, value in values.items():
+        setattr(agent, field, value)
+    _writer.update(Agent, {'pk': agent.pk}, values=values)
+    _dirty_agents.add(agent.pk)
 
 
 def _update_agent_status(agent, new_status: str, save_history: bool = True):
     """
     Actualiza el estado de un agente y crea registro de historial.
-    Cierra el registro anterior de AgentStatusHistory.
+    Al aplicarse se cierra el registro anterior de AgentStatusHistory y su
+    duración se acumula en las métricas diarias del estado anterior.
     """
-    from apps.agents.models import Agent, AgentStatusHistory
-
     old_status = agent.status
     if old_status == new_status:
         return
 
-    now = timezone.now()
-
-    # Cerrar registro de historial anterior
     if save_history:
-        prev_record = AgentStatusHistory.objects.filter(
-            agent=agent, ended_at__isnull=True
-        ).first()
-        if prev_record:
-            prev_record.ended_at = now
-            prev_record.duration = int(
-                (now - prev_record.started_at).total_seconds()
-            )
-            prev_record.save(update_fields=['ended_at', 'duration'])
-
-            # Acumular tiempo en métricas diarias
-            if old_status == 'available':
-                agent.available_time_today += prev_record.duration
-            elif old_status == 'break':
-                agent.break_time_today += prev_record.duration
-            elif old_status in ('oncall', 'busy'):
-                agent.oncall_time_today += prev_record.duration
-            elif old_status == 'wrapup':
-                agent.wrapup_time_today += prev_record.duration
-
-        # Crear nuevo registro de historial
-        AgentStatusHistory.objects.create(
-            agent=agent,
-            status=new_status,
-            started_at=now,
-        )
-
-    agent.status = new_status
-    agent.save(update_fields=[
-        'status', 'available_time_today', 'break_time_today',
-        'oncall_time_today', 'wrapup_time_today',
-    ])
+        _writer.agent_transition(agent.pk, old_status, new_status, _event_now())
+    _save_agent(agent, status=new_status)
 
     logger.info(f"[AMI] Agente {agent.sip_extension}: {old_status} → {new_status}")
 
 
-def _update_queue_stats(queue, **kwargs):
-    """Actualiza las estadísticas en tiempo real de una cola."""
+def _update_queue_stats(queue, floor_zero=(), **kwargs):
+    """Encola cambios a las estadísticas en tiempo real de una cola."""
     from apps.queues.models import QueueStats
 
-    stats, _ = QueueStats.objects.get_or_create(queue=queue)
+    increments, values = {}, {}
     for field, value in kwargs.items():
-        if hasattr(stats, field):
-            if isinstance(value, int) and field.startswith('calls_'):
-                # Incrementar contadores
-                setattr(stats, field, getattr(stats, field, 0) + value)
-            else:
-                setattr(stats, field, value)
-    stats.save()
+        if isinstance(value, int) and field.startswith('calls_'):
+            # Incrementar contadores
+            increments[field] = value
+        else:
+            values[field] = value
+    _writer.update(
+        QueueStats, {'queue_id': queue.pk},
+        increments=increments, values=values, floor_zero=floor_zero, ensure=True,
+    )
 
 
 # ─────────────────────────────────────────────────────────────────
@@ -272,9 +261,7 @@ def _update_queue_stats(queue, **kwargs):
 
 def _process_cdr_event(event: dict):
     """Crea/actualiza un registro Call a partir de un evento CDR de AMI."""
-    from apps.telephony.models import Call
     from apps.agents.models import Agent
-    from apps.recordings.models import Recording
 
     unique_id = event.get('UniqueID', '') or event.get('Uniqueid', '')
     src = event.get('Source', '') or event.get('CallerID', '')
@@ -299,9 +286,9 @@ def _process_cdr_event(event: dict):
     state = _pop_state(unique_id)
 
     # Si fue marcado como voicemail, abandoned o transferred usar ese estado
-    call_status = state.get('final_status') or _map_disposition(disposition)
+    call_status = state.final_status or _map_disposition(disposition)
 
-    start_time = _parse_datetime(start_str) or timezone.now()
+    start_time = _parse_datetime(start_str) or _event_now()
     answer_time = _parse_datetime(answer_str)
     end_time = _parse_datetime(end_str) or (start_time + timedelta(seconds=duration))
 
@@ -310,7 +297,7 @@ def _process_cdr_event(event: dict):
         wait_time = max(0, int((answer_time - start_time).total_seconds()))
 
     # Si tenemos queue_enter_time del evento QueueCallerJoin, usarla
-    queue_enter = state.get('queue_enter_time')
+    queue_enter = state.queue_enter_time
     if queue_enter and answer_time:
         wait_time = max(0, int((answer_time - queue_enter).total_seconds()))
     elif queue_enter and not answer_time:
@@ -318,21 +305,21 @@ def _process_cdr_event(event: dict):
         wait_time = max(0, int((end_time - queue_enter).total_seconds()))
 
     # Hold time acumulado de eventos Hold/Unhold
-    hold_time = state.get('hold_time', 0)
+    hold_time = state.hold_time
 
     # Buscar agente — primero del estado, luego del canal
-    agent = state.get('agent')
+    agent = state.agent
     if not agent:
         dst_channel = event.get('DestinationChannel', '')
         ext = _extract_extension(dst_channel or channel)
         agent = _find_agent_by_extension(ext)
 
     # Queue del estado en memoria
-    queue = state.get('queue')
+    queue = state.queue
 
     # Transfer info del estado
-    transferred = state.get('transferred', False)
-    transfer_to = state.get('transfer_to', '')
+    transferred = state.transferred
+    transfer_to = state.transfer_to
 
     dst_channel = event.get('DestinationChannel', '')
 
@@ -361,36 +348,32 @@ def _process_cdr_event(event: dict):
             'ami_disposition': disposition,
             'ami_duration': duration,
             'ami_accountcode': event.get('AccountCode', ''),
-            'queue_name': state.get('queue_name', ''),
-            'hold_events': state.get('hold_events', 0),
-            'ring_no_answer_count': state.get('ring_no_answer_count', 0),
+            'queue_name': state.queue_name,
+            'hold_events': state.hold_events,
+            'ring_no_answer_count': state.ring_no_answer_count,
         },
     }
 
-    call, created = Call.objects.update_or_create(
-        call_id=call_id,
-        defaults=defaults,
-    )
+    def on_saved(call, created):
+        action_name = "CREADO" if created else "ACTUALIZADO"
+        logger.info(
+            f"[CDR] {action_name} Call {call.id}: {call_id}  "
+            f"{src} → {dst}  {direction}  {call_status}  "
+            f"dur={duration}s  bill={billsec}s  hold={hold_time}s  "
+            f"queue={state.queue_name or '-'}  transferred={transferred}"
+        )
+        # Buscar grabación asociada
+        _link_recording(call, event)
 
-    action_name = "CREADO" if created else "ACTUALIZADO"
-    logger.info(
-        f"[CDR] {action_name} Call {call.id}: {call_id}  "
-        f"{src} → {dst}  {direction}  {call_status}  "
-        f"dur={duration}s  bill={billsec}s  hold={hold_time}s  "
-        f"queue={state.get('queue_name', '-')}  transferred={transferred}"
-    )
+    _writer.upsert_call(call_id, defaults, on_saved=on_saved)
 
     # Actualizar métricas del agente
     if agent and call_status == 'completed':
-        agent.calls_today += 1
-        agent.talk_time_today += billsec
-        agent.last_call_time = timezone.now()
-        agent.save(update_fields=['calls_today', 'talk_time_today', 'last_call_time'])
-
-    # Buscar grabación asociada
-    _link_recording(call, event)
-
-    return call
+        _writer.update(
+            Agent, {'pk': agent.pk},
+            increments={'calls_today': 1, 'talk_time_today': billsec},
+            values={'last_call_time': _event_now()},
+        )
 
 
 def _process_queue_caller_join(event: dict):
@@ -406,15 +389,15 @@ def _process_queue_caller_join(event: dict):
         return
 
     state = _get_state(uniqueid)
-    state['queue_enter_time'] = timezone.now()
-    state['queue_name'] = queue_name
-    state['queue'] = _find_queue_by_name(queue_name)
-    state['caller'] = caller
+    state.queue_enter_time = _event_now()
+    state.queue_name = queue_name
+    state.queue = _find_queue_by_name(queue_name)
+    state.caller = caller
 
     logger.info(f"[QUEUE] Llamante {caller} entró a cola '{queue_name}' (pos {event.get('Position', '?')})")
 
     # Actualizar QueueStats
-    queue = state.get('queue')
+    queue = state.queue
     if queue:
         _update_queue_stats(queue, calls_waiting=1)
 
@@ -432,21 +415,17 @@ def _process_queue_caller_abandon(event: dict):
         return
 
     state = _get_state(uniqueid)
-    state['final_status'] = 'abandoned'
-    state['queue_name'] = queue_name
+    state.final_status = 'abandoned'
+    state.queue_name = queue_name
 
-    queue = state.get('queue') or _find_queue_by_name(queue_name)
-    state['queue'] = queue
+    queue = state.queue or _find_queue_by_name(queue_name)
+    state.queue = queue
 
     logger.info(f"[QUEUE] Llamada {uniqueid} ABANDONADA en cola '{queue_name}' tras {hold_time}s")
 
     # Actualizar QueueStats
     if queue:
-        from apps.queues.models import QueueStats
-        stats, _ = QueueStats.objects.get_or_create(queue=queue)
-        stats.calls_abandoned += 1
-        stats.calls_waiting = max(0, stats.calls_waiting - 1)
-        stats.save(update_fields=['calls_abandoned', 'calls_waiting'])
+        _update_queue_stats(queue, calls_abandoned=1, calls_waiting=-1, floor_zero=('calls_waiting',))
 
 
 def _process_queue_caller_leave(event: dict):
@@ -462,10 +441,7 @@ def _process_queue_caller_leave(event: dict):
 
     queue = _find_queue_by_name(queue_name)
     if queue:
-        from apps.queues.models import QueueStats
-        stats, _ = QueueStats.objects.get_or_create(queue=queue)
-        stats.calls_waiting = max(0, stats.calls_waiting - 1)
-        stats.save(update_fields=['calls_waiting'])
+        _update_queue_stats(queue, calls_waiting=-1, floor_zero=('calls_waiting',))
 
     logger.debug(f"[QUEUE] Llamante salió de cola '{queue_name}'")
 
@@ -488,10 +464,10 @@ def _process_agent_connect(event: dict):
     agent = _find_agent_by_extension(ext)
 
     state = _get_state(uniqueid)
-    state['agent'] = agent
-    state['queue_name'] = queue_name
-    if not state.get('queue'):
-        state['queue'] = _find_queue_by_name(queue_name)
+    state.agent = agent
+    state.queue_name = queue_name
+    if not state.queue:
+        state.queue = _find_queue_by_name(queue_name)
 
     logger.info(
         f"[QUEUE] Agente {ext or interface} conectó con llamada {uniqueid} "
@@ -501,17 +477,12 @@ def _process_agent_connect(event: dict):
     # Actualizar estado del agente a 'oncall'
     if agent:
         _update_agent_status(agent, 'oncall')
-        agent.current_calls = max(1, agent.current_calls + 1)
-        agent.save(update_fields=['current_calls'])
+        _save_agent(agent, current_calls=max(1, agent.current_calls + 1))
 
     # Actualizar QueueStats
-    queue = state.get('queue')
+    queue = state.queue
     if queue:
-        from apps.queues.models import QueueStats
-        stats, _ = QueueStats.objects.get_or_create(queue=queue)
-        stats.calls_completed += 1
-        stats.calls_waiting = max(0, stats.calls_waiting - 1)
-        stats.save(update_fields=['calls_completed', 'calls_waiting'])
+        _update_queue_stats(queue, calls_completed=1, calls_waiting=-1, floor_zero=('calls_waiting',))
 
 
 def _process_agent_complete(event: dict):
@@ -537,12 +508,11 @@ def _process_agent_complete(event: dict):
 
     # Devolver agente a estado 'available' (o 'wrapup' si hay wrap_up_time)
     if agent:
-        agent.current_calls = max(0, agent.current_calls - 1)
-        agent.save(update_fields=['current_calls'])
+        _save_agent(agent, current_calls=max(0, agent.current_calls - 1))
 
         # Si la cola tiene wrap_up_time configurado, poner en wrapup
         state = _get_state(uniqueid)
-        queue = state.get('queue')
+        queue = state.queue
         if queue and queue.wrap_up_time > 0:
             _update_agent_status(agent, 'wrapup')
         else:
@@ -555,16 +525,10 @@ def _process_agent_complete(event: dict):
         queue_name = event.get('Queue', '')
         queue_obj = _find_queue_by_name(queue_name)
         if queue_obj:
-            try:
-                member = QueueMember.objects.get(
-                    queue=queue_obj,
-                    agent__sip_extension=ext,
-                )
-                member.calls_taken += 1
-                member.last_call = timezone.now()
-                member.save(update_fields=['calls_taken', 'last_call'])
-            except QueueMember.DoesNotExist:
-                pass
+            _writer.update(
+                QueueMember, {'queue_id': queue_obj.pk, 'agent__sip_extension': ext},
+                increments={'calls_taken': 1}, values={'last_call': _event_now()},
+            )
 
 
 def _process_agent_ring_no_answer(event: dict):
@@ -582,7 +546,7 @@ def _process_agent_ring_no_answer(event: dict):
 
     if uniqueid:
         state = _get_state(uniqueid)
-        state['ring_no_answer_count'] = state.get('ring_no_answer_count', 0) + 1
+        state.ring_no_answer_count += 1
 
 
 def _process_hold(event: dict):
@@ -595,8 +559,8 @@ def _process_hold(event: dict):
         return
 
     state = _get_state(uniqueid)
-    state['hold_start'] = time.time()
-    state['hold_events'] = state.get('hold_events', 0) + 1
+    state.hold_start = _event_time()
+    state.hold_events += 1
 
     logger.debug(f"[HOLD] Llamada {uniqueid} puesta en espera")
 
@@ -611,10 +575,10 @@ def _process_unhold(event: dict):
         return
 
     state = _get_state(uniqueid)
-    hold_start = state.pop('hold_start', None)
+    hold_start, state.hold_start = state.hold_start, None
     if hold_start:
-        elapsed = int(time.time() - hold_start)
-        state['hold_time'] = state.get('hold_time', 0) + elapsed
+        elapsed = int(_event_time() - hold_start)
+        state.hold_time += elapsed
         logger.debug(f"[HOLD] Llamada {uniqueid} sacada de espera ({elapsed}s)")
 
 
@@ -633,9 +597,9 @@ def _process_blind_transfer(event: dict):
 
     state = _get_state(uniqueid)
     if result == 'Success':
-        state['transferred'] = True
-        state['transfer_to'] = extension
-        state['final_status'] = 'transferred'
+        state.transferred = True
+        state.transfer_to = extension
+        state.final_status = 'transferred'
         logger.info(f"[TRANSFER] Transferencia ciega {uniqueid} → ext {extension}")
     else:
         logger.warning(f"[TRANSFER] Transferencia ciega fallida {uniqueid}: {result}")
@@ -656,9 +620,9 @@ def _process_attended_transfer(event: dict):
 
     state = _get_state(uniqueid)
     if result == 'Success':
-        state['transferred'] = True
-        state['transfer_to'] = dest_exten
-        state['final_status'] = 'transferred'
+        state.transferred = True
+        state.transfer_to = dest_exten
+        state.final_status = 'transferred'
         logger.info(f"[TRANSFER] Transferencia asistida {uniqueid} → {dest_exten}")
 
 
@@ -674,8 +638,8 @@ def _process_voicemail_entry(event: dict):
         return
 
     state = _get_state(uniqueid)
-    state['final_status'] = 'voicemail'
-    state['voicemail_box'] = vm_box
+    state.final_status = 'voicemail'
+    state.voicemail_box = vm_box
 
     logger.info(f"[VOICEMAIL] Llamada {uniqueid} entró a buzón {vm_box}")
 
@@ -747,9 +711,18 @@ def _process_queue_member_pause(event: dict):
     queue_name = event.get('Queue', '')
     queue = _find_queue_by_name(queue_name)
     if queue:
-        QueueMember.objects.filter(
-            queue=queue, agent__sip_extension=ext
-        ).update(paused=(paused == '1'))
+        _writer.update(
+            QueueMember, {'queue_id': queue.pk, 'agent__sip_extension': ext},
+            values={'paused': paused == '1'},
+        )
+
+
+def _process_agent_login(event: dict):
+    _process_agent_login_logoff(event, is_login=True)
+
+
+def _process_agent_logoff(event: dict):
+    _process_agent_login_logoff(event, is_login=False)
 
 
 def _process_agent_login_logoff(event: dict, is_login: bool):
@@ -762,17 +735,36 @@ def _process_agent_login_logoff(event: dict, is_login: bool):
         return
 
     if is_login:
-        agent.logged_in_at = timezone.now()
+        _save_agent(agent, logged_in_at=_event_now())
         _update_agent_status(agent, 'available')
         logger.info(f"[AGENT] Login: {ext}")
     else:
         _update_agent_status(agent, 'offline')
-        agent.logged_in_at = None
-        agent.current_calls = 0
-        agent.save(update_fields=['logged_in_at', 'current_calls'])
+        _save_agent(agent, logged_in_at=None, current_calls=0)
         logger.info(f"[AGENT] Logoff: {ext}")
 
 
+# ─────────────────────────────────────────────────────────────────
+# Troncales y endpoints PJSIP
+# ─────────────────────────────────────────────────────────────────
+
+def _process_contact_status(event: dict):
+    """
+    Evento: ContactStatus — Cambio de disponibilidad de un contacto PJSIP.
+    Campos: URI, ContactStatus, AOR, EndpointName, RoundtripUsec.
+    """
+    trunk_status_cache.apply_contact_status(event)
+
+
+def _process_registry(event: dict):
+    """
+    Evento: Registry — Cambio de estado de un registro saliente.
+    Campos: ChannelType, Username, Domain, Status, Cause.
+    """
+    trunk_status_cache.apply_registry(event)
+    logger.info(f"[TRUNK] Registro {event.get('Domain', '')}: {event.get('Status', '')}")
+
+
 # ─────────────────────────────────────────────────────────────────
 # Grabaciones
 # ─────────────────────────────────────────────────────────────────
@@ -811,107 +803,568 @@ _EVENT_HANDLERS = {
     'QueueMemberStatus':    _process_queue_member_status,
     'QueueMemberPause':     _process_queue_member_pause,
     'QueueMemberPaused':    _process_queue_member_pause,  # alias
+    'AgentLogin':           _process_agent_login,
+    'AgentLogoff':          _process_agent_logoff,
+    'ContactStatus':        _process_contact_status,
+    'Registry':             _process_registry,
 }
 
+# Mismo mapa indexado por el nombre en bytes: los eventos sin handler
+# (Newexten, VarSet, ...) se descartan sin decodificarlos
+_HANDLERS_BY_NAME = {name.encode(): handler for name, handler in _EVENT_HANDLERS.items()}
+
+# Eventos que alimentan el estado en memoria de las llamadas (_call_states);
+# son los que se reprocesan para reconstruirlo
+_STATE_EVENTS = frozenset({
+    b'Cdr', b'QueueCallerJoin', b'QueueCallerAbandon', b'AgentConnect', b'AgentComplete',
+    b'AgentRingNoAnswer', b'Hold', b'Unhold', b'BlindTransfer', b'AttendedTransfer',
+    b'VoicemailUserEntry',
+})
+
+# Eventos que reflejan el estado actual de Asterisk (troncales): no se
+# reprocesan desde el journal, volverían a un estado viejo
+_LIVE_EVENTS = frozenset({b'ContactStatus', b'Registry'})
+
+# Series de Prometheus por nombre de evento, resueltas una sola vez
+_RECEIVED_METRICS = {}
+_HANDLER_METRICS = {}
+
 
 # ─────────────────────────────────────────────────────────────────
-# Loop principal del listener
+# Conexión AMI (asyncio)
 # ─────────────────────────────────────────────────────────────────
 
-def _listener_loop():
-    """Loop principal: conecta, escucha TODOS los eventos, reconecta en fallo."""
-    delay = RECONNECT_DELAY
-    last_cleanup = time.time()
+def _filter_action() -> bytes:
+    """
+    Acción Filter que deja pasar sólo los eventos con handler.
+    Asterisk aplica la regex (POSIX extendida) a cada evento completo, que
+    empieza con 'Event: <nombre>\\r\\n'.
+    """
+    names = '|'.join(sorted(_EVENT_HANDLERS))
+    return (
+        f"Action: Filter\r\n"
+        f"ActionID: vozipomni-filter\r\n"
+        f"Operation: Add\r\n"
+        f"Filter: ^Event: ({names})[[:space:]]\r\n"
+        f"\r\n"
+    ).encode()
 
-    while not _stop_event.is_set():
-        sock = None
+
+async def _read_response(reader, parser: AMIFrameParser, frames: list[bytes]) -> AMIEvent | None:
+    """
+    Lee hasta la respuesta a la última acción enviada y la saca de `frames`;
+    los demás bloques quedan en `frames` en orden. None si se cerró el socket.
+    """
+    checked = 0
+    while True:
+        for i in range(checked, len(frames)):
+            if frames[i].startswith(b'Response:'):
+                return AMIEvent(frames.pop(i))
+        checked = len(frames)
+        data = await asyncio.wait_for(reader.read(READ_SIZE), timeout=10)
+        if not data:
+            return None
+        frames.extend(parser.feed(data))
+
+
+async def _ami_login(reader, writer, parser: AMIFrameParser) -> list[bytes] | None:
+    """
+    Autenticación AMI con suscripción a TODOS los eventos necesarios.
+    Retorna los bloques recibidos después de la respuesta (None si falla).
+    """
+    # El banner es una sola línea: 'Asterisk Call Manager/x.y.z'
+    await asyncio.wait_for(reader.readline(), timeout=10)
+    # Events: system,call,agent,cdr,dialplan,user — cubrir todo lo relevante
+    # 'user' es necesario para VoicemailUserEntry
+    cmd = (
+        f"Action: Login\r\n"
+        f"Username: {AMI_USER}\r\n"
+        f"Secret: {AMI_SECRET}\r\n"
+        f"Events: system,call,agent,cdr,dialplan,user\r\n"
+        f"\r\n"
+    )
+    writer.write(cmd.encode())
+    await writer.drain()
+
+    frames = []
+    response = await _read_response(reader, parser, frames)
+    if response is None or response.get('Response') != 'Success':
+        return None
+
+    if EVENT_FILTER:
+        # Las clases de arriba incluyen Newexten, VarSet, etc. en cada llamada:
+        # filtrarlos en Asterisk evita enviarlos por el socket y cortarlos acá
+        writer.write(_filter_action())
+        await writer.drain()
+        response = await _read_response(reader, parser, frames)
+        if response is None:
+            return None
+        if response.get('Response') == 'Success':
+            logger.info(f"[AMI Listener] Filtro instalado: {len(_EVENT_HANDLERS)} eventos")
+        else:
+            logger.warning(
+                f"[AMI Listener] Asterisk rechazó el filtro de eventos "
+                f"({response.get('Message', '')}); se reciben todos"
+            )
+    return frames
+
+
+# ─────────────────────────────────────────────────────────────────
+# Procesamiento (hilo de handlers)
+# ─────────────────────────────────────────────────────────────────
+
+def _handler_metrics(name: bytes) -> tuple:
+    """Series de Prometheus de un evento (procesados, errores, duración)."""
+    series = _HANDLER_METRICS.get(name)
+    if series is None:
+        event = name.decode(errors='ignore')
+        series = _HANDLER_METRICS[name] = (
+            metrics.ami_events_handled_total.labels(event=event),
+            metrics.ami_event_errors_total.labels(event=event),
+            metrics.ami_event_handler_seconds.labels(event=event),
+        )
+    return series
+
+
+def _handle(name: bytes, handler, frame: bytes, ts: float | None):
+    """Ejecuta un handler con el instante del evento."""
+    global _event_ts
+    handled, errors, duration = _handler_metrics(name)
+    _event_ts = ts
+    started = time.perf_counter()
+    try:
+        handler(AMIEvent(frame))
+    except Exception as e:
+        errors.inc()
+        logger.error(
+            f"[AMI Listener] Error procesando {name.decode(errors='ignore')}: {e}",
+            exc_info=True,
+        )
+    finally:
+        duration.observe(time.perf_counter() - started)
+        handled.inc()
+        _event_ts = None
+
+
+def _publish_agent_availability(pks):
+    """
+    Publica la disponibilidad de los agentes guardados para el dialer
+    (campaign:{id}:agents:available y el roster de 'dialer:agents'). El
+    write-behind usa update(), que no dispara push_agent_availability.
+    """
+    from apps.campaigns.hopper import CampaignHopperFeeder
+
+    try:
+        agents = [a for a in (reference_cache.agent_by_pk(pk) for pk in pks) if a is not None]
+        CampaignHopperFeeder().sync_agents(agents)
+    except Exception as e:
+        logger.warning(f"[AMI Listener] No se pudo publicar la disponibilidad de {len(pks)} agentes: {e}")
+
+
+def _flush_writes(force: bool = False):
+    """
+    Aplica las mutaciones pendientes si toca (hilo de handlers).
+    Retorna el offset del journal hasta el que todo quedó en la BD.
+    """
+    global _applied_id
+    if not len(_writer):
+        _applied_id = _processed_id
+        return _applied_id
+    if not force and not _writer.due():
+        return _applied_id
+    from django.db import close_old_connections
+
+    close_old_connections()
+    items = len(_writer)
+    try:
+        if not _writer.flush():
+            # Lote descartado: los agentes cacheados tienen valores que no se guardaron
+            reference_cache.clear()
+        elif _dirty_agents:
+            _publish_agent_availability(_dirty_agents)
+            if SHARDS > 1:
+                # Los demás shards cachean los mismos agentes: releen sólo su estado
+                reference_cache.touch_agents(_dirty_agents)
+        _dirty_agents.clear()
+        _applied_id = _processed_id
+    except Exception as e:
+        logger.error(f"[AMI Listener] Error aplicando mutaciones ({items} pendientes): {e}")
+    return _applied_id
+
+
+def _run_handlers(batch: list):
+    """Ejecuta en orden los handlers de un lote de eventos (hilo de handlers)."""
+    global _processed_id
+    from django.db import close_old_connections
+
+    close_old_connections()
+    for name, handler, frame, entry_id, ts in batch:
+        if handler is not None:
+            _handle(name, handler, frame, ts)
+        if entry_id is not None:
+            _processed_id = entry_id
+    return _flush_writes()
+
+
+def _replay_state(entries: list):
+    """Reprocesa eventos del journal sólo para reconstruir _call_states (sin escribir en la BD)."""
+    global _writer
+    live, _writer = _writer, WriteBehind()
+    try:
+        for entry_id, frame in entries:
+            name = frame_event_name(frame)
+            if name in _STATE_EVENTS:
+                _handle(name, _HANDLERS_BY_NAME[name], frame, entry_time(entry_id))
+    finally:
+        _writer = live
+        # Los handlers asignaron valores históricos a los agentes cacheados
+        reference_cache.clear()
+
+
+def replay_entries(entries, writer: WriteBehind) -> int:
+    """
+    Procesa entradas del journal (id, frame) aplicando con `writer`.
+    Usado por replay_ami_events; retorna los eventos con handler procesados.
+    """
+    global _writer
+    live, _writer = _writer, writer
+    processed = 0
+    try:
+        for entry_id, frame in entries:
+            name = frame_event_name(frame)
+            handler = _HANDLERS_BY_NAME.get(name) if name else None
+            if handler is None or name in _LIVE_EVENTS:
+                continue
+            _handle(name, handler, frame, entry_time(entry_id))
+            processed += 1
+            if writer.due():
+                writer.flush()
+        writer.flush()
+    finally:
+        _writer = live
+        reference_cache.clear()
+    return processed
+
+
+# ─────────────────────────────────────────────────────────────────
+# Ingesta y consumo (event loop)
+# ─────────────────────────────────────────────────────────────────
+
+async def _dispatch_events(queue: asyncio.Queue, executor: ThreadPoolExecutor,
+                           journal: AMIJournal | None):
+    """Pasa los eventos encolados al hilo de handlers, por lotes y en orden."""
+    loop = asyncio.get_running_loop()
+    saved = None
+    while True:
         try:
-            logger.info(f"[AMI Listener] Conectando a AMI {AMI_HOST}:{AMI_PORT}...")
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10)
-            sock.connect((AMI_HOST, AMI_PORT))
-
-            if not _ami_login(sock):
-                logger.error("[AMI Listener] Login AMI fallido")
-                raise ConnectionError("Login AMI fallido")
-
-            logger.info(
-                "[AMI Listener] ✓ Conectado a AMI — escuchando eventos: "
-                "CDR, Queue, Hold, Transfer, Voicemail, Agent"
+            first = await asyncio.wait_for(queue.get(), timeout=_writer.flush_interval)
+        except asyncio.TimeoutError:
+            # Sin eventos nuevos: aplicar lo que quedó pendiente
+            applied = await loop.run_in_executor(executor, _flush_writes, True)
+        else:
+            batch = [first]
+            while len(batch) < DISPATCH_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            applied = await loop.run_in_executor(executor, _run_handlers, batch)
+
+        if journal is not None and applied is not None and applied != saved:
+            try:
+                await journal.save_checkpoint(applied)
+                saved = applied
+            except Exception as e:
+                logger.warning(f"[AMI Journal] No se pudo guardar el checkpoint: {e}")
+
+
+async def _put(queue: asyncio.Queue, item):
+    if queue.full():
+        # Contrapresión: no leer más hasta que haya espacio
+        await queue.put(item)
+    else:
+        queue.put_nowait(item)
+
+
+async def _enqueue_frames(frames: list[bytes], queue: asyncio.Queue):
+    """Encola directamente (sin journal) los bloques que tienen handler."""
+    for frame in frames:
+        name = frame_event_name(frame)
+        handler = _HANDLERS_BY_NAME.get(name) if name else None
+        if handler is not None:
+            await _put(queue, (name, handler, frame, None, None))
+
+
+def _count_received(events: list[bytes]):
+    counts = defaultdict(int)
+    for frame in events:
+        counts[frame_event_name(frame)] += 1
+    for name, count in counts.items():
+        series = _RECEIVED_METRICS.get(name)
+        if series is None:
+            series = _RECEIVED_METRICS[name] = metrics.ami_events_received_total.labels(
+                event=name.decode(errors='ignore') if name else '-',
             )
-            delay = RECONNECT_DELAY
-
-            sock.settimeout(PING_INTERVAL + 5)
-            buffer = ''
-            last_ping = time.time()
-
-            while not _stop_event.is_set():
-                now = time.time()
-
-                # Keepalive
-                if now - last_ping > PING_INTERVAL:
-                    try:
-                        sock.sendall(b"Action: Ping\r\n\r\n")
-                        last_ping = now
-                    except Exception:
-                        break
-
-                # Limpieza periódica de estados stale
-                if now - last_cleanup > 600:  # cada 10 min
-                    _cleanup_stale_state()
-                    last_cleanup = now
-
-                try:
-                    data = sock.recv(4096)
-                    if not data:
-                        logger.warning("[AMI Listener] Socket cerrado por Asterisk")
-                        break
-                    buffer += data.decode('utf-8', errors='ignore')
-                except socket.timeout:
-                    continue
-
-                # Procesar eventos completos
-                while '\r\n\r\n' in buffer:
-                    event_raw, _, buffer = buffer.partition('\r\n\r\n')
-                    event = _parse_ami_event(event_raw)
-                    event_type = event.get('Event', '')
-
-                    # Despachar al handler correspondiente
-                    handler = _EVENT_HANDLERS.get(event_type)
-                    if handler:
-                        try:
-                            handler(event)
-                        except Exception as e:
-                            logger.error(
-                                f"[AMI Listener] Error procesando {event_type}: {e}",
-                                exc_info=True,
-                            )
-
-                    # Eventos especiales sin handler dedicado
-                    elif event_type == 'AgentLogin':
-                        try:
-                            _process_agent_login_logoff(event, is_login=True)
-                        except Exception as e:
-                            logger.error(f"[AMI] Error AgentLogin: {e}")
-                    elif event_type == 'AgentLogoff':
-                        try:
-                            _process_agent_login_logoff(event, is_login=False)
-                        except Exception as e:
-                            logger.error(f"[AMI] Error AgentLogoff: {e}")
+        series.inc(count)
+
 
+async def _ingest(frames: list[bytes], queue: asyncio.Queue, journal: AMIJournal | None):
+    """Guarda los eventos leídos en el journal; si no está disponible, los procesa directo."""
+    events = [frame for frame in frames if frame.startswith(b'Event:')]
+    if not events:
+        return
+    _count_received(events)
+    if journal is not None:
+        try:
+            if SHARDS > 1:
+                routed = route(events, SHARDS)
+                await journal.append_many(
+                    {journal_key(shard, SHARDS): frames for shard, frames in routed.items()}
+                )
+            else:
+                await journal.append(events)
+            return
         except Exception as e:
-            logger.error(f"[AMI Listener] Error: {e}")
-        finally:
-            if sock:
-                try:
-                    sock.close()
-                except Exception:
-                    pass
+            logger.warning(f"[AMI Journal] No disponible, procesando {len(events)} eventos sin journal: {e}")
+    await _enqueue_frames(events, queue)
 
-        if not _stop_event.is_set():
-            logger.info(f"[AMI Listener] Reconectando en {delay}s...")
-            _stop_event.wait(delay)
-            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+async def _warm_up(journal: AMIJournal, checkpoint: str, executor: ThreadPoolExecutor):
+    """Reconstruye el estado de las llamadas en curso con los eventos previos al checkpoint."""
+    loop = asyncio.get_running_loop()
+    cursor = time_id(entry_time(checkpoint) - JOURNAL_WARMUP)
+    total = 0
+    while True:
+        entries = await journal.range(cursor, checkpoint, count=1000)
+        if entries:
+            await loop.run_in_executor(executor, _replay_state, entries)
+            total += len(entries)
+        if len(entries) < 1000:
+            break
+        cursor = next_id(entries[-1][0])
+    logger.info(f"[AMI Journal] Estado reconstruido con {total} eventos previos al checkpoint {checkpoint}")
+
+
+async def _consume_journal(journal: AMIJournal, queue: asyncio.Queue, executor: ThreadPoolExecutor):
+    """Lee el journal desde el checkpoint y encola los eventos con handler."""
+    while True:
+        try:
+            last = await journal.load_checkpoint()
+            if last is None:
+                # Primer arranque con journal: desde ahora
+                last = await journal.last_id()
+            else:
+                await _warm_up(journal, last, executor)
+            break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[AMI Journal] Error leyendo checkpoint: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+    logger.info(f"[AMI Journal] Consumiendo eventos desde {last}")
+
+    while True:
+        try:
+            entries = await journal.read(last, count=DISPATCH_BATCH * 5, block_ms=1000)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[AMI Journal] Error leyendo eventos: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+            continue
+        if not entries:
+            continue
+        handled = None
+        for entry_id, frame in entries:
+            name = frame_event_name(frame)
+            handler = _HANDLERS_BY_NAME.get(name) if name else None
+            if handler is not None:
+                handled = entry_id
+                await _put(queue, (name, handler, frame, entry_id, entry_time(entry_id)))
+        last = entries[-1][0]
+        if handled != last:
+            # Avanzar el checkpoint también sobre eventos sin handler
+            await _put(queue, (None, None, None, last, None))
+
+
+async def _read_events(reader, writer, parser: AMIFrameParser, queue: asyncio.Queue,
+                       journal: AMIJournal | None):
+    """Lee eventos hasta que Asterisk cierre la conexión."""
+    last_ping = time.monotonic()
+
+    while not _stop_event.is_set():
+        try:
+            data = await asyncio.wait_for(reader.read(READ_SIZE), timeout=PING_INTERVAL)
+        except asyncio.TimeoutError:
+            data = None
+        else:
+            if not data:
+                logger.warning("[AMI Listener] Socket cerrado por Asterisk")
+                return
+
+        now = time.monotonic()
+
+        # Keepalive
+        if now - last_ping >= PING_INTERVAL:
+            writer.write(b"Action: Ping\r\n\r\n")
+            await writer.drain()
+            last_ping = now
+
+        if data:
+            await _ingest(parser.feed(data), queue, journal)
+
+
+async def _cleanup_periodically(executor: ThreadPoolExecutor):
+    """Expira estados de llamada en cada tick de la rueda, en el hilo de handlers."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(_call_states.resolution)
+        await loop.run_in_executor(executor, _cleanup_stale_state)
+
+
+def _refresh_trunk_status():
+    try:
+        trunk_status_cache.refresh()
+    except Exception as e:
+        logger.warning(f"[AMI Listener] No se pudo cargar el estado de troncales: {e}")
+
+
+async def _supervise_shards(pool: ShardPool):
+    while True:
+        await asyncio.sleep(RECONNECT_DELAY)
+        pool.ensure_alive()
+
+
+async def _shutdown(tasks: list, queue: asyncio.Queue, executor: ThreadPoolExecutor,
+                    journal: AMIJournal | None):
+    """Detiene las tareas y aplica lo pendiente antes de salir."""
+    loop = asyncio.get_running_loop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Procesar lo que quedó leído antes de salir; lo que quede en el
+    # journal sin procesar se retoma desde el checkpoint
+    remaining = []
+    while not queue.empty():
+        remaining.append(queue.get_nowait())
+    applied = await loop.run_in_executor(executor, _run_handlers, remaining)
+    applied = await loop.run_in_executor(executor, _flush_writes, True) or applied
+    if journal is not None:
+        try:
+            if applied is not None:
+                await journal.save_checkpoint(applied)
+            await journal.redis.aclose()
+        except Exception:
+            pass
+    executor.shutdown(wait=True)
+
+
+async def consume_journal_forever(journal: AMIJournal):
+    """Procesa un stream del journal hasta ser cancelado (proceso de un shard)."""
+    queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ami-handlers')
+    tasks = [
+        asyncio.create_task(_dispatch_events(queue, executor, journal)),
+        asyncio.create_task(_consume_journal(journal, queue, executor)),
+        asyncio.create_task(_cleanup_periodically(executor)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await _shutdown(tasks, queue, executor, journal)
+
+
+async def _listen_forever():
+    """Conecta, escucha TODOS los eventos y reconecta en fallo."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ami-handlers')
+    journal = AMIJournal.from_settings() if JOURNAL_ENABLED else None
+    start_metrics_server()
+    # El dispatcher local procesa lo que no pudo ir al journal
+    tasks = [
+        asyncio.create_task(_dispatch_events(queue, executor, journal)),
+        asyncio.create_task(_cleanup_periodically(executor)),
+    ]
+    if journal is not None:
+        # Los eventos que lleguen antes de que arranquen los consumidores
+        # quedan después de su checkpoint y no se pierden
+        consumers = [journal] if SHARDS == 1 else [
+            AMIJournal(journal.redis, journal_key(shard, SHARDS), consumer=shard_consumer(shard))
+            for shard in range(SHARDS)
+        ]
+        try:
+            for consumer in consumers:
+                await consumer.ensure_checkpoint()
+        except Exception as e:
+            logger.warning(f"[AMI Journal] No se pudo inicializar el checkpoint: {e}")
+    pool = supervisor = None
+    if journal is not None and SHARDS > 1:
+        pool = ShardPool(SHARDS)
+        pool.start()
+        supervisor = asyncio.create_task(_supervise_shards(pool))
+    elif journal is not None:
+        tasks.append(asyncio.create_task(_consume_journal(journal, queue, executor)))
+    elif SHARDS > 1:
+        logger.warning("[AMI Listener] AMI_LISTENER_WORKERS requiere el journal; procesando en este hilo")
+    delay = RECONNECT_DELAY
+
+    try:
+        while not _stop_event.is_set():
+            writer = None
+            try:
+                logger.info(f"[AMI Listener] Conectando a AMI {AMI_HOST}:{AMI_PORT}...")
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(AMI_HOST, AMI_PORT), timeout=10
+                )
+                parser = AMIFrameParser()
+                pending = await _ami_login(reader, writer, parser)
+                if pending is None:
+                    logger.error("[AMI Listener] Login AMI fallido")
+                    raise ConnectionError("Login AMI fallido")
+
+                logger.info(
+                    "[AMI Listener] ✓ Conectado a AMI — escuchando eventos: "
+                    "CDR, Queue, Hold, Transfer, Voicemail, Agent"
+                )
+                delay = RECONNECT_DELAY
+                # Los eventos de troncales de mientras estuvo desconectado se perdieron
+                loop.run_in_executor(None, _refresh_trunk_status)
+
+                await _ingest(pending, queue, journal)
+                await _read_events(reader, writer, parser, queue, journal)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[AMI Listener] Error: {e}")
+            finally:
+                if writer:
+                    writer.close()
+
+            if not _stop_event.is_set():
+                logger.info(f"[AMI Listener] Reconectando en {delay}s...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+    finally:
+        if pool is not None:
+            supervisor.cancel()
+            await loop.run_in_executor(None, pool.stop)
+        await _shutdown(tasks, queue, executor, journal)
+
+
+def _listener_loop():
+    """Hilo del listener: corre el event loop hasta que se pida detenerlo."""
+    global _listener_loop_ref, _listener_task
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _listener_loop_ref = loop
+    try:
+        _listener_task = loop.create_task(_listen_forever())
+        loop.run_until_complete(_listener_task)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        _listener_loop_ref = None
+        _listener_task = None
+        loop.close()
 
 
 # ─────────────────────────────────────────────────────────────────
@@ -940,12 +1393,33 @@ def stop_listener():
     """Detiene el listener de forma limpia."""
     global _listener_thread
     _stop_event.set()
+    loop, task = _listener_loop_ref, _listener_task
+    if loop and task:
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass  # El loop ya terminó
     if _listener_thread:
         _listener_thread.join(timeout=10)
         _listener_thread = None
     logger.info("[AMI Listener] Detenido")
 
 
+def start_metrics_server(port: int = METRICS_PORT):
+    """Expone /metrics de este proceso (listener o shard) en `port` (idempotente)."""
+    global _metrics_port
+    if not port or _metrics_port is not None:
+        return
+    from prometheus_client import start_http_server
+    try:
+        start_http_server(port)
+    except OSError as e:
+        logger.warning(f"[AMI Listener] No se pudo exponer /metrics en el puerto {port}: {e}")
+        return
+    _metrics_port = port
+    logger.info(f"[AMI Listener] Métricas en :{port}/metrics")
+
+
 def is_running() -> bool:
     """Verifica si el listener está corriendo."""
     return _listener_thread is not None and _listener_thread.is_alive()
@@ -0,0 +1,155 @@
+"""
+Journal durable de eventos AMI en un Redis Stream.
+
+El listener agrega cada evento AMI tal como llegó (bytes) al stream
+'ami:events' antes de procesarlo; el ID de cada entrada ('<ms>-<seq>') es su
+offset y su instante. Los handlers consumen del stream y el checkpoint
+('ami:events:checkpoint', un offset por consumidor) sólo avanza cuando las
+mutaciones de esos eventos ya se aplicaron en la base de datos. Si el worker
+se reinicia, el consumo sigue desde el checkpoint; los eventos recibidos
+mientras tanto no se pierden.
+
+Con AMI_LISTENER_WORKERS > 1 hay un stream por shard ('ami:events:<n>', ver
+ami_shards.py), cada uno con su propio checkpoint.
+
+El stream se recorta por largo aproximado (AMI_JOURNAL_MAXLEN). El comando
+replay_ami_events vuelve a procesar un rango de tiempo del journal.
+"""
+import heapq
+import logging
+import os
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_KEY = 'ami:events'
+CHECKPOINT_KEY = 'ami:events:checkpoint'
+JOURNAL_MAXLEN = int(os.environ.get('AMI_JOURNAL_MAXLEN', '2000000'))
+JOURNAL_ENABLED = os.environ.get('AMI_JOURNAL_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+FRAME_FIELD = b'f'
+
+
+def _redis_url() -> str:
+    return getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0')
+
+
+def journal_key(shard: int = 0, shards: int = 1) -> str:
+    """Stream de un shard (con un solo shard se mantiene 'ami:events')."""
+    return JOURNAL_KEY if shards <= 1 else f'{JOURNAL_KEY}:{shard}'
+
+
+def _id_order(entry_id) -> tuple[int, int]:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, _, seq = entry_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+def entry_time(entry_id) -> float:
+    """Instante (epoch en segundos) de una entrada a partir de su ID."""
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    return int(entry_id.split('-', 1)[0]) / 1000
+
+
+def next_id(entry_id) -> str:
+    """ID inmediatamente posterior (para seguir un XRANGE sin repetir la última entrada)."""
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, _, seq = entry_id.partition('-')
+    return f'{ms}-{int(seq or 0) + 1}'
+
+
+def time_id(moment: datetime | float) -> str:
+    """ID mínimo del stream para un instante."""
+    ts = moment.timestamp() if isinstance(moment, datetime) else moment
+    return f'{max(0, int(ts * 1000))}-0'
+
+
+class AMIJournal:
+    """Journal de eventos AMI sobre redis.asyncio (sin decode_responses: frames en bytes)."""
+
+    def __init__(self, redis_client=None, key: str = JOURNAL_KEY,
+                 maxlen: int = JOURNAL_MAXLEN, consumer: str = 'listener'):
+        self.redis = redis_client
+        self.key = key
+        self.maxlen = maxlen
+        self.consumer = consumer
+
+    @classmethod
+    def from_settings(cls, key: str = JOURNAL_KEY, consumer: str = 'listener') -> 'AMIJournal':
+        import redis.asyncio as aioredis
+        return cls(aioredis.from_url(_redis_url()), key=key, consumer=consumer)
+
+    async def append(self, frames: list[bytes]) -> list[bytes]:
+        """Agregar bloques en un solo round trip. Retorna sus IDs."""
+        return await self.append_many({self.key: frames})
+
+    async def append_many(self, batches: dict[str, list[bytes]]) -> list[bytes]:
+        """Agregar bloques a varios streams (shards) en un solo round trip."""
+        pipe = self.redis.pipeline(transaction=False)
+        for key, frames in batches.items():
+            for frame in frames:
+                pipe.xadd(key, {FRAME_FIELD: frame}, maxlen=self.maxlen, approximate=True)
+        if not len(pipe):
+            return []
+        return await pipe.execute()
+
+    async def read(self, after: str, count: int = 1000, block_ms: int = 1000) -> list[tuple]:
+        """Entradas posteriores a `after`: [(id, frame)]."""
+        response = await self.redis.xread({self.key: after}, count=count, block=block_ms)
+        if not response:
+            return []
+        return [(entry_id, fields.get(FRAME_FIELD, b'')) for entry_id, fields in response[0][1]]
+
+    async def range(self, start: str, end: str, count: int = 1000) -> list[tuple]:
+        """Entradas entre `start` y `end` (inclusive), como máximo `count`."""
+        entries = await self.redis.xrange(self.key, min=start, max=end, count=count)
+        return [(entry_id, fields.get(FRAME_FIELD, b'')) for entry_id, fields in entries]
+
+    async def last_id(self) -> str:
+        """ID de la última entrada ('0-0' si el stream está vacío)."""
+        entries = await self.redis.xrevrange(self.key, count=1)
+        return entries[0][0].decode() if entries else '0-0'
+
+    async def load_checkpoint(self) -> str | None:
+        value = await self.redis.hget(CHECKPOINT_KEY, self.consumer)
+        return value.decode() if value else None
+
+    async def ensure_checkpoint(self):
+        """Fijar el checkpoint en la última entrada si el consumidor aún no tiene uno."""
+        await self.redis.hsetnx(CHECKPOINT_KEY, self.consumer, await self.last_id())
+
+    async def save_checkpoint(self, entry_id):
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        await self.redis.hset(CHECKPOINT_KEY, self.consumer, entry_id)
+
+
+def iter_journal(start: str, end: str = '+', batch: int = 1000, key: str = JOURNAL_KEY,
+                 redis_client=None):
+    """Recorre el journal entre dos IDs con el cliente síncrono: (id, frame)."""
+    if redis_client is None:
+        import redis
+        redis_client = redis.from_url(_redis_url())
+    cursor = start
+    while True:
+        entries = redis_client.xrange(key, min=cursor, max=end, count=batch)
+        for entry_id, fields in entries:
+            yield entry_id, fields.get(FRAME_FIELD, b'')
+        if len(entries) < batch:
+            return
+        cursor = next_id(entries[-1][0])
+
+
+def iter_journals(start: str, end: str = '+', keys=(JOURNAL_KEY,), redis_client=None):
+    """Recorre varios streams (shards) a la vez, en orden de ID: (id, frame)."""
+    if redis_client is None:
+        import redis
+        redis_client = redis.from_url(_redis_url())
+    streams = [iter_journal(start, end, key=key, redis_client=redis_client) for key in keys]
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=lambda entry: _id_order(entry[0]))
@@ -0,0 +1,271 @@
+"""
+Multiplexor de acciones AMI para los servicios de llamadas y colas.
+
+CallService y QueueService hacían async_to_sync(asterisk_ami.<acción>) por
+cada acción: un salto de event loop por llamada y una respuesta esperada
+detrás de otra. Pausar a un agente en 12 colas eran 12 round trips en serie.
+
+El multiplexor mantiene una sola sesión AMI por proceso (Events: off) en un
+event loop propio, en un hilo daemon. Cualquier hilo entrega acciones y
+recibe concurrent.futures.Future; cada acción lleva su ActionID y el lector
+resuelve el futuro que corresponda a cada respuesta, en el orden en que
+lleguen. Un lote se escribe de una sola vez y Asterisk lo ejecuta en orden:
+
+    responses = ami_mux.call_many([
+        {'Action': 'QueuePause', 'Queue': queue, 'Interface': 'PJSIP/1001', 'Paused': 'true'}
+        for queue in queues
+    ])
+
+Las acciones que responden con una lista de eventos (QueueStatus) se piden
+con listing=True y se resuelven con los eventos al llegar 'EventList: Complete'.
+
+Si la sesión se cae, los futuros pendientes fallan con ConnectionError y la
+próxima acción reconecta. Después de un fork el hijo arranca sin sesión ni
+hilo (el loop del padre no existe en el hijo).
+"""
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+from django.conf import settings
+
+from apps.telephony.ami_pool import CONNECT_TIMEOUT, READ_SIZE, AMIError
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser
+
+logger = logging.getLogger(__name__)
+
+ACTION_TIMEOUT = float(os.environ.get('AMI_MUX_TIMEOUT', '5'))
+
+
+class _Pending:
+    """Futuro de una acción en vuelo y, si es de listado, sus eventos."""
+
+    __slots__ = ('future', 'events')
+
+    def __init__(self, future: Future, listing: bool):
+        self.future = future
+        self.events = [] if listing else None
+
+
+class AMIMultiplexer:
+    """Sesión AMI compartida por todos los hilos del proceso, con acciones en pipeline."""
+
+    def __init__(self, connect_timeout: float = CONNECT_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._reset()
+
+    def _reset(self):
+        self._writer: asyncio.StreamWriter | None = None
+        # La sesión acepta acciones sólo después del login
+        self._ready = False
+        self._reader_task: asyncio.Task | None = None
+        self._connecting: asyncio.Lock | None = None
+        self._pending: dict[str, _Pending] = {}
+        self._seq = itertools.count(1)
+        self._prefix = f'vzmux-{os.getpid()}'
+        self.sent = self.sessions = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # API (cualquier hilo)
+    # ─────────────────────────────────────────────────────────────
+
+    def submit_many(self, actions: list[dict], listing: bool = False) -> list[Future]:
+        """Entrega un lote de acciones. Retorna un futuro por acción, en el mismo orden."""
+        futures = [Future() for _ in actions]
+        if futures:
+            asyncio.run_coroutine_threadsafe(self._send(actions, futures, listing), self._ensure_loop())
+        return futures
+
+    def submit(self, action: dict, listing: bool = False) -> Future:
+        return self.submit_many([action], listing)[0]
+
+    def call_many(self, actions: list[dict], timeout: float = ACTION_TIMEOUT,
+                  listing: bool = False) -> list:
+        """
+        Ejecuta un lote y espera todas las respuestas (AMIEvent, o lista de
+        eventos con listing=True). TimeoutError si alguna no llega a tiempo.
+        """
+        futures = self.submit_many(actions, listing)
+        try:
+            return [future.result(timeout) for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def call(self, action: dict, timeout: float = ACTION_TIMEOUT, listing: bool = False):
+        return self.call_many([action], timeout, listing)[0]
+
+    def close(self):
+        """Cierra la sesión y detiene el hilo del loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(self.connect_timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(self.connect_timeout)
+        loop.close()
+
+    def stats(self) -> dict:
+        return {
+            'connected': self._ready,
+            'in_flight': len(self._pending),
+            'sent': self.sent,
+            'sessions': self.sessions,
+        }
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='ami-mux', daemon=True,
+                )
+                self._thread.start()
+            return self._loop
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._loop = self._thread = None
+        self._reset()
+
+    # ─────────────────────────────────────────────────────────────
+    # Loop del multiplexor
+    # ─────────────────────────────────────────────────────────────
+
+    async def _send(self, actions: list[dict], futures: list[Future], listing: bool):
+        try:
+            await self._session()
+        except Exception as e:
+            for future in futures:
+                self._settle(future, error=e)
+            return
+        self._write(actions, futures, listing)
+
+    def _write(self, actions: list[dict], futures: list[Future], listing: bool = False):
+        chunks = []
+        for action, future in zip(actions, futures):
+            if future.cancelled():
+                continue  # el llamador ya se rindió
+            action_id = f'{self._prefix}-{next(self._seq)}'
+            self._pending[action_id] = _Pending(future, listing)
+            lines = ''.join(f'{key}: {value}\r\n' for key, value in action.items())
+            chunks.append(f'{lines}ActionID: {action_id}\r\n\r\n'.encode())
+        self._writer.write(b''.join(chunks))
+        self.sent += len(chunks)
+
+    async def _session(self):
+        """Abre y autentica la sesión si no hay una activa."""
+        if self._ready:
+            return
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if not self._ready:
+                await asyncio.wait_for(self._connect(), self.connect_timeout)
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(
+            getattr(settings, 'ASTERISK_HOST', 'asterisk'),
+            int(getattr(settings, 'ASTERISK_AMI_PORT', 5038)),
+        )
+        self._writer = writer
+        try:
+            await reader.readline()  # 'Asterisk Call Manager/x.y.z'
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_responses(reader, writer))
+            login = Future()
+            self._write([{
+                'Action': 'Login',
+                'Username': getattr(settings, 'ASTERISK_AMI_USER', 'admin'),
+                'Secret': getattr(settings, 'ASTERISK_AMI_PASSWORD', 'vozipomni_ami_2026'),
+                'Events': 'off',
+            }], [login])
+            response = await asyncio.wrap_future(login)
+            if response.get('Response') != 'Success':
+                raise AMIError(f"Login AMI rechazado: {response.get('Message', '')}")
+        except BaseException as e:
+            # También si wait_for cancela: no dejar una sesión sin autenticar
+            self._drop(writer, ConnectionError(f'Login AMI fallido: {e!r}'))
+            raise
+        self._ready = True
+        self.sessions += 1
+        logger.info("[AMI Mux] Sesión AMI abierta")
+
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        parser = AMIFrameParser()
+        error = ConnectionError('AMI cerró la conexión')
+        try:
+            while data := await reader.read(READ_SIZE):
+                for frame in parser.feed(data):
+                    self._resolve(frame)
+        except OSError as e:
+            error = ConnectionError(f'Error leyendo de AMI: {e}')
+        finally:
+            self._drop(writer, error)
+
+    def _resolve(self, frame: bytes):
+        item = AMIEvent(frame)
+        action_id = item.get('ActionID')
+        pending = self._pending.get(action_id)
+        if pending is None:
+            return
+        if pending.events is not None:
+            listing = item.get('EventList', '').lower()
+            if frame.startswith(b'Response:'):
+                # Una respuesta de error termina el listado sin eventos
+                if item.get('Response') == 'Success' and listing == 'start':
+                    return
+            elif listing != 'complete':
+                pending.events.append(item)
+                return
+            result = pending.events
+        elif frame.startswith(b'Response:'):
+            result = item
+        else:
+            return
+        del self._pending[action_id]
+        self._settle(pending.future, result=result)
+
+    @staticmethod
+    def _settle(future: Future, result=None, error: Exception | None = None):
+        # El llamador puede cancelar desde otro hilo en cualquier momento
+        try:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _drop(self, writer: asyncio.StreamWriter, error: Exception):
+        """Cierra la sesión y falla sus acciones en vuelo."""
+        if self._writer is writer:
+            self._writer = None
+            self._ready = False
+            pending, self._pending = self._pending, {}
+            if pending:
+                logger.warning(f"[AMI Mux] Sesión perdida con {len(pending)} acciones en vuelo")
+            for item in pending.values():
+                self._settle(item.future, error=error)
+        writer.close()
+
+    async def _shutdown(self):
+        writer = self._writer
+        if writer is not None:
+            writer.write(b'Action: Logoff\r\n\r\n')
+            self._drop(writer, ConnectionError('Multiplexor AMI cerrado'))
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+
+ami_mux = AMIMultiplexer()
+os.register_at_fork(after_in_child=ami_mux._after_fork)
@@ -0,0 +1,290 @@
+"""
+Pool de conexiones AMI autenticadas para los llamadores sincrónicos.
+
+Antes cada uso de AsteriskAMI abría un socket, hacía login, mandaba una o dos
+acciones y cerraba: una conexión TCP más un round trip de login por request.
+El pool mantiene por proceso hasta AMI_POOL_SIZE conexiones ya logueadas
+(con 'Events: off': no reciben eventos, sólo respuestas) y las presta:
+
+    with ami_pool.connection() as conn:
+        conn.action({'Action': 'ModuleLoad', 'LoadType': 'reload', 'Module': 'app_queue.so'})
+        output = conn.command('pjsip show registrations')
+
+Cada acción lleva un ActionID propio y la respuesta se busca por ese ID, así
+una respuesta tardía de una acción que expiró no se confunde con la
+siguiente, y varias acciones se pueden mandar juntas y esperar todas a la vez
+(pipeline). Una conexión que estuvo ociosa más de AMI_POOL_PING_AFTER
+segundos se verifica con Ping antes de prestarla; si falla, o si falla una
+acción por error de socket, se descarta y se abre otra.
+
+Después de un fork (workers Celery prefork) el hijo empieza con el pool
+vacío: los sockets heredados son del padre.
+"""
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get('AMI_POOL_SIZE', '4'))
+PING_AFTER = int(os.environ.get('AMI_POOL_PING_AFTER', '30'))
+CONNECT_TIMEOUT = 5
+READ_SIZE = 65536
+
+
+class AMIError(Exception):
+    """Asterisk rechazó el login o la conexión no responde como AMI."""
+
+
+class AMIConnection:
+    """Sesión AMI bloqueante con respuestas correlacionadas por ActionID. No es thread-safe."""
+
+    def __init__(self, host: str, port: int, username: str, secret: str,
+                 timeout: float = CONNECT_TIMEOUT):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._parser = AMIFrameParser()
+        self._frames = deque()
+        self._seq = itertools.count(1)
+        self._prefix = f'vz-{os.getpid()}-{id(self):x}'
+        self.closed = False
+        try:
+            self._read_banner(time.monotonic() + timeout)
+            response = self.action(
+                {'Action': 'Login', 'Username': username, 'Secret': secret, 'Events': 'off'},
+                timeout=timeout,
+            )
+        except Exception:
+            self.close(logoff=False)
+            raise
+        if response.get('Response') != 'Success':
+            self.close(logoff=False)
+            raise AMIError(f"Login AMI rechazado: {response.get('Message', '')}")
+        self.last_used = time.monotonic()
+
+    def _read_banner(self, deadline: float):
+        # 'Asterisk Call Manager/x.y.z\r\n' no termina en línea vacía
+        data = b''
+        while b'\r\n' not in data:
+            data += self._recv(deadline)
+        self._frames.extend(self._parser.feed(data.split(b'\r\n', 1)[1]))
+
+    def _recv(self, deadline: float) -> bytes:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('AMI no respondió a tiempo')
+        self._sock.settimeout(remaining)
+        data = self._sock.recv(READ_SIZE)
+        if not data:
+            raise ConnectionError('AMI cerró la conexión')
+        return data
+
+    def _next_frame(self, deadline: float) -> bytes:
+        while not self._frames:
+            self._frames.extend(self._parser.feed(self._recv(deadline)))
+        return self._frames.popleft()
+
+    # ─────────────────────────────────────────────────────────────
+    # Acciones
+    # ─────────────────────────────────────────────────────────────
+
+    def send(self, action: dict) -> str:
+        """Envía una acción sin esperar la respuesta. Retorna su ActionID."""
+        action_id = f'{self._prefix}-{next(self._seq)}'
+        lines = ''.join(f'{key}: {value}\r\n' for key, value in action.items())
+        self._sock.sendall(f'{lines}ActionID: {action_id}\r\n\r\n'.encode())
+        return action_id
+
+    def wait(self, action_ids, timeout: float = CONNECT_TIMEOUT) -> dict[str, AMIEvent]:
+        """Espera las respuestas de las acciones enviadas, en cualquier orden."""
+        pending = set(action_ids)
+        responses = {}
+        deadline = time.monotonic() + timeout
+        while pending:
+            frame = self._next_frame(deadline)
+            if not frame.startswith(b'Response:'):
+                continue  # eventos de la lista de otra acción
+            response = AMIEvent(frame)
+            action_id = response.get('ActionID')
+            if action_id in pending:
+                pending.discard(action_id)
+                responses[action_id] = response
+        self.last_used = time.monotonic()
+        return responses
+
+    def action(self, action: dict, timeout: float = CONNECT_TIMEOUT) -> AMIEvent:
+        """Envía una acción y retorna su respuesta."""
+        action_id = self.send(action)
+        return self.wait([action_id], timeout)[action_id]
+
+    def pipeline(self, actions: list[dict], timeout: float = CONNECT_TIMEOUT) -> list[AMIEvent]:
+        """
+        Envía todas las acciones de una vez y espera sus respuestas (en el
+        orden de `actions`). Asterisk las ejecuta en orden dentro de la sesión.
+        """
+        action_ids = [self.send(action) for action in actions]
+        responses = self.wait(action_ids, timeout)
+        return [responses[action_id] for action_id in action_ids]
+
+    def collect(self, actions: list[dict], timeout: float = 10) -> list[list[AMIEvent]]:
+        """
+        Envía acciones que responden con una lista de eventos (EventList:
+        PJSIPShowEndpoints, QueueStatus, ...) y retorna los eventos de cada
+        una, en el orden de `actions`. Una respuesta de error cuenta como
+        lista vacía ('No endpoints found').
+        """
+        action_ids = [self.send(action) for action in actions]
+        events = {action_id: [] for action_id in action_ids}
+        pending = set(action_ids)
+        deadline = time.monotonic() + timeout
+        while pending:
+            frame = self._next_frame(deadline)
+            item = AMIEvent(frame)
+            action_id = item.get('ActionID')
+            if action_id not in pending:
+                continue
+            listing = item.get('EventList', '').lower()
+            if frame.startswith(b'Response:'):
+                if item.get('Response') != 'Success' or listing != 'start':
+                    pending.discard(action_id)
+            elif listing == 'complete':
+                pending.discard(action_id)
+            else:
+                events[action_id].append(item)
+        self.last_used = time.monotonic()
+        return [events[action_id] for action_id in action_ids]
+
+    def command(self, command: str, timeout: float = 10) -> str:
+        """Ejecuta un comando CLI. Retorna el texto de la respuesta (líneas 'Output:')."""
+        response = self.action({'Action': 'Command', 'Command': command}, timeout)
+        return response.raw.decode('utf-8', errors='ignore')
+
+    def ping(self, timeout: float = 2) -> bool:
+        try:
+            return self.action({'Action': 'Ping'}, timeout).get('Response') == 'Success'
+        except (OSError, AMIError):
+            return False
+
+    def close(self, logoff: bool = True):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if logoff:
+                self._sock.sendall(b'Action: Logoff\r\n\r\n')
+        except OSError:
+            pass
+        finally:
+            self._sock.close()
+
+
+class AMIPool:
+    """Conexiones AMI ociosas por proceso, reutilizadas entre requests y tareas."""
+
+    def __init__(self, size: int = POOL_SIZE, ping_after: float = PING_AFTER, factory=None):
+        self.size = size
+        self.ping_after = ping_after
+        self._factory = factory or self._connect
+        self._idle: list[AMIConnection] = []
+        self._lock = threading.Lock()
+        self.created = self.reused = self.discarded = 0
+
+    @staticmethod
+    def _connect() -> AMIConnection:
+        return AMIConnection(
+            getattr(settings, 'ASTERISK_HOST', 'asterisk'),
+            int(getattr(settings, 'ASTERISK_AMI_PORT', 5038)),
+            getattr(settings, 'ASTERISK_AMI_USER', 'admin'),
+            getattr(settings, 'ASTERISK_AMI_PASSWORD', 'vozipomni_ami_2026'),
+        )
+
+    def acquire(self) -> AMIConnection:
+        """Una conexión lista para usar: ociosa y sana, o nueva."""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            if time.monotonic() - conn.last_used < self.ping_after or conn.ping():
+                self.reused += 1
+                return conn
+            self.discard(conn)
+        conn = self._factory()
+        self.created += 1
+        logger.debug(f"[AMI Pool] Nueva conexión ({self.created} creadas)")
+        return conn
+
+    def release(self, conn: AMIConnection):
+        """Devuelve una conexión; las que sobran del tamaño del pool se cierran."""
+        if conn.closed:
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def discard(self, conn: AMIConnection):
+        """Cierra una conexión rota (no vuelve al pool)."""
+        self.discarded += 1
+        conn.close(logoff=False)
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión; si la usa una acción con error de socket, se descarta."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except OSError:
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def call(self, method: str, *args, **kwargs):
+        """
+        Ejecuta un método de AMIConnection con una conexión del pool,
+        reintentando una vez con otra si la prestada estaba rota.
+        Sólo para acciones que se pueden repetir sin efectos (no Originate).
+        """
+        for attempt in (1, 2):
+            try:
+                with self.connection() as conn:
+                    return getattr(conn, method)(*args, **kwargs)
+            except (ConnectionError, BrokenPipeError):
+                if attempt == 2:
+                    raise
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _after_fork(self):
+        # Los sockets son del padre: olvidarlos sin Logoff
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        return {
+            'idle': len(self._idle),
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded,
+        }
+
+
+ami_pool = AMIPool()
+os.register_at_fork(after_in_child=ami_pool._after_fork)
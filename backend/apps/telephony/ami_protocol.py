@@ -0,0 +1,142 @@
+"""
+Framing incremental del protocolo AMI a nivel de bytes.
+
+Asterisk envía bloques 'Key: Value\\r\\n' terminados en una línea vacía
+(\\r\\n\\r\\n). AMIFrameParser acumula lo recibido en un bytearray reutilizable
+y corta los bloques completos buscando el separador sólo en lo nuevo; el
+buffer se compacta una vez por lectura, no una vez por evento.
+
+AMIEvent no decodifica el bloque al crearse: el nombre del evento se lee en
+bytes para decidir si hay handler, y cada header se decodifica la primera vez
+que un handler lo pide.
+"""
+from collections.abc import Mapping
+
+FRAME_END = b'\r\n\r\n'
+_EVENT_PREFIX = b'Event:'
+
+
+class AMIFrameParser:
+    """Corta el flujo de bytes de AMI en bloques completos."""
+
+    __slots__ = ('_buffer', '_scanned')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Bytes del buffer ya revisados sin encontrar fin de bloque
+        self._scanned = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Agrega datos recibidos y retorna los bloques completos (sin el separador)."""
+        buffer = self._buffer
+        buffer += data
+        # El separador pudo quedar partido entre la lectura anterior y esta
+        pos = buffer.find(FRAME_END, max(0, self._scanned - 3))
+        if pos < 0:
+            self._scanned = len(buffer)
+            return []
+
+        frames = []
+        start = 0
+        view = memoryview(buffer)
+        try:
+            while pos >= 0:
+                if pos > start:
+                    frames.append(bytes(view[start:pos]))
+                start = pos + 4
+                pos = buffer.find(FRAME_END, start)
+        finally:
+            view.release()
+        del buffer[:start]
+        self._scanned = len(buffer)
+        return frames
+
+    def clear(self):
+        self._buffer.clear()
+        self._scanned = 0
+
+
+def frame_event_name(frame: bytes) -> bytes | None:
+    """Nombre del evento del bloque, en bytes y sin decodificar (None si no es evento)."""
+    if frame.startswith(_EVENT_PREFIX):
+        start = len(_EVENT_PREFIX)
+    else:
+        pos = frame.find(b'\r\n' + _EVENT_PREFIX)
+        if pos < 0:
+            return None
+        start = pos + 2 + len(_EVENT_PREFIX)
+    end = frame.find(b'\r\n', start)
+    return frame[start:end if end >= 0 else None].strip()
+
+
+class AMIEvent(Mapping):
+    """
+    Evento AMI con decodificación perezosa de headers.
+
+    Se usa como el dict de antes (event.get('Uniqueid', '')): si un header
+    aparece repetido gana el último, y los valores se decodifican en UTF-8
+    ignorando bytes inválidos.
+    """
+
+    __slots__ = ('raw', '_values', '_parsed')
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._values: dict[str, str] = {}
+        self._parsed = False
+
+    def _find(self, key: str) -> str | None:
+        name = key.encode() + b':'
+        raw = self.raw
+        pos = raw.rfind(b'\r\n' + name)
+        if pos >= 0:
+            start = pos + 2 + len(name)
+        elif raw.startswith(name):
+            start = len(name)
+        else:
+            return None
+        end = raw.find(b'\r\n', start)
+        return raw[start:end if end >= 0 else None].decode('utf-8', errors='ignore').strip()
+
+    def get(self, key, default=None):
+        values = self._values
+        if key in values:
+            return values[key]
+        if self._parsed:
+            return default
+        value = self._find(key)
+        if value is None:
+            return default
+        values[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _parse_all(self):
+        if self._parsed:
+            return
+        for line in self.raw.split(b'\r\n'):
+            key, sep, value = line.partition(b':')
+            if sep:
+                self._values[key.strip().decode('utf-8', errors='ignore')] = (
+                    value.decode('utf-8', errors='ignore').strip()
+                )
+        self._parsed = True
+
+    def __iter__(self):
+        self._parse_all()
+        return iter(self._values)
+
+    def __len__(self):
+        self._parse_all()
+        return len(self._values)
+
+    def __repr__(self):
+        return f'AMIEvent({self.raw[:80]!r})'
@@ -0,0 +1,174 @@
+"""
+Procesamiento de eventos AMI repartido en varios procesos.
+
+Con AMI_LISTENER_WORKERS > 1 el hilo del listener sólo lee el socket, corta
+los eventos y los agrega al journal repartidos en un stream por shard
+('ami:events:<n>'). Cada shard lo procesa un proceso propio (ShardPool), con
+su estado de llamadas, su write-behind y su checkpoint; así los handlers usan
+todos los núcleos en vez de competir por el GIL de un solo hilo.
+
+El shard de un evento sale de su identidad:
+  - Eventos de agente (QueueMemberStatus, QueueMemberPause, AgentLogin,
+    AgentLogoff): la interfaz sin el sufijo del canal (PJSIP/1001).
+  - El resto: Linkedid, o Uniqueid/UniqueID si no viene.
+El Cdr de cada canal trae el Linkedid si cdr_manager.conf lo mapea
+(docker/asterisk/configs); si no, se toma el visto en los eventos previos
+del mismo Uniqueid (LinkedIds). Así todos los eventos de una misma llamada,
+con todas sus patas, y los de un mismo agente, caen en el mismo shard y se
+procesan en el orden en que llegaron. Los cambios de estado
+de un agente que vienen de eventos de llamada (AgentConnect, AgentComplete)
+se procesan en el shard de la llamada.
+
+Cada shard expone sus métricas de handlers en AMI_METRICS_PORT + 1 + n.
+
+Requiere el journal (AMI_JOURNAL_ENABLED). Cambiar la cantidad de workers
+reparte los eventos en otros streams: hacerlo con el listener detenido y
+los shards al día.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import zlib
+from collections import OrderedDict
+
+from apps.telephony.ami_journal import AMIJournal, journal_key
+from apps.telephony.ami_protocol import AMIEvent, frame_event_name
+
+logger = logging.getLogger(__name__)
+
+SHARDS = max(1, int(os.environ.get('AMI_LISTENER_WORKERS', '1')))
+
+_AGENT_EVENTS = frozenset({
+    b'QueueMemberStatus', b'QueueMemberPause', b'QueueMemberPaused', b'AgentLogin', b'AgentLogoff',
+})
+
+
+class LinkedIds:
+    """Linkedid de los canales vistos (los más recientes), para rutear su Cdr."""
+
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        self._links: OrderedDict[str, str] = OrderedDict()
+
+    def learn(self, uniqueid: str, linkedid: str):
+        self._links[uniqueid] = linkedid
+        self._links.move_to_end(uniqueid)
+        if len(self._links) > self.maxsize:
+            self._links.popitem(last=False)
+
+    def get(self, uniqueid: str) -> str:
+        return self._links.get(uniqueid, '')
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+
+# Sólo lo usa el hilo que lee el socket (route)
+_linked_ids = LinkedIds()
+
+
+def shard_key(frame: bytes, name: bytes | None = None, links: LinkedIds | None = None) -> str:
+    """Identidad de la llamada o del agente del evento ('' si no tiene)."""
+    if name is None:
+        name = frame_event_name(frame)
+    event = AMIEvent(frame)
+    if name in _AGENT_EVENTS:
+        interface = event.get('Interface') or event.get('StateInterface') or event.get('Channel', '')
+        return interface.split('-', 1)[0]
+    links = _linked_ids if links is None else links
+    linkedid = event.get('Linkedid') or event.get('LinkedID', '')
+    uniqueid = event.get('Uniqueid') or event.get('UniqueID', '')
+    if name == b'Cdr':
+        # Un canal puede generar varios Cdr (transferencias): no se descarta el vínculo
+        return linkedid or links.get(uniqueid) or uniqueid
+    if linkedid and uniqueid and linkedid != uniqueid:
+        links.learn(uniqueid, linkedid)
+    return linkedid or uniqueid
+
+
+def shard_for(frame: bytes, shards: int, name: bytes | None = None, links: LinkedIds | None = None) -> int:
+    """Shard de un evento. crc32 y no hash(): debe ser estable entre procesos."""
+    if shards <= 1:
+        return 0
+    return zlib.crc32(shard_key(frame, name, links).encode()) % shards
+
+
+def route(frames: list[bytes], shards: int, links: LinkedIds | None = None) -> dict[int, list[bytes]]:
+    """Reparte los eventos por shard conservando el orden de llegada."""
+    routed: dict[int, list[bytes]] = {}
+    for frame in frames:
+        routed.setdefault(shard_for(frame, shards, links=links), []).append(frame)
+    return routed
+
+
+def shard_consumer(shard: int) -> str:
+    """Nombre del consumidor (checkpoint) de un shard."""
+    return f'shard-{shard}'
+
+
+def run_shard(shard: int, shards: int):
+    """Proceso de un shard: consume su stream hasta recibir SIGTERM."""
+    import django
+    django.setup()
+
+    from apps.telephony import ami_cdr_listener as listener
+
+    journal = AMIJournal.from_settings(key=journal_key(shard, shards), consumer=shard_consumer(shard))
+    listener.start_metrics_server(listener.METRICS_PORT + 1 + shard if listener.METRICS_PORT else 0)
+
+    async def main():
+        task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        await listener.consume_journal_forever(journal)
+
+    logger.info(f"[AMI Shard {shard}/{shards}] Iniciado (pid {os.getpid()})")
+    try:
+        asyncio.run(main())
+    except asyncio.CancelledError:
+        pass
+    logger.info(f"[AMI Shard {shard}/{shards}] Detenido")
+
+
+class ShardPool:
+    """Procesos de los shards: uno por shard, reiniciados si terminan."""
+
+    def __init__(self, shards: int = SHARDS):
+        self.shards = shards
+        # spawn: el listener corre en un hilo del worker Celery, no se puede hacer fork
+        self._ctx = multiprocessing.get_context('spawn')
+        self._procs: dict[int, multiprocessing.Process] = {}
+
+    def _spawn(self, shard: int):
+        proc = self._ctx.Process(
+            target=run_shard, args=(shard, self.shards), name=f'ami-shard-{shard}', daemon=True,
+        )
+        proc.start()
+        self._procs[shard] = proc
+
+    def start(self):
+        for shard in range(self.shards):
+            self._spawn(shard)
+        logger.info(f"[AMI Shards] {self.shards} procesos iniciados")
+
+    def ensure_alive(self) -> int:
+        """Reinicia los shards que terminaron. Retorna cuántos se reiniciaron."""
+        restarted = 0
+        for shard, proc in list(self._procs.items()):
+            if not proc.is_alive():
+                logger.warning(f"[AMI Shards] Shard {shard} terminó (exit {proc.exitcode}), reiniciando")
+                self._spawn(shard)
+                restarted += 1
+        return restarted
+
+    def stop(self, timeout: float = 15):
+        """Pide a cada shard que aplique lo pendiente y termine."""
+        for proc in self._procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self._procs.values():
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.kill()
+        self._procs.clear()
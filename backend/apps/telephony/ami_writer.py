@@ -0,0 +1,298 @@
+"""
+Write-behind de las mutaciones que generan los eventos AMI.
+
+Los handlers del listener no escriben en la base de datos: encolan la
+mutación aquí y el hilo de handlers la aplica cada AMI_WRITE_BEHIND_MS
+milisegundos o al juntar AMI_WRITE_BEHIND_ITEMS mutaciones, en una sola
+transacción:
+
+  - Llamadas (CDR): un upsert por call_id (bulk_create + bulk_update) y luego
+    post_save de cada Call, para que webhooks y estadísticas sigan igual.
+  - Cambios de estado de agentes: se cierran/crean los AgentStatusHistory en
+    el orden en que llegaron (bulk_update + bulk_create).
+  - Contadores y campos: un UPDATE por fila con F() (los incrementos se suman,
+    los valores quedan con el último).
+
+Mientras una mutación no se aplicó, overlay() la refleja sobre la instancia
+leída de la base de datos, para que el siguiente evento del mismo agente vea
+su estado real. No es thread-safe: se usa sólo desde el hilo de handlers.
+
+Para reprocesar el journal (replay_ami_events) se usa con frozen_models, cuyas
+filas no se escriben (sólo quedan en el overlay), y notify=False, que omite
+post_save y callbacks para no repetir webhooks de llamadas históricas.
+"""
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.db import DataError, DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = int(os.environ.get('AMI_WRITE_BEHIND_MS', '200')) / 1000
+MAX_ITEMS = int(os.environ.get('AMI_WRITE_BEHIND_ITEMS', '500'))
+
+# Estado anterior del agente → contador de tiempo diario al que se suma
+AGENT_TIME_FIELDS = {
+    'available': 'available_time_today',
+    'break': 'break_time_today',
+    'oncall': 'oncall_time_today',
+    'busy': 'oncall_time_today',
+    'wrapup': 'wrapup_time_today',
+}
+
+
+class _RowUpdate:
+    """Incrementos y valores pendientes de una fila."""
+
+    __slots__ = ('model', 'lookup', 'increments', 'values', 'floor_zero', 'ensure')
+
+    def __init__(self, model, lookup: dict):
+        self.model = model
+        self.lookup = lookup
+        self.increments = Counter()
+        self.values = {}
+        self.floor_zero = set()
+        self.ensure = False
+
+
+class WriteBehind:
+    """Cola de mutaciones de los eventos AMI con flush por lotes."""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_items: int = MAX_ITEMS,
+                 clock=time.monotonic, frozen_models=(), notify: bool = True):
+        self.flush_interval = flush_interval
+        self.max_items = max_items
+        self._clock = clock
+        self.frozen_models = tuple(frozen_models)
+        self.notify = notify
+        # Valores de filas de frozen_models: sólo overlay, nunca se escriben
+        self._frozen: dict[tuple, dict] = {}
+        self._reset()
+
+    def _reset(self):
+        self._rows: dict[tuple, _RowUpdate] = {}
+        # agent_id -> [(estado anterior, estado nuevo, instante)] en orden de llegada
+        self._transitions: dict[int, list] = defaultdict(list)
+        # call_id -> {'defaults': {...}, 'callbacks': [...]}
+        self._calls: dict[str, dict] = {}
+        self._items = 0
+        self._first_at = None
+
+    def __len__(self) -> int:
+        return self._items
+
+    def _queued(self):
+        self._items += 1
+        if self._first_at is None:
+            self._first_at = self._clock()
+
+    def due(self) -> bool:
+        """Hay que aplicar: lote completo o la mutación más vieja ya esperó el intervalo."""
+        if self._items >= self.max_items:
+            return True
+        return self._first_at is not None and self._clock() - self._first_at >= self.flush_interval
+
+    # ─────────────────────────────────────────────────────────────
+    # Encolar
+    # ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _key(model, lookup: dict) -> tuple:
+        return model, tuple(sorted(lookup.items()))
+
+    def update(self, model, lookup: dict, increments: dict = None, values: dict = None,
+               floor_zero=(), ensure: bool = False):
+        """
+        Encolar un UPDATE de las filas de `model` que cumplen `lookup`.
+
+        increments se suman con F(), sin bajar de 0 los campos de floor_zero;
+        values se asignan (gana el último). Con ensure se crea la fila si no
+        existe (p. ej. QueueStats de una cola).
+        """
+        key = self._key(model, lookup)
+        if model in self.frozen_models:
+            if values:
+                self._frozen.setdefault(key, {}).update(values)
+            return
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = _RowUpdate(model, dict(lookup))
+        if increments:
+            row.increments.update(increments)
+        if values:
+            row.values.update(values)
+        row.floor_zero.update(floor_zero)
+        row.ensure = row.ensure or ensure
+        self._queued()
+
+    def agent_transition(self, agent_id: int, old_status: str, new_status: str, at):
+        """Encolar un cambio de estado de agente con su historial."""
+        self._transitions[agent_id].append((old_status, new_status, at))
+        self._queued()
+
+    def upsert_call(self, call_id: str, defaults: dict, on_saved=None):
+        """Encolar el update_or_create de un Call; on_saved(call, created) corre tras el commit."""
+        entry = self._calls.setdefault(call_id, {'defaults': {}, 'callbacks': []})
+        entry['defaults'].update(defaults)
+        if on_saved:
+            entry['callbacks'].append(on_saved)
+        self._queued()
+
+    def overlay(self, instance):
+        """Aplicar sobre la instancia los valores pendientes de su fila."""
+        key = self._key(type(instance), {'pk': instance.pk})
+        row = self._rows.get(key)
+        pending = row.values if row is not None else self._frozen.get(key, {})
+        for field, value in pending.items():
+            setattr(instance, field, value)
+        return instance
+
+    # ─────────────────────────────────────────────────────────────
+    # Aplicar
+    # ─────────────────────────────────────────────────────────────
+
+    def flush(self) -> int:
+        """
+        Aplicar todo lo pendiente en una transacción. Retorna mutaciones aplicadas.
+        Si la base de datos no está disponible lo pendiente se conserva para el
+        próximo intento; si el lote es inválido se descarta.
+        """
+        if not self._items:
+            return 0
+        items = self._items
+        try:
+            with transaction.atomic():
+                saved_calls = self._flush_calls()
+                agent_seconds = self._flush_transitions()
+                self._flush_rows(agent_seconds)
+        except (IntegrityError, DataError) as e:
+            logger.error(f"[AMI Writer] Lote de {items} mutaciones descartado: {e}")
+            self._reset()
+            return 0
+        except DatabaseError as e:
+            logger.error(f"[AMI Writer] Error aplicando {items} mutaciones, se reintentará: {e}")
+            raise
+
+        self._reset()
+        if not self.notify:
+            return items
+        for call, created, callbacks in saved_calls:
+            post_save.send(sender=type(call), instance=call, created=created,
+                           update_fields=None, raw=False, using='default')
+            for callback in callbacks:
+                try:
+                    callback(call, created)
+                except Exception as e:
+                    logger.warning(f"[AMI Writer] Error post-guardado de {call.call_id}: {e}")
+        return items
+
+    def _flush_calls(self) -> list:
+        if not self._calls:
+            return []
+        from apps.telephony.models import Call
+
+        existing = {c.call_id: c for c in Call.objects.filter(call_id__in=list(self._calls))}
+        to_create, to_update, fields, saved = [], [], set(), []
+        for call_id, entry in self._calls.items():
+            defaults = entry['defaults']
+            call = existing.get(call_id)
+            if call is None:
+                call = Call(call_id=call_id, **defaults)
+                to_create.append(call)
+            else:
+                for field, value in defaults.items():
+                    setattr(call, field, value)
+                fields.update(defaults)
+                to_update.append(call)
+            saved.append((call, call_id not in existing, entry['callbacks']))
+
+        if to_create:
+            Call.objects.bulk_create(to_create)
+        if to_update:
+            Call.objects.bulk_update(to_update, fields=sorted(fields))
+        return saved
+
+    def _flush_transitions(self) -> dict:
+        """Cerrar y crear historial de estados; retorna segundos por agente y contador."""
+        seconds = defaultdict(Counter)
+        if not self._transitions:
+            return seconds
+        from apps.agents.models import AgentStatusHistory
+
+        open_records = {}
+        for record in AgentStatusHistory.objects.filter(
+            agent_id__in=list(self._transitions), ended_at__isnull=True
+        ).order_by('-started_at'):
+            open_records.setdefault(record.agent_id, record)
+
+        closed, created = [], []
+        for agent_id, steps in self._transitions.items():
+            current = open_records.get(agent_id)
+            for old_status, new_status, at in steps:
+                # Un registro abierto posterior al evento (replay) no se toca
+                if current is not None and current.started_at <= at:
+                    current.ended_at = at
+                    current.duration = max(0, int((at - current.started_at).total_seconds()))
+                    if current.pk:
+                        closed.append(current)
+                    field = AGENT_TIME_FIELDS.get(old_status)
+                    if field:
+                        seconds[agent_id][field] += current.duration
+                current = AgentStatusHistory(agent_id=agent_id, status=new_status, started_at=at)
+                created.append(current)
+
+        if closed:
+            AgentStatusHistory.objects.bulk_update(closed, fields=['ended_at', 'duration'])
+        if created:
+            starts = [record.started_at for record in created]
+            AgentStatusHistory.objects.bulk_create(created)
+            # started_at es auto_now_add: restaurar el instante del evento si
+            # se aplica con atraso (backlog o replay)
+            late = []
+            for record, started_at in zip(created, starts):
+                if record.pk and abs((record.started_at - started_at).total_seconds()) > 1:
+                    record.started_at = started_at
+                    late.append(record)
+            if late:
+                AgentStatusHistory.objects.bulk_update(late, fields=['started_at'])
+        return seconds
+
+    def _flush_rows(self, agent_seconds: dict):
+        rows = list(self._rows.values())
+        # Segundos de estado de los agentes: se suman a su UPDATE sin tocar lo
+        # pendiente (si la transacción falla, se recalculan en el reintento)
+        extra = {}
+        from apps.agents.models import Agent
+        if agent_seconds and Agent not in self.frozen_models:
+            for agent_id, fields in agent_seconds.items():
+                key = self._key(Agent, {'pk': agent_id})
+                extra[key] = fields
+                if key not in self._rows:
+                    rows.append(_RowUpdate(Agent, {'pk': agent_id}))
+
+        # Crear las filas que deben existir (una inserción por modelo)
+        missing = defaultdict(list)
+        for row in rows:
+            if row.ensure:
+                missing[row.model].append(row.model(**row.lookup))
+        for model, objs in missing.items():
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+
+        for row in rows:
+            increments = Counter(row.increments)
+            increments.update(extra.get(self._key(row.model, row.lookup), {}))
+            changes = dict(row.values)
+            for field, delta in increments.items():
+                if not delta:
+                    continue
+                expression = F(field) + delta
+                if field in row.floor_zero:
+                    expression = Greatest(expression, 0)
+                changes[field] = expression
+            if changes:
+                row.model.objects.filter(**row.lookup).update(**changes)
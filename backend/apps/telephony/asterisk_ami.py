@@ -3,7 +3,6 @@ Asterisk Manager Interface (AMI) Service
 Maneja la conexión y comunicación con Asterisk
 """
 import asyncio
-import socket
 import logging
 from typing import Optional, Dict, Callable
 from panoramisk import Manager
@@ -11,6 +10,9 @@ from django.conf import settings
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from apps.telephony.ami_pool import ami_pool
+from apps.telephony.trunk_status import trunk_status_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,6 +22,7 @@ class AsteriskAMI:
     def __init__(self):
         self.manager: Optional[Manager] = None
         self.connected = False
+        self._conn = None
         self.event_handlers: Dict[str, Callable] = {}
         self.channel_layer = get_channel_layer()
         
@@ -30,125 +33,72 @@ class AsteriskAMI:
         self.ami_password = getattr(settings, 'ASTERISK_AMI_PASSWORD', 'vozipomni_ami_2026')
     
     # ========== MÉTODOS SINCRÓNICOS PARA COMANDOS SIMPLES ==========
-    
+    # Usan una conexión del pool del proceso (ver ami_pool.py): connect() la
+    # toma ya autenticada y disconnect() la devuelve sin cerrarla.
+
     def connect(self):
-        """Conectar al AMI de Asterisk (versión sincrónica)"""
+        """Tomar una conexión AMI del pool (versión sincrónica)"""
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.settimeout(5)
-            self.sock.connect((self.ami_host, self.ami_port))
-            
-            # Leer banner
-            self._read_response()
-            
-            # Autenticarse
-            self._send_command(f"Action: Login\r\nUsername: {self.ami_user}\r\nSecret: {self.ami_password}\r\n\r\n")
-            response = self._read_response()
-            
-            if 'Success' in response:
-                self.connected = True
-                logger.info(f"✓ Conectado a Asterisk AMI en {self.ami_host}:{self.ami_port}")
-                return True
-            else:
-                logger.error("Error de autenticación AMI")
-                return False
-                
+            self._conn = ami_pool.acquire()
+            self.connected = True
+            return True
         except Exception as e:
             logger.error(f"Error conectando a Asterisk AMI: {e}")
             self.connected = False
             return False
-    
-    def disconnect(self):
-        """Desconectar del AMI (versión sincrónica)"""
-        if hasattr(self, 'sock'):
-            try:
-                self._send_command("Action: Logoff\r\n\r\n")
-                self.sock.close()
-            except:
-                pass
-            self.connected = False
-            logger.info("Desconectado de Asterisk AMI")
-    
-    def _send_command(self, command):
-        """Enviar comando al AMI"""
-        if hasattr(self, 'sock'):
-            self.sock.sendall(command.encode('utf-8'))
-    
-    def _read_response(self):
-        """Leer UNA respuesta AMI (hasta el primer doble CRLF)"""
-        response = b''
-        while True:
-            try:
-                chunk = self.sock.recv(4096)
-                if not chunk:
-                    break
-                response += chunk
-                if b'\r\n\r\n' in response:
-                    break
-            except socket.timeout:
-                break
-        return response.decode('utf-8', errors='ignore')
 
-    @staticmethod
-    def _strip_ami_output_prefix(response: str) -> str:
-        """
-        Preprocesa la respuesta de AMI 'Action: Command'.
-        Asterisk AMI envuelve cada línea de salida CLI con el prefijo 'Output: '.
-        Este método lo elimina para que el parser trabaje con la salida CLI pura.
-        También elimina las líneas de cabecera AMI (Response:, Privilege:, etc.).
-        """
-        cleaned_lines = []
-        for line in response.split('\n'):
-            line = line.rstrip('\r')
-            # Eliminar prefijo 'Output: ' o 'Output:'
-            if line.startswith('Output: '):
-                line = line[8:]
-            elif line.startswith('Output:'):
-                line = line[7:]
-            # Omitir cabeceras AMI internas
-            elif line.startswith(('Response:', 'Privilege:', 'ActionID:')):
-                continue
-            cleaned_lines.append(line)
-        return '\n'.join(cleaned_lines)
+    def disconnect(self):
+        """Devolver la conexión al pool (versión sincrónica)"""
+        conn, self._conn = getattr(self, '_conn', None), None
+        if conn is not None:
+            ami_pool.release(conn)
+        self.connected = False
 
-    def _read_command_response(self, timeout=5):
+    def _call(self, method: str, *args, retry: bool = True, **kwargs):
         """
-        Leer respuesta completa de Action: Command.
-        Lee hasta encontrar '--END COMMAND--' o hasta timeout.
+        Ejecuta un método de la conexión prestada. Si la conexión estaba rota
+        se descarta y, con retry, se repite una vez con otra del pool.
         """
-        import time
-        response = b''
-        old_timeout = self.sock.gettimeout()
-        self.sock.settimeout(1)  # 1s entre chunks
-        deadline = time.time() + timeout
         try:
-            while time.time() < deadline:
-                try:
-                    chunk = self.sock.recv(8192)
-                    if not chunk:
-                        break
-                    response += chunk
-                    if b'--END COMMAND--' in response:
-                        break
-                except socket.timeout:
-                    # Si ya tenemos algo y no llega más, aceptar lo que hay
-                    if response:
-                        break
-        finally:
-            self.sock.settimeout(old_timeout)
-        return response.decode('utf-8', errors='ignore')
-    
+            return getattr(self._conn, method)(*args, **kwargs)
+        except OSError as e:
+            ami_pool.discard(self._conn)
+            self._conn = None
+            self.connected = False
+            if not retry or not isinstance(e, ConnectionError):
+                raise
+        self._conn = ami_pool.acquire()
+        self.connected = True
+        return getattr(self._conn, method)(*args, **kwargs)
+
+    def action(self, action: dict, timeout: float = 5, retry: bool = True):
+        """Enviar una acción AMI y retornar su respuesta (AMIEvent)"""
+        if not self.connected:
+            raise ConnectionError("No conectado a Asterisk AMI")
+        return self._call('action', action, timeout=timeout, retry=retry)
+
+    def pipeline(self, actions: list, timeout: float = 5, retry: bool = True):
+        """Enviar varias acciones juntas y retornar sus respuestas en orden"""
+        if not self.connected:
+            raise ConnectionError("No conectado a Asterisk AMI")
+        return self._call('pipeline', actions, timeout=timeout, retry=retry)
+
+    def command(self, command: str, timeout: float = 10) -> str:
+        """Ejecutar un comando CLI y retornar la respuesta cruda (líneas 'Output:')"""
+        if not self.connected:
+            raise ConnectionError("No conectado a Asterisk AMI")
+        return self._call('command', command, timeout=timeout)
+
     def reload_module(self, module_name):
         """Recargar un módulo específico de Asterisk"""
         if not self.connected:
             return False
         
         try:
-            self._send_command(f"Action: ModuleLoad\r\nLoadType: reload\r\nModule: {module_name}\r\n\r\n")
-            response = self._read_response()
+            response = self.action({'Action': 'ModuleLoad', 'LoadType': 'reload', 'Module': module_name})
             # AMI puede responder 'Success' o no contener 'Error'
-            success = 'Success' in response or ('Error' not in response and 'Response:' in response)
-            logger.info(f"Módulo {module_name} recargado (success={success}, resp={response[:200].strip()})")
+            success = response.get('Response') != 'Error'
+            logger.info(f"Módulo {module_name} recargado (success={success}, resp={response.get('Message', '')})")
             return success
         except Exception as e:
             logger.error(f"Error recargando módulo {module_name}: {e}")
@@ -160,8 +110,7 @@ class AsteriskAMI:
             return False
         
         try:
-            self._send_command("Action: Command\r\nCommand: dialplan reload\r\n\r\n")
-            response = self._read_response()
+            self.command('dialplan reload')
             logger.info("Dialplan recargado")
             return True
         except Exception as e:
@@ -185,28 +134,26 @@ class AsteriskAMI:
         if not self.connected:
             raise ConnectionError("No conectado a Asterisk AMI")
 
-        cmd = (
-            f"Action: Originate\r\n"
-            f"Channel: {channel}\r\n"
-            f"Context: {context}\r\n"
-            f"Exten: {exten}\r\n"
-            f"Priority: {priority}\r\n"
-            f"Timeout: {timeout}\r\n"
-            f"Async: true\r\n"
-        )
+        action = {
+            'Action': 'Originate',
+            'Channel': channel,
+            'Context': context,
+            'Exten': exten,
+            'Priority': priority,
+            'Timeout': timeout,
+            'Async': 'true',
+        }
         if caller_id:
-            cmd += f"CallerID: {caller_id}\r\n"
+            action['CallerID'] = caller_id
         if variable:
-            var_str = ','.join(f"{k}={v}" for k, v in variable.items())
-            cmd += f"Variable: {var_str}\r\n"
-        cmd += "\r\n"
+            action['Variable'] = ','.join(f"{k}={v}" for k, v in variable.items())
 
-        self._send_command(cmd)
-        response = self._read_response()
-        success = 'Success' in response or 'Queued' in response
+        # Sin reintento: repetir un Originate podría duplicar la llamada
+        response = self.action(action, retry=False)
+        success = response.get('Response') == 'Success'
         logger.info(f"Originate {channel} -> {context}/{exten}: success={success}")
-        if not success and 'Error' in response:
-            raise RuntimeError(f"AMI Originate error: {response[:200]}")
+        if not success:
+            raise RuntimeError(f"AMI Originate error: {response.get('Message', '')}")
         return response
     
     def sip_show_peers(self):
@@ -215,368 +162,20 @@ class AsteriskAMI:
             return []
         
         try:
-            self._send_command("Action: SIPpeers\r\n\r\n")
-            response = self._read_response()
+            response = self.action({'Action': 'SIPpeers'})
             # Parsear respuesta (simplificado)
-            return response
+            return response.raw.decode('utf-8', errors='ignore')
         except Exception as e:
             logger.error(f"Error obteniendo peers SIP: {e}")
             return []
     
-    def pjsip_show_endpoints(self):
-        """
-        Obtener endpoints PJSIP parseando la salida CLI de 'pjsip show endpoints'.
-        Retorna dict: { 'NombreEndpoint': { 'state': '...', 'contacts': [...] } }
-        Incluye variantes de nombre normalizadas (minúsculas, guiones→underscores)
-        """
-        if not self.connected:
-            return {}
-
-        try:
-            self._send_command("Action: Command\r\nCommand: pjsip show endpoints\r\n\r\n")
-            raw_response = self._read_command_response(timeout=10)
-
-            logger.info(f"AMI pjsip show endpoints respuesta ({len(raw_response)} bytes)")
-            logger.debug(f"AMI pjsip show endpoints RAW:\n{raw_response[:2000]}")
-
-            # Limpiar prefijo 'Output:' que AMI agrega a cada línea
-            response = self._strip_ami_output_prefix(raw_response)
-
-            endpoints = {}
-            current_ep = None
-
-            for line in response.split('\n'):
-                line = line.rstrip('\r')
-                stripped = line.strip()
-
-                # Línea de Endpoint: " Endpoint:  trunk-vozip  Not in use  0 of inf"
-                # También manejar formato con separador /: "Endpoint:  trunk-vozip/6001  ..."
-                if stripped.startswith('Endpoint:'):
-                    parts = stripped.split()
-                    if len(parts) >= 2:
-                        ep_name = parts[1]
-                        # Ignorar la cabecera con <...>
-                        if '<' in ep_name:
-                            continue
-                        # Limpiar posible /CID del nombre
-                        if '/' in ep_name:
-                            ep_name = ep_name.split('/')[0]
-                        state = ' '.join(parts[2:]) if len(parts) > 2 else 'Unknown'
-                        current_ep = ep_name
-                        endpoints[current_ep] = {
-                            'name': current_ep,
-                            'state': state,
-                            'contacts': []
-                        }
-                        logger.debug(f"  Endpoint encontrado: {ep_name} state={state}")
-
-                # Línea de Contact: "  Contact:  trunk-vozip/sip:host 958a7 Avail  277.794"
-                elif stripped.startswith('Contact:') and current_ep:
-                    parts = stripped.split()
-                    if len(parts) >= 2:
-                        contact_uri = parts[1]
-                        # Determinar disponibilidad
-                        avail = any(
-                            kw in line.lower() for kw in ('avail', 'available', 'reachable')
-                        )
-                        endpoints[current_ep]['contacts'].append({
-                            'uri': contact_uri,
-                            'available': avail,
-                            'raw': stripped
-                        })
-                        logger.debug(f"  Contact: {contact_uri} avail={avail}")
-
-                # Línea de Transport: " Transport:  trunk-transport  udp ..."
-                elif stripped.startswith('Transport:') and current_ep:
-                    parts = stripped.split()
-                    if len(parts) >= 2 and '<' not in parts[1]:
-                        endpoints[current_ep]['transport'] = parts[1]
-
-                # Línea Aor: "  Aor:  trunk-vozip  1"
-                elif stripped.startswith('Aor:') and current_ep:
-                    parts = stripped.split()
-                    if len(parts) >= 2 and '<' not in parts[1]:
-                        endpoints[current_ep]['aor'] = parts[1]
-
-            logger.info(f"PJSIP endpoints encontrados: {list(endpoints.keys())}")
-            return endpoints
-
-        except Exception as e:
-            logger.error(f"Error obteniendo endpoints PJSIP: {e}")
-            return {}
-
-    def pjsip_show_registrations(self):
-        """
-        Obtener registros PJSIP parseando la salida CLI de 'pjsip show registrations'.
-        Retorna dict: { 'NombreRegistro': { 'status': '...', 'server_uri': '...' } }
-        Incluye variantes de nombre normalizadas para lookup flexible.
-        """
-        if not self.connected:
-            return {}
-
-        try:
-            self._send_command("Action: Command\r\nCommand: pjsip show registrations\r\n\r\n")
-            raw_response = self._read_command_response(timeout=10)
-
-            logger.info(f"AMI pjsip show registrations respuesta ({len(raw_response)} bytes)")
-            logger.debug(f"AMI pjsip show registrations RAW:\n{raw_response[:2000]}")
-
-            # Limpiar prefijo 'Output:' que AMI agrega a cada línea
-            response = self._strip_ami_output_prefix(raw_response)
-
-            registrations = {}
-
-            for line in response.split('\n'):
-                line = line.rstrip('\r')
-                stripped = line.strip()
-                # Formato típico:
-                #  <Registration/ServerURI......>  <Auth..>  <Status.....>
-                #  trunk-vozip-reg/sip:provider    trunk..   Registered
-                # o:
-                #  trunk-vozip                     trunk..   Registered
-
-                # Ignorar cabeceras y separadores
-                if '<' in line or '====' in line or not stripped:
-                    continue
-                if stripped.startswith('Registration:'):
-                    continue
-                # Ignorar líneas que son solo texto informativo
-                if stripped.startswith('Objects found:') or stripped.startswith('--'):
-                    continue
-
-                parts = stripped.split()
-                if len(parts) >= 2:
-                    reg_id = parts[0]
-                    # Ignorar la palabra 'Registration' si aparece como primer campo
-                    if reg_id.lower() == 'registration' and '<' not in line:
-                        continue
-                    # Determinar status: buscar palabras clave conocidas
-                    reg_status = 'Unknown'
-                    for p in parts:
-                        p_lower = p.lower()
-                        if p_lower in ('registered', 'unregistered', 'rejected',
-                                       'failed', 'stopped', 'attempting'):
-                            reg_status = p.capitalize()
-                            break
-                    if reg_status != 'Unknown' or '/' in reg_id:
-                        # Extraer nombre base del trunk a partir del registro.
-                        # El wizard PJSIP genera nombres con estos patrones:
-                        #   trunk-reg-0/sip:host   → base trunk
-                        #   trunk-reg/sip:host     → base trunk
-                        #   trunk/sip:host         → base trunk
-                        # Siempre dividir por '/' primero para quitar la URI
-                        base_name = reg_id.split('/')[0]
-                        
-                        # Quitar sufijos de registro generados por el wizard:
-                        # -reg-0, -reg-1, -reg (con o sin índice numérico)
-                        import re as _re
-                        base_name_no_suffix = _re.sub(r'-reg(-\d+)?$', '', base_name)
-                        
-                        reg_entry = {
-                            'status': reg_status,
-                            'name': base_name,
-                            'base_name': base_name_no_suffix
-                        }
-                        registrations[base_name] = reg_entry
-                        # Registrar también con el nombre base (sin sufijo) para lookup
-                        if base_name != base_name_no_suffix:
-                            registrations[base_name_no_suffix] = reg_entry
-                        
-                        logger.debug(f"  Registration: {base_name} → base={base_name_no_suffix} status={reg_status}")
-
-            logger.info(f"PJSIP registrations encontradas: {list(registrations.keys())}")
-            return registrations
-
-        except Exception as e:
-            logger.error(f"Error obteniendo registros PJSIP: {e}")
-            return {}
-    
-    def pjsip_check_endpoint(self, endpoint_name):
-        """
-        Verificar un endpoint PJSIP individual usando 'pjsip show endpoint <name>'.
-        Fallback más confiable que parsear la lista completa.
-        Retorna dict con info del endpoint o None si no existe.
-        """
-        if not self.connected:
-            return None
-
-        try:
-            self._send_command(f"Action: Command\r\nCommand: pjsip show endpoint {endpoint_name}\r\n\r\n")
-            raw_response = self._read_command_response(timeout=8)
-
-            logger.debug(f"pjsip show endpoint {endpoint_name}: {len(raw_response)} bytes")
-
-            # Limpiar prefijo 'Output:' que AMI agrega a cada línea
-            response = self._strip_ami_output_prefix(raw_response)
-
-            # Si la respuesta contiene "Unable to retrieve" o "not found", no existe
-            if 'Unable to retrieve' in response or 'not found' in response.lower():
-                return None
-
-            # Buscar información del endpoint
-            result = {
-                'name': endpoint_name,
-                'found': False,
-                'state': 'Unknown',
-                'contacts': []
-            }
-
-            for line in response.split('\n'):
-                stripped = line.strip().rstrip('\r')
-                # Buscar el nombre del endpoint en la respuesta
-                if 'Endpoint:' in stripped and endpoint_name.lower() in stripped.lower():
-                    result['found'] = True
-                    parts = stripped.split()
-                    if len(parts) > 2:
-                        result['state'] = ' '.join(parts[2:])
-                elif stripped.startswith('Contact:'):
-                    avail = any(kw in line.lower() for kw in ('avail', 'available', 'reachable'))
-                    result['contacts'].append({'available': avail, 'raw': stripped})
-                    result['found'] = True
-                elif 'DeviceState' in stripped or 'context' in stripped.lower():
-                    result['found'] = True
-
-            if result['found']:
-                return result
-            
-            # Aún si no parseamos nada, si no dice "not found" y tiene contenido
-            # significativo, considerarlo encontrado
-            content_lines = [l.strip() for l in response.split('\n') 
-                           if l.strip() and not l.strip().startswith(('Response:', 'Privilege:', 'Output:', '--'))]
-            if len(content_lines) > 3:
-                result['found'] = True
-                return result
-
-            return None
-
-        except Exception as e:
-            logger.error(f"Error verificando endpoint {endpoint_name}: {e}")
-            return None
-
-    def pjsip_check_registration(self, reg_name):
-        """
-        Verificar una registration PJSIP individual usando 'pjsip show registration <name>'.
-        Retorna dict con status o None si no existe.
-        """
-        if not self.connected:
-            return None
-
-        try:
-            # Probar con sufijo -reg primero (formato wizard)
-            names_to_try = [f"{reg_name}-reg", reg_name]
-            
-            for name in names_to_try:
-                self._send_command(f"Action: Command\r\nCommand: pjsip show registration {name}\r\n\r\n")
-                raw_response = self._read_command_response(timeout=8)
-
-                logger.debug(f"pjsip show registration {name}: {len(raw_response)} bytes")
-
-                # Limpiar prefijo 'Output:' que AMI agrega a cada línea
-                response = self._strip_ami_output_prefix(raw_response)
-
-                if 'Unable to retrieve' in response or 'not found' in response.lower():
-                    continue
-
-                # Buscar estado
-                reg_status = 'Unknown'
-                for line in response.split('\n'):
-                    stripped = line.strip().rstrip('\r').lower()
-                    if 'status' in stripped:
-                        for keyword in ('registered', 'unregistered', 'rejected', 'failed', 'attempting'):
-                            if keyword in stripped:
-                                reg_status = keyword.capitalize()
-                                break
-                    # También buscar directamente las palabras clave en la respuesta
-                    for keyword in ('registered', 'unregistered', 'rejected', 'failed', 'attempting'):
-                        if keyword in stripped and 'sends_registration' not in stripped:
-                            reg_status = keyword.capitalize()
-                            break
-                    if reg_status != 'Unknown':
-                        break
-
-                if reg_status != 'Unknown':
-                    return {'status': reg_status, 'name': name}
-                
-                # Si hay contenido significativo pero no se parseó el status
-                content_lines = [l.strip() for l in response.split('\n') 
-                               if l.strip() and not l.strip().startswith(('Response:', 'Privilege:', 'Output:', '--'))]
-                if len(content_lines) > 2:
-                    return {'status': 'Unknown', 'name': name}
-
-            return None
-
-        except Exception as e:
-            logger.error(f"Error verificando registration {reg_name}: {e}")
-            return None
-
     def get_trunk_registration_status(self, trunk_name):
         """
-        Obtener estado de registro de una troncal específica.
-        El PJSIP Wizard genera nombres de registro con sufijos:
-          - trunk-reg-0   (formato más común en Asterisk 21)
-          - trunk-reg     (formato antiguo)
-          - trunk         (sin sufijo, si el wizard no agrega índice)
+        Obtener estado de registro de una troncal específica desde el snapshot
+        de trunk_status (eventos AMI + acciones PJSIPShow*), sin parsear CLI.
         """
         try:
-            import re as _re
-            # Primero intentar con la lista completa (más eficiente)
-            registrations = self.pjsip_show_registrations()
-            
-            # El parser ya normaliza los nombres base, buscar directamente por trunk_name
-            reg = registrations.get(trunk_name)
-            if reg:
-                status = reg.get('status', 'Unknown')
-                if status == 'Registered':
-                    return 'Registered'
-                elif status in ('Rejected', 'Failed'):
-                    return 'Failed'
-                elif status == 'Unregistered':
-                    return 'Unregistered'
-                elif status == 'Attempting':
-                    return 'Attempting'
-                return status
-
-            # Si no encontramos por nombre exacto, buscar cualquier registro
-            # cuyo base_name coincida (por si el parser no normalizó bien)
-            for reg_key, reg_data in registrations.items():
-                if reg_data.get('base_name') == trunk_name:
-                    status = reg_data.get('status', 'Unknown')
-                    if status == 'Registered':
-                        return 'Registered'
-                    elif status in ('Rejected', 'Failed'):
-                        return 'Failed'
-                    return status
-
-            # Fallback: verificación individual con variantes de nombre
-            # Asterisk 21 usa trunk-reg-0, -1, etc. según el índice del wizard
-            variants_to_try = [
-                f"{trunk_name}-reg-0",
-                f"{trunk_name}-reg-1",
-                f"{trunk_name}-reg",
-                trunk_name,
-            ]
-            for variant in variants_to_try:
-                reg_check = self.pjsip_check_registration(variant)
-                if reg_check and reg_check.get('status', 'Unknown') != 'Unknown':
-                    status = reg_check['status']
-                    if status == 'Registered':
-                        return 'Registered'
-                    elif status in ('Rejected', 'Failed'):
-                        return 'Failed'
-                    elif status == 'Attempting':
-                        return 'Attempting'
-                    return status
-
-            # Fallback: buscar en endpoints (troncales sin registro, IP-based)
-            endpoints = self.pjsip_show_endpoints()
-            ep = endpoints.get(trunk_name)
-            if ep:
-                contacts = ep.get('contacts', [])
-                if any(c.get('available') for c in contacts):
-                    return 'Available'
-                return 'No Contacts'
-
-            return 'Not Configured'
+            return trunk_status_cache.trunk_status(trunk_name)
         except Exception as e:
             logger.error(f"Error verificando estado de troncal {trunk_name}: {e}")
             return 'Error'
@@ -5,15 +5,107 @@ Compatible con la arquitectura OmniLeads:
 - Troncales en pjsip_wizard.conf (manejado por PJSIPConfigGenerator)
 - Dialplan con contextos from-pstn, from-pbx, from-internal
 - Redis como backend para datos en tiempo real
+
+Generación incremental: cada archivo dinámico declara de qué modelos depende
+y qué recarga en Asterisk (CONFIG_FILES). Un cambio en un modelo regenera
+sólo los archivos que lo usan, cada archivo se escribe sólo si su hash de
+contenido difiere del que está en disco (escritura atómica tmp + rename) y
+se recargan sólo los módulos de los archivos que cambiaron.
 """
 import os
+import hashlib
 import logging
+import tempfile
 from pathlib import Path
 from django.conf import settings
 from .models import Extension, InboundRoute, OutboundRoute, Voicemail, MusicOnHold, TimeCondition, IVR, CustomDestination
 
 logger = logging.getLogger(__name__)
 
+# Archivo dinámico → (método generador, modelos que lo alimentan, recargas).
+# 'dialplan' es 'dialplan reload'; el resto son módulos para ModuleLoad.
+CONFIG_FILES = {
+    'pjsip_extensions.conf': (
+        'generate_pjsip_extensions_conf',
+        {'Extension', 'Agent'},
+        ('res_pjsip.so', 'chan_pjsip.so'),
+    ),
+    'extensions_dynamic.conf': (
+        'generate_extensions_conf',
+        {'Extension', 'Queue', 'InboundRoute', 'OutboundRoute', 'SIPTrunk', 'IVR', 'CustomDestination'},
+        ('dialplan',),
+    ),
+    'queues_dynamic.conf': (
+        'generate_queues_dynamic_conf',
+        {'Queue', 'QueueMember', 'Agent'},
+        ('app_queue.so',),
+    ),
+    'voicemail_dynamic.conf': (
+        'generate_voicemail_conf',
+        {'Voicemail'},
+        ('app_voicemail.so',),
+    ),
+    'musiconhold_dynamic.conf': (
+        'generate_musiconhold_conf',
+        {'MusicOnHold'},
+        ('res_musiconhold.so',),
+    ),
+}
+
+
+def config_files_for(models=None) -> list:
+    """Archivos dinámicos afectados por cambios en `models` (nombres de modelo). None = todos."""
+    if models is None:
+        return list(CONFIG_FILES)
+    return [filename for filename, (_, depends, _) in CONFIG_FILES.items() if depends & set(models)]
+
+
+def reloads_for(filenames) -> list:
+    """Recargas necesarias para los archivos dados, sin repetir y en orden de CONFIG_FILES."""
+    reloads = []
+    for filename, (_, _, targets) in CONFIG_FILES.items():
+        if filename in filenames:
+            reloads.extend(target for target in targets if target not in reloads)
+    return reloads
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def write_if_changed(path, content: str) -> bool:
+    """
+    Escribe `content` en `path` sólo si difiere de lo que hay en disco.
+    Escritura atómica (archivo temporal en el mismo directorio + rename):
+    Asterisk nunca lee un archivo a medio escribir. Retorna si cambió.
+    """
+    path = Path(path)
+    data = content.encode('utf-8')
+    try:
+        current = path.read_bytes()
+    except FileNotFoundError:
+        current = None
+    if current is not None and content_digest(current) == content_digest(data):
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode = path.stat().st_mode & 0o777 if current is not None else 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
 
 class AsteriskConfigGenerator:
     """
@@ -32,6 +124,8 @@ class AsteriskConfigGenerator:
         # Directorio estático de Asterisk para archivos de configuración completos
         # (voicemail.conf, musiconhold.conf) que Asterisk carga directamente
         self.static_config_dir = Path('/etc/asterisk')
+        # Archivos que cambiaron en disco en la última escritura
+        self.changed_files = []
     
     def generate_pjsip_extensions_conf(self):
         """
@@ -57,6 +151,12 @@ class AsteriskConfigGenerator:
             "; ==========================================================================",
             "",
         ]
+
+        # Modo Realtime: las extensiones viven en ps_endpoints/ps_auths/ps_aors
+        from .realtime import realtime_enabled
+        if realtime_enabled():
+            config.append("; PJSIP_PROVISIONING=realtime: extensiones publicadas vía Asterisk Realtime")
+            return '\n'.join(config)
         
         # Extensiones de agentes WebRTC: detectar por Agent model además de extension_type
         # Esto corrige extensiones creadas con tipo PJSIP que en realidad son WebRTC
@@ -202,6 +302,11 @@ class AsteriskConfigGenerator:
             "; ====== EXTENSIONES INTERNAS + RUTAS SALIENTES (merge con from-internal) ======",
             "[from-internal]",
         ]
+
+        # Destinos personalizados en una sola query (rutas e IVRs los resuelven por nombre)
+        custom_destinations = {
+            dest.name: dest for dest in CustomDestination.objects.filter(is_active=True)
+        }
         
         # Agregar extensiones internas
         extensions = Extension.objects.filter(is_active=True).order_by('extension')
@@ -222,8 +327,8 @@ class AsteriskConfigGenerator:
         # Extensiones de colas (marcar extensión de la cola → Queue())
         try:
             from apps.queues.models import Queue
-            queues = Queue.objects.filter(is_active=True)
-            if queues.exists():
+            queues = list(Queue.objects.filter(is_active=True))
+            if queues:
                 config.extend([
                     "",
                     "; ====== EXTENSIONES DE COLAS ======",
@@ -242,8 +347,8 @@ class AsteriskConfigGenerator:
             logger.warning(f"No se pudieron generar extensiones de colas: {e}")
         
         # Rutas entrantes (DIDs) - merge con [from-pstn] estático
-        inbound_routes = InboundRoute.objects.filter(is_active=True).order_by('priority')
-        if inbound_routes.exists():
+        inbound_routes = list(InboundRoute.objects.filter(is_active=True).order_by('priority'))
+        if inbound_routes:
             config.extend([
                 "",
                 "; ====== RUTAS ENTRANTES (DIDs) DINÁMICAS ======",
@@ -270,7 +375,7 @@ class AsteriskConfigGenerator:
                 elif route.destination_type == 'announcement':
                     config.append(f" same => n,Playback({route.destination})")
                 elif route.destination_type == 'custom_destination':
-                    custom_dest = CustomDestination.objects.filter(name=route.destination, is_active=True).first()
+                    custom_dest = custom_destinations.get(route.destination)
                     if custom_dest:
                         config.append(
                             f" same => n,Goto({custom_dest.context},{custom_dest.extension},{custom_dest.priority})"
@@ -285,8 +390,10 @@ class AsteriskConfigGenerator:
         
         # Rutas salientes - RE-ABRIR contexto [from-internal]
         # Es necesario porque si hay rutas entrantes, el contexto activo es [from-pstn]
-        outbound_routes = OutboundRoute.objects.filter(is_active=True).select_related('trunk').order_by('priority', 'name')
-        if outbound_routes.exists():
+        outbound_routes = list(
+            OutboundRoute.objects.filter(is_active=True).select_related('trunk').order_by('priority', 'name')
+        )
+        if outbound_routes:
             config.extend([
                 "",
                 "; ====== RUTAS SALIENTES DINÁMICAS ======",
@@ -341,7 +448,7 @@ class AsteriskConfigGenerator:
                 elif dest_type == 'announcement':
                     config.append(f"{first_step},Playback({dest_value})")
                 elif dest_type == 'custom_destination':
-                    custom_dest = CustomDestination.objects.filter(name=dest_value, is_active=True).first()
+                    custom_dest = custom_destinations.get(dest_value)
                     if custom_dest:
                         config.append(
                             f"{first_step},Goto({custom_dest.context},{custom_dest.extension},{custom_dest.priority})"
@@ -493,7 +600,8 @@ class AsteriskConfigGenerator:
         """
         Genera queues_dynamic.conf con colas dinámicas desde la base de datos
         """
-        from apps.queues.models import Queue
+        from django.db.models import Prefetch
+        from apps.queues.models import Queue, QueueMember
         
         config = [
             "; queues_dynamic.conf - Generado automáticamente por VoziPOmni",
@@ -502,7 +610,11 @@ class AsteriskConfigGenerator:
         ]
         
         try:
-            queues = Queue.objects.filter(is_active=True)
+            # Miembros de todas las colas en una sola query (no una por cola)
+            active_members = QueueMember.objects.select_related('agent').filter(agent__user__is_active=True)
+            queues = Queue.objects.filter(is_active=True).prefetch_related(
+                Prefetch('members', queryset=active_members)
+            )
             for queue in queues:
                 strategy = queue.strategy or 'ringall'
                 timeout = queue.timeout or 30
@@ -534,7 +646,7 @@ class AsteriskConfigGenerator:
                 ])
                 
                 # Agregar miembros de la cola
-                for member in queue.members.select_related('agent').filter(agent__is_active=True):
+                for member in queue.members.all():
                     ext = getattr(member.agent, 'sip_extension', None)
                     if ext:
                         penalty = member.penalty or 0
@@ -560,22 +672,23 @@ class AsteriskConfigGenerator:
         # TODOS los archivos van al directorio dinámico (volumen compartido)
         # /etc/asterisk/ es un bind mount de solo lectura desde el host
         # Los archivos estáticos (voicemail.conf, etc.) se incluyen via #include
-        dynamic_configs = {
-            'pjsip_extensions.conf': self.generate_pjsip_extensions_conf(),
-            'extensions_dynamic.conf': self.generate_extensions_conf(),
-            'queues_dynamic.conf': self.generate_queues_dynamic_conf(),
-            'voicemail_dynamic.conf': self.generate_voicemail_conf(),
-            'musiconhold_dynamic.conf': self.generate_musiconhold_conf(),
-        }
-        
-        # Escribir todos los archivos al directorio dinámico
-        for filename, content in dynamic_configs.items():
-            filepath = self.config_dir / filename
+        return self.write_configs(list(CONFIG_FILES))
+    
+    def write_configs(self, filenames):
+        """
+        Genera sólo los archivos indicados y escribe los que cambiaron.
+        Retorna {archivo: contenido}; los escritos quedan en self.changed_files.
+        """
+        dynamic_configs = {}
+        self.changed_files = []
+        for filename in filenames:
+            content = dynamic_configs[filename] = getattr(self, CONFIG_FILES[filename][0])()
             try:
-                filepath.parent.mkdir(parents=True, exist_ok=True)
-                with open(filepath, 'w') as f:
-                    f.write(content)
-                logger.info(f"✓ {filename} generado en {self.config_dir}")
+                if write_if_changed(self.config_dir / filename, content):
+                    self.changed_files.append(filename)
+                    logger.info(f"✓ {filename} generado en {self.config_dir}")
+                else:
+                    logger.debug(f"{filename} sin cambios")
             except Exception as e:
                 logger.error(f"✗ Error generando {filename}: {e}")
         
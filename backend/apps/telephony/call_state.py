@@ -0,0 +1,168 @@
+"""
+Estado en memoria de las llamadas en curso del listener AMI.
+
+Cada llamada (por uniqueid) tiene un CallState con __slots__: los campos
+que acumulan los eventos de cola, hold, transferencia y voicemail hasta que
+llega su Cdr. Sin dict por llamada el estado ocupa una fracción de memoria,
+y los uniqueid se internan porque la misma cadena está en el índice y en la
+rueda de expiración.
+
+Expiración con timer wheel: una rueda de slots de WHEEL_RESOLUTION segundos
+que cubre el TTL. Cada estado está en el slot de su vencimiento y se mueve
+de slot al tocarlo (O(1)); expire() sólo recorre los slots vencidos desde la
+última llamada, no todos los estados. Si se supera max_states se descartan
+primero los que vencen antes (evicted).
+
+No es thread-safe: se usa sólo desde el hilo de handlers.
+"""
+import math
+import os
+import sys
+import time
+
+STATE_TTL = int(os.environ.get('AMI_CALL_STATE_TTL', '7200'))  # 2 horas en segundos
+MAX_STATES = int(os.environ.get('AMI_CALL_STATE_MAX', '200000'))
+WHEEL_RESOLUTION = 60
+
+
+class CallState:
+    """Datos acumulados de una llamada hasta su Cdr."""
+
+    __slots__ = (
+        'uniqueid', 'deadline', 'slot',
+        'queue_enter_time', 'queue_name', 'queue', 'caller', 'agent', 'final_status',
+        'ring_no_answer_count', 'hold_start', 'hold_events', 'hold_time',
+        'transferred', 'transfer_to', 'voicemail_box',
+    )
+
+    def __init__(self, uniqueid: str = ''):
+        self.uniqueid = uniqueid
+        self.deadline = 0
+        self.slot = -1
+        self.queue_enter_time = None
+        self.queue_name = ''
+        self.queue = None
+        self.caller = ''
+        self.agent = None
+        self.final_status = None
+        self.ring_no_answer_count = 0
+        self.hold_start = None
+        self.hold_events = 0
+        self.hold_time = 0
+        self.transferred = False
+        self.transfer_to = ''
+        self.voicemail_box = ''
+
+    def __repr__(self):
+        return f'CallState({self.uniqueid!r}, queue={self.queue_name!r}, final={self.final_status!r})'
+
+
+class CallStateStore:
+    """Estados de llamada por uniqueid con expiración por timer wheel."""
+
+    def __init__(self, ttl: float = STATE_TTL, max_states: int = MAX_STATES,
+                 resolution: float = WHEEL_RESOLUTION, clock=time.time):
+        self.ttl = ttl
+        self.max_states = max_states
+        self.resolution = resolution
+        self._ttl_ticks = max(1, math.ceil(ttl / resolution))
+        self._wheel = [set() for _ in range(self._ttl_ticks + 1)]
+        self._states: dict[str, CallState] = {}
+        # Último tick ya procesado por expire()
+        self._tick = int(clock() // resolution)
+        # Vencimiento más lejano asignado
+        self._horizon = self._tick
+        self.created = self.completed = self.expired = self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, uniqueid) -> bool:
+        return uniqueid in self._states
+
+    def _schedule(self, state: CallState, now: float):
+        # Nunca en un slot ya procesado (eventos reprocesados con instantes viejos)
+        state.deadline = max(int(now // self.resolution) + self._ttl_ticks, self._tick + 1)
+        self._horizon = max(self._horizon, state.deadline)
+        slot = state.deadline % len(self._wheel)
+        if slot != state.slot:
+            if state.slot >= 0:
+                self._wheel[state.slot].discard(state.uniqueid)
+            self._wheel[slot].add(state.uniqueid)
+            state.slot = slot
+
+    def _unschedule(self, state: CallState):
+        if state.slot >= 0:
+            self._wheel[state.slot].discard(state.uniqueid)
+            state.slot = -1
+
+    def get(self, uniqueid: str, now: float) -> CallState:
+        """Estado de la llamada (lo crea si no existe) con el vencimiento renovado."""
+        state = self._states.get(uniqueid)
+        if state is None:
+            if len(self._states) >= self.max_states:
+                self._evict_one()
+            uniqueid = sys.intern(uniqueid)
+            state = self._states[uniqueid] = CallState(uniqueid)
+            self.created += 1
+        self._schedule(state, now)
+        return state
+
+    def pop(self, uniqueid: str) -> CallState:
+        """Quita y retorna el estado de la llamada (vacío si no había)."""
+        state = self._states.pop(uniqueid, None)
+        if state is None:
+            return CallState(uniqueid)
+        self._unschedule(state)
+        self.completed += 1
+        return state
+
+    def _evict_one(self):
+        """Descarta el estado que vence antes."""
+        size = len(self._wheel)
+        # Si expire() no corrió en un rato un slot mezcla vencimientos de vueltas distintas
+        for tick in range(self._tick + 1, self._horizon + 1):
+            slot = self._wheel[tick % size]
+            for uniqueid in slot:
+                state = self._states[uniqueid]
+                if state.deadline <= tick:
+                    slot.discard(uniqueid)
+                    del self._states[uniqueid]
+                    state.slot = -1
+                    self.evicted += 1
+                    return
+
+    def expire(self, now: float) -> int:
+        """Elimina los estados vencidos hasta `now`. Retorna cuántos."""
+        tick = int(now // self.resolution)
+        if tick <= self._tick:
+            return 0
+        size = len(self._wheel)
+        expired = 0
+        # Con una vuelta completa ya se revisaron todos los slots
+        for current in range(max(self._tick + 1, tick - size + 1), tick + 1):
+            slot = self._wheel[current % size]
+            for uniqueid in list(slot):
+                state = self._states[uniqueid]
+                if state.deadline <= tick:
+                    slot.discard(uniqueid)
+                    del self._states[uniqueid]
+                    state.slot = -1
+                    expired += 1
+        self._tick = tick
+        self.expired += expired
+        return expired
+
+    def clear(self):
+        self._states.clear()
+        for slot in self._wheel:
+            slot.clear()
+
+    def stats(self) -> dict:
+        return {
+            'live': len(self._states),
+            'created': self.created,
+            'completed': self.completed,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
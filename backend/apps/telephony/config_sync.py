@@ -0,0 +1,252 @@
+"""
+Sincronización de la config de Asterisk con un solo worker por proceso.
+
+Antes cada post_save lanzaba un thread: si ya había una sincronización en
+curso el cambio se descartaba (y Asterisk quedaba desactualizado), y una
+edición masiva de 500 agentes eran 500 threads reescribiendo
+pjsip_agents.conf y recargando PJSIP.
+
+Ahora las señales sólo marcan qué modelos cambiaron (config_sync.mark()).
+Un único hilo espera a que pasen CONFIG_SYNC_DEBOUNCE segundos sin cambios
+nuevos (como mucho CONFIG_SYNC_MAX_DELAY desde el primero) y aplica todo el
+conjunto sucio de una vez con apply_config_changes(). Un cambio que llega
+durante una sincronización queda marcado y garantiza otra pasada.
+
+Métricas: vozipomni_config_sync_lag_seconds (del primer cambio a la config
+aplicada) y vozipomni_config_sync_pending_seconds (antigüedad del cambio
+pendiente más viejo; 0 si no hay).
+"""
+import logging
+import os
+import threading
+import time
+
+from django.db import close_old_connections
+
+from core.metrics import (
+    config_sync_changes_total, config_sync_lag_seconds, config_sync_pending_seconds,
+    config_syncs_total,
+)
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = float(os.environ.get('CONFIG_SYNC_DEBOUNCE', '1'))
+MAX_DELAY = float(os.environ.get('CONFIG_SYNC_MAX_DELAY', '10'))
+AGENTS_PJSIP_PATH = '/var/lib/asterisk/dynamic/pjsip_agents.conf'
+
+
+def generate_agents_pjsip_conf():
+    """Contenido de pjsip_agents.conf: endpoints de agentes WebRTC. Retorna (texto, cantidad)."""
+    from apps.agents.models import Agent
+    from .realtime import realtime_enabled
+
+    # KAMAILIO_HOST: nombre DNS del contenedor Kamailio (bridge) o IP del servidor (host network)
+    # En docker-compose bridge: 'kamailio' (service name resuelve en la red interna)
+    # En producción network_mode:host: configurar KAMAILIO_HOST=localhost o IP real
+    kamailio_host = os.environ.get('KAMAILIO_HOST', 'kamailio')
+    lines = [
+        '; Auto-generated by VozipOmni – NO EDITAR MANUALMENTE',
+        '; Agentes WebRTC para Asterisk PJSIP',
+        '',
+    ]
+    if realtime_enabled():
+        # Los agentes se publican en ps_endpoints/ps_auths/ps_aors
+        lines.append('; PJSIP_PROVISIONING=realtime: agentes publicados vía Asterisk Realtime')
+        return '\n'.join(lines), 0
+    agents = list(Agent.objects.filter(webrtc_enabled=True).select_related('user').order_by('sip_extension'))
+    for a in agents:
+        ext = a.sip_extension
+        password = a.sip_password or ext
+        display = a.user.get_full_name() or ext
+        lines += [
+            f'[{ext}](webrtc_endpoint)',
+            f'auth={ext}-auth',
+            f'aors={ext}-aor',
+            f'callerid="{display}" <{ext}>',
+            '',
+            f'[{ext}-auth]',
+            'type=auth',
+            'auth_type=userpass',
+            f'username={ext}',
+            f'password={password}',
+            '',
+            f'[{ext}-aor]',
+            'type=aor',
+            'max_contacts=2',
+            # remove_existing=no: NO borrar el contacto estático al recibir un REGISTER
+            # desde Kamailio. Con =yes Asterisk eliminaría el contact cada vez que
+            # procesa un REGISTER y el agente quedaría inalcanzable.
+            'remove_existing=no',
+            # Contacto estático apuntando a Kamailio: cuando Asterisk marca PJSIP/{ext},
+            # envía el INVITE a Kamailio que lo enruta al browser del agente vía WebSocket.
+            # Sin este contact= el AOR queda vacío y la llamada falla con CHANUNAVAIL.
+            f'contact=sip:{ext}@{kamailio_host}:5060',
+            'qualify_frequency=30',
+            '',
+        ]
+    return '\n'.join(lines), len(agents)
+
+
+def apply_config_changes(models=None):
+    """
+    Regenera la config de Asterisk afectada por cambios en `models` (nombres
+    de modelo; None = toda) y recarga sólo los módulos cuyos archivos cambiaron.
+    """
+    from .asterisk_config import AsteriskConfigGenerator, config_files_for, reloads_for, write_if_changed
+    from .pjsip_config_generator import PJSIPConfigGenerator
+    from .realtime import prune, realtime_enabled, sync_all
+
+    # 1. Troncales (pjsip_wizard.conf): el wizard tiene su propia secuencia de recarga
+    trunks_reloaded = False
+    if models is None or 'SIPTrunk' in models:
+        pjsip_gen = PJSIPConfigGenerator()
+        success, msg = pjsip_gen.save_and_reload(force=False)
+        if success:
+            trunks_reloaded = pjsip_gen.changed
+            logger.info(f"✓ Troncales PJSIP sincronizadas: {msg}")
+        else:
+            logger.error(f"✗ Error sincronizando troncales: {msg}")
+
+    # 2. Agentes WebRTC (pjsip_agents.conf)
+    agents_changed = False
+    if models is None or 'Agent' in models:
+        content, count = generate_agents_pjsip_conf()
+        try:
+            agents_changed = write_if_changed(AGENTS_PJSIP_PATH, content)
+            if agents_changed:
+                logger.info(f"✓ pjsip_agents.conf generado con {count} agentes")
+        except OSError as e:
+            logger.warning(f"No se pudo escribir pjsip_agents.conf (normal fuera de Docker): {e}")
+
+    # 2b. Modo Realtime: las filas se publican una a una desde las señales
+    #     (provision()); aquí sólo se retiran huérfanos, o se publica todo
+    #     en una sincronización completa. No requiere recargar nada.
+    if realtime_enabled() and (models is None or {'Agent', 'Extension'} & set(models)):
+        if models is None:
+            published, removed = sync_all()
+            logger.info(f"✓ PJSIP Realtime: {published} endpoints publicados, {removed} retirados")
+        else:
+            removed = prune()
+            if removed:
+                logger.info(f"✓ PJSIP Realtime: {removed} endpoints huérfanos retirados")
+
+    # 3. Regenerar sólo los archivos que dependen de lo que cambió
+    config_gen = AsteriskConfigGenerator()
+    config_gen.write_configs(config_files_for(models))
+    reloads = reloads_for(config_gen.changed_files)
+    if agents_changed and 'res_pjsip.so' not in reloads:
+        reloads.insert(0, 'res_pjsip.so')
+    if trunks_reloaded:
+        # reload_pjsip() ya recargó res_pjsip.so
+        reloads = [target for target in reloads if target != 'res_pjsip.so']
+    if not reloads:
+        logger.info("Config de Asterisk sin cambios, no se recarga nada")
+        return
+
+    # 4. Recargar en Asterisk sólo lo necesario, en un solo envío
+    from .asterisk_ami import AsteriskAMI
+    ami = AsteriskAMI()
+    if ami.connect():
+        ami.pipeline([
+            {'Action': 'Command', 'Command': 'dialplan reload'} if target == 'dialplan'
+            else {'Action': 'ModuleLoad', 'LoadType': 'reload', 'Module': target}
+            for target in reloads
+        ], timeout=10)
+        ami.disconnect()
+        logger.info(f"✓ Asterisk recargado ({', '.join(reloads)})")
+
+
+class ConfigSyncWorker:
+    """Conjunto de modelos sucios y el hilo que los aplica, agrupados por debounce."""
+
+    def __init__(self, apply=apply_config_changes, debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY):
+        self._apply = apply
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._dirty: set[str] = set()
+        self._all = False
+        # Instantes (monotonic) del cambio pendiente más viejo y del último
+        self._first_change = None
+        self._last_change = None
+        self._running = False
+        self.changes = self.runs = 0
+
+    def mark(self, models=None):
+        """Marca modelos cambiados (None = toda la config) para la próxima sincronización."""
+        with self._cond:
+            if models is None:
+                self._all = True
+            else:
+                self._dirty.update(models)
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self.changes += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='config-sync', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        config_sync_changes_total.inc()
+
+    def pending_age(self) -> float:
+        """Segundos desde el cambio pendiente más viejo (0 si no hay)."""
+        first = self._first_change
+        return time.monotonic() - first if first is not None else 0.0
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que no queden cambios pendientes ni sincronización en curso."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._first_change is None and not self._running, timeout,
+            )
+
+    def _take(self):
+        """Espera cambios y el fin de la ventana de debounce. Retorna (modelos, primer cambio)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._first_change is not None)
+            while True:
+                deadline = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            models = None if self._all else set(self._dirty)
+            first = self._first_change
+            self._dirty.clear()
+            self._all = False
+            self._first_change = self._last_change = None
+            self._running = True
+            return models, first
+
+    def _run(self):
+        while True:
+            models, first = self._take()
+            result = 'ok'
+            try:
+                self._apply(models)
+            except Exception as e:
+                result = 'error'
+                logger.error(f"✗ Error sincronizando config Asterisk: {e}")
+            finally:
+                close_old_connections()
+                config_syncs_total.labels(result=result).inc()
+                config_sync_lag_seconds.observe(time.monotonic() - first)
+                with self._cond:
+                    self._running = False
+                    self.runs += 1
+                    self._cond.notify_all()
+
+    def _after_fork(self):
+        # El hilo no existe en el hijo; los cambios marcados son del padre
+        self._reset()
+
+
+config_sync = ConfigSyncWorker()
+config_sync_pending_seconds.set_function(config_sync.pending_age)
+os.register_at_fork(after_in_child=config_sync._after_fork)
@@ -0,0 +1,146 @@
+"""
+Management command para medir el parsing de eventos AMI del listener
+Uso: python manage.py bench_ami_listener [--capture archivo] [--events N]
+
+Compara el framing anterior (buffer str + partition + splitlines) con
+AMIFrameParser sobre tráfico AMI grabado, p. ej. con:
+    ncat asterisk 5038 < login.txt > captura.ami
+Sin --capture se genera una mezcla sintética con la proporción típica de un
+contact center (mayoría de eventos de dialplan sin handler, ráfagas de
+QueueMemberStatus y un Cdr por llamada). No ejecuta los handlers (no toca la BD).
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.telephony.ami_cdr_listener import _EVENT_HANDLERS, _HANDLERS_BY_NAME
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser, frame_event_name
+
+
+def _frame(**headers) -> bytes:
+    return ''.join(f'{k}: {v}\r\n' for k, v in headers.items()).encode() + b'\r\n'
+
+
+def _call_events(n: int, rng: random.Random) -> list[bytes]:
+    uid = f'1760000000.{n}'
+    channel = f'PJSIP/{1000 + n % 200}-{n:08x}'
+    common = dict(Privilege='call,all', Channel=channel, ChannelState='6', ChannelStateDesc='Up',
+                  CallerIDNum=f'300{n:07d}', CallerIDName='Cliente', ConnectedLineNum='<unknown>',
+                  Language='es', AccountCode='', Context='from-pstn', Exten='s', Priority='1',
+                  Uniqueid=uid, Linkedid=uid)
+    events = [_frame(Event='Newchannel', **common)]
+    for i in range(rng.randint(6, 14)):
+        events.append(_frame(Event='Newexten', **common, Extension='s', Application='Set',
+                             AppData=f'CDR(userfield)=campaign-{n % 7}-{i}'))
+        events.append(_frame(Event='VarSet', **common, Variable=f'VAR_{i}', Value='x' * 24))
+    events.append(_frame(Event='QueueCallerJoin', **common, Queue='ventas', Position='1', Count='1'))
+    for member in range(rng.randint(2, 8)):
+        events.append(_frame(Event='QueueMemberStatus', Privilege='agent,all', Queue='ventas',
+                             MemberName=f'Agente {member}', Interface=f'PJSIP/{1000 + member}',
+                             StateInterface=f'PJSIP/{1000 + member}', Membership='dynamic',
+                             Penalty='0', CallsTaken='12', LastCall='1760000000', InCall='1',
+                             Status=str(rng.choice([1, 2, 6])), Paused='0', PausedReason='',
+                             Ringinuse='0', Wrapuptime='0'))
+    events.append(_frame(Event='AgentConnect', **common, Queue='ventas', MemberName='Agente 1',
+                         Interface='PJSIP/1001', HoldTime='4', RingTime='3'))
+    events.append(_frame(Event='Hangup', **common, Cause='16', **{'Cause-txt': 'Normal Clearing'}))
+    events.append(_frame(Event='Cdr', Privilege='cdr,all', AccountCode='', Source=f'300{n:07d}',
+                         Destination='s', DestinationContext='from-pstn', CallerID='"Cliente"',
+                         Channel=channel, DestinationChannel='PJSIP/1001-0000beef',
+                         LastApplication='Queue', LastData='ventas', StartTime='2026-01-01 10:00:00',
+                         AnswerTime='2026-01-01 10:00:04', EndTime='2026-01-01 10:03:00',
+                         Duration='180', BillableSeconds='176', Disposition='ANSWERED',
+                         AMAFlags='DOCUMENTATION', UniqueID=uid, UserField=''))
+    return events
+
+
+def synthetic_capture(events: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    frames, n = [], 0
+    while len(frames) < events:
+        frames.extend(_call_events(n, rng))
+        n += 1
+    return b''.join(frames[:events])
+
+
+def legacy_parse(data: bytes, chunk: int) -> tuple[int, int]:
+    """Framing anterior del listener (str += decode, partition, splitlines)."""
+    total = handled = 0
+    buffer = ''
+    for i in range(0, len(data), chunk):
+        buffer += data[i:i + chunk].decode('utf-8', errors='ignore')
+        while '\r\n\r\n' in buffer:
+            event_raw, _, buffer = buffer.partition('\r\n\r\n')
+            event = {}
+            for line in event_raw.strip().splitlines():
+                if ':' in line:
+                    key, _, value = line.partition(':')
+                    event[key.strip()] = value.strip()
+            total += 1
+            if event.get('Event', '') in _EVENT_HANDLERS:
+                event.get('Uniqueid', '')
+                handled += 1
+    return total, handled
+
+
+def frame_parse(data: bytes, chunk: int) -> tuple[int, int]:
+    """Framing actual: AMIFrameParser + nombre en bytes + headers perezosos."""
+    total = handled = 0
+    parser = AMIFrameParser()
+    view = memoryview(data)
+    for i in range(0, len(data), chunk):
+        for frame in parser.feed(view[i:i + chunk]):
+            total += 1
+            name = frame_event_name(frame)
+            if name in _HANDLERS_BY_NAME:
+                AMIEvent(frame).get('Uniqueid', '')
+                handled += 1
+    return total, handled
+
+
+class Command(BaseCommand):
+    help = 'Mide eventos/segundo del parsing AMI del listener sobre tráfico grabado o sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capture', help='Archivo con bytes AMI grabados del socket')
+        parser.add_argument('--events', type=int, default=200000,
+                            help='Eventos sintéticos si no se indica --capture')
+        parser.add_argument('--chunk', type=int, default=4096, help='Tamaño de cada lectura del socket')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+
+    def handle(self, *args, **options):
+        if options['capture']:
+            try:
+                with open(options['capture'], 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                raise CommandError(f'No se pudo leer la captura: {e}')
+            # Descartar el banner y lo que quede antes del primer bloque
+            start = data.find(b'\r\n') + 2 if data.startswith(b'Asterisk Call Manager') else 0
+            data = data[start:]
+            source = options['capture']
+        else:
+            data = synthetic_capture(options['events'])
+            source = f"sintético ({options['events']} eventos)"
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Tráfico: {source}, {len(data) / 1e6:.1f} MB, lecturas de {options['chunk']} bytes"
+        ))
+
+        results = {}
+        for label, parse in (('anterior (str)', legacy_parse), ('bytes', frame_parse)):
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                total, handled = parse(data, options['chunk'])
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = total / best
+            self.stdout.write(
+                f"  {label:<15} {total / best:>12,.0f} eventos/s  "
+                f"({total} eventos, {handled} con handler, {best * 1000:.0f} ms)"
+            )
+
+        speedup = results['bytes'] / results['anterior (str)']
+        self.stdout.write(self.style.SUCCESS(f"  Mejora: x{speedup:.1f}"))
@@ -0,0 +1,129 @@
+"""
+Management command para medir el procesamiento de eventos AMI por shards
+Uso: python manage.py bench_ami_shards [--workers 1,2,4] [--since ... --until ...]
+
+Reparte el tráfico entre N procesos con el mismo ruteo que el listener
+(ver ami_shards.py) y mide eventos/segundo de los handlers con 1 y N
+procesos. El tráfico sale del journal (--since/--until) o, si no se indica,
+de la mezcla sintética de bench_ami_listener.
+
+Cada proceso aplica sus mutaciones dentro de una transacción que se
+revierte al final: la base de datos queda como estaba. Con --no-writes las
+mutaciones se descartan sin llegar a la base de datos (sólo CPU y lecturas).
+"""
+import multiprocessing
+import queue
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.telephony.ami_journal import iter_journals, journal_key, time_id
+from apps.telephony.ami_protocol import AMIFrameParser
+from apps.telephony.ami_shards import SHARDS, shard_for
+from apps.telephony.ami_writer import WriteBehind
+from apps.telephony.management.commands.bench_ami_listener import synthetic_capture
+
+
+class _DiscardingWriter(WriteBehind):
+    """Write-behind que descarta lo encolado (--no-writes)."""
+
+    def flush(self) -> int:
+        items = len(self)
+        self._reset()
+        return items
+
+
+def _bench_shard(entries: list, writes: bool, barrier, results):
+    """Proceso de un shard del benchmark."""
+    import django
+    django.setup()
+
+    from django.db import transaction
+
+    from apps.telephony import ami_cdr_listener as listener
+
+    writer = WriteBehind(notify=False) if writes else _DiscardingWriter(notify=False)
+    barrier.wait()
+    started = time.monotonic()
+    with transaction.atomic():
+        processed = listener.replay_entries(entries, writer)
+        transaction.set_rollback(True)
+    results.put((started, time.monotonic(), processed))
+
+
+def _parse_moment(value: str, option: str):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise CommandError(f'{option}: fecha inválida "{value}" (formato ISO)')
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = 'Compara eventos/segundo de los handlers AMI con 1 y N procesos (shards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4', help='Cantidades de procesos a comparar')
+        parser.add_argument('--since', help='Reprocesar el journal desde (ISO 8601)')
+        parser.add_argument('--until', help='Hasta (ISO 8601, por defecto ahora)')
+        parser.add_argument('--events', type=int, default=100000,
+                            help='Eventos sintéticos si no se indica --since')
+        parser.add_argument('--no-writes', action='store_true',
+                            help='Descartar las mutaciones en vez de aplicarlas (y revertirlas)')
+
+    def handle(self, *args, **options):
+        try:
+            counts = sorted({int(n) for n in options['workers'].split(',')})
+        except ValueError:
+            raise CommandError('--workers: lista de enteros separados por coma (p. ej. 1,2,4)')
+
+        if options['since']:
+            since = _parse_moment(options['since'], '--since')
+            until = _parse_moment(options['until'], '--until') if options['until'] else timezone.now()
+            keys = [journal_key(shard, SHARDS) for shard in range(SHARDS)]
+            entries = list(iter_journals(time_id(since), time_id(until), keys))
+            source = f'journal {since} → {until}'
+        else:
+            frames = AMIFrameParser().feed(synthetic_capture(options['events']))
+            base = int(time.time() * 1000) - len(frames)
+            entries = [(f'{base + i}-0'.encode(), frame) for i, frame in enumerate(frames)]
+            source = f"sintético ({options['events']} eventos)"
+        if not entries:
+            raise CommandError('No hay eventos para reprocesar')
+
+        self.stdout.write(self.style.HTTP_INFO(f'Tráfico: {source}, {len(entries)} eventos'))
+        ctx = multiprocessing.get_context('spawn')
+        baseline = None
+        for workers in counts:
+            shards = [[] for _ in range(workers)]
+            for entry in entries:
+                shards[shard_for(entry[1], workers)].append(entry)
+
+            barrier, results = ctx.Barrier(workers), ctx.Queue()
+            procs = [
+                ctx.Process(target=_bench_shard, args=(shard, not options['no_writes'], barrier, results))
+                for shard in shards
+            ]
+            for proc in procs:
+                proc.start()
+            timings = []
+            while len(timings) < len(procs):
+                try:
+                    timings.append(results.get(timeout=1))
+                except queue.Empty:
+                    if any(proc.exitcode not in (None, 0) for proc in procs):
+                        for proc in procs:
+                            proc.kill()
+                        raise CommandError(f'Un proceso del benchmark con {workers} shards falló')
+            for proc in procs:
+                proc.join()
+
+            elapsed = max(end for _, end, _ in timings) - min(start for start, _, _ in timings)
+            rate = len(entries) / elapsed
+            baseline = baseline or rate
+            sizes = ', '.join(str(len(shard)) for shard in shards)
+            self.stdout.write(
+                f'  {workers:>2} proceso(s) {rate:>12,.0f} eventos/s  x{rate / baseline:.1f}  '
+                f'({sum(p for _, _, p in timings)} con handler, {elapsed * 1000:.0f} ms, shards: {sizes})'
+            )
@@ -0,0 +1,160 @@
+"""
+Management command para medir la generación de config de Asterisk a escala de contact center
+Uso: python manage.py bench_config_generation [--scale 1.0] [--repeat 3] [--no-budgets]
+
+Siembra un tenant sintético con las factories de telefonía (TENANT: 10k
+extensiones, 2k rutas entrantes, 500 IVRs, 200 colas, 100 troncales, con
+--scale como multiplicador) y mide cada generador de GENERATORS: tiempo
+(el mejor de --repeat), queries y tamaño del archivo generado.
+
+Presupuestos (BUDGETS): la cantidad de queries de un generador no debe
+depender del tamaño del tenant, así que un N+1 (una query por IVR, ruta o
+cola) se pasa del presupuesto aun con --scale chico. El de tiempo se
+multiplica por --scale. Si algún generador se pasa el comando termina con
+error, para usarlo como gate en CI.
+
+Todo se siembra dentro de una transacción que se revierte al final: la
+base de datos queda como estaba.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+# Tamaño del tenant con --scale 1
+TENANT = {
+    'extensions': 10000,
+    'inbound_routes': 2000,
+    'ivrs': 500,
+    'queues': 200,
+    'trunks': 100,
+    'agents': 1000,
+    'members_per_queue': 10,
+    'outbound_routes_per_trunk': 2,
+    'custom_destinations': 50,
+}
+
+# (clase generadora, método)
+GENERATORS = [
+    ('apps.telephony.asterisk_config.AsteriskConfigGenerator', 'generate_extensions_conf'),
+    ('apps.telephony.asterisk_config.AsteriskConfigGenerator', 'generate_queues_dynamic_conf'),
+    ('apps.telephony.asterisk_config.AsteriskConfigGenerator', 'generate_pjsip_extensions_conf'),
+    ('apps.telephony.pjsip_config_generator.PJSIPConfigGenerator', 'generate_all_trunks_config'),
+]
+
+# método → (queries máximas, segundos máximos con --scale 1)
+BUDGETS = {
+    'generate_extensions_conf': (6, 3.0),
+    'generate_queues_dynamic_conf': (2, 1.0),
+    'generate_pjsip_extensions_conf': (2, 2.0),
+    'generate_all_trunks_config': (1, 0.5),
+}
+
+
+def _bulk(factory_class, size, **kwargs):
+    """Construye `size` instancias con la factory y las inserta en un solo bulk_create."""
+    model = factory_class._meta.model
+    return model.objects.bulk_create(factory_class.build_batch(size, **kwargs), batch_size=1000)
+
+
+def seed_tenant(scale: float = 1.0) -> dict:
+    """Siembra el tenant sintético (sin señales: bulk_create). Retorna las cantidades creadas."""
+    from apps.telephony.tests import factories
+
+    sizes = {key: max(1, round(value * scale)) for key, value in TENANT.items()
+             if key not in ('members_per_queue', 'outbound_routes_per_trunk')}
+
+    _bulk(factories.ExtensionFactory, sizes['extensions'])
+    _bulk(factories.CustomDestinationFactory, sizes['custom_destinations'])
+    _bulk(factories.InboundRouteFactory, sizes['inbound_routes'])
+    _bulk(factories.IVRFactory, sizes['ivrs'])
+
+    trunks = _bulk(factories.SIPTrunkFactory, sizes['trunks'])
+    for _ in range(TENANT['outbound_routes_per_trunk']):
+        factories.OutboundRouteFactory._meta.model.objects.bulk_create(
+            [factories.OutboundRouteFactory.build(trunk=trunk) for trunk in trunks], batch_size=1000,
+        )
+
+    users = _bulk(factories.UserFactory, sizes['agents'])
+    agents = factories.AgentFactory._meta.model.objects.bulk_create(
+        [factories.AgentFactory.build(user=user) for user in users], batch_size=1000,
+    )
+    queues = _bulk(factories.QueueFactory, sizes['queues'])
+    per_queue = min(TENANT['members_per_queue'], len(agents))
+    members = [
+        factories.QueueMemberFactory.build(queue=queue, agent=agents[(i * per_queue + j) % len(agents)])
+        for i, queue in enumerate(queues) for j in range(per_queue)
+    ]
+    factories.QueueMemberFactory._meta.model.objects.bulk_create(members, batch_size=1000)
+
+    sizes['outbound_routes'] = len(trunks) * TENANT['outbound_routes_per_trunk']
+    sizes['queue_members'] = len(members)
+    return sizes
+
+
+def run_benchmark(repeat: int = 3) -> dict:
+    """Corre cada generador `repeat` veces. Retorna {método: (segundos, queries, bytes)}."""
+    from django.utils.module_loading import import_string
+
+    results = {}
+    for class_path, method in GENERATORS:
+        generate = getattr(import_string(class_path)(), method)
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                content = generate()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[method] = (best, len(queries), len(content))
+    return results
+
+
+def over_budget(results: dict, scale: float = 1.0) -> list:
+    """Mensajes de los generadores que exceden su presupuesto."""
+    problems = []
+    for method, (seconds, queries, _) in results.items():
+        max_queries, max_seconds = BUDGETS[method]
+        if queries > max_queries:
+            problems.append(f'{method}: {queries} queries (máx {max_queries}; ¿N+1?)')
+        if seconds > max_seconds * max(scale, 0.1):
+            problems.append(f'{method}: {seconds:.3f}s (máx {max_seconds * max(scale, 0.1):.3f}s)')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo y queries de los generadores de config de Asterisk con un tenant sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplicador del tenant (1 = 10k extensiones, 500 IVRs, ...)')
+        parser.add_argument('--repeat', type=int, default=3, help='Corridas por generador (se toma la mejor)')
+        parser.add_argument('--no-budgets', action='store_true', help='Sólo medir, sin fallar por presupuestos')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        if scale <= 0:
+            raise CommandError('--scale debe ser mayor que 0')
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            sizes = seed_tenant(scale)
+            self.stdout.write(
+                f"Tenant sintético sembrado en {time.perf_counter() - started:.1f}s: "
+                + ', '.join(f'{key}={value}' for key, value in sizes.items())
+            )
+            results = run_benchmark(max(1, options['repeat']))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'generador':<34}{'tiempo':>10}{'queries':>9}{'KiB':>9}")
+        for method, (seconds, queries, size) in results.items():
+            self.stdout.write(f'{method:<34}{seconds * 1000:>8.1f}ms{queries:>9}{size / 1024:>9.0f}')
+
+        problems = over_budget(results, scale)
+        if problems and not options['no_budgets']:
+            raise CommandError('Presupuesto excedido:\n  ' + '\n  '.join(problems))
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(f'⚠ {problem}'))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('✓ Dentro de presupuesto'))
@@ -6,6 +6,7 @@ from django.core.management.base import BaseCommand
 from apps.telephony.asterisk_config import AsteriskConfigGenerator
 from apps.telephony.pjsip_config_generator import PJSIPConfigGenerator
 from apps.telephony.asterisk_ami import AsteriskAMI
+from apps.telephony.realtime import realtime_enabled, sync_all
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,6 +63,17 @@ class Command(BaseCommand):
                 success = False
             self.stdout.write('')
 
+        # Publicar agentes y extensiones en las tablas PJSIP Realtime
+        if not options['only_trunks'] and realtime_enabled():
+            self.stdout.write('🗄️  Publicando endpoints PJSIP Realtime (ps_endpoints/ps_auths/ps_aors)...')
+            try:
+                published, removed = sync_all()
+                self.stdout.write(self.style.SUCCESS(f'  ✓ {published} endpoints publicados, {removed} retirados'))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'  ✗ Error: {str(e)}'))
+                success = False
+            self.stdout.write('')
+
         # Regenerar extensiones y dialplan
         if not options['only_trunks']:
             self.stdout.write('📞 Regenerando extensiones y dialplan...')
@@ -0,0 +1,98 @@
+"""
+Management command para reprocesar eventos AMI del journal
+Uso: python manage.py replay_ami_events --since 2026-10-01T08:00 [--until ...]
+
+Vuelve a pasar por los handlers del listener los eventos guardados en el
+journal (Redis Stream 'ami:events', o uno por shard) entre dos instantes. Antes se reprocesan
+sin escribir los AMI_JOURNAL_WARMUP segundos previos para reconstruir el
+estado de las llamadas que estaban en curso al inicio del rango.
+
+Los Call se recrean/actualizan por call_id (idempotente); los campos en vivo
+de los agentes (estado, contadores del día) no se tocan y no se disparan
+webhooks ni post_save. Para recalcular historial y contadores de colas sin
+duplicarlos usar --rebuild-history / --reset-queue-stats.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.agents.models import Agent, AgentStatusHistory
+from apps.telephony import ami_cdr_listener as listener
+from apps.telephony.ami_journal import iter_journals, journal_key, time_id
+from apps.telephony.ami_protocol import frame_event_name
+from apps.telephony.ami_shards import SHARDS
+from apps.telephony.ami_writer import WriteBehind
+
+
+def _parse_moment(value: str, option: str):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise CommandError(f'{option}: fecha inválida "{value}" (formato ISO, p. ej. 2026-10-01T08:00)')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = 'Reprocesa un rango de tiempo del journal de eventos AMI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', required=True, help='Inicio del rango (ISO 8601)')
+        parser.add_argument('--until', help='Fin del rango (ISO 8601, por defecto ahora)')
+        parser.add_argument('--rebuild-history', action='store_true',
+                            help='Borrar el historial de estados de agentes del rango antes de reprocesar')
+        parser.add_argument('--reset-queue-stats', action='store_true',
+                            help='Poner en 0 los contadores de llamadas de las colas antes de reprocesar')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Sólo contar los eventos del rango por tipo')
+
+    def handle(self, *args, **options):
+        since = _parse_moment(options['since'], '--since')
+        until = _parse_moment(options['until'], '--until') if options['until'] else timezone.now()
+        if until <= since:
+            raise CommandError('--until debe ser posterior a --since')
+
+        start, end = time_id(since), time_id(until)
+        # Con shards se recorren todos los streams juntos, en orden de llegada
+        keys = [journal_key(shard, SHARDS) for shard in range(SHARDS)]
+
+        if options['dry_run']:
+            counts = Counter()
+            for _, frame in iter_journals(start, end, keys):
+                counts[(frame_event_name(frame) or b'?').decode(errors='ignore')] += 1
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+            self.stdout.write(f'{sum(counts.values())} eventos entre {since} y {until}:')
+            for name, count in counts.most_common():
+                handled = '' if name.encode() in listener._HANDLERS_BY_NAME else ' (sin handler)'
+                self.stdout.write(f'  {name:<24} {count:>8}{handled}')
+            return
+
+        # Reconstruir el estado de las llamadas en curso al inicio del rango
+        warmup = list(iter_journals(
+            time_id(since - timedelta(seconds=listener.JOURNAL_WARMUP)), start, keys
+        ))
+        if warmup and warmup[-1][0].decode() == start:
+            warmup.pop()
+        listener._replay_state(warmup)
+        self.stdout.write(f'Estado reconstruido con {len(warmup)} eventos previos')
+
+        with transaction.atomic():
+            if options['rebuild_history']:
+                deleted, _ = AgentStatusHistory.objects.filter(
+                    started_at__gte=since, started_at__lt=until
+                ).delete()
+                self.stdout.write(f'Historial de agentes borrado: {deleted} registros')
+            if options['reset_queue_stats']:
+                from apps.queues.models import QueueStats
+                reset = QueueStats.objects.update(calls_waiting=0, calls_completed=0, calls_abandoned=0)
+                self.stdout.write(f'Contadores de colas en 0: {reset}')
+
+        writer = WriteBehind(frozen_models=(Agent,), notify=False)
+        processed = listener.replay_entries(iter_journals(start, end, keys), writer)
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} eventos reprocesados entre {since} y {until}'
+        ))
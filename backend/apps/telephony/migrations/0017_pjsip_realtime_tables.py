@@ -0,0 +1,73 @@
+# Generated by Django 4.2.9 on 2026-10-17 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telephony', '0016_add_missing_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PsAor',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('max_contacts', models.IntegerField(blank=True, null=True)),
+                ('remove_existing', models.CharField(blank=True, max_length=3, null=True)),
+                ('contact', models.CharField(blank=True, max_length=255, null=True)),
+                ('qualify_frequency', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'AOR PJSIP (Realtime)',
+                'verbose_name_plural': 'AORs PJSIP (Realtime)',
+                'db_table': 'ps_aors',
+            },
+        ),
+        migrations.CreateModel(
+            name='PsAuth',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('auth_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('username', models.CharField(blank=True, max_length=40, null=True)),
+                ('password', models.CharField(blank=True, max_length=80, null=True)),
+            ],
+            options={
+                'verbose_name': 'Auth PJSIP (Realtime)',
+                'verbose_name_plural': 'Auths PJSIP (Realtime)',
+                'db_table': 'ps_auths',
+            },
+        ),
+        migrations.CreateModel(
+            name='PsEndpoint',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('transport', models.CharField(blank=True, max_length=40, null=True)),
+                ('aors', models.CharField(blank=True, max_length=200, null=True)),
+                ('auth', models.CharField(blank=True, max_length=40, null=True)),
+                ('context', models.CharField(blank=True, max_length=40, null=True)),
+                ('disallow', models.CharField(blank=True, max_length=200, null=True)),
+                ('allow', models.CharField(blank=True, max_length=200, null=True)),
+                ('callerid', models.CharField(blank=True, max_length=100, null=True)),
+                ('direct_media', models.CharField(blank=True, max_length=3, null=True)),
+                ('rtp_symmetric', models.CharField(blank=True, max_length=3, null=True)),
+                ('force_rport', models.CharField(blank=True, max_length=3, null=True)),
+                ('rewrite_contact', models.CharField(blank=True, max_length=3, null=True)),
+                ('trust_id_inbound', models.CharField(blank=True, max_length=3, null=True)),
+                ('device_state_busy_at', models.IntegerField(blank=True, null=True)),
+                ('identify_by', models.CharField(blank=True, max_length=80, null=True)),
+                ('webrtc', models.CharField(blank=True, max_length=3, null=True)),
+                ('dtls_auto_generate_cert', models.CharField(blank=True, max_length=3, null=True)),
+                ('dtls_verify', models.CharField(blank=True, max_length=40, null=True)),
+                ('dtls_setup', models.CharField(blank=True, max_length=20, null=True)),
+                ('ice_support', models.CharField(blank=True, max_length=3, null=True)),
+                ('media_encryption', models.CharField(blank=True, max_length=20, null=True)),
+            ],
+            options={
+                'verbose_name': 'Endpoint PJSIP (Realtime)',
+                'verbose_name_plural': 'Endpoints PJSIP (Realtime)',
+                'db_table': 'ps_endpoints',
+            },
+        ),
+    ]
@@ -770,3 +770,78 @@ class WebhookDelivery(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Entrega de Webhook'
         verbose_name_plural = 'Entregas de Webhook'
+
+
+# ============= TABLAS PJSIP REALTIME =============
+# Espejo de las tablas que lee res_config_pgsql cuando PJSIP_PROVISIONING='realtime'.
+# Los nombres de columna son los de Asterisk: no agregar campos propios
+# (Asterisk rechaza el objeto si encuentra una columna desconocida).
+# Los mantiene apps.telephony.realtime a partir de Agent y Extension.
+
+class PsEndpoint(models.Model):
+    """Endpoint PJSIP publicado vía Realtime (tabla ps_endpoints)."""
+
+    id = models.CharField(max_length=40, primary_key=True)
+    transport = models.CharField(max_length=40, null=True, blank=True)
+    aors = models.CharField(max_length=200, null=True, blank=True)
+    auth = models.CharField(max_length=40, null=True, blank=True)
+    context = models.CharField(max_length=40, null=True, blank=True)
+    disallow = models.CharField(max_length=200, null=True, blank=True)
+    allow = models.CharField(max_length=200, null=True, blank=True)
+    callerid = models.CharField(max_length=100, null=True, blank=True)
+    direct_media = models.CharField(max_length=3, null=True, blank=True)
+    rtp_symmetric = models.CharField(max_length=3, null=True, blank=True)
+    force_rport = models.CharField(max_length=3, null=True, blank=True)
+    rewrite_contact = models.CharField(max_length=3, null=True, blank=True)
+    trust_id_inbound = models.CharField(max_length=3, null=True, blank=True)
+    device_state_busy_at = models.IntegerField(null=True, blank=True)
+    identify_by = models.CharField(max_length=80, null=True, blank=True)
+    webrtc = models.CharField(max_length=3, null=True, blank=True)
+    dtls_auto_generate_cert = models.CharField(max_length=3, null=True, blank=True)
+    dtls_verify = models.CharField(max_length=40, null=True, blank=True)
+    dtls_setup = models.CharField(max_length=20, null=True, blank=True)
+    ice_support = models.CharField(max_length=3, null=True, blank=True)
+    media_encryption = models.CharField(max_length=20, null=True, blank=True)
+
+    class Meta:
+        db_table = 'ps_endpoints'
+        verbose_name = 'Endpoint PJSIP (Realtime)'
+        verbose_name_plural = 'Endpoints PJSIP (Realtime)'
+
+    def __str__(self):
+        return self.id
+
+
+class PsAuth(models.Model):
+    """Credenciales PJSIP publicadas vía Realtime (tabla ps_auths)."""
+
+    id = models.CharField(max_length=40, primary_key=True)
+    auth_type = models.CharField(max_length=20, null=True, blank=True)
+    username = models.CharField(max_length=40, null=True, blank=True)
+    password = models.CharField(max_length=80, null=True, blank=True)
+
+    class Meta:
+        db_table = 'ps_auths'
+        verbose_name = 'Auth PJSIP (Realtime)'
+        verbose_name_plural = 'Auths PJSIP (Realtime)'
+
+    def __str__(self):
+        return self.id
+
+
+class PsAor(models.Model):
+    """AOR PJSIP publicado vía Realtime (tabla ps_aors)."""
+
+    id = models.CharField(max_length=40, primary_key=True)
+    max_contacts = models.IntegerField(null=True, blank=True)
+    remove_existing = models.CharField(max_length=3, null=True, blank=True)
+    contact = models.CharField(max_length=255, null=True, blank=True)
+    qualify_frequency = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ps_aors'
+        verbose_name = 'AOR PJSIP (Realtime)'
+        verbose_name_plural = 'AORs PJSIP (Realtime)'
+
+    def __str__(self):
+        return self.id
@@ -2,11 +2,10 @@
 PJSIP Configuration Generator
 Genera archivos de configuración PJSIP Wizard automáticamente desde el modelo SIPTrunk
 """
-import os
 import logging
-from pathlib import Path
 from django.conf import settings
 from .models import SIPTrunk
+from .asterisk_config import write_if_changed
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +23,8 @@ class PJSIPConfigGenerator:
             'PJSIP_CONFIG_PATH',
             '/var/lib/asterisk/dynamic/pjsip_wizard.conf'
         )
+        # Si la última escritura cambió el archivo en disco
+        self.changed = False
     
     @staticmethod
     def _format_callerid(trunk):
@@ -534,13 +535,10 @@ class PJSIPConfigGenerator:
             if config_content is None:
                 config_content = self.generate_all_trunks_config()
             
-            # Crear directorio si no existe
-            config_dir = os.path.dirname(self.config_path)
-            Path(config_dir).mkdir(parents=True, exist_ok=True)
-            
-            # Escribir archivo
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                f.write(config_content)
+            # Escritura atómica y sólo si el contenido cambió
+            self.changed = write_if_changed(self.config_path, config_content)
+            if not self.changed:
+                return True, f"Sin cambios en {self.config_path}"
             
             logger.info(f"✓ Configuración PJSIP escrita en: {self.config_path}")
             return True, f"Configuración guardada en {self.config_path}"
@@ -584,8 +582,7 @@ class PJSIPConfigGenerator:
             time.sleep(1)
             
             # 3. CLI pjsip reload — fallback para asegurar que todo está aplicado
-            ami._send_command("Action: Command\r\nCommand: pjsip reload\r\n\r\n")
-            ami._read_command_response(timeout=5)
+            ami.command('pjsip reload', timeout=5)
             time.sleep(1)
             
             # 4. Recargar el módulo de registro saliente — CRÍTICO para que
@@ -603,10 +600,13 @@ class PJSIPConfigGenerator:
             logger.error(f"✗ {error_msg}")
             return False, error_msg
     
-    def save_and_reload(self):
+    def save_and_reload(self, force=True):
         """
         Guarda la configuración y recarga Asterisk
         
+        Args:
+            force: Recargar aunque el archivo no haya cambiado
+        
         Returns:
             tuple: (success: bool, message: str)
         """
@@ -614,6 +614,8 @@ class PJSIPConfigGenerator:
         write_success, write_msg = self.write_config_file()
         if not write_success:
             return False, write_msg
+        if not self.changed and not force:
+            return True, "Configuración sin cambios, no se recarga"
         
         # Recargar Asterisk
         reload_success, reload_msg = self.reload_pjsip()
@@ -0,0 +1,209 @@
+"""
+Provisión de endpoints PJSIP de agentes y extensiones vía Asterisk Realtime.
+
+En modo 'files' (por defecto) cada alta o baja de agente reescribe
+pjsip_agents.conf / pjsip_extensions.conf completos y recarga res_pjsip.so:
+el tiempo de recarga crece con la cantidad de agentes y durante la recarga
+los registros se ven afectados.
+
+Con PJSIP_PROVISIONING='realtime' Asterisk lee endpoints, auths y AORs de
+las tablas ps_endpoints/ps_auths/ps_aors (res_config_pgsql + sorcery.conf)
+y los archivos dinámicos quedan sólo con la cabecera. Un cambio de agente o
+extensión es entonces un upsert de tres filas por su número (provision()),
+sin recargar nada: sorcery consulta la base en cada búsqueda.
+
+Las filas replican exactamente lo que generan los archivos:
+- agentes WebRTC → generate_agents_pjsip_conf() + template [webrtc_endpoint]
+- extensiones    → AsteriskConfigGenerator.generate_pjsip_extensions_conf()
+Si un número es a la vez agente WebRTC y extensión, gana el agente (igual
+que en modo archivos, donde la extensión se omite para evitar duplicados).
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_TYPES = ('PJSIP', 'WEBRTC', 'SIP')
+
+
+def realtime_enabled() -> bool:
+    """True si los endpoints de agentes y extensiones se publican vía Realtime."""
+    return getattr(settings, 'PJSIP_PROVISIONING', 'files') == 'realtime'
+
+
+def agent_rows(agent):
+    """Filas (endpoint, auth, aor) de un agente WebRTC, como en pjsip_agents.conf."""
+    ext = agent.sip_extension
+    display = agent.user.get_full_name() or ext
+    kamailio_host = os.environ.get('KAMAILIO_HOST', 'kamailio')
+    endpoint = {
+        # Valores del template [webrtc_endpoint](!) de pjsip.conf
+        'transport': 'transport-udp',
+        'context': 'from-internal',
+        'disallow': 'all',
+        'allow': 'ulaw,alaw',
+        'direct_media': 'no',
+        'rtp_symmetric': 'yes',
+        'force_rport': 'yes',
+        'rewrite_contact': 'yes',
+        'trust_id_inbound': 'yes',
+        'identify_by': 'username,auth_username',
+        'auth': ext,
+        'aors': ext,
+        'callerid': f'"{display}" <{ext}>',
+        # Columnas que sólo usan las extensiones: en NULL por si el número lo era antes
+        'device_state_busy_at': None,
+        'webrtc': None,
+        'dtls_auto_generate_cert': None,
+        'dtls_verify': None,
+        'dtls_setup': None,
+        'ice_support': None,
+        'media_encryption': None,
+    }
+    auth = {'auth_type': 'userpass', 'username': ext, 'password': agent.sip_password or ext}
+    aor = {
+        'max_contacts': 2,
+        'remove_existing': 'no',
+        # Contacto estático hacia Kamailio (ver generate_agents_pjsip_conf)
+        'contact': f'sip:{ext}@{kamailio_host}:5060',
+        'qualify_frequency': 30,
+    }
+    return endpoint, auth, aor
+
+
+def extension_rows(ext):
+    """Filas (endpoint, auth, aor) de una extensión, como en pjsip_extensions.conf."""
+    number = str(ext.extension)
+    is_webrtc = ext.extension_type == 'WEBRTC'
+    callerid = ext.callerid if ext.callerid else f'"{ext.name}" <{number}>'
+    if callerid and '<' not in callerid:
+        callerid = f'"{ext.name}" <{callerid}>'
+    endpoint = {
+        'transport': 'transport-wss' if is_webrtc else (ext.transport or 'transport-udp'),
+        'context': ext.context,
+        'disallow': 'all',
+        'allow': 'ulaw,alaw' if is_webrtc else (ext.codecs or 'ulaw,alaw,g722'),
+        'auth': number,
+        'aors': number,
+        'callerid': callerid,
+        'direct_media': 'no',
+        'rtp_symmetric': 'yes',
+        'force_rport': 'yes',
+        'rewrite_contact': 'yes',
+        'trust_id_inbound': 'yes',
+        'device_state_busy_at': 1,
+        'identify_by': 'username,auth_username',
+        'webrtc': None,
+        'dtls_auto_generate_cert': None,
+        'dtls_verify': None,
+        'dtls_setup': None,
+        'ice_support': None,
+        'media_encryption': None,
+    }
+    if is_webrtc:
+        endpoint.update({
+            'webrtc': 'yes',
+            'dtls_auto_generate_cert': 'yes',
+            'dtls_verify': 'fingerprint',
+            'dtls_setup': 'actpass',
+            'ice_support': 'yes',
+            'media_encryption': 'dtls',
+        })
+    auth = {'auth_type': 'userpass', 'username': number, 'password': ext.secret}
+    aor = {
+        'max_contacts': ext.max_contacts or 1,
+        'remove_existing': 'yes',
+        'contact': None,
+        'qualify_frequency': 30,
+    }
+    return endpoint, auth, aor
+
+
+def _rows_for(number):
+    """Filas que corresponden hoy a `number`, o None si no debe existir."""
+    from apps.agents.models import Agent
+    from .models import Extension
+
+    agent = Agent.objects.filter(sip_extension=number, webrtc_enabled=True).select_related('user').first()
+    if agent is not None:
+        return agent_rows(agent)
+    ext = Extension.objects.filter(
+        extension=number, is_active=True, extension_type__in=EXTENSION_TYPES,
+    ).first()
+    if ext is not None:
+        return extension_rows(ext)
+    return None
+
+
+def _models():
+    from .models import PsAor, PsAuth, PsEndpoint
+    return PsEndpoint, PsAuth, PsAor
+
+
+def provision(number) -> bool:
+    """
+    Publica (o retira) el endpoint/auth/aor de un número según el estado actual
+    de Agent y Extension. Retorna True si el número quedó publicado.
+    """
+    number = str(number)
+    rows = _rows_for(number)
+    with transaction.atomic():
+        for model, values in zip(_models(), rows or (None, None, None)):
+            if values is None:
+                model.objects.filter(id=number).delete()
+            else:
+                model.objects.update_or_create(id=number, defaults=values)
+    return rows is not None
+
+
+def provision_on_commit(number):
+    """Programa provision(number) tras el commit; un error sólo se registra."""
+    def run():
+        try:
+            published = provision(number)
+            logger.info(f"✓ PJSIP Realtime {number}: {'publicado' if published else 'retirado'}")
+        except Exception as e:
+            logger.error(f"✗ Error publicando {number} en PJSIP Realtime: {e}")
+
+    transaction.on_commit(run)
+
+
+def _wanted_numbers():
+    from apps.agents.models import Agent
+    from .models import Extension
+
+    numbers = set(Agent.objects.filter(webrtc_enabled=True).values_list('sip_extension', flat=True))
+    numbers.update(
+        str(n) for n in Extension.objects.filter(
+            is_active=True, extension_type__in=EXTENSION_TYPES,
+        ).values_list('extension', flat=True)
+    )
+    return numbers
+
+
+def prune() -> int:
+    """
+    Borra las filas de números que ya no son agente ni extensión (p. ej. al
+    cambiar la sip_extension de un agente queda huérfano el número anterior).
+    Retorna la cantidad de números retirados.
+    """
+    wanted = _wanted_numbers()
+    removed = set()
+    with transaction.atomic():
+        for model in _models():
+            stale = set(model.objects.values_list('id', flat=True)) - wanted
+            if stale:
+                model.objects.filter(id__in=stale).delete()
+                removed |= stale
+    return len(removed)
+
+
+def sync_all():
+    """Publica todos los agentes y extensiones y retira los huérfanos. Retorna (publicados, retirados)."""
+    wanted = _wanted_numbers()
+    for number in sorted(wanted):
+        provision(number)
+    return len(wanted), prune()
@@ -0,0 +1,234 @@
+"""
+Caché en memoria de agentes y colas para el camino de eventos.
+
+Los handlers del listener AMI buscan el agente por extensión y la cola por
+nombre o extensión en casi todos los eventos, siempre sobre los mismos pocos
+cientos de filas. ReferenceCache carga cada tabla completa una vez (una
+consulta) y responde desde memoria:
+
+    agent_by_extension('1001')   agent_by_pk(7)
+    queue_by_name('ventas')      (nombre o extensión)
+    active_queues()
+
+Consistencia entre procesos: cada cambio de datos de referencia
+(post_save/post_delete de Agent, Queue o del usuario del agente, ver
+signals.py) incrementa tras el commit el contador 'refcache:version' en
+Redis. Cada proceso compara su versión con la de Redis como máximo cada
+REFERENCE_CACHE_CHECK_MS y si cambió descarta lo cargado.
+
+El estado en vivo de los agentes (LIVE_AGENT_FIELDS) no cambia la versión:
+quien lo guarda (los shards del listener al aplicar el write-behind, o un
+save() con update_fields sólo de esos campos) publica los pks en el stream
+'refcache:live' y los demás procesos releen sólo esos campos de esos
+agentes. Sin Redis la caché se desactiva y las búsquedas van a la base de
+datos.
+
+Los agentes cacheados son instancias compartidas: el listener les asigna los
+campos que escribe (estado, llamadas en curso) y las vistas sólo deben leer
+datos de referencia (nombre, extensión). Los contadores en vivo se leen de la
+base de datos.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'refcache:version'
+LIVE_KEY = 'refcache:live'
+CHECK_INTERVAL = int(os.environ.get('REFERENCE_CACHE_CHECK_MS', '1000')) / 1000
+
+# Campos del agente que cambian con la operación, no con la configuración
+# (updated_at acompaña a cualquier save con update_fields)
+LIVE_AGENT_FIELDS = frozenset({'status', 'last_status_change', 'logged_in_at', 'current_calls', 'updated_at'})
+
+# Entradas del stream leídas por chequeo; con más atraso se recarga todo
+LIVE_BATCH = 500
+LIVE_MAXLEN = 10000
+
+
+class ReferenceCache:
+    """Agentes por extensión/pk y colas por nombre/extensión, con versión en Redis."""
+
+    def __init__(self, redis_client=None, check_interval: float = CHECK_INTERVAL,
+                 clock=time.monotonic):
+        self._redis_client = redis_client
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._version = None
+        self._live_id = None     # última entrada de refcache:live aplicada
+        self._checked_at = None
+        self._online = True
+        self._agents = None      # (por extensión, por pk)
+        self._queues = None      # (por nombre y extensión, activas)
+
+    def _redis(self):
+        if self._redis_client is None:
+            from apps.campaigns.hopper import get_redis
+            self._redis_client = get_redis()
+        return self._redis_client
+
+    def clear(self):
+        with self._lock:
+            self._agents = None
+            self._queues = None
+
+    # ─────────────────────────────────────────────────────────────
+    # Versión
+    # ─────────────────────────────────────────────────────────────
+
+    def sync(self, force: bool = False):
+        """Descarta lo cargado si otro proceso cambió los datos (a lo sumo cada check_interval)."""
+        now = self._clock()
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            redis = self._redis()
+            version = int(redis.get(VERSION_KEY) or 0)
+            if version != self._version or self._live_id is None:
+                self.clear()
+                self._version = version
+                tail = redis.xrevrange(LIVE_KEY, count=1)
+                self._live_id = tail[0][0] if tail else '0-0'
+                self._online = True
+                return
+            entries = redis.xrange(LIVE_KEY, min=f'({self._live_id}', count=LIVE_BATCH)
+        except Exception as e:
+            if self._online:
+                logger.warning(f"[RefCache] Redis no disponible, consultando la base de datos: {e}")
+            self._online = False
+            self._live_id = None
+            self.clear()
+            return
+        self._online = True
+        if entries:
+            self._live_id = entries[-1][0]
+            if len(entries) >= LIVE_BATCH:
+                self.clear()
+            else:
+                self._refresh_live({pk for _, data in entries for pk in data['agents'].split(',')})
+
+    def _refresh_live(self, pks):
+        """Releer de la base de datos el estado en vivo de los agentes cargados indicados."""
+        agents = self._agents
+        if agents is None:
+            return
+        by_pk = agents[1]
+        pks = [int(pk) for pk in pks if pk and int(pk) in by_pk]
+        if not pks:
+            return
+        from apps.agents.models import Agent
+        for row in Agent.objects.filter(pk__in=pks).values('pk', *LIVE_AGENT_FIELDS):
+            agent = by_pk[row.pop('pk')]
+            for field, value in row.items():
+                setattr(agent, field, value)
+
+    def touch_agents(self, pks):
+        """
+        Publicar que cambió el estado en vivo de estos agentes.
+
+        No toca la versión: los demás procesos conservan lo cargado y releen
+        sólo LIVE_AGENT_FIELDS de esos agentes en su próximo chequeo.
+        """
+        pks = sorted({str(pk) for pk in pks})
+        if not pks:
+            return
+        try:
+            self._redis().xadd(LIVE_KEY, {'agents': ','.join(pks)},
+                               maxlen=LIVE_MAXLEN, approximate=True)
+        except Exception as e:
+            logger.warning(f"[RefCache] No se pudo publicar el estado de agentes: {e}")
+
+    def invalidate(self, local: bool = True):
+        """
+        Publicar un cambio de agentes/colas a los demás procesos.
+
+        Con local=False el proceso ya refleja el cambio en sus instancias (el
+        listener) y conserva lo cargado si nadie más cambió nada entretanto.
+        """
+        if local:
+            self.clear()
+        try:
+            version = int(self._redis().incr(VERSION_KEY))
+        except Exception as e:
+            logger.warning(f"[RefCache] No se pudo publicar la invalidación: {e}")
+            self.clear()
+            return
+        if not local and self._version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self.clear()
+            self._version = version
+
+    # ─────────────────────────────────────────────────────────────
+    # Carga
+    # ─────────────────────────────────────────────────────────────
+
+    def _load_agents(self):
+        agents = self._agents
+        if agents is None:
+            from apps.agents.models import Agent
+            rows = list(Agent.objects.select_related('user'))
+            agents = ({a.sip_extension: a for a in rows if a.sip_extension}, {a.pk: a for a in rows})
+            with self._lock:
+                self._agents = agents
+        return agents
+
+    def _load_queues(self):
+        queues = self._queues
+        if queues is None:
+            from apps.queues.models import Queue
+            rows = list(Queue.objects.order_by('pk'))
+            lookup = {q.extension: q for q in rows if q.extension}
+            # El nombre gana sobre la extensión, como en la búsqueda original
+            lookup.update({q.name: q for q in rows})
+            queues = (lookup, [q for q in rows if q.is_active])
+            with self._lock:
+                self._queues = queues
+        return queues
+
+    # ─────────────────────────────────────────────────────────────
+    # Búsquedas
+    # ─────────────────────────────────────────────────────────────
+
+    def agent_by_extension(self, extension: str):
+        if not extension:
+            return None
+        self.sync()
+        if not self._online:
+            from apps.agents.models import Agent
+            return Agent.objects.select_related('user').filter(sip_extension=extension).first()
+        return self._load_agents()[0].get(extension)
+
+    def agent_by_pk(self, pk):
+        if pk is None:
+            return None
+        self.sync()
+        if not self._online:
+            from apps.agents.models import Agent
+            return Agent.objects.select_related('user').filter(pk=pk).first()
+        return self._load_agents()[1].get(pk)
+
+    def queue_by_name(self, name: str):
+        """Cola por nombre o, si no hay, por extensión."""
+        if not name:
+            return None
+        self.sync()
+        if not self._online:
+            from apps.queues.models import Queue
+            return (Queue.objects.filter(name=name).first()
+                    or Queue.objects.filter(extension=name).first())
+        return self._load_queues()[0].get(name)
+
+    def active_queues(self) -> list:
+        self.sync()
+        if not self._online:
+            from apps.queues.models import Queue
+            return list(Queue.objects.filter(is_active=True).order_by('pk'))
+        return list(self._load_queues()[1])
+
+
+reference_cache = ReferenceCache()
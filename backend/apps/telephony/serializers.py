@@ -3,7 +3,8 @@ from .models import (
     Call, SIPTrunk, IVR, Extension, InboundRoute, 
     OutboundRoute, Voicemail, MusicOnHold, TimeCondition, CustomDestination
 )
-from .asterisk_ami import AsteriskAMI
+from .ami_pool import AMIError
+from .trunk_status import trunk_status_cache
 
 
 class CallSerializer(serializers.ModelSerializer):
@@ -48,34 +49,16 @@ class SIPTrunkSerializer(serializers.ModelSerializer):
             if request.parser_context.get('view').action != 'retrieve':
                 return None
         
+        # Estado desde el snapshot en Redis que mantienen los eventos AMI
         try:
-            # Si NO envía registros, verificar disponibilidad del endpoint
-            if not obj.sends_registration:
-                ami = AsteriskAMI()
-                if ami.connect():
-                    # Verificar si el endpoint está disponible
-                    endpoints = ami.pjsip_show_endpoints()
-                    ami.disconnect()
-                    
-                    if obj.name in endpoints:
-                        endpoint = endpoints[obj.name]
-                        # Si tiene contactos disponibles, está operativo
-                        if endpoint.get('contacts'):
-                            return 'Available'
-                        # Si no tiene contactos pero el endpoint existe, está configurado pero sin contacto
-                        return 'No Contact'
-                    return 'Not Found'
-                return 'Disconnected'
-            
-            # Si SÍ envía registros, verificar estado de registro
-            ami = AsteriskAMI()
-            if ami.connect():
-                status = ami.get_trunk_registration_status(obj.name)
-                ami.disconnect()
-                return status
+            status = trunk_status_cache.trunk_status(obj.name, obj.sends_registration)
+        except (OSError, AMIError):
             return 'Disconnected'
-        except Exception as e:
+        except Exception:
             return 'Error'
+        if not obj.sends_registration:
+            return {'No Contacts': 'No Contact', 'Not Configured': 'Not Found'}.get(status, status)
+        return status
     
     def get_registration_detail(self, obj):
         """Obtener detalle legible del estado de registro"""
@@ -1,157 +1,205 @@
 """
 Servicios de telefonía de alto nivel
-Wrappers síncronos para operaciones AMI
+Wrappers síncronos para operaciones AMI, sobre la sesión compartida del
+multiplexor (ami_mux): sin event loop por llamada y con lotes en pipeline
 """
-from asgiref.sync import async_to_sync
-from .asterisk_ami import asterisk_ami
+from .ami_mux import ami_mux
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _result(response) -> dict:
+    """Respuesta AMI → {'success', 'data'[, 'error']}"""
+    data = dict(response)
+    if data.get('Response') == 'Error':
+        return {'success': False, 'error': data.get('Message', ''), 'data': data}
+    return {'success': True, 'data': data}
+
+
+def _run(action: dict, what: str) -> dict:
+    try:
+        return _result(ami_mux.call(action))
+    except Exception as e:
+        logger.error(f"Error {what}: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+def _run_batch(actions: dict, what: str) -> dict:
+    """
+    Ejecuta un lote {clave: acción} en una sola escritura y retorna
+    {clave: resultado}. Si la sesión falla, todas fallan con el mismo error.
+    """
+    if not actions:
+        return {}
+    try:
+        responses = ami_mux.call_many(list(actions.values()))
+    except Exception as e:
+        logger.error(f"Error {what}: {e}")
+        return {key: {'success': False, 'error': str(e)} for key in actions}
+    return {key: _result(response) for key, response in zip(actions, responses)}
+
+
+def _queue_pause_action(queue_name: str, interface: str, paused: bool, reason: str = None) -> dict:
+    action = {
+        'Action': 'QueuePause',
+        'Queue': queue_name,
+        'Interface': interface,
+        'Paused': 'true' if paused else 'false',
+    }
+    if reason:
+        action['Reason'] = reason
+    return action
+
+
+def _queue_add_action(queue_name: str, interface: str, member_name: str, penalty: int = 0) -> dict:
+    return {
+        'Action': 'QueueAdd',
+        'Queue': queue_name,
+        'Interface': interface,
+        'Penalty': str(penalty),
+        'MemberName': member_name,
+    }
+
+
 class CallService:
     """Servicio para gestionar llamadas"""
-    
+
     @staticmethod
-    def originate_call(agent_extension: str, destination: str, 
+    def originate_call(agent_extension: str, destination: str,
                       caller_id: str = None, campaign_id: int = None):
         """
         Originar una llamada desde un agente
-        
+
         Args:
             agent_extension: Extensión del agente (ej: 1000)
             destination: Número destino
             caller_id: Caller ID a mostrar
             campaign_id: ID de campaña (opcional)
         """
-        channel = f"PJSIP/{agent_extension}"
         variables = {}
-        
+
         if campaign_id:
             variables['CAMPAIGN_ID'] = str(campaign_id)
-        
+
         variables['DESTINATION'] = destination
-        
-        try:
-            result = async_to_sync(asterisk_ami.originate_call)(
-                channel=channel,
-                extension=destination,
-                context='from-internal',
-                caller_id=caller_id,
-                variables=variables
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error originating call: {e}")
-            return {'success': False, 'error': str(e)}
-    
+
+        action = {
+            'Action': 'Originate',
+            'Channel': f"PJSIP/{agent_extension}",
+            'Exten': destination,
+            'Context': 'from-internal',
+            'Priority': '1',
+            'Timeout': '30000',
+            'Async': 'true',
+            'Variable': ','.join(f"{k}={v}" for k, v in variables.items()),
+        }
+        if caller_id:
+            action['CallerID'] = caller_id
+
+        return _run(action, 'originating call')
+
     @staticmethod
-    def hangup_call(channel: str):
-        """Colgar una llamada"""
-        try:
-            result = async_to_sync(asterisk_ami.hangup)(channel)
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error hanging up call: {e}")
-            return {'success': False, 'error': str(e)}
-    
+    def hangup_call(channel: str, cause: int = 16):
+        """Colgar una llamada (16 = Normal Clearing)"""
+        return _run({'Action': 'Hangup', 'Channel': channel, 'Cause': str(cause)}, 'hanging up call')
+
     @staticmethod
-    def transfer_call(channel: str, extension: str):
+    def transfer_call(channel: str, extension: str, context: str = 'from-internal'):
         """Transferir una llamada"""
-        try:
-            result = async_to_sync(asterisk_ami.transfer)(
-                channel=channel,
-                extension=extension
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error transferring call: {e}")
-            return {'success': False, 'error': str(e)}
-    
+        return _run({
+            'Action': 'Redirect',
+            'Channel': channel,
+            'Exten': extension,
+            'Context': context,
+            'Priority': '1',
+        }, 'transferring call')
+
     @staticmethod
-    def start_recording(channel: str, filename: str):
+    def start_recording(channel: str, filename: str, format: str = 'wav', mix: bool = True):
         """Iniciar grabación de llamada"""
-        try:
-            result = async_to_sync(asterisk_ami.monitor_start)(
-                channel=channel,
-                filename=filename
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error starting recording: {e}")
-            return {'success': False, 'error': str(e)}
-    
+        return _run({
+            'Action': 'Monitor',
+            'Channel': channel,
+            'File': filename,
+            'Format': format,
+            'Mix': 'true' if mix else 'false',
+        }, 'starting recording')
+
     @staticmethod
     def stop_recording(channel: str):
         """Detener grabación"""
-        try:
-            result = async_to_sync(asterisk_ami.monitor_stop)(channel)
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error stopping recording: {e}")
-            return {'success': False, 'error': str(e)}
+        return _run({'Action': 'StopMonitor', 'Channel': channel}, 'stopping recording')
 
 
 class QueueService:
     """Servicio para gestionar colas ACD"""
-    
+
     @staticmethod
-    def add_agent_to_queue(queue_name: str, agent_extension: str, 
+    def add_agent_to_queue(queue_name: str, agent_extension: str,
                           agent_name: str = None, penalty: int = 0):
         """Agregar agente a una cola"""
+        return _run(_queue_add_action(
+            queue_name, f"PJSIP/{agent_extension}", agent_name or f"Agent {agent_extension}", penalty,
+        ), 'adding agent to queue')
+
+    @staticmethod
+    def add_agent_to_queues(penalties: dict, agent_extension: str, agent_name: str = None):
+        """Agregar agente a varias colas en un lote. penalties: {cola: penalty}"""
         interface = f"PJSIP/{agent_extension}"
-        
-        try:
-            result = async_to_sync(asterisk_ami.add_queue_member)(
-                queue=queue_name,
-                interface=interface,
-                member_name=agent_name or f"Agent {agent_extension}",
-                penalty=penalty
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error adding agent to queue: {e}")
-            return {'success': False, 'error': str(e)}
-    
+        member_name = agent_name or f"Agent {agent_extension}"
+        return _run_batch({
+            queue_name: _queue_add_action(queue_name, interface, member_name, penalty)
+            for queue_name, penalty in penalties.items()
+        }, 'adding agent to queues')
+
     @staticmethod
     def remove_agent_from_queue(queue_name: str, agent_extension: str):
         """Remover agente de una cola"""
+        return _run({
+            'Action': 'QueueRemove',
+            'Queue': queue_name,
+            'Interface': f"PJSIP/{agent_extension}",
+        }, 'removing agent from queue')
+
+    @staticmethod
+    def remove_agent_from_queues(queue_names: list, agent_extension: str):
+        """Remover agente de varias colas en un lote"""
         interface = f"PJSIP/{agent_extension}"
-        
-        try:
-            result = async_to_sync(asterisk_ami.remove_queue_member)(
-                queue=queue_name,
-                interface=interface
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error removing agent from queue: {e}")
-            return {'success': False, 'error': str(e)}
-    
+        return _run_batch({
+            queue_name: {'Action': 'QueueRemove', 'Queue': queue_name, 'Interface': interface}
+            for queue_name in queue_names
+        }, 'removing agent from queues')
+
     @staticmethod
-    def pause_agent(queue_name: str, agent_extension: str, 
+    def pause_agent(queue_name: str, agent_extension: str,
                    paused: bool = True, reason: str = None):
         """Pausar/Despausar agente en cola"""
+        return _run(
+            _queue_pause_action(queue_name, f"PJSIP/{agent_extension}", paused, reason),
+            'pausing agent',
+        )
+
+    @staticmethod
+    def pause_agent_in_queues(queue_names: list, agent_extension: str,
+                              paused: bool = True, reason: str = None):
+        """Pausar/Despausar agente en varias colas en un lote. Retorna {cola: resultado}"""
         interface = f"PJSIP/{agent_extension}"
-        
-        try:
-            result = async_to_sync(asterisk_ami.pause_queue_member)(
-                queue=queue_name,
-                interface=interface,
-                paused=paused,
-                reason=reason
-            )
-            return {'success': True, 'data': result}
-        except Exception as e:
-            logger.error(f"Error pausing agent: {e}")
-            return {'success': False, 'error': str(e)}
-    
+        return _run_batch({
+            queue_name: _queue_pause_action(queue_name, interface, paused, reason)
+            for queue_name in queue_names
+        }, 'pausing agent in queues')
+
     @staticmethod
     def get_queue_status(queue_name: str = None):
-        """Obtener estado de cola(s)"""
+        """Obtener estado de cola(s): eventos QueueParams/QueueMember/QueueEntry"""
+        action = {'Action': 'QueueStatus'}
+        if queue_name:
+            action['Queue'] = queue_name
+
         try:
-            result = async_to_sync(asterisk_ami.get_queue_status)(queue_name)
-            return {'success': True, 'data': result}
+            events = ami_mux.call(action, timeout=10, listing=True)
+            return {'success': True, 'data': [dict(event) for event in events]}
         except Exception as e:
             logger.error(f"Error getting queue status: {e}")
             return {'success': False, 'error': str(e)}
@@ -1,7 +1,8 @@
 """
 Signal handlers para sincronizar cambios en modelos con Asterisk.
-Ejecución SÍNCRONA directa via threads (sin dependencia de Celery).
+Los cambios se encolan en el worker de config_sync (sin dependencia de Celery).
 """
+from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import (
@@ -11,62 +12,27 @@ from .models import (
 from apps.queues.models import Queue, QueueMember
 from apps.agents.models import Agent
 import logging
-import os
-import threading
 
 logger = logging.getLogger(__name__)
 
-# Flag para evitar re-entrancia de sincronización
-_sync_lock = threading.Lock()
-
-
-def _sync_asterisk_config():
+def sync_asterisk_now(models=None):
     """
-    Regenera TODA la config de Asterisk y recarga.
-    Se ejecuta en un thread separado para no bloquear el request HTTP.
+    Encola la sincronización de la config afectada por `models` (nombres de
+    modelo; None = toda). La aplica el worker de config_sync tras el commit,
+    agrupada con los demás cambios cercanos.
     """
-    if not _sync_lock.acquire(blocking=False):
-        logger.debug("Sincronización ya en curso, omitiendo")
-        return
+    from django.db import transaction
+    from .config_sync import config_sync
 
-    try:
-        from .pjsip_config_generator import PJSIPConfigGenerator
-        from .asterisk_config import AsteriskConfigGenerator
-
-        # 1. Regenerar troncales (pjsip_wizard.conf)
-        pjsip_gen = PJSIPConfigGenerator()
-        success, msg = pjsip_gen.save_and_reload()
-        if success:
-            logger.info(f"✓ Troncales PJSIP sincronizadas: {msg}")
-        else:
-            logger.error(f"✗ Error sincronizando troncales: {msg}")
-
-        # 2. Regenerar extensiones, dialplan, voicemail, etc.
-        config_gen = AsteriskConfigGenerator()
-        config_gen.write_all_configs()
-
-        # 3. Recargar módulos de Asterisk
-        from .asterisk_ami import AsteriskAMI
-        ami = AsteriskAMI()
-        if ami.connect():
-            ami.reload_module('res_pjsip.so')
-            ami.reload_module('chan_pjsip.so')
-            ami.reload_dialplan()
-            ami.reload_module('app_voicemail.so')
-            ami.reload_module('app_queue.so')
-            ami.disconnect()
-            logger.info("✓ Asterisk recargado (PJSIP, dialplan, voicemail, queues)")
+    transaction.on_commit(lambda: config_sync.mark(models))
 
-    except Exception as e:
-        logger.error(f"✗ Error sincronizando config Asterisk: {e}")
-    finally:
-        _sync_lock.release()
 
+def provision_realtime(number):
+    """En modo PJSIP Realtime, publica o retira el endpoint de `number` tras el commit (sin reload)."""
+    from .realtime import provision_on_commit, realtime_enabled
 
-def sync_asterisk_now():
-    """Lanza la sincronización en background thread"""
-    t = threading.Thread(target=_sync_asterisk_config, daemon=True)
-    t.start()
+    if realtime_enabled():
+        provision_on_commit(number)
 
 
 # ============= SEÑALES PARA TRONCALES SIP =============
@@ -77,13 +43,13 @@ def on_sip_trunk_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva troncal SIP creada: {instance.name}")
     else:
         logger.info(f"🔄 Troncal SIP actualizada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=SIPTrunk)
 def on_sip_trunk_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Troncal SIP eliminada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA RUTAS ENTRANTES =============
@@ -94,13 +60,13 @@ def on_inbound_route_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva ruta entrante creada: {instance.did}")
     else:
         logger.info(f"🔄 Ruta entrante actualizada: {instance.did}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=InboundRoute)
 def on_inbound_route_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Ruta entrante eliminada: {instance.did}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA RUTAS SALIENTES =============
@@ -111,13 +77,13 @@ def on_outbound_route_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva ruta saliente creada: {instance.name}")
     else:
         logger.info(f"🔄 Ruta saliente actualizada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=OutboundRoute)
 def on_outbound_route_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Ruta saliente eliminada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA EXTENSIONES =============
@@ -128,13 +94,15 @@ def on_extension_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva extensión creada: {instance.extension}")
     else:
         logger.info(f"🔄 Extensión actualizada: {instance.extension}")
-    sync_asterisk_now()
+    provision_realtime(instance.extension)
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=Extension)
 def on_extension_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Extensión eliminada: {instance.extension}")
-    sync_asterisk_now()
+    provision_realtime(instance.extension)
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA IVRs =============
@@ -145,13 +113,13 @@ def on_ivr_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nuevo IVR creado: {instance.name}")
     else:
         logger.info(f"🔄 IVR actualizado: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=IVR)
 def on_ivr_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  IVR eliminado: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA BUZONES DE VOZ =============
@@ -162,13 +130,13 @@ def on_voicemail_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nuevo buzón de voz creado: {instance.mailbox}")
     else:
         logger.info(f"🔄 Buzón de voz actualizado: {instance.mailbox}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=Voicemail)
 def on_voicemail_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Buzón de voz eliminado: {instance.mailbox}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA CONDICIONES DE HORARIO =============
@@ -179,13 +147,13 @@ def on_time_condition_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva condición de horario creada: {instance.name}")
     else:
         logger.info(f"🔄 Condición de horario actualizada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=TimeCondition)
 def on_time_condition_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Condición de horario eliminada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA COLAS =============
@@ -196,13 +164,13 @@ def on_queue_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Nueva cola creada: {instance.name}")
     else:
         logger.info(f"🔄 Cola actualizada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=Queue)
 def on_queue_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Cola eliminada: {instance.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_save, sender=QueueMember)
@@ -211,13 +179,13 @@ def on_queue_member_save(sender, instance, created, **kwargs):
         logger.info(f"✨ Miembro agregado a cola {instance.queue.name}: agente {instance.agent}")
     else:
         logger.info(f"🔄 Miembro actualizado en cola {instance.queue.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=QueueMember)
 def on_queue_member_delete(sender, instance, **kwargs):
     logger.info(f"🗑️  Miembro eliminado de cola {instance.queue.name}")
-    sync_asterisk_now()
+    sync_asterisk_now({sender.__name__})
 
 
 # ============= SEÑALES PARA LLAMADAS =============
@@ -281,85 +249,65 @@ def _dispatch_call_webhook(instance, created):
 
 # ============= SEÑALES PARA AGENTES (PJSIP WebRTC) =============
 
+AGENT_SIP_FIELDS = {'sip_extension', 'sip_password', 'webrtc_enabled'}
+
+
 @receiver(post_save, sender=Agent)
-def on_agent_save(sender, instance, created, **kwargs):
-    """Regenerar pjsip_agents.conf cuando un agente es creado o modificado."""
+def on_agent_save(sender, instance, created, update_fields=None, **kwargs):
+    """Publicar el endpoint del agente (Realtime) o regenerar pjsip_agents.conf."""
     action = 'creado' if created else 'actualizado'
     logger.info(f"👤 Agente {action}: {instance.sip_extension}")
-    _sync_agent_pjsip()
+    # Los saves de estado (status, last_activity...) no cambian el endpoint
+    # ni la config generada
+    if created or update_fields is None or AGENT_SIP_FIELDS & set(update_fields):
+        provision_realtime(instance.sip_extension)
+        sync_asterisk_now({sender.__name__})
 
 
 @receiver(post_delete, sender=Agent)
 def on_agent_delete(sender, instance, **kwargs):
-    """Regenerar pjsip_agents.conf cuando un agente es eliminado."""
+    """Retirar el endpoint del agente (Realtime) o regenerar pjsip_agents.conf."""
     logger.info(f"🗑️  Agente eliminado: {instance.sip_extension}")
-    _sync_agent_pjsip()
+    provision_realtime(instance.sip_extension)
+    sync_asterisk_now({sender.__name__})
 
 
-def _sync_agent_pjsip():
-    """Regenerar /var/lib/asterisk/dynamic/pjsip_agents.conf y recargar PJSIP."""
-    def _do_sync():
-        try:
-            agents = Agent.objects.filter(webrtc_enabled=True).select_related('user')
-            config_path = '/var/lib/asterisk/dynamic/pjsip_agents.conf'
-            # KAMAILIO_HOST: nombre DNS del contenedor Kamailio (bridge) o IP del servidor (host network)
-            # En docker-compose bridge: 'kamailio' (service name resuelve en la red interna)
-            # En producción network_mode:host: configurar KAMAILIO_HOST=localhost o IP real
-            kamailio_host = os.environ.get('KAMAILIO_HOST', 'kamailio')
-            lines = [
-                '; Auto-generated by VozipOmni – NO EDITAR MANUALMENTE',
-                '; Agentes WebRTC para Asterisk PJSIP',
-                '',
-            ]
-            for a in agents:
-                ext = a.sip_extension
-                password = a.sip_password or ext
-                display = a.user.get_full_name() or ext
-                lines += [
-                    f'[{ext}](webrtc_endpoint)',
-                    f'auth={ext}-auth',
-                    f'aors={ext}-aor',
-                    f'callerid="{display}" <{ext}>',
-                    '',
-                    f'[{ext}-auth]',
-                    'type=auth',
-                    'auth_type=userpass',
-                    f'username={ext}',
-                    f'password={password}',
-                    '',
-                    f'[{ext}-aor]',
-                    'type=aor',
-                    'max_contacts=2',
-                    # remove_existing=no: NO borrar el contacto estático al recibir un REGISTER
-                    # desde Kamailio. Con =yes Asterisk eliminaría el contact cada vez que
-                    # procesa un REGISTER y el agente quedaría inalcanzable.
-                    'remove_existing=no',
-                    # Contacto estático apuntando a Kamailio: cuando Asterisk marca PJSIP/{ext},
-                    # envía el INVITE a Kamailio que lo enruta al browser del agente vía WebSocket.
-                    # Sin este contact= el AOR queda vacío y la llamada falla con CHANUNAVAIL.
-                    f'contact=sip:{ext}@{kamailio_host}:5060',
-                    'qualify_frequency=30',
-                    '',
-                ]
-            try:
-                with open(config_path, 'w') as f:
-                    f.write('\n'.join(lines))
-                logger.info(f"✓ pjsip_agents.conf generado con {agents.count()} agentes")
-            except OSError as e:
-                logger.warning(f"No se pudo escribir pjsip_agents.conf (normal fuera de Docker): {e}")
-                return
-
-            from .asterisk_ami import AsteriskAMI
-            ami = AsteriskAMI()
-            if ami.connect():
-                ami.reload_module('res_pjsip.so')
-                ami.disconnect()
-                logger.info("✓ Asterisk PJSIP recargado para agentes WebRTC")
-        except Exception as e:
-            logger.error(f"✗ Error sincronizando PJSIP de agentes: {e}")
+# ============= CACHÉ DE AGENTES Y COLAS =============
+
+def _invalidate_reference_cache():
+    """Descartar la caché local y publicar el cambio a los demás procesos tras el commit."""
+    from django.db import transaction
+    from .reference_cache import reference_cache
+
+    reference_cache.clear()
+    transaction.on_commit(reference_cache.invalidate)
 
-    t = threading.Thread(target=_do_sync, daemon=True)
-    t.start()
+
+@receiver(post_save, sender=Agent)
+@receiver(post_delete, sender=Agent)
+@receiver(post_save, sender=Queue)
+@receiver(post_delete, sender=Queue)
+def on_reference_data_change(sender, instance, update_fields=None, **kwargs):
+    from .reference_cache import LIVE_AGENT_FIELDS
+
+    # Cambios de estado en vivo: sólo se publica el agente, sin recargar todo
+    if sender is Agent and update_fields is not None and set(update_fields) <= LIVE_AGENT_FIELDS:
+        from django.db import transaction
+        from .reference_cache import reference_cache
+
+        pk = instance.pk
+        transaction.on_commit(lambda: reference_cache.touch_agents([pk]))
+        return
+    _invalidate_reference_cache()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def on_agent_user_save(sender, instance, update_fields=None, **kwargs):
+    # El login sólo actualiza last_login: no cambia nada de lo cacheado
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if Agent.objects.filter(user_id=instance.pk).exists():
+        _invalidate_reference_cache()
 
 
 # ============= INSTALACIÓN DE SEÑALES =============
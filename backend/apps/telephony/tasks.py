@@ -104,15 +104,26 @@ def check_asterisk_health():
     try:
         ami = AsteriskAMI()
         if ami.connect():
+            # La conexión puede venir del pool: confirmar que Asterisk responde
+            alive = ami.action({'Action': 'Ping'}).get('Response') == 'Success'
             ami.disconnect()
-            cache.set('asterisk_health', {'status': 'connected'}, timeout=120)
-            return {'status': 'connected'}
+            if alive:
+                cache.set('asterisk_health', {'status': 'connected'}, timeout=120)
+                return {'status': 'connected'}
     except Exception as e:
         logger.error(f"Health check error: {e}")
     cache.set('asterisk_health', {'status': 'disconnected'}, timeout=120)
     return {'status': 'disconnected'}
 
 
+@shared_task(name='apps.telephony.tasks.refresh_trunk_status')
+def refresh_trunk_status():
+    """Recarga el estado de endpoints/registros PJSIP (red de seguridad de los eventos)."""
+    from apps.telephony.trunk_status import trunk_status_cache
+    endpoints, registrations = trunk_status_cache.refresh()
+    return {'endpoints': len(endpoints), 'registrations': len(registrations)}
+
+
 @shared_task(name='apps.telephony.tasks.run_ami_cdr_listener')
 def run_ami_cdr_listener():
     """Arranca el listener AMI CDR como hilo daemon dentro del worker Celery."""
@@ -0,0 +1,131 @@
+"""
+Factories for telephony configuration models.
+
+Built on the base factories in core.tests.factories. Used by the config
+generation benchmark (bench_config_generation) to seed synthetic tenants,
+so every factory works with build_batch() + bulk_create().
+"""
+import factory
+from django.contrib.auth import get_user_model
+
+from apps.agents.models import Agent
+from apps.queues.models import Queue, QueueMember
+from apps.telephony.models import (
+    IVR, CustomDestination, Extension, InboundRoute, OutboundRoute, SIPTrunk,
+)
+from core.tests.factories import BaseFactory, fake
+
+DESTINATION_TYPES = ['extension', 'queue', 'ivr', 'voicemail', 'announcement', 'custom_destination']
+
+
+class ExtensionFactory(BaseFactory):
+    class Meta:
+        model = Extension
+
+    extension = factory.Sequence(lambda n: str(100000 + n))
+    name = factory.LazyFunction(lambda: fake.name())
+    extension_type = factory.Iterator(['PJSIP', 'PJSIP', 'PJSIP', 'WEBRTC'])
+    secret = factory.Sequence(lambda n: f'secret-{n}')
+    voicemail_enabled = factory.Iterator([False, True])
+
+
+class SIPTrunkFactory(BaseFactory):
+    class Meta:
+        model = SIPTrunk
+
+    name = factory.Sequence(lambda n: f'trunk-{n}')
+    trunk_type = factory.Iterator(['nat_provider', 'no_nat_provider', 'pbx_lan', 'corporate', 'custom'])
+    host = factory.Sequence(lambda n: f'sip{n}.proveedor.co')
+    outbound_auth_username = factory.Sequence(lambda n: f'user{n}')
+    outbound_auth_password = factory.Sequence(lambda n: f'pass{n}')
+    inbound_auth_username = factory.Sequence(lambda n: f'in{n}')
+    inbound_auth_password = factory.Sequence(lambda n: f'inpass{n}')
+    caller_id = factory.Sequence(lambda n: f'60{n:08d}')
+
+
+class OutboundRouteFactory(BaseFactory):
+    class Meta:
+        model = OutboundRoute
+
+    name = factory.Sequence(lambda n: f'saliente-{n}')
+    pattern = factory.Iterator(['_3XXXXXXXXX', '_60XXXXXXXX', '_00.', '_9XXXXXXX'])
+    trunk = factory.SubFactory(SIPTrunkFactory)
+    prefix = factory.Iterator(['', '9'])
+    priority = factory.Sequence(lambda n: n)
+
+
+class CustomDestinationFactory(BaseFactory):
+    class Meta:
+        model = CustomDestination
+
+    name = factory.Sequence(lambda n: f'destino-{n}')
+    context = factory.Sequence(lambda n: f'custom-{n}')
+
+
+class IVRFactory(BaseFactory):
+    class Meta:
+        model = IVR
+
+    name = factory.Sequence(lambda n: f'ivr-{n}')
+    extension = factory.Sequence(lambda n: str(700000 + n))
+    welcome_message = 'custom/bienvenida'
+    timeout_destination_type = 'queue'
+    timeout_destination = 'queue-0'
+    invalid_destination_type = 'custom_destination'
+    invalid_destination = 'destino-0'
+    # Una opción por tipo de destino: '6' apunta a un destino personalizado
+    menu_options = factory.Sequence(lambda n: {
+        str(digit): {
+            'type': dest_type,
+            'destination': f'destino-{n % 50}' if dest_type == 'custom_destination' else f'{dest_type}-{n % 50}',
+        }
+        for digit, dest_type in enumerate(DESTINATION_TYPES, start=1)
+    })
+
+
+class InboundRouteFactory(BaseFactory):
+    class Meta:
+        model = InboundRoute
+
+    did = factory.Sequence(lambda n: f'601{n:07d}')
+    description = factory.Sequence(lambda n: f'DID {n}')
+    destination_type = factory.Iterator(DESTINATION_TYPES)
+    destination = factory.LazyAttributeSequence(
+        lambda obj, n: f'destino-{n % 50}' if obj.destination_type == 'custom_destination' else str(n % 50)
+    )
+
+
+class QueueFactory(BaseFactory):
+    class Meta:
+        model = Queue
+
+    name = factory.Sequence(lambda n: f'queue-{n}')
+    extension = factory.Sequence(lambda n: str(800000 + n))
+    strategy = factory.Iterator(['ringall', 'leastrecent', 'fewestcalls', 'rrmemory'])
+
+
+class UserFactory(BaseFactory):
+    class Meta:
+        model = get_user_model()
+
+    username = factory.Sequence(lambda n: f'agente{n}')
+    first_name = factory.LazyFunction(lambda: fake.first_name())
+    last_name = factory.LazyFunction(lambda: fake.last_name())
+
+
+class AgentFactory(BaseFactory):
+    class Meta:
+        model = Agent
+
+    user = factory.SubFactory(UserFactory)
+    agent_id = factory.Sequence(lambda n: f'AG{n:05d}')
+    sip_extension = factory.Sequence(lambda n: str(900000 + n))
+
+
+class QueueMemberFactory(BaseFactory):
+    class Meta:
+        model = QueueMember
+
+    queue = factory.SubFactory(QueueFactory)
+    agent = factory.SubFactory(AgentFactory)
+    penalty = factory.Iterator([0, 1, 2])
@@ -0,0 +1,93 @@
+"""
+Tests for AMI event filtering and per-event metrics
+"""
+import asyncio
+import re
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from apps.telephony import ami_cdr_listener as listener
+from apps.telephony.ami_protocol import AMIFrameParser
+
+
+class _Writer:
+    def __init__(self):
+        self.sent = b''
+
+    def write(self, data):
+        self.sent += data
+
+    async def drain(self):
+        pass
+
+
+def _login(*chunks):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'Asterisk Call Manager/9.0.0\r\n')
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        writer = _Writer()
+        pending = await listener._ami_login(reader, writer, AMIFrameParser())
+        return pending, writer.sent
+
+    return asyncio.run(run())
+
+
+class AMIFilterTest(SimpleTestCase):
+    """Test the Filter action sent after login"""
+
+    def test_filter_matches_only_handled_events(self):
+        """The filter regex admits handled event names and nothing else"""
+        action = listener._filter_action().decode()
+        pattern = re.search(r'Filter: \^Event: \((.*)\)\[\[:space:\]\]', action).group(1)
+        names = pattern.split('|')
+        self.assertEqual(set(names), set(listener._EVENT_HANDLERS))
+        self.assertNotIn('Newexten', names)
+
+    def test_login_installs_filter_and_keeps_events(self):
+        """Events around the filter response are returned in order"""
+        pending, sent = _login(
+            b'Response: Success\r\nMessage: Authentication accepted\r\n\r\n',
+            b'Event: Hold\r\nUniqueid: 1\r\n\r\nResponse: Success\r\nActionID: vozipomni-filter\r\n\r\n',
+            b'Event: Unhold\r\nUniqueid: 1\r\n\r\n',
+        )
+        self.assertIn(b'Action: Filter\r\n', sent)
+        self.assertEqual(pending, [b'Event: Hold\r\nUniqueid: 1', b'Event: Unhold\r\nUniqueid: 1'])
+
+    def test_rejected_filter_keeps_session(self):
+        """A rejected filter is not fatal; a failed login is"""
+        pending, _ = _login(
+            b'Response: Success\r\n\r\nResponse: Error\r\nMessage: Permission denied\r\n\r\n',
+        )
+        self.assertEqual(pending, [])
+        with patch.object(listener, 'EVENT_FILTER', False):
+            pending, sent = _login(b'Response: Error\r\nMessage: Authentication failed\r\n\r\n')
+        self.assertIsNone(pending)
+        self.assertNotIn(b'Action: Filter', sent)
+
+
+class HandlerMetricsTest(SimpleTestCase):
+    """Test per-event handler metrics"""
+
+    def _sample(self, name, event):
+        return REGISTRY.get_sample_value(name, {'event': event}) or 0
+
+    def test_counts_handled_events_and_errors(self):
+        """Every handled event is counted and timed; exceptions count as errors"""
+        def failing(event):
+            raise ValueError('boom')
+
+        handled = self._sample('vozipomni_ami_events_handled_total', 'TestEvent')
+        errors = self._sample('vozipomni_ami_event_errors_total', 'TestEvent')
+        timed = self._sample('vozipomni_ami_event_handler_seconds_count', 'TestEvent')
+        with self.assertLogs(listener.logger, 'ERROR'):
+            listener._handle(b'TestEvent', failing, b'Event: TestEvent', None)
+        listener._handle(b'TestEvent', lambda event: None, b'Event: TestEvent', None)
+
+        self.assertEqual(self._sample('vozipomni_ami_events_handled_total', 'TestEvent'), handled + 2)
+        self.assertEqual(self._sample('vozipomni_ami_event_errors_total', 'TestEvent'), errors + 1)
+        self.assertEqual(self._sample('vozipomni_ami_event_handler_seconds_count', 'TestEvent'), timed + 2)
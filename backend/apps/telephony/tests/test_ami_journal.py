@@ -0,0 +1,68 @@
+"""
+Tests for the AMI event journal and replay
+"""
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from apps.agents.models import Agent, AgentStatusHistory
+from apps.telephony import ami_cdr_listener as listener
+from apps.telephony.ami_journal import entry_time, next_id, time_id
+from apps.telephony.ami_writer import WriteBehind
+from apps.telephony.call_state import CallStateStore
+
+User = get_user_model()
+
+
+def _frame(**headers):
+    return ''.join(f'{k}: {v}\r\n' for k, v in headers.items()).encode()
+
+
+class JournalIdTest(SimpleTestCase):
+    """Test stream ID helpers"""
+
+    def test_ids_round_trip_time(self):
+        """IDs carry the entry time in milliseconds"""
+        moment = datetime(2026, 10, 1, 8, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(time_id(moment), f'{int(moment.timestamp() * 1000)}-0')
+        self.assertEqual(entry_time(time_id(moment)), moment.timestamp())
+        self.assertEqual(entry_time(b'1760000000123-4'), 1760000000.123)
+
+    def test_next_id_skips_only_the_entry(self):
+        """next_id resumes right after an entry of the same millisecond"""
+        self.assertEqual(next_id(b'1760000000123-4'), '1760000000123-5')
+        self.assertEqual(next_id('1760000000123'), '1760000000123-1')
+
+
+class ReplayTest(TestCase):
+    """Test reprocessing journal entries"""
+
+    def setUp(self):
+        """Set up test data"""
+        user = User.objects.create_user(username='agent1', password='testpass123', role='agent')
+        self.agent = Agent.objects.create(user=user, agent_id='AGT001', sip_extension='1001', status='offline')
+        patcher = patch.object(listener, '_call_states', CallStateStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_replay_uses_event_time_and_keeps_live_agent(self):
+        """History is rebuilt at the journal timestamps without touching the agent row"""
+        start = 1760000000000
+        entries = [
+            (f'{start}-0'.encode(), _frame(Event='AgentLogin', Interface='PJSIP/1001-0001')),
+            (f'{start + 500}-0'.encode(), _frame(Event='Newexten', Channel='PJSIP/1001-0001')),
+            (f'{start + 90000}-0'.encode(),
+             _frame(Event='QueueMemberPause', Interface='PJSIP/1001-0001', Paused='1', Queue='ventas')),
+        ]
+
+        processed = listener.replay_entries(entries, WriteBehind(frozen_models=(Agent,), notify=False))
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(Agent.objects.get(pk=self.agent.pk).status, 'offline')
+        history = list(AgentStatusHistory.objects.filter(agent=self.agent).order_by('started_at'))
+        self.assertEqual([h.status for h in history], ['available', 'break'])
+        self.assertEqual(history[0].started_at.timestamp(), start / 1000)
+        self.assertEqual(history[0].duration, 90)
+        self.assertIsNone(history[1].ended_at)
@@ -0,0 +1,76 @@
+"""
+Tests for the shared AMI action multiplexer
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.telephony import services
+from apps.telephony.ami_mux import AMIMultiplexer
+from apps.telephony.ami_pool import AMIError
+from apps.telephony.tests.test_ami_pool import _AMIServer
+
+
+class AMIMultiplexerTest(SimpleTestCase):
+    """Test batching, cross-thread sharing and reconnects against a fake AMI"""
+
+    def setUp(self):
+        """Start a fake AMI server and point a fresh multiplexer at it"""
+        self.server = _AMIServer()
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings = override_settings(
+            ASTERISK_HOST='127.0.0.1', ASTERISK_AMI_PORT=self.server.server_address[1],
+            ASTERISK_AMI_USER='admin', ASTERISK_AMI_PASSWORD='secret',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.mux = AMIMultiplexer()
+        self.addCleanup(self.mux.close)
+
+    def test_batch_is_answered_in_order_on_one_session(self):
+        """A 12-queue pause goes out as one batch and replies map back by ActionID"""
+        responses = self.mux.call_many([
+            {'Action': 'QueuePause', 'Queue': f'queue-{n}'} for n in range(12)
+        ] + [{'Action': 'Hangup'}])
+        self.assertEqual([r.get('Message') for r in responses], ['QueuePause'] * 12 + ['Hangup'])
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(self.mux.stats()['in_flight'], 0)
+
+    def test_threads_share_the_session(self):
+        """Concurrent callers pipeline on the same login"""
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(
+                lambda n: self.mux.call({'Action': f'Action{n}'}).get('Message'), range(32)
+            ))
+        self.assertEqual(results, [f'Action{n}' for n in range(32)])
+        self.assertEqual(self.server.logins, 1)
+
+    def test_reconnects_after_session_loss(self):
+        """Once Asterisk drops the session the next action logs in again"""
+        self.mux.call({'Action': 'Ping'})
+        self.server.drop_sessions()
+        deadline = time.monotonic() + 2
+        while self.mux.stats()['connected'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.mux.call({'Action': 'Ping'}).get('Response'), 'Success')
+        self.assertEqual(self.server.logins, 2)
+
+    def test_rejected_login(self):
+        """Bad credentials fail the submitted actions"""
+        with self.settings(ASTERISK_AMI_PASSWORD='wrong'):
+            with self.assertRaises(AMIError):
+                self.mux.call({'Action': 'Ping'})
+        self.assertFalse(self.mux.stats()['connected'])
+
+    def test_queue_service_batch(self):
+        """QueueService reports one result per queue"""
+        with patch.object(services, 'ami_mux', self.mux):
+            results = services.QueueService.pause_agent_in_queues(['ventas', 'soporte'], '1001')
+        self.assertEqual(list(results), ['ventas', 'soporte'])
+        self.assertTrue(all(result['success'] for result in results.values()))
+        self.assertEqual(self.server.actions, ['Login', 'QueuePause', 'QueuePause'])
@@ -0,0 +1,127 @@
+"""
+Tests for the pooled AMI client
+"""
+import socket
+import socketserver
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.telephony.ami_pool import AMIError, AMIPool
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser
+from apps.telephony import asterisk_ami
+
+
+class _AMIHandler(socketserver.BaseRequestHandler):
+    """Minimal Asterisk Manager: login, Ping, Command and a stale reply before each answer"""
+
+    def handle(self):
+        server = self.server
+        server.sessions.append(self.request)
+        self.request.sendall(b'Asterisk Call Manager/9.0.0\r\n')
+        parser = AMIFrameParser()
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                return
+            for frame in parser.feed(data):
+                action = AMIEvent(frame)
+                name, action_id = action.get('Action'), action.get('ActionID', '')
+                if name == 'Login':
+                    server.logins += 1
+                    ok = action.get('Secret') == 'secret'
+                    reply = f"Response: {'Success' if ok else 'Error'}\r\nActionID: {action_id}\r\n"
+                elif name == 'Command':
+                    reply = (f"Response: Success\r\nActionID: {action_id}\r\n"
+                             f"Output: ran {action.get('Command')}\r\n")
+                elif name == 'Logoff':
+                    return
+                else:
+                    reply = f"Response: Success\r\nActionID: {action_id}\r\nMessage: {name}\r\n"
+                server.actions.append(name)
+                self.request.sendall(
+                    b'Response: Success\r\nActionID: stale-1\r\n\r\n' + reply.encode() + b'\r\n'
+                )
+
+
+class _AMIServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _AMIHandler)
+        self.logins = 0
+        self.actions = []
+        self.sessions = []
+
+    def drop_sessions(self):
+        for session in self.sessions:
+            session.shutdown(socket.SHUT_RDWR)
+            session.close()
+        self.sessions.clear()
+
+
+class AMIPoolTest(SimpleTestCase):
+    """Test connection reuse, ActionID matching and reconnects"""
+
+    def setUp(self):
+        """Start a fake AMI server and point a fresh pool at it"""
+        self.server = _AMIServer()
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.pool = AMIPool(size=2)
+        self.addCleanup(self.pool.clear)
+        port = self.server.server_address[1]
+        settings = override_settings(
+            ASTERISK_HOST='127.0.0.1', ASTERISK_AMI_PORT=port,
+            ASTERISK_AMI_USER='admin', ASTERISK_AMI_PASSWORD='secret',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = patch.object(asterisk_ami, 'ami_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self):
+        ami = asterisk_ami.AsteriskAMI.__new__(asterisk_ami.AsteriskAMI)
+        ami.connected = False
+        ami._conn = None
+        return ami
+
+    def test_connections_are_reused_across_clients(self):
+        """Consecutive clients share one authenticated session"""
+        for _ in range(3):
+            ami = self._client()
+            self.assertTrue(ami.connect())
+            self.assertTrue(ami.reload_module('app_queue.so'))
+            ami.disconnect()
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(self.pool.stats()['reused'], 2)
+
+    def test_responses_are_matched_by_action_id(self):
+        """Stale replies are skipped and pipelined replies come back in order"""
+        with self.pool.connection() as conn:
+            self.assertIn('ran pjsip reload', conn.command('pjsip reload'))
+            responses = conn.pipeline([{'Action': 'Redirect'}, {'Action': 'Originate'}])
+        self.assertEqual([r.get('Message') for r in responses], ['Redirect', 'Originate'])
+
+    def test_broken_connection_is_replaced(self):
+        """A pooled session closed by Asterisk is discarded and the action retried"""
+        ami = self._client()
+        ami.connect()
+        ami.disconnect()
+        self.server.drop_sessions()
+        ami.connect()
+        self.assertIn('ran dialplan reload', ami.command('dialplan reload'))
+        ami.disconnect()
+        self.assertEqual(self.server.logins, 2)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+
+    def test_rejected_login(self):
+        """Bad credentials raise and leave nothing in the pool"""
+        with self.settings(ASTERISK_AMI_PASSWORD='wrong'):
+            with self.assertRaises(AMIError):
+                self.pool.acquire()
+        self.assertEqual(self.pool.stats()['idle'], 0)
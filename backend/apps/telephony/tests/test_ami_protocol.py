@@ -0,0 +1,48 @@
+"""
+Tests for the AMI byte-level framing
+"""
+from django.test import SimpleTestCase
+
+from apps.telephony.ami_protocol import AMIEvent, AMIFrameParser, frame_event_name
+
+
+class AMIFrameParserTest(SimpleTestCase):
+    """Test incremental framing of the AMI stream"""
+
+    def test_frames_split_across_reads(self):
+        """Frames and separators split between reads are reassembled"""
+        parser = AMIFrameParser()
+        stream = b'Event: Hangup\r\nUniqueid: 1.1\r\n\r\nEvent: Cdr\r\nUniqueID: 1.1\r\n\r\n'
+        frames = []
+        for i in range(0, len(stream), 5):
+            frames.extend(parser.feed(stream[i:i + 5]))
+        self.assertEqual(frames, [
+            b'Event: Hangup\r\nUniqueid: 1.1',
+            b'Event: Cdr\r\nUniqueID: 1.1',
+        ])
+        self.assertEqual(len(parser), 0)
+
+    def test_partial_frame_is_kept(self):
+        """An incomplete frame stays buffered until its terminator arrives"""
+        parser = AMIFrameParser()
+        self.assertEqual(parser.feed(b'Event: Hold\r\nUniqueid: 2.1\r\n'), [])
+        self.assertEqual(parser.feed(b'\r\n'), [b'Event: Hold\r\nUniqueid: 2.1'])
+
+    def test_event_name(self):
+        """The event name is read without decoding the frame"""
+        self.assertEqual(frame_event_name(b'Event: QueueMemberStatus\r\nQueue: ventas'), b'QueueMemberStatus')
+        self.assertEqual(frame_event_name(b'Response: Success\r\nMessage: Pong'), None)
+
+
+class AMIEventTest(SimpleTestCase):
+    """Test lazy header access"""
+
+    def test_get_like_a_dict(self):
+        """Headers decode on access; the last repeated header wins"""
+        event = AMIEvent('Event: VarSet\r\nVariable: A\r\nVariable: B\r\nValue:  ñ \r\nCause-txt: Normal'.encode())
+        self.assertEqual(event.get('Event'), 'VarSet')
+        self.assertEqual(event['Variable'], 'B')
+        self.assertEqual(event.get('Value'), 'ñ')
+        self.assertEqual(event.get('Cause-txt'), 'Normal')
+        self.assertEqual(event.get('Missing', ''), '')
+        self.assertEqual(dict(event), {'Event': 'VarSet', 'Variable': 'B', 'Value': 'ñ', 'Cause-txt': 'Normal'})
@@ -0,0 +1,65 @@
+"""
+Tests for AMI event sharding
+"""
+from django.test import SimpleTestCase
+
+from apps.telephony.ami_shards import LinkedIds, route, shard_for, shard_key
+
+
+def _frame(**headers):
+    return ''.join(f'{k}: {v}\r\n' for k, v in headers.items()).encode()
+
+
+class ShardRoutingTest(SimpleTestCase):
+    """Test how events are partitioned across shard workers"""
+
+    def test_call_events_share_a_shard(self):
+        """Every event of a call lands on the shard of its Linkedid"""
+        call = [
+            _frame(Event='QueueCallerJoin', Uniqueid='1760.1', Linkedid='1760.1', Queue='ventas'),
+            _frame(Event='Hold', Uniqueid='1760.2', Linkedid='1760.1', Channel='PJSIP/1001-0002'),
+            _frame(Event='Cdr', UniqueID='1760.1', Disposition='ANSWERED'),
+        ]
+        self.assertEqual({shard_key(frame) for frame in call}, {'1760.1'})
+        for shards in (2, 3, 8):
+            self.assertEqual(len({shard_for(frame, shards) for frame in call}), 1)
+
+    def test_multi_leg_call_cdrs_follow_linkedid(self):
+        """Cdr events of every leg land with the call, with or without a Linkedid header"""
+        links = LinkedIds()
+        call = [
+            _frame(Event='QueueCallerJoin', Uniqueid='1760.1', Linkedid='1760.1', Queue='ventas'),
+            _frame(Event='AgentConnect', Uniqueid='1760.1', DestUniqueid='1760.2',
+                   Linkedid='1760.1', DestLinkedid='1760.1'),
+            _frame(Event='Hold', Uniqueid='1760.2', Linkedid='1760.1', Channel='PJSIP/1001-0002'),
+            _frame(Event='Hangup', Uniqueid='1760.3', Linkedid='1760.1', Cause='16'),
+            _frame(Event='Cdr', UniqueID='1760.2', Disposition='ANSWERED'),
+            _frame(Event='Cdr', UniqueID='1760.2', Disposition='ANSWERED'),
+            _frame(Event='Cdr', UniqueID='1760.3', LinkedID='1760.1', Disposition='ANSWERED'),
+            _frame(Event='Cdr', UniqueID='1760.1', Disposition='ANSWERED'),
+        ]
+        self.assertEqual({shard_key(frame, links=links) for frame in call}, {'1760.1'})
+        # Otherwise the legs would be split across shards
+        self.assertNotEqual(shard_for(call[4], 8, links=LinkedIds()), shard_for(call[0], 8))
+        self.assertEqual(len(route(call, 8, links=links)), 1)
+
+        bounded = LinkedIds(maxsize=1)
+        bounded.learn('1760.2', '1760.1')
+        bounded.learn('1760.3', '1760.1')
+        self.assertEqual((len(bounded), bounded.get('1760.2')), (1, ''))
+
+    def test_agent_events_use_interface(self):
+        """Agent events are keyed by interface, without the channel suffix"""
+        login = _frame(Event='AgentLogin', Interface='PJSIP/1001-00000a1f')
+        status = _frame(Event='QueueMemberStatus', Interface='PJSIP/1001', Queue='ventas', Status='1')
+        self.assertEqual(shard_key(login), 'PJSIP/1001')
+        self.assertEqual(shard_for(login, 4), shard_for(status, 4))
+
+    def test_route_keeps_arrival_order(self):
+        """Routing preserves the relative order of events within a shard"""
+        frames = [_frame(Event='Hangup', Uniqueid=f'1760.{i % 3}', Cause=str(i)) for i in range(12)]
+        routed = route(frames, 4)
+        self.assertEqual(sum(len(group) for group in routed.values()), 12)
+        for group in routed.values():
+            self.assertEqual(group, [frame for frame in frames if frame in group])
+        self.assertEqual(route(frames, 1), {0: frames})
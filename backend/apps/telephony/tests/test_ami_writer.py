@@ -0,0 +1,112 @@
+"""
+Tests for the AMI listener write-behind
+"""
+import json
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.agents.models import Agent, AgentStatusHistory
+from apps.campaigns.models import Campaign
+from apps.queues.models import Queue, QueueStats
+from apps.telephony import ami_cdr_listener as listener
+from apps.telephony.ami_protocol import AMIEvent
+from apps.telephony.ami_writer import WriteBehind
+from apps.telephony.reference_cache import ReferenceCache
+from apps.telephony.models import Call
+
+User = get_user_model()
+
+
+def _event(**headers):
+    return AMIEvent(''.join(f'{k}: {v}\r\n' for k, v in headers.items()).encode())
+
+
+class WriteBehindTest(TestCase):
+    """Test batched persistence of AMI event mutations"""
+
+    def setUp(self):
+        """Set up test data"""
+        user = User.objects.create_user(username='agent1', password='testpass123', role='agent')
+        self.agent = Agent.objects.create(user=user, agent_id='AGT001', sip_extension='1001', status='offline')
+        with patch('apps.telephony.signals.sync_asterisk_now'):
+            self.queue = Queue.objects.create(name='ventas', extension='600')
+
+        writer = WriteBehind(flush_interval=60, max_items=10000)
+        patcher = patch.object(listener, '_writer', writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = writer
+
+    def test_agent_transitions_keep_order(self):
+        """Queued status changes are visible before the flush and applied in order"""
+        listener._process_agent_login(_event(Event='AgentLogin', Interface='PJSIP/1001-0001'))
+        listener._process_queue_member_pause(
+            _event(Event='QueueMemberPause', Interface='PJSIP/1001-0001', Paused='1', Queue='ventas')
+        )
+        self.assertEqual(Agent.objects.get(pk=self.agent.pk).status, 'offline')
+
+        self.writer.flush()
+
+        self.assertEqual(Agent.objects.get(pk=self.agent.pk).status, 'break')
+        history = list(AgentStatusHistory.objects.filter(agent=self.agent).order_by('id'))
+        self.assertEqual([h.status for h in history], ['available', 'break'])
+        self.assertIsNotNone(history[0].ended_at)
+        self.assertIsNone(history[1].ended_at)
+
+    def test_queue_counters_use_increments(self):
+        """Queue counters from several events collapse into one update"""
+        for uniqueid in ('1.1', '1.2', '1.3'):
+            listener._process_queue_caller_join(_event(Event='QueueCallerJoin', Uniqueid=uniqueid, Queue='ventas'))
+        listener._process_queue_caller_abandon(_event(Event='QueueCallerAbandon', Uniqueid='1.1', Queue='ventas'))
+
+        self.writer.flush()
+
+        stats = QueueStats.objects.get(queue=self.queue)
+        self.assertEqual(stats.calls_waiting, 2)
+        self.assertEqual(stats.calls_abandoned, 1)
+
+    @patch('apps.telephony.ami_cdr_listener._link_recording')
+    def test_cdr_upsert_sends_post_save(self, link_recording):
+        """CDR events are bulk upserted and still reach post_save receivers"""
+        cdr = dict(Event='Cdr', UniqueID='2.1', Source='3001234567', Destination='600',
+                   Channel='PJSIP/trunk-0001', DestinationContext='from-pstn',
+                   Disposition='ANSWERED', Duration='60', BillableSeconds='50')
+        listener._process_cdr_event(_event(**cdr))
+        with patch('apps.telephony.signals._dispatch_call_webhook') as webhook:
+            self.writer.flush()
+            listener._process_cdr_event(_event(**dict(cdr, Disposition='BUSY')))
+            self.writer.flush()
+
+        call = Call.objects.get(call_id='ast-2.1')
+        self.assertEqual(call.status, 'busy')
+        self.assertEqual(call.talk_time, 50)
+        self.assertEqual([c.kwargs.get('created', c.args[1]) for c in webhook.call_args_list], [True, False])
+        self.assertEqual(link_recording.call_count, 2)
+
+    def test_status_change_reaches_dialer_roster(self):
+        """An AMI login applied by the write-behind publishes the agent as available"""
+        campaign = Campaign.objects.create(
+            name='Predictiva', campaign_type='outbound', dialer_type='predictive',
+            status='active', start_date=timezone.now(), created_by=self.agent.user,
+        )
+        self.agent.campaigns.add(campaign)
+        redis = MagicMock()
+        offline = ReferenceCache(MagicMock(get=MagicMock(side_effect=ConnectionError)))
+
+        with patch.object(listener, 'reference_cache', offline), \
+                patch('apps.campaigns.hopper.get_redis', return_value=redis):
+            listener._process_agent_login(_event(Event='AgentLogin', Interface='PJSIP/1001-0001'))
+            listener._flush_writes(force=True)
+
+        pipe = redis.pipeline.return_value
+        pipe.sadd.assert_called_once_with(f'campaign:{campaign.id}:agents:available', self.agent.id)
+        channel, message = pipe.publish.call_args.args
+        self.assertEqual(channel, 'dialer:agents')
+        self.assertEqual(
+            {k: v for k, v in json.loads(message).items() if k != 'agent'},
+            {'type': 'agent', 'agent_id': self.agent.id, 'available': True, 'campaign_ids': [campaign.id]},
+        )
+        self.assertEqual(listener._dirty_agents, set())
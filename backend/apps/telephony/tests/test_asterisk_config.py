@@ -0,0 +1,78 @@
+"""
+Tests for incremental Asterisk config generation
+"""
+import os
+import stat
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.telephony.asterisk_config import (
+    AsteriskConfigGenerator, config_files_for, reloads_for, write_if_changed,
+)
+from apps.telephony.config_sync import apply_config_changes
+
+
+class WriteIfChangedTest(SimpleTestCase):
+    """Test hash comparison and atomic replacement"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'dynamic', 'queues_dynamic.conf')
+
+    def test_only_writes_when_content_differs(self):
+        """Same content is a no-op; new content replaces the file and keeps its mode"""
+        self.assertTrue(write_if_changed(self.path, '[ventas]\n'))
+        os.chmod(self.path, 0o640)
+        mtime = os.stat(self.path).st_mtime_ns
+        self.assertFalse(write_if_changed(self.path, '[ventas]\n'))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+        self.assertTrue(write_if_changed(self.path, '[soporte]\n'))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '[soporte]\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['queues_dynamic.conf'])
+
+    def test_dependencies_and_reloads(self):
+        """An IVR only touches the dialplan; an extension touches PJSIP and the dialplan"""
+        self.assertEqual(config_files_for({'IVR'}), ['extensions_dynamic.conf'])
+        self.assertEqual(config_files_for({'TimeCondition'}), [])
+        files = config_files_for({'Extension'})
+        self.assertEqual(files, ['pjsip_extensions.conf', 'extensions_dynamic.conf'])
+        self.assertEqual(reloads_for(files), ['res_pjsip.so', 'chan_pjsip.so', 'dialplan'])
+
+
+class IncrementalSyncTest(TestCase):
+    """Test that a sync renders and reloads only what the change affects"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(ASTERISK_CONFIG_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_sync_reloads_only_changed_files(self):
+        """A first sync reloads the dialplan, an identical second one reloads nothing"""
+        AsteriskConfigGenerator().write_all_configs()
+        with patch('apps.telephony.asterisk_ami.AsteriskAMI') as ami_class:
+            ami = ami_class.return_value
+            ami.connect.return_value = True
+
+            with patch.object(AsteriskConfigGenerator, 'generate_extensions_conf',
+                              return_value='[from-internal]\nexten => 100,1,Answer()\n'):
+                apply_config_changes({'IVR'})
+            ami.pipeline.assert_called_once()
+            self.assertEqual(ami.pipeline.call_args.args[0],
+                             [{'Action': 'Command', 'Command': 'dialplan reload'}])
+
+            ami.pipeline.reset_mock()
+            with patch.object(AsteriskConfigGenerator, 'generate_extensions_conf',
+                              return_value='[from-internal]\nexten => 100,1,Answer()\n'), \
+                    patch.object(AsteriskConfigGenerator, 'generate_pjsip_extensions_conf') as pjsip:
+                apply_config_changes({'IVR'})
+            pjsip.assert_not_called()
+            ami.pipeline.assert_not_called()
@@ -0,0 +1,55 @@
+"""
+Tests for the in-memory call state store
+"""
+from django.test import SimpleTestCase
+
+from apps.telephony.call_state import CallStateStore
+
+
+class CallStateStoreTest(SimpleTestCase):
+    """Test call state bookkeeping and timer-wheel expiry"""
+
+    def setUp(self):
+        """Set up a store with a 10 minute TTL on 1 minute ticks"""
+        self.store = CallStateStore(ttl=600, max_states=3, resolution=60, clock=lambda: 0)
+
+    def test_pop_returns_accumulated_state(self):
+        """Fields set by events are returned once by pop"""
+        state = self.store.get('1760.1', 0)
+        state.hold_events += 1
+        state.queue_name = 'ventas'
+        popped = self.store.pop('1760.1')
+        self.assertIs(popped, state)
+        self.assertNotIn('1760.1', self.store)
+        empty = self.store.pop('1760.1')
+        self.assertEqual((empty.hold_events, empty.queue_name, empty.final_status), (0, '', None))
+        self.assertEqual(self.store.stats()['completed'], 1)
+
+    def test_expires_after_ttl_without_updates(self):
+        """Idle calls expire after the TTL; touched calls are rescheduled"""
+        self.store.get('idle', 0)
+        self.store.get('busy', 0)
+        self.assertEqual(self.store.expire(300), 0)
+        self.store.get('busy', 300)
+        self.assertEqual(self.store.expire(660), 1)
+        self.assertNotIn('idle', self.store)
+        self.assertIn('busy', self.store)
+        self.assertEqual(self.store.expire(3600), 1)
+        self.assertEqual(self.store.stats(), {
+            'live': 0, 'created': 2, 'completed': 0, 'expired': 2, 'evicted': 0,
+        })
+
+    def test_old_event_time_never_lands_in_a_processed_slot(self):
+        """States created from replayed events still expire on a later sweep"""
+        self.store.expire(6000)
+        self.store.get('replayed', 0)
+        self.assertEqual(self.store.expire(6060), 1)
+
+    def test_evicts_soonest_deadline_over_limit(self):
+        """Above max_states the state closest to expiry is dropped"""
+        for i, now in enumerate((0, 120, 240)):
+            self.store.get(f'call-{i}', now)
+        self.store.get('call-3', 300)
+        self.assertNotIn('call-0', self.store)
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.stats()['evicted'], 1)
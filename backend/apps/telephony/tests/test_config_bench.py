@@ -0,0 +1,33 @@
+"""
+Tests for the config generation benchmark budgets
+"""
+from django.test import TestCase
+
+from apps.telephony.management.commands.bench_config_generation import (
+    over_budget, run_benchmark, seed_tenant,
+)
+
+
+class ConfigGenerationBudgetTest(TestCase):
+    """Test that generators stay within their query budgets as the tenant grows"""
+
+    def test_queries_do_not_grow_with_tenant(self):
+        """Doubling IVRs, routes and queues adds no queries (no N+1)"""
+        seed_tenant(scale=0.01)
+        small = run_benchmark(repeat=1)
+        seed_tenant(scale=0.02)
+        large = run_benchmark(repeat=1)
+
+        self.assertEqual(
+            {method: result[1] for method, result in large.items()},
+            {method: result[1] for method, result in small.items()},
+        )
+        self.assertEqual(over_budget(large, scale=0.03), [])
+
+    def test_queue_members_are_rendered(self):
+        """Every seeded queue lists its members"""
+        sizes = seed_tenant(scale=0.01)
+        from apps.telephony.asterisk_config import AsteriskConfigGenerator
+
+        content = AsteriskConfigGenerator().generate_queues_dynamic_conf()
+        self.assertEqual(content.count('member => PJSIP/'), sizes['queue_members'])
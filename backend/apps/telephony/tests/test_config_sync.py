@@ -0,0 +1,71 @@
+"""
+Tests for the coalescing config-sync worker
+"""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from apps.agents.models import Agent
+from apps.telephony.config_sync import ConfigSyncWorker
+
+
+class ConfigSyncWorkerTest(SimpleTestCase):
+    """Test debouncing, coalescing and changes that land mid-sync"""
+
+    def setUp(self):
+        self.runs = []
+        self.worker = ConfigSyncWorker(apply=self.runs.append, debounce=0.05, max_delay=2)
+
+    def test_burst_is_coalesced_into_one_run(self):
+        """500 agent saves inside the window produce a single sync"""
+        for _ in range(500):
+            self.worker.mark({'Agent'})
+        self.worker.mark({'Queue'})
+        self.assertTrue(self.worker.flush(timeout=5))
+        self.assertEqual(self.runs, [{'Agent', 'Queue'}])
+        self.assertEqual(self.worker.pending_age(), 0.0)
+
+    def test_full_sync_wins_over_model_set(self):
+        """A request for the whole config is not narrowed by other marks"""
+        self.worker.mark({'IVR'})
+        self.worker.mark()
+        self.assertTrue(self.worker.flush(timeout=5))
+        self.assertEqual(self.runs, [None])
+
+    def test_change_during_sync_triggers_another_run(self):
+        """A save made while a sync is running is applied by a second run"""
+        started, release = threading.Event(), threading.Event()
+
+        def apply(models):
+            self.runs.append(models)
+            if len(self.runs) == 1:
+                started.set()
+                release.wait(5)
+
+        worker = ConfigSyncWorker(apply=apply, debounce=0.05, max_delay=2)
+        worker.mark({'IVR'})
+        self.assertTrue(started.wait(5))
+        worker.mark({'Extension'})
+        release.set()
+        self.assertTrue(worker.flush(timeout=5))
+        self.assertEqual(self.runs, [{'IVR'}, {'Extension'}])
+        self.assertEqual(worker.runs, 2)
+
+
+class AgentSaveSyncTest(TestCase):
+    """Test which agent saves regenerate the Asterisk config"""
+
+    def test_status_saves_do_not_mark_config(self):
+        """Login/logout only touch live fields; SIP changes still mark a sync"""
+        user = get_user_model().objects.create_user(username='agent1', password='testpass123', role='agent')
+        with patch('apps.telephony.signals.sync_asterisk_now') as sync:
+            agent = Agent.objects.create(user=user, agent_id='AGT001', sip_extension='1001')
+            marked = sync.call_count
+            agent.login()
+            agent.logout()
+            self.assertEqual(sync.call_count, marked)
+            agent.webrtc_enabled = not agent.webrtc_enabled
+            agent.save(update_fields=['webrtc_enabled'])
+            self.assertGreater(sync.call_count, marked)
@@ -0,0 +1,70 @@
+"""
+Tests for Realtime-backed PJSIP provisioning
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from apps.agents.models import Agent
+from apps.telephony import realtime
+from apps.telephony.asterisk_config import AsteriskConfigGenerator
+from apps.telephony.config_sync import generate_agents_pjsip_conf
+from apps.telephony.models import Extension, PsAor, PsAuth, PsEndpoint
+
+User = get_user_model()
+
+
+@override_settings(PJSIP_PROVISIONING='realtime')
+class RealtimeProvisioningTest(TestCase):
+    """Test that agent and extension changes become row upserts without reloads"""
+
+    def setUp(self):
+        mark = patch('apps.telephony.config_sync.config_sync.mark')
+        self.mark = mark.start()
+        self.addCleanup(mark.stop)
+        ami = patch('apps.telephony.asterisk_ami.AsteriskAMI')
+        self.ami = ami.start()
+        self.addCleanup(ami.stop)
+        self.user = User.objects.create_user(
+            username='ana', password='pass123', first_name='Ana', last_name='Ruiz',
+        )
+
+    def test_agent_lifecycle(self):
+        """An agent is published on save, falls back to its extension, and disappears on delete"""
+        with self.captureOnCommitCallbacks(execute=True):
+            agent = Agent.objects.create(
+                user=self.user, agent_id='AG1', sip_extension='1001', sip_password='s3cret',
+            )
+        endpoint = PsEndpoint.objects.get(id='1001')
+        self.assertEqual(endpoint.transport, 'transport-udp')
+        self.assertEqual(endpoint.callerid, '"Ana Ruiz" <1001>')
+        self.assertEqual(PsAuth.objects.get(id='1001').password, 's3cret')
+        self.assertEqual(PsAor.objects.get(id='1001').contact, 'sip:1001@kamailio:5060')
+
+        # Sin WebRTC el número queda publicado como extensión SIP
+        with self.captureOnCommitCallbacks(execute=True):
+            agent.webrtc_enabled = False
+            agent.save()
+        aor = PsAor.objects.get(id='1001')
+        self.assertEqual((aor.contact, aor.remove_existing), (None, 'yes'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            agent.delete()
+            Extension.objects.filter(extension='1001').delete()
+        self.assertFalse(PsEndpoint.objects.exists())
+        self.assertFalse(PsAuth.objects.exists())
+        self.assertFalse(PsAor.objects.exists())
+        self.ami.assert_not_called()
+
+    def test_files_are_header_only_and_orphans_pruned(self):
+        """Realtime mode leaves the dynamic PJSIP files empty and prunes stale rows"""
+        Extension.objects.create(extension='2001', name='Recepción', secret='x')
+        PsEndpoint.objects.create(id='9999')
+        PsAor.objects.create(id='9999')
+        self.assertEqual(realtime.sync_all(), (1, 1))
+        self.assertEqual(PsEndpoint.objects.get(id='2001').allow, 'ulaw,alaw,g722')
+        self.assertFalse(PsAor.objects.filter(id='9999').exists())
+
+        self.assertNotIn('[2001]', AsteriskConfigGenerator().generate_pjsip_extensions_conf())
+        self.assertEqual(generate_agents_pjsip_conf()[1], 0)
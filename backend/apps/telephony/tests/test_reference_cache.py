@@ -0,0 +1,130 @@
+"""
+Tests for the agent/queue reference cache
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from apps.agents.models import Agent
+from apps.queues.models import Queue
+from apps.telephony.reference_cache import VERSION_KEY, ReferenceCache
+
+User = get_user_model()
+
+
+class _Redis:
+    """In-memory stand-in for the version counter and the live-status stream"""
+
+    def __init__(self):
+        self.data = {}
+        self.stream = []
+        self.down = False
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError('redis down')
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        entry_id = f'{len(self.stream) + 1}-0'
+        self.stream.append((entry_id, dict(fields)))
+        return entry_id
+
+    def xrevrange(self, key, count=None):
+        return self.stream[::-1][:count]
+
+    def xrange(self, key, min='-', count=None):
+        after = int(min.lstrip('(').split('-')[0])
+        return [e for e in self.stream if int(e[0].split('-')[0]) > after][:count]
+
+
+class ReferenceCacheTest(TestCase):
+    """Test cached agent and queue lookups"""
+
+    def setUp(self):
+        """Set up test data"""
+        user = User.objects.create_user(username='agent1', password='testpass123', role='agent')
+        self.agent = Agent.objects.create(user=user, agent_id='AGT001', sip_extension='1001')
+        with patch('apps.telephony.signals.sync_asterisk_now'):
+            self.queue = Queue.objects.create(name='ventas', extension='600')
+        self.redis = _Redis()
+        self.clock = [0.0]
+        self.cache = ReferenceCache(self.redis, check_interval=1, clock=lambda: self.clock[0])
+
+    def test_lookups_are_served_from_memory(self):
+        """After the first load, lookups by extension and name run no queries"""
+        self.assertEqual(self.cache.agent_by_extension('1001'), self.agent)
+        self.assertEqual(self.cache.queue_by_name('ventas'), self.queue)
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.assertEqual(self.cache.agent_by_extension('1001').user.username, 'agent1')
+                self.assertEqual(self.cache.queue_by_name('600'), self.queue)
+                self.assertIsNone(self.cache.agent_by_extension('9999'))
+            self.assertEqual(self.cache.active_queues(), [self.queue])
+
+    def test_version_bump_reloads_after_check_interval(self):
+        """A change published by another process is picked up on the next check"""
+        self.cache.agent_by_extension('1001')
+        Agent.objects.filter(pk=self.agent.pk).update(sip_extension='1002')
+        self.redis.incr(VERSION_KEY)
+
+        self.assertIsNotNone(self.cache.agent_by_extension('1001'))
+        self.clock[0] = 2
+        self.assertIsNone(self.cache.agent_by_extension('1001'))
+        self.assertEqual(self.cache.agent_by_extension('1002').pk, self.agent.pk)
+
+    def test_own_change_keeps_loaded_rows(self):
+        """Publishing a change the process already holds does not drop its cache"""
+        self.cache.agent_by_pk(self.agent.pk)
+        self.cache.invalidate(local=False)
+        with self.assertNumQueries(0):
+            self.cache.agent_by_pk(self.agent.pk)
+
+        self.redis.incr(VERSION_KEY)  # another process
+        self.cache.invalidate(local=False)
+        with self.assertNumQueries(1):
+            self.cache.agent_by_pk(self.agent.pk)
+
+    def test_falls_back_to_database_without_redis(self):
+        """Without the version counter every lookup goes to the database"""
+        self.redis.down = True
+        with self.assertNumQueries(2):
+            self.assertEqual(self.cache.queue_by_name('600'), self.queue)
+        self.clock[0] = 2
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.agent_by_extension('1001'), self.agent)
+
+    def test_live_status_refreshes_only_touched_agents(self):
+        """A status change published per agent updates the cached row without a full reload"""
+        self.cache.agent_by_pk(self.agent.pk)
+        self.cache.touch_agents([])  # nothing to publish
+        Agent.objects.filter(pk=self.agent.pk).update(status='busy', current_calls=1)
+        self.cache.touch_agents([self.agent.pk])
+
+        self.clock[0] = 2
+        with self.assertNumQueries(1):
+            agent = self.cache.agent_by_extension('1001')
+        self.assertEqual((agent.status, agent.current_calls), ('busy', 1))
+        self.assertEqual(self.redis.data.get(VERSION_KEY), None)
+
+    def test_status_save_does_not_bump_version(self):
+        """Saving only live fields publishes the agent instead of bumping the version"""
+        self.redis.data[VERSION_KEY] = 5
+        with patch('apps.telephony.reference_cache.reference_cache', self.cache), \
+                patch('apps.telephony.signals.sync_asterisk_now'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.agent.login()
+        self.assertEqual(self.redis.data[VERSION_KEY], 5)
+        self.assertEqual(self.redis.stream[-1][1], {'agents': str(self.agent.pk)})
+
+        with patch('apps.telephony.reference_cache.reference_cache', self.cache), \
+                patch('apps.telephony.signals.sync_asterisk_now'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.agent.max_concurrent_calls = 2
+            self.agent.save()
+        self.assertEqual(self.redis.data[VERSION_KEY], 6)
@@ -0,0 +1,149 @@
+"""
+Tests for the event-fed trunk status snapshot
+"""
+from contextlib import contextmanager
+
+from django.test import SimpleTestCase
+
+from apps.telephony.ami_protocol import AMIEvent
+from apps.telephony.trunk_status import (
+    REFRESHED_KEY, TrunkStatusCache, find_registration,
+)
+
+
+def _event(**headers):
+    return AMIEvent(''.join(f'{k}: {v}\r\n' for k, v in headers.items()).encode())
+
+
+class _Redis:
+    """In-memory stand-in for the few Redis commands the cache uses"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = str(value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        bucket = self.data.setdefault(key, {})
+        if mapping:
+            bucket.update(mapping)
+        if field is not None:
+            bucket[field] = value
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class _Pool:
+    """Answers the three PJSIPShow* listings with whatever the test sets"""
+
+    def __init__(self):
+        self.contact_status = 'Reachable'
+        self.registration_status = 'Registered'
+        self.fetches = 0
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def collect(self, actions):
+        self.fetches += 1
+        return [
+            [_event(Event='EndpointList', ObjectName='carrier', DeviceState='Not in use', Aor='carrier')],
+            [_event(Event='ContactList', Endpoint='carrier', Uri='sip:10.0.0.1:5060',
+                    Status=self.contact_status, RoundtripUsec='1200')],
+            [_event(Event='OutboundRegistrationDetail', ObjectName='carrier-reg-0',
+                    Status=self.registration_status, ServerUri='sip:sip.carrier.net',
+                    ClientUri='sip:1000@sip.carrier.net')],
+        ]
+
+
+class TrunkStatusCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.pool = _Pool()
+        self.cache = TrunkStatusCache(redis_client=_Redis(), pool=self.pool, clock=lambda: self.now)
+
+    def test_snapshot_loads_once_and_keeps_changed_at(self):
+        self.assertEqual(self.cache.trunk_status('carrier'), 'Registered')
+        self.assertEqual(self.cache.trunk_status('carrier', sends_registration=False), 'Available')
+        self.assertEqual(self.pool.fetches, 1)
+
+        self.now = 2000.0
+        endpoints, registrations = self.cache.refresh()
+        self.assertEqual(endpoints['carrier']['changed_at'], 1000.0)
+
+        self.pool.registration_status = 'Rejected'
+        self.now = 3000.0
+        endpoints, registrations = self.cache.refresh()
+        self.assertEqual(registrations['carrier-reg-0']['changed_at'], 3000.0)
+        self.assertEqual(self.cache.trunk_status('carrier'), 'Failed')
+        self.assertEqual(self.cache.trunk_status('unknown', sends_registration=False), 'Not Configured')
+
+    def test_contact_status_event_flips_availability(self):
+        self.cache.refresh()
+        self.now = 1500.0
+        self.cache.apply_contact_status(_event(
+            Event='ContactStatus', EndpointName='carrier', URI='sip:10.0.0.1:5060',
+            ContactStatus='Unreachable',
+        ))
+        endpoints, _ = self.cache.snapshot()
+        self.assertEqual(endpoints['carrier']['changed_at'], 1500.0)
+        self.assertEqual(self.cache.trunk_status('carrier', sends_registration=False), 'No Contacts')
+
+        self.cache.apply_contact_status(_event(
+            Event='ContactStatus', EndpointName='carrier', URI='sip:10.0.0.1:5060', ContactStatus='Removed',
+        ))
+        endpoints, _ = self.cache.snapshot()
+        self.assertEqual(endpoints['carrier']['contacts'], {})
+        self.assertEqual(self.pool.fetches, 1)
+
+    def test_registry_event_matches_by_uri(self):
+        self.cache.refresh()
+        self.cache.apply_registry(_event(
+            Event='Registry', ChannelType='PJSIP', Username='sip:1000@sip.carrier.net',
+            Domain='sip:sip.carrier.net', Status='Unregistered',
+        ))
+        self.assertEqual(self.cache.trunk_status('carrier'), 'Unregistered')
+
+        # A registration the snapshot does not know forces a reload on the next read
+        self.cache.apply_registry(_event(
+            Event='Registry', ChannelType='PJSIP', Domain='sip:other.net', Status='Registered',
+        ))
+        self.assertIsNone(self.cache._redis().get(REFRESHED_KEY))
+        self.cache.snapshot()
+        self.assertEqual(self.pool.fetches, 2)
+
+    def test_find_registration_strips_wizard_suffix(self):
+        registrations = {
+            'Carrier_B-reg-1': {'base_name': 'Carrier_B', 'status': 'Registered'},
+            'other': {'base_name': 'other', 'status': 'Unregistered'},
+        }
+        self.assertEqual(find_registration(registrations, 'carrier-b')['status'], 'Registered')
+        self.assertIsNone(find_registration(registrations, 'carrier'))
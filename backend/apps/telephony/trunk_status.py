@@ -0,0 +1,270 @@
+"""
+Estado de endpoints y registros PJSIP en Redis, alimentado por AMI.
+
+Antes cada consulta de estado (listado de troncales, detalle, métricas)
+mandaba 'pjsip show endpoints' / 'pjsip show registrations' por CLI y
+parseaba el texto. Ahora el estado vive en dos hashes de Redis:
+
+    trunkstatus:endpoints       nombre → {state, contacts: {uri: {status, rtt_us}}, changed_at}
+    trunkstatus:registrations   nombre → {base_name, status, server_uri, client_uri, changed_at}
+
+que se cargan completos con acciones estructuradas (PJSIPShowEndpoints,
+PJSIPShowContacts, PJSIPShowRegistrationsOutbound) y se mantienen al día con
+los eventos ContactStatus y Registry que recibe el listener AMI. changed_at
+es el epoch del último cambio de disponibilidad/estado, no de la última
+lectura.
+
+La carga completa corre al conectar el listener, cada TRUNK_STATUS_REFRESH
+segundos (tarea Celery refresh_trunk_status) y cuando un evento Registry no
+corresponde a ningún registro conocido (tras un reload). Si nunca se cargó,
+la primera lectura la hace; sin Redis las lecturas consultan AMI directo.
+"""
+import json
+import logging
+import os
+import re
+import time
+
+from redis.exceptions import RedisError
+
+from apps.telephony.ami_pool import ami_pool
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS_KEY = 'trunkstatus:endpoints'
+REGISTRATIONS_KEY = 'trunkstatus:registrations'
+REFRESHED_KEY = 'trunkstatus:refreshed_at'
+REFRESH_INTERVAL = int(os.environ.get('TRUNK_STATUS_REFRESH', '300'))
+
+# Estados de contacto que cuentan como disponible (NonQualified: sin qualify)
+AVAILABLE_CONTACT = frozenset({'Reachable', 'NonQualified'})
+
+_REG_SUFFIX = re.compile(r'-reg(-\d+)?$')
+
+
+def registration_base(name: str) -> str:
+    """Nombre de la troncal de un registro del wizard (trunk-reg-0 → trunk)."""
+    return _REG_SUFFIX.sub('', name)
+
+
+def has_available_contact(endpoint: dict | None) -> bool:
+    return bool(endpoint) and any(
+        contact.get('status') in AVAILABLE_CONTACT for contact in endpoint['contacts'].values()
+    )
+
+
+def _name_variants(name: str) -> list[str]:
+    return list(dict.fromkeys([name, name.replace('-', '_'), name.replace('_', '-')]))
+
+
+def find_endpoint(endpoints: dict, name: str) -> dict | None:
+    """Endpoint por nombre, tolerando mayúsculas y guiones/underscores."""
+    lower = {key.lower(): value for key, value in endpoints.items()}
+    for variant in _name_variants(name):
+        found = endpoints.get(variant) or lower.get(variant.lower())
+        if found:
+            return found
+    return None
+
+
+def find_registration(registrations: dict, name: str) -> dict | None:
+    """
+    Registro saliente de una troncal. El PJSIP Wizard de Asterisk 21 lo
+    nombra trunk-reg-0, trunk-reg-1, trunk-reg o trunk.
+    """
+    wanted = {variant.lower() for variant in _name_variants(name)}
+    for reg_name in sorted(registrations):
+        registration = registrations[reg_name]
+        if reg_name.lower() in wanted or registration['base_name'].lower() in wanted:
+            return registration
+    return None
+
+
+class TrunkStatusCache:
+    """Snapshot de endpoints/registros PJSIP en Redis, con carga por AMI y parches por evento."""
+
+    def __init__(self, redis_client=None, pool=ami_pool, clock=time.time):
+        self._redis_client = redis_client
+        self._pool = pool
+        self._clock = clock
+
+    def _redis(self):
+        if self._redis_client is None:
+            from apps.campaigns.hopper import get_redis
+            self._redis_client = get_redis()
+        return self._redis_client
+
+    # ─────────────────────────────────────────────────────────────
+    # Carga completa
+    # ─────────────────────────────────────────────────────────────
+
+    def _fetch(self) -> tuple[dict, dict]:
+        """Estado actual desde AMI, sin changed_at."""
+        with self._pool.connection() as conn:
+            endpoint_list, contact_list, registration_list = conn.collect([
+                {'Action': 'PJSIPShowEndpoints'},
+                {'Action': 'PJSIPShowContacts'},
+                {'Action': 'PJSIPShowRegistrationsOutbound'},
+            ])
+
+        endpoints = {}
+        by_aor = {}
+        for event in endpoint_list:
+            name = event.get('ObjectName', '')
+            if not name:
+                continue
+            endpoints[name] = {'name': name, 'state': event.get('DeviceState', 'Unknown'), 'contacts': {}}
+            for aor in filter(None, event.get('Aor', '').split(',')):
+                by_aor.setdefault(aor.strip(), name)
+
+        for event in contact_list:
+            endpoint = endpoints.get(event.get('Endpoint') or by_aor.get(event.get('Aor', ''), ''))
+            uri = event.get('Uri', '')
+            if endpoint is not None and uri:
+                endpoint['contacts'][uri] = {
+                    'status': event.get('Status', 'Unknown'),
+                    'rtt_us': int(event.get('RoundtripUsec') or 0),
+                }
+
+        registrations = {}
+        for event in registration_list:
+            name = event.get('ObjectName', '')
+            if event.get('Event') != 'OutboundRegistrationDetail' or not name:
+                continue
+            registrations[name] = {
+                'name': name,
+                'base_name': registration_base(name),
+                'status': event.get('Status', 'Unknown'),
+                'server_uri': event.get('ServerUri', ''),
+                'client_uri': event.get('ClientUri', ''),
+            }
+        return endpoints, registrations
+
+    @staticmethod
+    def _stamp(current: dict, previous: dict, now: float, key) -> dict:
+        """changed_at de cada registro: el anterior si `key` no cambió."""
+        for name, record in current.items():
+            before = previous.get(name)
+            same = before is not None and key(before) == key(record)
+            record['changed_at'] = before['changed_at'] if same else now
+        return current
+
+    def refresh(self) -> tuple[dict, dict]:
+        """Recarga todo desde AMI y lo guarda en Redis. Retorna (endpoints, registros)."""
+        endpoints, registrations = self._fetch()
+        redis = self._redis()
+        previous_endpoints, previous_registrations = self._load()
+        now = self._clock()
+        self._stamp(endpoints, previous_endpoints, now, has_available_contact)
+        self._stamp(registrations, previous_registrations, now, lambda r: r['status'])
+
+        pipe = redis.pipeline()
+        pipe.delete(ENDPOINTS_KEY, REGISTRATIONS_KEY)
+        if endpoints:
+            pipe.hset(ENDPOINTS_KEY, mapping={n: json.dumps(r) for n, r in endpoints.items()})
+        if registrations:
+            pipe.hset(REGISTRATIONS_KEY, mapping={n: json.dumps(r) for n, r in registrations.items()})
+        pipe.set(REFRESHED_KEY, now)
+        pipe.execute()
+        logger.debug(f"[TrunkStatus] {len(endpoints)} endpoints, {len(registrations)} registros")
+        return endpoints, registrations
+
+    # ─────────────────────────────────────────────────────────────
+    # Lectura
+    # ─────────────────────────────────────────────────────────────
+
+    def _load(self) -> tuple[dict, dict]:
+        redis = self._redis()
+        pipe = redis.pipeline()
+        pipe.hgetall(ENDPOINTS_KEY)
+        pipe.hgetall(REGISTRATIONS_KEY)
+        endpoints, registrations = pipe.execute()
+        return (
+            {name: json.loads(raw) for name, raw in endpoints.items()},
+            {name: json.loads(raw) for name, raw in registrations.items()},
+        )
+
+    def snapshot(self) -> tuple[dict, dict]:
+        """(endpoints, registros) por nombre. Carga desde AMI si nunca se cargó."""
+        try:
+            if self._redis().get(REFRESHED_KEY) is not None:
+                return self._load()
+        except RedisError as e:
+            logger.warning(f"[TrunkStatus] Redis no disponible, consultando AMI: {e}")
+            return self._fetch()
+        return self.refresh()
+
+    def trunk_status(self, name: str, sends_registration: bool = True,
+                     snapshot: tuple[dict, dict] | None = None) -> str:
+        """
+        Estado de una troncal: Registered, Unregistered, Failed, Attempting
+        (con registro) o Available, No Contacts, Not Configured.
+        """
+        endpoints, registrations = snapshot or self.snapshot()
+        if sends_registration:
+            registration = find_registration(registrations, name)
+            if registration:
+                status = registration['status']
+                return 'Failed' if status in ('Rejected', 'Failed') else status
+        endpoint = find_endpoint(endpoints, name)
+        if endpoint:
+            return 'Available' if has_available_contact(endpoint) else 'No Contacts'
+        return 'Not Configured'
+
+    # ─────────────────────────────────────────────────────────────
+    # Eventos (hilo de handlers del listener)
+    # ─────────────────────────────────────────────────────────────
+
+    def apply_contact_status(self, event):
+        """
+        Evento ContactStatus: URI, ContactStatus (Created, Removed, Reachable,
+        Unreachable, Updated, NonQualified), AOR, EndpointName, RoundtripUsec.
+        """
+        name = event.get('EndpointName', '')
+        uri = event.get('URI', '')
+        if not name or not uri:
+            return
+        redis = self._redis()
+        raw = redis.hget(ENDPOINTS_KEY, name)
+        endpoint = json.loads(raw) if raw else {
+            'name': name, 'state': 'Unknown', 'contacts': {}, 'changed_at': self._clock(),
+        }
+        was_available = has_available_contact(endpoint)
+        status = event.get('ContactStatus', '')
+        if status == 'Removed':
+            endpoint['contacts'].pop(uri, None)
+        else:
+            contact = endpoint['contacts'].setdefault(uri, {'status': 'Unknown', 'rtt_us': 0})
+            if status not in ('Created', 'Updated'):
+                contact['status'] = status
+            contact['rtt_us'] = int(event.get('RoundtripUsec') or contact['rtt_us'])
+        if has_available_contact(endpoint) != was_available:
+            endpoint['changed_at'] = self._clock()
+        redis.hset(ENDPOINTS_KEY, name, json.dumps(endpoint))
+
+    def apply_registry(self, event):
+        """
+        Evento Registry (ChannelType PJSIP): Username (client URI), Domain
+        (server URI), Status. No trae el nombre del registro: se busca por URI.
+        """
+        if event.get('ChannelType', 'PJSIP') != 'PJSIP':
+            return
+        redis = self._redis()
+        server_uri, client_uri = event.get('Domain', ''), event.get('Username', '')
+        for name, raw in redis.hgetall(REGISTRATIONS_KEY).items():
+            registration = json.loads(raw)
+            if registration['server_uri'] != server_uri:
+                continue
+            if client_uri and registration['client_uri'] not in ('', client_uri):
+                continue
+            status = event.get('Status', registration['status'])
+            if status != registration['status']:
+                registration['status'] = status
+                registration['changed_at'] = self._clock()
+                redis.hset(REGISTRATIONS_KEY, name, json.dumps(registration))
+            return
+        # Registro desconocido (reload con troncales nuevas): recargar en la próxima lectura
+        redis.delete(REFRESHED_KEY)
+
+
+trunk_status_cache = TrunkStatusCache()
@@ -15,6 +15,7 @@ from .serializers import (
 )
 from .asterisk_config import AsteriskConfigGenerator
 from .asterisk_ami import AsteriskAMI
+from .trunk_status import find_endpoint, find_registration, has_available_contact, trunk_status_cache
 
 
 class CallViewSet(viewsets.ModelViewSet):
@@ -75,8 +76,9 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statuses(self, request):
         """
-        Obtener estado de registro de TODAS las troncales activas en una sola consulta AMI.
-        Optimizado para el listado — una sola conexión AMI.
+        Obtener estado de registro de TODAS las troncales activas.
+        Lee el snapshot de trunk_status (Redis, alimentado por eventos AMI);
+        'since' es el epoch del último cambio de estado.
         
         GET /api/telephony/trunks/statuses/
         """
@@ -87,9 +89,11 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
         result = {}
         
         try:
-            ami = AsteriskAMI()
-            if not ami.connect():
+            try:
+                endpoints, registrations = trunk_status_cache.snapshot()
+            except Exception as e:
                 # Asterisk no disponible
+                _logger.warning(f"Estado de troncales no disponible: {e}")
                 for t in trunks:
                     result[str(t.id)] = {
                         'status': 'Desconectado',
@@ -97,85 +101,17 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
                         'detail': 'No se pudo conectar a Asterisk AMI'
                     }
                 return Response(result)
-            
-            # Obtener endpoints y registros en una sola sesión
-            endpoints = ami.pjsip_show_endpoints() or {}
-            registrations = ami.pjsip_show_registrations() or {}
-
-            _logger.info(f"AMI endpoints encontrados: {list(endpoints.keys())}")
-            _logger.info(f"AMI registrations encontradas: {list(registrations.keys())}")
-            _logger.info(f"Troncales activas en BD: {[t.name for t in trunks]}")
-
-            # Crear mapas case-insensitive para búsqueda flexible
-            ep_lower_map = {k.lower(): v for k, v in endpoints.items()}
-            reg_lower_map = {k.lower(): v for k, v in registrations.items()}
-
-            def find_endpoint(name):
-                """Buscar endpoint por nombre con variantes"""
-                # 1. Búsqueda exacta
-                if name in endpoints:
-                    return endpoints[name]
-                # 2. Case-insensitive
-                if name.lower() in ep_lower_map:
-                    return ep_lower_map[name.lower()]
-                # 3. Reemplazar guiones por underscores y viceversa
-                alt_name = name.replace('-', '_')
-                if alt_name in endpoints:
-                    return endpoints[alt_name]
-                if alt_name.lower() in ep_lower_map:
-                    return ep_lower_map[alt_name.lower()]
-                alt_name2 = name.replace('_', '-')
-                if alt_name2 in endpoints:
-                    return endpoints[alt_name2]
-                if alt_name2.lower() in ep_lower_map:
-                    return ep_lower_map[alt_name2.lower()]
-                return None
-
-            def find_registration(name):
-                """
-                Buscar registration por nombre con variantes.
-                El PJSIP Wizard de Asterisk 21 genera sufijos como:
-                  trunk-reg-0, trunk-reg-1, trunk-reg, trunk
-                """
-                import re as _re
-                variants = [
-                    name,
-                    f"{name}-reg",
-                    f"{name}-reg-0",
-                    f"{name}-reg-1",
-                    name.replace('-', '_'),
-                    f"{name.replace('-', '_')}-reg",
-                    f"{name.replace('-', '_')}-reg-0",
-                    name.replace('_', '-'),
-                    f"{name.replace('_', '-')}-reg",
-                    f"{name.replace('_', '-')}-reg-0",
-                ]
-                for v in variants:
-                    if v in registrations:
-                        return registrations[v]
-                    if v.lower() in reg_lower_map:
-                        return reg_lower_map[v.lower()]
-                # Búsqueda por base_name si el parser ya normalizó
-                for reg_key, reg_data in registrations.items():
-                    if reg_data.get('base_name', '').lower() == name.lower():
-                        return reg_data
-                return None
-                return None
 
             for t in trunks:
-                ep = find_endpoint(t.name)
-                ep_found = ep is not None
-                contacts = ep.get('contacts', []) if ep else []
-                has_avail_contact = any(c.get('available') for c in contacts) if contacts else False
-
-                _logger.info(f"Troncal '{t.name}': ep_found={ep_found}, sends_reg={t.sends_registration}, contacts={len(contacts)}")
+                ep = find_endpoint(endpoints, t.name)
+                contacts = list(ep['contacts'].values()) if ep else []
+                has_avail_contact = has_available_contact(ep)
 
                 if t.sends_registration:
                     # Troncales con registro: verificar estado de registro
-                    reg = find_registration(t.name)
+                    reg = find_registration(registrations, t.name)
                     if reg:
                         reg_state = reg.get('status', 'Unknown')
-                        _logger.info(f"  Registration '{t.name}': state={reg_state}")
                         if reg_state in ('Registered',):
                             result[str(t.id)] = {'status': 'Registrado', 'class': 'success'}
                         elif reg_state in ('Unregistered',):
@@ -186,61 +122,31 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
                             result[str(t.id)] = {'status': 'Conectando...', 'class': 'warning'}
                         else:
                             result[str(t.id)] = {'status': reg_state, 'class': 'warning'}
-                    elif ep_found:
-                        # Endpoint existe pero sin registro — posiblemente IP-based
-                        if has_avail_contact:
-                            result[str(t.id)] = {'status': 'Disponible', 'class': 'success'}
-                        else:
-                            result[str(t.id)] = {'status': 'Sin Registro', 'class': 'warning'}
+                        result[str(t.id)]['since'] = reg.get('changed_at')
+                        continue
+                    if ep is None:
+                        result[str(t.id)] = {'status': 'No Configurado', 'class': 'gray',
+                                             'detail': 'Endpoint no encontrado en Asterisk. Regenere la configuración.'}
+                        continue
+                    # Endpoint existe pero sin registro — posiblemente IP-based
+                    if has_avail_contact:
+                        result[str(t.id)] = {'status': 'Disponible', 'class': 'success'}
                     else:
-                        # Fallback: verificación individual
-                        _logger.info(f"  Fallback individual para '{t.name}' (registration)")
-                        reg_check = ami.pjsip_check_registration(t.name)
-                        if reg_check:
-                            reg_state = reg_check.get('status', 'Unknown')
-                            if reg_state == 'Registered':
-                                result[str(t.id)] = {'status': 'Registrado', 'class': 'success'}
-                            elif reg_state == 'Attempting':
-                                result[str(t.id)] = {'status': 'Conectando...', 'class': 'warning'}
-                            elif reg_state in ('Rejected', 'Failed'):
-                                result[str(t.id)] = {'status': 'Rechazado', 'class': 'error'}
-                            else:
-                                result[str(t.id)] = {'status': 'No Registrado', 'class': 'warning'}
-                        else:
-                            # Verificar si al menos el endpoint existe
-                            ep_check = ami.pjsip_check_endpoint(t.name)
-                            if ep_check:
-                                result[str(t.id)] = {'status': 'EP sin Registro', 'class': 'warning',
-                                                     'detail': 'Endpoint existe pero no hay registro activo'}
-                            else:
-                                result[str(t.id)] = {'status': 'No Configurado', 'class': 'gray',
-                                                     'detail': 'Endpoint no encontrado en Asterisk. Regenere la configuración.'}
+                        result[str(t.id)] = {'status': 'EP sin Registro', 'class': 'warning',
+                                             'detail': 'Endpoint existe pero no hay registro activo'}
                 else:
                     # Troncales sin registro: verificar endpoint y contactos
-                    if ep_found:
-                        if has_avail_contact:
-                            result[str(t.id)] = {'status': 'Disponible', 'class': 'success'}
-                        elif contacts:
-                            result[str(t.id)] = {'status': 'Inalcanzable', 'class': 'warning'}
-                        else:
-                            result[str(t.id)] = {'status': 'Sin Contacto', 'class': 'warning'}
+                    if ep is None:
+                        result[str(t.id)] = {'status': 'No Encontrado', 'class': 'gray',
+                                             'detail': 'Endpoint no encontrado en Asterisk. Regenere la configuración.'}
+                        continue
+                    if has_avail_contact:
+                        result[str(t.id)] = {'status': 'Disponible', 'class': 'success'}
+                    elif contacts:
+                        result[str(t.id)] = {'status': 'Inalcanzable', 'class': 'warning'}
                     else:
-                        # Fallback: verificación individual
-                        _logger.info(f"  Fallback individual para '{t.name}' (endpoint)")
-                        ep_check = ami.pjsip_check_endpoint(t.name)
-                        if ep_check:
-                            ep_contacts = ep_check.get('contacts', [])
-                            if any(c.get('available') for c in ep_contacts):
-                                result[str(t.id)] = {'status': 'Disponible', 'class': 'success'}
-                            elif ep_contacts:
-                                result[str(t.id)] = {'status': 'Inalcanzable', 'class': 'warning'}
-                            else:
-                                result[str(t.id)] = {'status': 'Sin Contacto', 'class': 'warning'}
-                        else:
-                            result[str(t.id)] = {'status': 'No Encontrado', 'class': 'gray',
-                                                 'detail': 'Endpoint no encontrado en Asterisk. Regenere la configuración.'}
-            
-            ami.disconnect()
+                        result[str(t.id)] = {'status': 'Sin Contacto', 'class': 'warning'}
+                result[str(t.id)]['since'] = ep.get('changed_at')
 
             # Auto-regenerar config si hay troncales sin endpoint (con cooldown de 120s)
             not_found_ids = [tid for tid, info in result.items() if info.get('status') in ('No Encontrado', 'No Configurado')]
@@ -326,12 +232,12 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
             time.sleep(3)
             trunks = SIPTrunk.objects.filter(is_active=True, sends_registration=True)
             results = {}
-            ami = AsteriskAMI()
-            if ami.connect():
+            try:
+                snapshot = trunk_status_cache.refresh()
                 for trunk in trunks:
-                    reg_status = ami.get_trunk_registration_status(trunk.name)
-                    results[trunk.name] = reg_status
-                ami.disconnect()
+                    results[trunk.name] = trunk_status_cache.trunk_status(trunk.name, snapshot=snapshot)
+            except Exception as e:
+                logger.warning(f"No se pudo verificar el estado de las troncales: {e}")
 
             return Response({
                 'success': True,
@@ -379,8 +285,10 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
         """
         trunk = self.get_object()
         try:
-            ami = AsteriskAMI()
-            if not ami.connect():
+            # Una prueba explícita consulta Asterisk en el momento (y actualiza el snapshot)
+            try:
+                snapshot = trunk_status_cache.refresh()
+            except Exception:
                 return Response({
                     'success': False,
                     'message': 'No se pudo conectar a Asterisk AMI',
@@ -390,12 +298,10 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
             
             # Si NO requiere registro, verificar disponibilidad del endpoint
             if not trunk.sends_registration:
-                endpoints = ami.pjsip_show_endpoints()
-                ami.disconnect()
+                endpoint = find_endpoint(snapshot[0], trunk.name)
                 
-                if trunk.name in endpoints:
-                    endpoint = endpoints[trunk.name]
-                    has_contacts = len(endpoint.get('contacts', [])) > 0
+                if endpoint:
+                    has_contacts = has_available_contact(endpoint)
                     
                     return Response({
                         'success': True,
@@ -418,8 +324,7 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
                     })
             
             # Si SÍ requiere registro, verificar estado de registro
-            reg_status = ami.get_trunk_registration_status(trunk.name)
-            ami.disconnect()
+            reg_status = trunk_status_cache.trunk_status(trunk.name, snapshot=snapshot)
             
             is_registered = reg_status == 'Registered'
             
@@ -472,21 +377,19 @@ class SIPTrunkViewSet(viewsets.ModelViewSet):
             time.sleep(2)
             
             # Verificar estado de registro
-            ami = AsteriskAMI()
-            if ami.connect():
-                reg_status = ami.get_trunk_registration_status(trunk.name)
-                ami.disconnect()
-                
+            try:
+                reg_status = trunk_status_cache.trunk_status(trunk.name, snapshot=trunk_status_cache.refresh())
+            except Exception:
                 return Response({
                     'success': True,
-                    'message': 'Configuración recargada',
-                    'status': reg_status,
-                    'registered': reg_status == 'Registered'
+                    'message': 'Configuración recargada pero no se pudo verificar estado'
                 })
             
             return Response({
                 'success': True,
-                'message': 'Configuración recargada pero no se pudo verificar estado'
+                'message': 'Configuración recargada',
+                'status': reg_status,
+                'registered': reg_status == 'Registered'
             })
             
         except Exception as e:
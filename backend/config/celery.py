@@ -24,6 +24,16 @@ app.conf.beat_schedule = {
         'task': 'apps.campaigns.tasks.process_pending_calls',
         'schedule': 10.0,  # cada 10 segundos
     },
+    # Mantener los hoppers de contactos del dialer entre marca baja/alta
+    'feed-campaign-hoppers': {
+        'task': 'apps.campaigns.tasks.feed_campaign_hoppers',
+        'schedule': 5.0,  # cada 5 segundos
+    },
+    # Cierres de llamada del dialer -> estado e intentos de los contactos
+    'apply-call-completions': {
+        'task': 'apps.campaigns.tasks.apply_call_completions',
+        'schedule': 5.0,  # cada 5 segundos
+    },
     'update-agent-statistics': {
         'task': 'apps.agents.tasks.update_agent_statistics',
         'schedule': 60.0,  # cada minuto
@@ -51,6 +61,12 @@ app.conf.beat_schedule = {
         'schedule': 60.0,  # 1 minuto
     },
     
+    # Estado de troncales PJSIP: los eventos lo mantienen, esto corrige lo perdido
+    'refresh-trunk-status': {
+        'task': 'apps.telephony.tasks.refresh_trunk_status',
+        'schedule': float(os.environ.get('TRUNK_STATUS_REFRESH', '300')),
+    },
+    
     # Reiniciar métricas diarias de agentes a medianoche
     'reset-daily-agent-metrics': {
         'task': 'apps.agents.tasks.reset_daily_agent_metrics',
@@ -16,7 +16,7 @@ DIALER_CONFIG = {
     # Ratio máximo permitido
     'MAX_RATIO': config('DIALER_MAX_RATIO', default=3.0, cast=float),
     
-    # Ratio mínimo permitido
+    # Ratio mínimo permitido (líneas en vuelo por agente; 1.0 = una línea por agente)
     'MIN_RATIO': config('DIALER_MIN_RATIO', default=1.0, cast=float),
     
     # Ajuste de ratio por iteración
@@ -24,6 +24,12 @@ DIALER_CONFIG = {
     
     # Intervalo de procesamiento (segundos)
     'PROCESSING_INTERVAL': config('DIALER_PROCESSING_INTERVAL', default=10, cast=int),
+    
+    # Ventana deslizante de estadísticas de pacing por campaña (segundos)
+    'PACING_WINDOW': config('DIALER_PACING_WINDOW', default=300, cast=int),
+    
+    # Llamadas mínimas en la ventana antes de confiar en las estadísticas
+    'PACING_MIN_SAMPLES': config('DIALER_PACING_MIN_SAMPLES', default=20, cast=int),
 }
 
 
@@ -52,6 +58,39 @@ CALL_BLASTING_CONFIG = {
 }
 
 
+# ============= CONFIGURACIÓN HOPPER =============
+
+HOPPER_CONFIG = {
+    # Rellenar el hopper de la campaña cuando baje de esta cantidad
+    'LOW_WATERMARK': config('HOPPER_LOW_WATERMARK', default=200, cast=int),
+    
+    # Cantidad objetivo de contactos en el hopper tras rellenar
+    'HIGH_WATERMARK': config('HOPPER_HIGH_WATERMARK', default=1000, cast=int),
+    
+    # Contactos leídos de Postgres por consulta
+    'BATCH_SIZE': config('HOPPER_BATCH_SIZE', default=500, cast=int),
+    
+    # Intervalo de la tarea que rellena los hoppers (segundos)
+    'FEED_INTERVAL': config('HOPPER_FEED_INTERVAL', default=5, cast=int),
+    
+    # Segundos antes de volver a recorrer una lista agotada (reintentos vencidos)
+    'RESCAN_INTERVAL': config('HOPPER_RESCAN_INTERVAL', default=60, cast=int),
+}
+
+
+# ============= HORARIO DE LLAMADAS =============
+
+CALLING_HOURS_CONFIG = {
+    # Ventana diaria por defecto (hora local del contacto) si la campaña no define una
+    'START': config('DIALER_CALLING_START', default='08:00'),
+    'END': config('DIALER_CALLING_END', default='20:00'),
+    
+    # Días habilitados (0 = lunes ... 6 = domingo)
+    'DAYS': config('DIALER_CALLING_DAYS', default='0,1,2,3,4,5',
+                   cast=lambda v: [int(d) for d in v.split(',') if d.strip()]),
+}
+
+
 # ============= CONFIGURACIÓN GENERAL =============
 
 GENERAL_CONFIG = {
@@ -80,6 +119,12 @@ LIMITS_CONFIG = {
     
     # Contactos mínimos para campaña
     'MIN_CONTACTS': config('DIALER_MIN_CONTACTS', default=1, cast=int),
+    
+    # Originaciones por segundo por campaña (0 = sin límite)
+    'CALLS_PER_SECOND': config('DIALER_CALLS_PER_SECOND', default=0, cast=float),
+    
+    # Canales simultáneos por troncal (0 = sin límite)
+    'TRUNK_MAX_CHANNELS': config('DIALER_TRUNK_MAX_CHANNELS', default=0, cast=int),
 }
 
 
@@ -89,6 +134,8 @@ def get_dialer_config():
         'predictive': DIALER_CONFIG,
         'progressive': PROGRESSIVE_CONFIG,
         'call_blasting': CALL_BLASTING_CONFIG,
+        'hopper': HOPPER_CONFIG,
+        'calling_hours': CALLING_HOURS_CONFIG,
         'general': GENERAL_CONFIG,
         'limits': LIMITS_CONFIG,
     }
@@ -311,6 +311,12 @@ ASTERISK_CONFIG = {
 # con las configuraciones de troncales creadas desde la interfaz web
 PJSIP_CONFIG_PATH = config('PJSIP_CONFIG_PATH', default=f'{ASTERISK_CONFIG_DIR}/pjsip_wizard.conf')
 
+# Provisión de endpoints PJSIP de agentes y extensiones:
+#   'files'    → pjsip_agents.conf / pjsip_extensions.conf + reload de res_pjsip
+#   'realtime' → filas en ps_endpoints/ps_auths/ps_aors (Asterisk Realtime), sin reload
+# Cambiar de modo requiere reiniciar Asterisk (sorcery.conf se lee al arrancar).
+PJSIP_PROVISIONING = config('PJSIP_PROVISIONING', default='files')
+
 # API Documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'VoziPOmni Contact Center API',
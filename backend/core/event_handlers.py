@@ -98,19 +98,18 @@ def on_agent_logged_in(sender, agent, user, **kwargs):
         }
     )
     
-    # Add agent to their assigned queues
+    # Add agent to their assigned queues (one pipelined AMI batch)
     from apps.queues.models import QueueMember
-    for queue_member in QueueMember.objects.filter(agent=agent):
-        try:
-            from apps.telephony.services import QueueService
-            QueueService.add_agent_to_queue(
-                queue_name=queue_member.queue.name,
-                agent_extension=agent.sip_extension,
-                agent_name=str(agent),
-                penalty=queue_member.penalty
-            )
-        except Exception as e:
-            logger.error(f"Error adding agent to queue: {e}")
+    from apps.telephony.services import QueueService
+    penalties = {
+        queue_member.queue.name: queue_member.penalty
+        for queue_member in QueueMember.objects.filter(agent=agent).select_related('queue')
+    }
+    for queue_name, result in QueueService.add_agent_to_queues(
+        penalties, agent_extension=agent.sip_extension, agent_name=str(agent)
+    ).items():
+        if not result['success']:
+            logger.error(f"Error adding agent to queue {queue_name}: {result['error']}")
 
 
 @receiver(agent_logged_out)
@@ -130,17 +129,15 @@ def on_agent_logged_out(sender, agent, user, session_duration=None, **kwargs):
         }
     )
     
-    # Remove agent from all queues
+    # Remove agent from all queues (one pipelined AMI batch)
     from apps.queues.models import QueueMember
-    for queue_member in QueueMember.objects.filter(agent=agent):
-        try:
-            from apps.telephony.services import QueueService
-            QueueService.remove_agent_from_queue(
-                queue_name=queue_member.queue.name,
-                agent_extension=agent.sip_extension
-            )
-        except Exception as e:
-            logger.error(f"Error removing agent from queue: {e}")
+    from apps.telephony.services import QueueService
+    queue_names = QueueMember.objects.filter(agent=agent).values_list('queue__name', flat=True)
+    for queue_name, result in QueueService.remove_agent_from_queues(
+        list(queue_names), agent_extension=agent.sip_extension
+    ).items():
+        if not result['success']:
+            logger.error(f"Error removing agent from queue {queue_name}: {result['error']}")
 
 
 @receiver(agent_status_changed)
@@ -165,17 +162,13 @@ def on_agent_status_changed(sender, agent, old_status, new_status, reason=None,
     should_pause = new_status in ['break', 'offline', 'wrapup']
     
     from apps.queues.models import QueueMember
-    for queue_member in QueueMember.objects.filter(agent=agent):
-        try:
-            from apps.telephony.services import QueueService
-            QueueService.pause_agent(
-                queue_name=queue_member.queue.name,
-                agent_extension=agent.sip_extension,
-                paused=should_pause,
-                reason=reason
-            )
-        except Exception as e:
-            logger.error(f"Error pausing/unpausing agent in queue: {e}")
+    from apps.telephony.services import QueueService
+    queue_names = QueueMember.objects.filter(agent=agent).values_list('queue__name', flat=True)
+    for queue_name, result in QueueService.pause_agent_in_queues(
+        list(queue_names), agent_extension=agent.sip_extension, paused=should_pause, reason=reason
+    ).items():
+        if not result['success']:
+            logger.error(f"Error pausing/unpausing agent in queue {queue_name}: {result['error']}")
 
 
 # ============= CALL EVENT HANDLERS =============
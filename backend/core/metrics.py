@@ -197,6 +197,33 @@ database_connection_status = Gauge(
     'Database connection status (1=connected, 0=disconnected)'
 )
 
+# ============= AMI LISTENER METRICS =============
+
+ami_events_received_total = Counter(
+    'vozipomni_ami_events_received_total',
+    'AMI events read from the Asterisk socket',
+    ['event']
+)
+
+ami_events_handled_total = Counter(
+    'vozipomni_ami_events_handled_total',
+    'AMI events processed by a listener handler',
+    ['event']
+)
+
+ami_event_errors_total = Counter(
+    'vozipomni_ami_event_errors_total',
+    'AMI event handlers that raised an exception',
+    ['event']
+)
+
+ami_event_handler_seconds = Histogram(
+    'vozipomni_ami_event_handler_seconds',
+    'AMI event handler execution time',
+    ['event'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+)
+
 celery_tasks_total = Counter(
     'vozipomni_celery_tasks_total',
     'Total Celery tasks executed',
@@ -210,6 +237,30 @@ celery_task_duration_seconds = Histogram(
     buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300)
 )
 
+# ============= ASTERISK CONFIG SYNC METRICS =============
+
+config_sync_changes_total = Counter(
+    'vozipomni_config_sync_changes_total',
+    'Model changes queued for Asterisk config sync'
+)
+
+config_syncs_total = Counter(
+    'vozipomni_config_syncs_total',
+    'Asterisk config sync runs (each one coalesces the queued changes)',
+    ['result']
+)
+
+config_sync_lag_seconds = Histogram(
+    'vozipomni_config_sync_lag_seconds',
+    'Time from the first queued change to the applied Asterisk config',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+
+config_sync_pending_seconds = Gauge(
+    'vozipomni_config_sync_pending_seconds',
+    'Age of the oldest config change not yet applied (0 when idle)'
+)
+
 # ============= DIALER METRICS =============
 
 dialer_predictive_ratio = Gauge(
@@ -381,11 +432,22 @@ def update_trunk_metrics():
     """Update trunk metrics (called periodically)"""
     try:
         from apps.telephony.models import SIPTrunk
+        from apps.telephony.trunk_status import trunk_status_cache
+        
+        # Estado real desde el snapshot de AMI; si no hay, el flag de la DB
+        try:
+            snapshot = trunk_status_cache.snapshot()
+        except Exception as e:
+            logger.warning(f"Trunk status snapshot unavailable: {e}")
+            snapshot = None
         
         for trunk in SIPTrunk.objects.filter(is_active=True):
-            trunk_registered.labels(trunk_name=trunk.name).set(
-                1 if trunk.is_registered else 0
-            )
+            if snapshot is not None:
+                status = trunk_status_cache.trunk_status(trunk.name, trunk.sends_registration, snapshot)
+                registered = status == ('Registered' if trunk.sends_registration else 'Available')
+            else:
+                registered = trunk.is_registered
+            trunk_registered.labels(trunk_name=trunk.name).set(1 if registered else 0)
             
             trunk_calls_active.labels(
                 trunk_name=trunk.name,
@@ -10,6 +10,7 @@ This module provides:
 import factory
 from factory.django import DjangoModelFactory
 from faker import Faker
+from faker.providers import BaseProvider
 import uuid
 from django.utils import timezone
 
@@ -128,7 +129,7 @@ class AddressMixin:
 # Common Faker Providers
 # ============================================================================
 
-class SpanishFakerProvider:
+class SpanishFakerProvider(BaseProvider):
     """
     Custom Faker provider for VoziPOmni-specific data.
     
@@ -0,0 +1,166 @@
+"""
+Correlación de eventos AMI con llamadas en curso y escritura de cierres
+
+LiveCallIndex: índice en memoria uniqueid/channel/linkedid -> call_id de las
+llamadas originadas por esta instancia. Se llena con Newchannel y
+OriginateResponse (y con el checkpoint al retomar una campaña); el Originate
+lleva ChannelId = call_id, así que el uniqueid del canal originado ya se
+conoce antes del primer evento. El tamaño está acotado: si se pierde un
+Hangup la entrada más antigua se descarta sola.
+
+CompletionWriter: los cierres de llamada se acumulan y se escriben en un solo
+pipeline cada `flush_interval` segundos o al juntar `batch_size` registros:
+    RPUSH calls:completed r1 r2 ...      (un comando por lote)
+    HSET  campaign:{id}:stats ...        (último valor por campaña)
+    DEL   call:{id1} call:{id2} ...
+El backend consume calls:completed y actualiza estado e intentos de cada
+contacto (apps/campaigns/tasks.py: apply_call_completions).
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_KEY = 'calls:completed'
+
+
+class LiveCallIndex:
+    """Índice acotado de llamadas vivas por uniqueid, channel y linkedid"""
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or int(os.getenv('DIALER_CALL_INDEX_SIZE', 50000))
+        # clave ('u'|'c'|'l', valor) -> call_id, en orden de inserción
+        self._keys: 'OrderedDict[tuple, str]' = OrderedDict()
+        # call_id -> claves registradas, para olvidarlas juntas
+        self._calls: Dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _put(self, kind: str, value: Optional[str], call_id: str):
+        if not value or value == '<null>':
+            return
+        key = (kind, value)
+        previous = self._keys.pop(key, None)
+        if previous is not None and previous != call_id:
+            self._calls.get(previous, set()).discard(key)
+        self._keys[key] = call_id
+        self._calls.setdefault(call_id, set()).add(key)
+        while len(self._keys) > self.max_size:
+            old_key, old_call = self._keys.popitem(last=False)
+            keys = self._calls.get(old_call)
+            if keys is not None:
+                keys.discard(old_key)
+                if not keys:
+                    del self._calls[old_call]
+
+    def bind(self, call_id: str, uniqueid: str = None, channel: str = None,
+             linkedid: str = None):
+        self._put('u', uniqueid, call_id)
+        self._put('c', channel, call_id)
+        self._put('l', linkedid, call_id)
+
+    def by_uniqueid(self, uniqueid: Optional[str]) -> Optional[str]:
+        return self._keys.get(('u', uniqueid)) if uniqueid else None
+
+    def lookup(self, uniqueid: Optional[str] = None, channel: Optional[str] = None) -> Optional[str]:
+        """call_id del canal originado (no usa linkedid: otros canales de la llamada lo comparten)"""
+        call_id = self.by_uniqueid(uniqueid)
+        if call_id is None and channel:
+            call_id = self._keys.get(('c', channel))
+        return call_id
+
+    def lookup_linked(self, uniqueid: Optional[str] = None,
+                      linkedid: Optional[str] = None) -> Optional[str]:
+        """call_id de cualquier canal de la llamada (p. ej. el del agente en AgentConnect)"""
+        call_id = self.by_uniqueid(uniqueid)
+        if call_id is None and linkedid:
+            call_id = self._keys.get(('l', linkedid))
+        return call_id
+
+    def forget(self, call_id: str):
+        for key in self._calls.pop(call_id, ()):
+            if self._keys.get(key) == call_id:
+                del self._keys[key]
+
+
+class CompletionWriter:
+    """Escritura por lotes de los cierres de llamada en Redis"""
+
+    def __init__(self, redis_client=None, flush_interval: float = None,
+                 batch_size: int = None, max_pending: int = 100000):
+        self.redis = redis_client
+        self.flush_interval = flush_interval or float(os.getenv('DIALER_COMPLETION_FLUSH_MS', 50)) / 1000
+        self.batch_size = batch_size or int(os.getenv('DIALER_COMPLETION_BATCH', 500))
+        self._records = deque(maxlen=max_pending)
+        self._stats: Dict[str, Dict] = {}
+        self._deletes: set = set()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        return len(self._records)
+
+    def complete(self, record: Dict, stats_key: str = None, stats: Dict = None,
+                 delete: Iterable[str] = ()):
+        """Encolar el cierre de una llamada (no hace I/O)"""
+        if len(self._records) == self._records.maxlen:
+            logger.warning("Cola de cierres de llamada llena, descartando el registro más antiguo")
+        self._records.append(json.dumps(record, default=str))
+        if stats_key and stats is not None:
+            self._stats[stats_key] = stats
+        self._deletes.update(delete)
+        if len(self._records) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Escribir lo acumulado en un solo round trip. Retorna registros escritos."""
+        if not (self._records or self._stats or self._deletes):
+            return 0
+        records, stats, deletes = list(self._records), self._stats, self._deletes
+        self._records.clear()
+        self._stats, self._deletes = {}, set()
+
+        pipe = self.redis.pipeline(transaction=False)
+        if records:
+            pipe.rpush(COMPLETED_KEY, *records)
+        for key, mapping in stats.items():
+            pipe.hset(key, mapping=mapping)
+        if deletes:
+            pipe.delete(*deletes)
+        try:
+            await pipe.execute()
+        except Exception:
+            # Devolver el lote para reintentar; lo encolado mientras tanto es más nuevo
+            self._records.extendleft(reversed(records))
+            for key, mapping in stats.items():
+                self._stats.setdefault(key, mapping)
+            self._deletes.update(deletes)
+            raise
+        return len(records)
+
+    async def run(self):
+        """Vaciar la cola periódicamente o al juntar un lote completo"""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error escribiendo cierres de llamada ({self.pending} pendientes): {e}")
+                    await asyncio.sleep(1)
+        finally:
+            if self._records:
+                try:
+                    await self.flush()
+                except Exception:
+                    pass
@@ -6,6 +6,7 @@ Utiliza Asterisk AMI para originar llamadas
 
 import asyncio
 import logging
+from collections import deque
 from datetime import datetime
 from enum import Enum
 from typing import List, Dict, Optional
@@ -13,8 +14,16 @@ import redis.asyncio as aioredis
 from panoramisk.manager import Manager as AMIManager
 import os
 import json
-import pytz
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import time
+
+from calls import CompletionWriter, LiveCallIndex
+from dnc import DNCFilter
+from hopper import ContactHopper
+from leases import CampaignLeases
+from origination import OriginationDispatcher, OriginationRejected, TrunkCapacityError, ORIGINATE_REASONS
+from pacing import PacingEngine
+from roster import AgentRoster
+from schedule import CallingSchedule
 
 # Custom exceptions
 class DialerException(Exception):
@@ -74,20 +83,41 @@ class DialerEngine:
         self.active_calls = {}
         self.agents_status = {}
         
-        # Configuraciones predictivas
-        self.predictive_ratio = 1.5  # Ratio de llamadas por agente
-        self.abandon_rate_target = 0.03  # 3% de abandono objetivo
+        # Pacing predictivo con estado independiente por campaña
+        self.pacing = PacingEngine()
+        # Hoppers de contactos (sorted sets en Redis) por campaña
+        self.hoppers: Dict[int, ContactHopper] = {}
+        # Originaciones concurrentes correlacionadas por ActionID
+        self.dispatcher = None
+        self.max_inflight_originates = int(os.getenv('DIALER_MAX_INFLIGHT_ORIGINATES', 100))
+        # call_id -> future resuelto cuando la llamada termina (hangup o fallo)
+        self.call_done: Dict[str, asyncio.Future] = {}
+        # uniqueid/channel/linkedid -> call_id de las llamadas en curso
+        self.call_index = LiveCallIndex()
+        # Cierres de llamada escritos en Redis por lotes
+        self.completions = CompletionWriter()
+        # Lista DNC en memoria (se carga en run_dnc_filter)
+        self.dnc = DNCFilter()
+        # Agentes disponibles por campaña, actualizados por pub/sub
+        self.roster = AgentRoster()
+        # Campañas repartidas entre instancias mediante leases en Redis
+        self.leases = CampaignLeases()
+        self._rebalance_lock = asyncio.Lock()
         
-    async def initialize(self):
-        """Inicializar conexiones"""
+    async def initialize(self, redis_client=None):
+        """Inicializar conexiones (redis_client permite inyectar un cliente, p. ej. en simulator.py)"""
         try:
             # Redis
-            self.redis_client = await aioredis.from_url(
+            self.redis_client = redis_client or await aioredis.from_url(
                 self.redis_url,
                 encoding="utf-8",
                 decode_responses=True
             )
             logger.info("Conectado a Redis")
+            self.dnc.redis = self.redis_client
+            self.roster.redis = self.redis_client
+            self.leases.bind(self.redis_client)
+            self.completions.redis = self.redis_client
         except Exception as e:
             logger.error(f"Error conectando a Redis: {e}")
             raise AMIConnectionError(f"Redis connection failed: {e}")
@@ -108,14 +138,26 @@ class DialerEngine:
             logger.error(f"Error conectando a Asterisk AMI: {e}")
             raise AMIConnectionError(f"AMI connection failed: {e}")
         
+        self.dispatcher = OriginationDispatcher(
+            self.ami_client,
+            max_in_flight=self.max_inflight_originates
+        )
+        
         # Registrar event listeners
+        self.dispatcher.bind()
         self.ami_client.register_event('Newchannel', self.on_new_channel)
         self.ami_client.register_event('Hangup', self.on_hangup)
         self.ami_client.register_event('AgentConnect', self.on_agent_connect)
+        self.ami_client.register_event('DialEnd', self.on_dial_end)
         self.ami_client.register_event('AgentComplete', self.on_agent_complete)
         
-    async def start_campaign(self, campaign_id: int, campaign_type: str):
-        """Iniciar una campaña de discado"""
+    async def start_campaign(self, campaign_id: int, campaign_type: str,
+                             checkpoint: Optional[Dict] = None):
+        """Iniciar una campaña de discado (retomando su checkpoint si existe)"""
+        if campaign_id in self.active_campaigns and not self.active_campaigns[campaign_id].get('stopped'):
+            logger.info(f"Campaña {campaign_id} ya está activa")
+            return
+        
         logger.info(f"Iniciando campaña {campaign_id} tipo: {campaign_type}")
         
         # Obtener configuración de campaña desde Redis
@@ -131,8 +173,21 @@ class DialerEngine:
             'started_at': datetime.now(),
             'calls_made': 0,
             'calls_answered': 0,
-            'calls_abandoned': 0
+            'calls_abandoned': 0,
+            # Ventanas de llamada por zona horaria
+            'schedule': CallingSchedule.from_config(campaign_config),
         }
+        self.pacing.get(campaign_id, campaign_config)
+        if checkpoint:
+            self.restore_checkpoint(campaign_id, checkpoint)
+        
+        # Migrar contactos cargados en la lista legacy al hopper
+        moved = await self.get_hopper(campaign_id).import_legacy_list(
+            f'campaign:{campaign_id}:contacts:pending',
+            vip_boost=campaign_config.get('vip_priority_boost', 10)
+        )
+        if moved:
+            logger.info(f"Campaña {campaign_id}: {moved} contactos migrados al hopper")
         
         # Iniciar loop de discado según el tipo
         if campaign_type == CampaignType.PROGRESSIVE.value:
@@ -148,8 +203,175 @@ class DialerEngine:
         """Detener una campaña"""
         if campaign_id in self.active_campaigns:
             self.active_campaigns[campaign_id]['stopped'] = True
+            self.roster.wake(campaign_id)
             logger.info(f"Campaña {campaign_id} marcada para detener")
             
+    async def listen_commands(self):
+        """
+        Escuchar comandos start/stop publicados por el backend en 'dialer:commands'
+        (ver apps/campaigns/tasks.py: queue_campaign_in_dialer).
+        El backend también registra la campaña en dialer:campaigns; el comando
+        sólo adelanta el rebalanceo para no esperar al próximo heartbeat.
+        """
+        pubsub = self.redis_client.pubsub()
+        await pubsub.subscribe('dialer:commands')
+        logger.info("Escuchando comandos en dialer:commands")
+        async for message in pubsub.listen():
+            if message.get('type') != 'message':
+                continue
+            try:
+                command = json.loads(message['data'])
+                campaign_id = int(command['campaign_id'])
+                if command.get('action') == 'start':
+                    await self.leases.want(campaign_id, command.get('campaign_type') or '')
+                    await self.rebalance()
+                elif command.get('action') == 'stop':
+                    await self.stop_campaign(campaign_id)
+            except Exception as e:
+                logger.error(f"Comando inválido en dialer:commands: {e}")
+            
+    # ============= REPARTO ENTRE INSTANCIAS =============
+
+    async def coordinate(self):
+        """Heartbeat, renovación de leases, checkpoints y rebalanceo periódicos"""
+        logger.info(f"Instancia del dialer: {self.leases.instance_id}")
+        while True:
+            try:
+                await self.coordinate_once()
+            except Exception as e:
+                logger.error(f"Error coordinando campañas: {e}")
+            await asyncio.sleep(self.leases.heartbeat_interval)
+
+    async def coordinate_once(self):
+        instances = await self.leases.heartbeat()
+        
+        for campaign_id in await self.leases.renew():
+            # Otra instancia tomó la campaña (p. ej. tras una partición de red)
+            logger.warning(f"Lease perdido para campaña {campaign_id}, deteniendo")
+            self.abandon_campaign(campaign_id)
+        
+        # Liberar leases de campañas cuyo loop ya terminó
+        for campaign_id in list(self.leases.owned):
+            if campaign_id not in self.active_campaigns:
+                await self.leases.release(campaign_id)
+        
+        await self.leases.save_checkpoints({
+            campaign_id: self.campaign_checkpoint(campaign_id)
+            for campaign_id in self.leases.owned
+            if campaign_id in self.active_campaigns
+        })
+        await self.rebalance(instances)
+
+    async def rebalance(self, instances: Optional[int] = None):
+        """Tomar campañas sin dueño hasta la cuota y ceder el excedente"""
+        async with self._rebalance_lock:
+            await self._rebalance(instances)
+
+    async def _rebalance(self, instances: Optional[int]):
+        wanted = await self.leases.wanted()
+        if instances is None:
+            instances = await self.leases.heartbeat()
+        
+        running = []
+        for campaign_id in sorted(self.leases.owned):
+            campaign = self.active_campaigns.get(campaign_id)
+            if campaign is None or campaign.get('stopped'):
+                continue
+            if campaign_id not in wanted:
+                await self.stop_campaign(campaign_id)
+            else:
+                running.append(campaign_id)
+        
+        quota = self.leases.quota(len(wanted), instances)
+        if len(running) > quota:
+            # Ceder una campaña por ciclo; su lease se libera cuando el loop termina
+            campaign_id = running[-1]
+            logger.info(f"Cediendo campaña {campaign_id} (cuota {quota}, {instances} instancias)")
+            await self.leases.save_checkpoints({campaign_id: self.campaign_checkpoint(campaign_id)})
+            await self.stop_campaign(campaign_id)
+            return
+        
+        for campaign_id, campaign_type in sorted(wanted.items()):
+            if len(running) >= quota:
+                break
+            if campaign_id in self.leases.owned:
+                continue
+            if await self.leases.acquire(campaign_id):
+                checkpoint = await self.leases.load_checkpoint(campaign_id)
+                await self.start_campaign(campaign_id, campaign_type, checkpoint)
+                if campaign_id in self.active_campaigns:
+                    running.append(campaign_id)
+
+    def campaign_checkpoint(self, campaign_id: int) -> Dict:
+        """Estado de la campaña necesario para retomarla en otra instancia"""
+        campaign = self.active_campaigns[campaign_id]
+        pacer = self.pacing.get(campaign_id, campaign['config'])
+        calls = [
+            {
+                'call_id': call_id,
+                'uniqueid': call.get('uniqueid'),
+                'channel': call.get('channel'),
+                'contact': call.get('contact'),
+                'agent': call.get('agent'),
+                'mode': call.get('mode'),
+                'status': call.get('status'),
+                'started_at': call.get('started_at'),
+            }
+            for call_id, call in self.active_calls.items()
+            # Sin uniqueid la llamada no se puede correlacionar desde otra instancia
+            if call.get('campaign_id') == campaign_id and call.get('uniqueid')
+        ]
+        return {
+            'owner': self.leases.instance_id,
+            'updated_at': time.time(),
+            'calls_made': campaign['calls_made'],
+            'calls_answered': campaign['calls_answered'],
+            'calls_abandoned': campaign['calls_abandoned'],
+            'ratio': pacer.ratio,
+            'calls': calls,
+        }
+
+    def restore_checkpoint(self, campaign_id: int, checkpoint: Dict):
+        """Retomar contadores, ratio y llamadas en curso de un checkpoint"""
+        campaign = self.active_campaigns[campaign_id]
+        for counter in ('calls_made', 'calls_answered', 'calls_abandoned'):
+            campaign[counter] = int(checkpoint.get(counter) or 0)
+        pacer = self.pacing.get(campaign_id, campaign['config'])
+        if checkpoint.get('ratio'):
+            pacer.ratio = float(checkpoint['ratio'])
+        
+        restored = 0
+        for call in checkpoint.get('calls') or []:
+            call_id = call['call_id']
+            if call_id in self.active_calls:
+                continue
+            self.active_calls[call_id] = dict(call, campaign_id=campaign_id)
+            del self.active_calls[call_id]['call_id']
+            self.call_index.bind(call_id, uniqueid=call.get('uniqueid'), channel=call.get('channel'))
+            if call.get('status') == CallStatus.ANSWERED.value:
+                pacer.record_connect(call_id)
+            else:
+                pacer.record_dial(call_id)
+            restored += 1
+        logger.info(
+            f"Campaña {campaign_id} retomada desde checkpoint de {checkpoint.get('owner')}: "
+            f"{campaign['calls_made']} llamadas, {restored} en curso"
+        )
+
+    def abandon_campaign(self, campaign_id: int):
+        """Dejar de gestionar una campaña cuyo lease tiene otra instancia"""
+        campaign = self.active_campaigns.get(campaign_id)
+        if campaign:
+            campaign['stopped'] = True
+            self.roster.wake(campaign_id)
+        for call_id, call in list(self.active_calls.items()):
+            if call.get('campaign_id') == campaign_id:
+                # El nuevo dueño procesa el hangup a partir del checkpoint
+                self.dispatcher.release(call_id)
+                self._finish_call(call_id)
+                self.call_index.forget(call_id)
+                self.active_calls.pop(call_id, None)
+            
     async def progressive_dialer_loop(self, campaign_id: int):
         """
         Campaña PROGRESIVA: Discado 1:1
@@ -166,21 +388,23 @@ class DialerEngine:
             # Obtener agentes disponibles
             available_agents = await self.get_available_agents(campaign_id)
             
-            for agent in available_agents:
-                # Un contacto por agente
-                contact = await self.get_next_contact(campaign_id)
-                
-                if contact:
-                    await self.originate_call(
-                        campaign_id=campaign_id,
-                        contact=contact,
-                        agent=agent
-                    )
-                    campaign['calls_made'] += 1
+            # Excluir agentes que ya tienen una originación en curso
+            busy_agents = {
+                str(call['agent']['id']) for call in self.active_calls.values()
+                if call.get('agent')
+            }
+            available_agents = [a for a in available_agents if str(a['id']) not in busy_agents]
+            
+            # Un contacto por agente, reclamados en un solo round trip
+            lines = min(len(available_agents), self.trunk_capacity(campaign_id))
+            contacts = await self.get_next_contacts(campaign_id, lines)
+            await self.originate_batch(campaign_id, list(zip(contacts, available_agents)))
             
-            # Esperar antes del siguiente ciclo
-            await asyncio.sleep(2)
+            # Esperar a que un agente quede libre o termine una llamada
+            await self.roster.wait(campaign_id)
         
+        self.roster.forget(campaign_id)
+        self.active_campaigns.pop(campaign_id, None)
         logger.info(f"Progressive dialer detenido para campaña {campaign_id}")
         
     async def predictive_dialer_loop(self, campaign_id: int):
@@ -201,28 +425,25 @@ class DialerEngine:
             num_agents = len(available_agents)
             
             if num_agents == 0:
-                await asyncio.sleep(1)
+                await self.roster.wait(campaign_id)
                 continue
             
-            # Calcular ratio de discado predictivo
-            current_ratio = await self.calculate_predictive_ratio(campaign_id)
-            calls_to_make = int(num_agents * current_ratio)
+            # Calcular líneas a marcar según el pacing de la campaña
+            pacer = self.pacing.get(campaign_id, campaign['config'])
+            calls_to_make = pacer.lines_to_dial(num_agents)
             
-            # Obtener contactos
-            for _ in range(calls_to_make):
-                contact = await self.get_next_contact(campaign_id)
-                
-                if contact:
-                    await self.originate_call(
-                        campaign_id=campaign_id,
-                        contact=contact,
-                        agent=None  # Se asigna cuando contesta
-                    )
-                    campaign['calls_made'] += 1
+            calls_to_make = min(calls_to_make, self.trunk_capacity(campaign_id))
             
-            # Esperar antes del siguiente ciclo
-            await asyncio.sleep(1)
+            # Obtener contactos y originar en paralelo (el agente se asigna cuando contesta)
+            contacts = await self.get_next_contacts(campaign_id, calls_to_make)
+            await self.originate_batch(campaign_id, [(contact, None) for contact in contacts])
+            
+            # Esperar cambios de agentes o fin de llamadas
+            await self.roster.wait(campaign_id)
         
+        self.roster.forget(campaign_id)
+        self.pacing.remove(campaign_id)
+        self.active_campaigns.pop(campaign_id, None)
         logger.info(f"Predictive dialer detenido para campaña {campaign_id}")
         
     async def preview_dialer_loop(self, campaign_id: int):
@@ -242,7 +463,7 @@ class DialerEngine:
 
             available_agents = await self.get_available_agents(campaign_id)
             if not available_agents:
-                await asyncio.sleep(2)
+                await self.roster.wait(campaign_id)
                 continue
 
             for agent in available_agents:
@@ -257,20 +478,18 @@ class DialerEngine:
                     if accepted:
                         contact = json.loads(already_assigned)
                         await self.redis_client.delete(assigned_key, f'{assigned_key}:accepted')
-                        try:
-                            await self.originate_call(campaign_id=campaign_id, contact=contact, agent=agent)
-                            campaign['calls_made'] += 1
-                        except Exception as e:
-                            logger.error(f"Preview originate failed: {e}")
+                        await self.originate_batch(campaign_id, [(contact, agent)])
                     elif rejected:
                         await self.redis_client.delete(assigned_key, f'{assigned_key}:rejected')
                         logger.info(f"Preview: agente {agent_id} rechazó contacto")
+                        self._drop_contact(campaign_id, json.loads(already_assigned), 'rejected')
                     else:
                         # Verificar timeout del preview
                         assigned_ts = float(await self.redis_client.get(f'{assigned_key}:ts') or 0)
                         if assigned_ts and (datetime.now().timestamp() - assigned_ts) > timeout_secs:
                             logger.info(f"Preview timeout para agente {agent_id}")
                             await self.redis_client.delete(assigned_key, f'{assigned_key}:ts')
+                            self._drop_contact(campaign_id, json.loads(already_assigned), 'preview_timeout')
                     continue
 
                 # Obtener siguiente contacto y asignarlo al agente
@@ -291,49 +510,153 @@ class DialerEngine:
                 }))
                 logger.info(f"Preview: contacto asignado a agente {agent_id}")
 
-            await asyncio.sleep(1)
+            # Las respuestas del agente (accepted/rejected) se revisan cada segundo
+            await self.roster.wait(campaign_id, timeout=1)
 
+        self.roster.forget(campaign_id)
+        self.active_campaigns.pop(campaign_id, None)
         logger.info(f"Preview dialer detenido para campaña {campaign_id}")
 
     async def call_blasting_loop(self, campaign_id: int):
         """
         CALL BLASTING: Discado masivo sin agentes
-        Reproduce mensaje grabado
+        Reproduce mensaje grabado.
+        
+        Ventana deslizante: se mantienen `max_concurrent_calls` llamadas en curso
+        y cada llamada que termina libera lugar para la siguiente. Los contactos
+        se leen del hopper por páginas, por lo que la memoria no depende del
+        tamaño de la lista. El progreso se persiste en campaign:{id}:blast:progress
+        y al pausar los contactos leídos pero no marcados vuelven al hopper,
+        de modo que un nuevo 'start' reanuda donde quedó.
         """
         logger.info(f"Iniciando call blasting para campaña {campaign_id}")
         campaign = self.active_campaigns[campaign_id]
         config = campaign['config']
         
-        # Obtener todos los contactos
-        contacts = await self.get_all_contacts(campaign_id)
-        
         # Configuración de concurrencia
         max_concurrent = config.get('max_concurrent_calls', 50)
-        batch_delay = config.get('batch_delay', 5)  # segundos entre lotes
+        page_size = config.get('blast_page_size', max_concurrent)
+        hopper = self.get_hopper(campaign_id)
+        progress_key = f'campaign:{campaign_id}:blast:progress'
         
-        # Dividir en lotes
-        batches = [contacts[i:i + max_concurrent] for i in range(0, len(contacts), max_concurrent)]
+        progress = await self.redis_client.hgetall(progress_key)
+        dialed = int(progress.get('dialed', 0))
+        await self.redis_client.hset(progress_key, mapping={
+            'state': 'running',
+            'resumed_at': datetime.now().isoformat(),
+        })
         
-        for batch in batches:
+        window = asyncio.Semaphore(max_concurrent)
+        page = deque()
+        in_flight = set()
+        
+        while not campaign.get('stopped'):
+            if not page:
+                page.extend(await hopper.claim(page_size, zones=await self.open_zones(campaign_id)))
+                if not page:
+                    size = await hopper.size()
+                    if size['total'] == 0 and not in_flight:
+                        break
+                    # Contactos programados, zonas fuera de horario o llamadas en curso: esperar
+                    await asyncio.sleep(1)
+                    continue
+                
+                await self.redis_client.hset(progress_key, mapping={
+                    'dialed': dialed,
+                    'last_contact_id': page[-1].get('id', ''),
+                })
+            
+            # Esperar un lugar libre en la ventana
+            await window.acquire()
             if campaign.get('stopped'):
+                window.release()
                 break
             
-            # Originar llamadas del lote
-            tasks = []
-            for contact in batch:
-                task = self.originate_call_blasting(campaign_id, contact, config)
-                tasks.append(task)
-            
-            await asyncio.gather(*tasks)
-            campaign['calls_made'] += len(batch)
-            
-            # Esperar antes del siguiente lote
-            await asyncio.sleep(batch_delay)
+            contact = page.popleft()
+            task = asyncio.create_task(self._blast_one(campaign_id, contact, config, window))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            dialed += 1
+        
+        if campaign.get('stopped'):
+            # Devolver al hopper los contactos leídos que no se marcaron
+            if page:
+                await hopper.add(list(page), vip_boost=config.get('vip_priority_boost', 10))
+            state = 'paused'
+        else:
+            state = 'completed'
+            # Nada más que discar: que ninguna instancia la vuelva a tomar
+            await self.leases.unwant(campaign_id)
+        
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        await self.redis_client.hset(progress_key, mapping={'dialed': dialed, 'state': state})
+        
+        self.active_campaigns.pop(campaign_id, None)
+        logger.info(f"Call blasting {state} para campaña {campaign_id} ({dialed} marcados)")
+        
+    async def _blast_one(self, campaign_id: int, contact: Dict, config: Dict,
+                         window: asyncio.Semaphore):
+        """Originar un mensaje y mantener ocupado su lugar en la ventana hasta que termine"""
+        try:
+            done = await self.originate_call_blasting(campaign_id, contact, config)
+            if done is not None:
+                campaign = self.active_campaigns.get(campaign_id)
+                if campaign:
+                    campaign['calls_made'] += 1
+                max_duration = config.get('blast_max_call_seconds', 600)
+                try:
+                    await asyncio.wait_for(asyncio.shield(done), timeout=max_duration)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Call blasting: llamada a {contact.get('phone_number')} sin hangup")
+        finally:
+            window.release()
         
-        logger.info(f"Call blasting completado para campaña {campaign_id}")
+    def trunk_capacity(self, campaign_id: int) -> int:
+        """Canales libres en la troncal de la campaña"""
+        config = self.active_campaigns[campaign_id]['config']
+        return self.dispatcher.trunk_capacity(
+            config.get('trunk', 'default_trunk'),
+            config.get('trunk_max_channels')
+        )
+        
+    async def originate_batch(self, campaign_id: int, pairs: List):
+        """
+        Originar varias llamadas concurrentemente.
+        pairs: lista de (contacto, agente|None). Los contactos que no se pudieron
+        originar por falta de canales vuelven al hopper; los que fallaron por
+        otro motivo se cierran como 'failed'.
+        """
+        if not pairs:
+            return 0
+        campaign = self.active_campaigns[campaign_id]
+        results = await asyncio.gather(
+            *(self.originate_call(campaign_id=campaign_id, contact=contact, agent=agent)
+              for contact, agent in pairs),
+            return_exceptions=True
+        )
+        originated = 0
+        for (contact, _agent), result in zip(pairs, results):
+            if isinstance(result, TrunkCapacityError):
+                await self.get_hopper(campaign_id).reschedule(
+                    contact,
+                    eligible_at=datetime.now().timestamp(),
+                    vip_boost=campaign['config'].get('vip_priority_boost', 10)
+                )
+            elif isinstance(result, Exception):
+                logger.error(f"Error originando llamada a {contact.get('phone_number')}: {result}")
+                self._drop_contact(campaign_id, contact, 'failed')
+            else:
+                originated += 1
+        campaign['calls_made'] += originated
+        return originated
         
     async def originate_call(self, campaign_id: int, contact: Dict, agent: Optional[Dict] = None):
-        """Originar llamada usando Asterisk AMI"""
+        """
+        Originar llamada usando Asterisk AMI.
+        Retorna al recibir el ack de Asterisk; el resultado (contestada, ocupado,
+        no contesta) se procesa al llegar el OriginateResponse con el mismo ActionID.
+        """
         if not contact or 'phone_number' not in contact:
             raise InvalidContactError(f"Invalid contact data: {contact}")
         
@@ -365,7 +688,6 @@ class DialerEngine:
                     'Priority': '1',
                     'CallerID': caller_id,
                     'Timeout': '30000',
-                    'Async': 'true',
                 }
             else:
                 # Predictivo: llamar directamente al contacto y encolarlo.
@@ -380,53 +702,49 @@ class DialerEngine:
                     'Priority': '1',
                     'CallerID': caller_id,
                     'Timeout': '30000',
-                    'Async': 'true',
                 }
             
             # Añadir variables al action — panoramisk acepta múltiples 'Variable' como lista
             # o como string concatenado. Usar lista garantiza headers separados en AMI.
             originate_action['Variable'] = [f'{k}={v}' for k, v in variables.items()]
             
-            # Originar llamada vía AMI
-            response = await self.ami_client.send_action(originate_action)
+            # Originar llamada vía AMI (concurrente, acotado por troncal y CPS)
+            call_id, response_future = await self.dispatcher.originate(
+                originate_action,
+                trunk=trunk,
+                max_channels=config.get('trunk_max_channels'),
+                cps=config.get('calls_per_second'),
+                bucket_key=campaign_id
+            )
             
-            # panoramisk Message: el header de respuesta es 'Response' (capitalizado)
-            ami_response = getattr(response, 'Response', '') or ''
-            if str(ami_response).lower() == 'success':
-                call_id = getattr(response, 'ActionID', None) or str(datetime.now().timestamp())
-                uniqueid = getattr(response, 'Uniqueid', call_id) or call_id
-                
-                self.active_calls[call_id] = {
-                    'campaign_id': campaign_id,
-                    'contact': contact,
-                    'agent': agent,
-                    'status': CallStatus.DIALING.value,
-                    'started_at': datetime.now(),
-                    'uniqueid': uniqueid
-                }
-                
-                # Guardar en Redis con múltiples referencias para búsqueda
-                await self.redis_client.setex(
-                    f'call:{call_id}',
-                    3600,
-                    json.dumps(self.active_calls[call_id], default=str)
-                )
-                
-                # Guardar referencias para mapeo en eventos
-                channel_name = f'PJSIP/{trunk}/{destination}'
-                await self.redis_client.setex(f'channel:{channel_name}:call_id', 3600, call_id)
-                await self.redis_client.setex(f'uniqueid:{uniqueid}:call_id', 3600, call_id)
-                
-                logger.info(f"Llamada originada: {call_id} -> {destination} (uniqueid: {uniqueid})")
-            else:
-                error_msg = f"AMI originate failed: {response}"
-                logger.error(error_msg)
-                raise CallOriginationError(error_msg)
+            self.active_calls[call_id] = {
+                'campaign_id': campaign_id,
+                'contact': contact,
+                'agent': agent,
+                'status': CallStatus.DIALING.value,
+                'started_at': datetime.now(),
+                'uniqueid': None
+            }
+            self.call_index.bind(call_id, uniqueid=call_id)
+            self.pacing.get(campaign_id, config).record_dial(call_id)
+            
+            await self.redis_client.setex(
+                f'call:{call_id}',
+                3600,
+                json.dumps(self.active_calls[call_id], default=str)
+            )
+            asyncio.create_task(self._track_originate_response(call_id, response_future))
+            
+            logger.info(f"Llamada originada: {call_id} -> {destination}")
+            return call_id
                 
         except InvalidContactError:
             raise
-        except CallOriginationError:
+        except TrunkCapacityError:
             raise
+        except OriginationRejected as e:
+            logger.error(str(e))
+            raise CallOriginationError(str(e))
         except KeyError as e:
             error_msg = f"Missing campaign configuration: {e}"
             logger.error(error_msg)
@@ -436,8 +754,55 @@ class DialerEngine:
             logger.exception(error_msg)
             raise CallOriginationError(error_msg)
             
-    async def originate_call_blasting(self, campaign_id: int, contact: Dict, config: Dict):
-        """Originar llamada para call blasting (sin agente)"""
+    async def _track_originate_response(self, call_id: str, response_future: asyncio.Future):
+        """Procesar el OriginateResponse correlacionado por ActionID"""
+        try:
+            event = await response_future
+        except Exception as e:
+            event = {'Response': 'Failure', 'Reason': '', 'error': str(e)}
+        
+        call_data = self.active_calls.get(call_id)
+        if not call_data:
+            return
+        
+        if str(event.get('Response', '')).lower() == 'success':
+            uniqueid = event.get('Uniqueid')
+            channel = event.get('Channel')
+            call_data['uniqueid'] = uniqueid
+            call_data['channel'] = channel
+            self.call_index.bind(call_id, uniqueid=uniqueid, channel=channel)
+            if call_data.get('mode') == CampaignType.CALL_BLASTING.value:
+                # Sin agente: contestar el mensaje cuenta como atendida
+                call_data['status'] = CallStatus.ANSWERED.value
+            return
+        
+        # La llamada no se estableció: no habrá Hangup que la cierre
+        reason = ORIGINATE_REASONS.get(str(event.get('Reason', '')), 'failed')
+        campaign_id = call_data['campaign_id']
+        campaign = self.active_campaigns.get(campaign_id)
+        if campaign:
+            self.pacing.get(campaign_id, campaign['config']).record_end(call_id, answered=False)
+        self._finish_call(call_id)
+        self.call_index.forget(call_id)
+        self.active_calls.pop(call_id, None)
+        
+        self.completions.complete({
+            'call_id': call_id,
+            'campaign_id': campaign_id,
+            'contact': call_data.get('contact'),
+            'agent': call_data.get('agent'),
+            'status': reason,
+            'started_at': str(call_data.get('started_at')),
+            'ended_at': str(datetime.now()),
+        }, delete=[f'call:{call_id}'])
+        logger.info(f"Llamada {call_id} no establecida ({reason})")
+            
+    async def originate_call_blasting(self, campaign_id: int, contact: Dict,
+                                      config: Dict) -> Optional[asyncio.Future]:
+        """
+        Originar llamada para call blasting (sin agente).
+        Retorna un future que se resuelve cuando la llamada termina.
+        """
         try:
             trunk = config.get('trunk', 'default_trunk')
             destination = contact['phone_number']
@@ -445,60 +810,89 @@ class DialerEngine:
             audio_file = config.get('audio_file', 'welcome')
             
             # Originar y reproducir mensaje
-            response = await self.ami_client.send_action({
-                'Action': 'Originate',
-                'Channel': f'PJSIP/{trunk}/{destination}',
-                'Application': 'Playback',
-                'Data': audio_file,
-                'CallerID': caller_id,
-                'Timeout': '30000',
-                'Async': 'true',
-                'Variable': f'CAMPAIGN_ID={campaign_id},CONTACT_ID={contact["id"]}'
-            })
-            
-            ami_response = getattr(response, 'Response', '') or ''
-            if str(ami_response).lower() == 'success':
-                logger.info(f"Call blasting originado: {destination}")
-            else:
-                logger.error(f"Error en call blasting: {response}")
+            call_id, response_future = await self.dispatcher.originate(
+                {
+                    'Action': 'Originate',
+                    'Channel': f'PJSIP/{trunk}/{destination}',
+                    'Application': 'Playback',
+                    'Data': audio_file,
+                    'CallerID': caller_id,
+                    'Timeout': '30000',
+                    'Variable': [f'CAMPAIGN_ID={campaign_id}', f'CONTACT_ID={contact["id"]}'],
+                },
+                trunk=trunk,
+                max_channels=config.get('trunk_max_channels'),
+                cps=config.get('calls_per_second'),
+                bucket_key=campaign_id
+            )
+            
+            self.active_calls[call_id] = {
+                'campaign_id': campaign_id,
+                'contact': contact,
+                'agent': None,
+                'mode': CampaignType.CALL_BLASTING.value,
+                'status': CallStatus.DIALING.value,
+                'started_at': datetime.now(),
+                'uniqueid': None
+            }
+            self.call_index.bind(call_id, uniqueid=call_id)
+            done = asyncio.get_running_loop().create_future()
+            self.call_done[call_id] = done
+            asyncio.create_task(self._track_originate_response(call_id, response_future))
+            
+            logger.info(f"Call blasting originado: {destination}")
+            return done
                 
+        except TrunkCapacityError:
+            await self.get_hopper(campaign_id).reschedule(
+                contact,
+                eligible_at=datetime.now().timestamp(),
+                vip_boost=config.get('vip_priority_boost', 10)
+            )
+            return None
         except Exception as e:
             logger.error(f"Error en call blasting: {e}")
+            self._drop_contact(campaign_id, contact, 'failed')
+            return None
+            
+    def _drop_contact(self, campaign_id: int, contact: Dict, status: str):
+        """
+        Cerrar un contacto reclamado del hopper que no se llegó a marcar.
+        Sin este cierre quedaría 'queued' en el backend (ver apply_completions).
+        """
+        self.completions.complete({
+            'call_id': None,
+            'campaign_id': campaign_id,
+            'contact': contact,
+            'agent': None,
+            'status': status,
+            'ended_at': str(datetime.now()),
+        })
+            
+    def _finish_call(self, call_id: str):
+        """Marcar la llamada como terminada para quien espere su fin"""
+        call_data = self.active_calls.get(call_id)
+        if call_data:
+            # Una línea o un agente se liberó: el loop de la campaña puede discar
+            self.roster.wake(call_data['campaign_id'])
+        done = self.call_done.pop(call_id, None)
+        if done is not None and not done.done():
+            done.set_result(True)
             
     async def calculate_predictive_ratio(self, campaign_id: int) -> float:
         """
-        Calcular ratio de discado predictivo basado en estadísticas
-        Objetivo: Maximizar contactos mientras se minimiza abandono
+        Ratio de discado predictivo de la campaña.
+        Se ajusta con la tasa de abandono de la ventana deslizante del pacer
+        de esa campaña, sin afectar a otras campañas activas.
         """
         campaign = self.active_campaigns[campaign_id]
+        pacer = self.pacing.get(campaign_id, campaign['config'])
+        current_ratio = pacer.adjust_ratio()
         
-        calls_made = campaign['calls_made']
-        calls_answered = campaign['calls_answered']
-        calls_abandoned = campaign['calls_abandoned']
-        
-        if calls_made == 0:
-            return 1.5  # Ratio inicial conservador
-        
-        # Calcular tasa de éxito
-        answer_rate = calls_answered / calls_made if calls_made > 0 else 0.3
-        
-        # Calcular tasa de abandono
-        abandon_rate = calls_abandoned / calls_answered if calls_answered > 0 else 0
-        
-        # Ajustar ratio basado en tasa de abandono
-        current_ratio = self.predictive_ratio
-        
-        if abandon_rate > self.abandon_rate_target:
-            # Demasiado abandono, reducir ratio
-            current_ratio = max(1.0, current_ratio - 0.1)
-        elif abandon_rate < self.abandon_rate_target * 0.5:
-            # Abandono muy bajo, podemos aumentar
-            current_ratio = min(3.0, current_ratio + 0.1)
-        
-        # Actualizar ratio
-        self.predictive_ratio = current_ratio
-        
-        logger.debug(f"Predictive ratio: {current_ratio:.2f} (answer: {answer_rate:.2%}, abandon: {abandon_rate:.2%})")
+        logger.debug(
+            f"Predictive ratio campaña {campaign_id}: {current_ratio:.2f} "
+            f"(answer: {pacer.answer_rate:.2%}, abandon: {pacer.abandon_rate:.2%})"
+        )
         
         return current_ratio
         
@@ -508,112 +902,102 @@ class DialerEngine:
         return json.loads(config) if config else None
         
     async def get_available_agents(self, campaign_id: int) -> List[Dict]:
-        """Obtener agentes disponibles para la campaña"""
-        agents_key = f'campaign:{campaign_id}:agents:available'
-        agent_ids = await self.redis_client.smembers(agents_key)
-        
-        agents = []
-        for agent_id in agent_ids:
-            agent_data = await self.redis_client.get(f'agent:{agent_id}')
-            if agent_data:
-                agents.append(json.loads(agent_data))
-        
-        return agents
+        """Obtener agentes disponibles para la campaña (roster local)"""
+        return await self.roster.available(campaign_id)
         
+    def get_hopper(self, campaign_id: int) -> ContactHopper:
+        """Obtener (o crear) el hopper de contactos de la campaña"""
+        hopper = self.hoppers.get(campaign_id)
+        if hopper is None:
+            config = self.active_campaigns.get(campaign_id, {}).get('config', {})
+            hopper = ContactHopper(
+                self.redis_client, campaign_id,
+                default_zone=config.get('timezone') or 'America/Bogota'
+            )
+            self.hoppers[campaign_id] = hopper
+        return hopper
+
     async def get_next_contact(self, campaign_id: int) -> Optional[Dict]:
+        """Obtener siguiente contacto de la campaña"""
+        contacts = await self.get_next_contacts(campaign_id, 1)
+        return contacts[0] if contacts else None
+
+    async def get_next_contacts(self, campaign_id: int, count: int) -> List[Dict]:
         """
-        Obtener siguiente contacto de la campaña.
-        Aplica filtros DNC, timezone y prioridad VIP antes de retornar.
+        Reclamar hasta `count` contactos elegibles del hopper de la campaña.
+        El hopper ya entrega los contactos ordenados por prioridad (con boost VIP).
+        Sólo se leen los buckets de zonas horarias con la ventana de llamada
+        abierta; los contactos de zonas cerradas permanecen en el hopper.
+        Aplica filtro DNC.
         Soporta reintentos multi-número: intenta phone_number, luego phone_2, phone_3.
         """
-        config = self.active_campaigns.get(campaign_id, {}).get('config', {})
+        campaign = self.active_campaigns.get(campaign_id, {})
+        config = campaign.get('config', {})
         dnc_enabled = config.get('dnc_enabled', True)
-        campaign_tz = config.get('timezone', 'America/Bogota')
-        vip_boost = config.get('vip_priority_boost', 10)
-
-        # Intentar hasta 10 contactos hasta encontrar uno válido
-        for _ in range(10):
-            contact_data = await self.redis_client.lpop(f'campaign:{campaign_id}:contacts:pending')
-            if not contact_data:
-                return None
-
-            contact = json.loads(contact_data)
-
-            # Determinar qué número usar (multi-number retry)
-            phone_fields = ['phone_number', 'phone_2', 'phone_3']
-            retry_index = contact.get('_retry_phone_index', 0)
-            phone = None
-            for idx in range(retry_index, len(phone_fields)):
-                candidate = contact.get(phone_fields[idx], '').strip()
-                if candidate:
-                    phone = candidate
-                    contact['phone_number'] = phone  # normalizar para originate_call
-                    contact['_retry_phone_index'] = idx
-                    break
+        hopper = self.get_hopper(campaign_id)
 
-            if not phone:
-                logger.info(f"Contacto {contact.get('id')} sin números disponibles, descartando")
-                continue
+        open_zones = await self.open_zones(campaign_id)
+        if not open_zones:
+            return []
 
-            # 1) Filtro DNC: verificar lista negra y opt-out
-            if dnc_enabled and await self._is_dnc_blocked(phone):
-                logger.info(f"DNC: saltando contacto {phone} (lista negra/opt-out)")
-                await self._mark_contact_dnc(contact, campaign_id)
-                continue
+        result = []
+        # Reintentar unas pocas rondas si los filtros descartan contactos
+        for _ in range(3):
+            needed = count - len(result)
+            if needed <= 0:
+                break
+            claimed = await hopper.claim(needed, zones=open_zones)
+            if not claimed:
+                break
 
-            # 2) Filtro Timezone: no marcar fuera del horario del contacto
-            contact_tz = contact.get('timezone') or campaign_tz
-            if not self._is_callable_now(contact_tz):
-                logger.info(f"TZ: saltando {phone} — fuera de horario en {contact_tz}")
-                # Re-encolar para el próximo ciclo
-                await self.redis_client.rpush(
-                    f'campaign:{campaign_id}:contacts:pending',
-                    json.dumps(contact)
-                )
-                continue
+            for contact in claimed:
+                # Determinar qué número usar (multi-number retry)
+                phone_fields = ['phone_number', 'phone_2', 'phone_3']
+                retry_index = contact.get('_retry_phone_index', 0)
+                phone = None
+                for idx in range(retry_index, len(phone_fields)):
+                    candidate = (contact.get(phone_fields[idx]) or '').strip()
+                    if candidate:
+                        phone = candidate
+                        contact['phone_number'] = phone  # normalizar para originate_call
+                        contact['_retry_phone_index'] = idx
+                        break
+
+                if not phone:
+                    logger.info(f"Contacto {contact.get('id')} sin números disponibles, descartando")
+                    self._drop_contact(campaign_id, contact, 'no_phone')
+                    continue
 
-            # 3) VIP boost: si es VIP, subir prioridad (ya se usa al cargar contactos)
-            if contact.get('is_vip'):
-                contact['priority'] = (contact.get('priority', 0) or 0) + vip_boost
+                # Filtro DNC: verificar lista negra y opt-out
+                if dnc_enabled and await self._is_dnc_blocked(phone):
+                    logger.info(f"DNC: saltando contacto {phone} (lista negra/opt-out)")
+                    await self._mark_contact_dnc(contact, campaign_id)
+                    self._drop_contact(campaign_id, contact, 'dnc')
+                    continue
+
+                result.append(contact)
 
-            return contact
+        return result
 
-        return None
+    async def open_zones(self, campaign_id: int) -> List[str]:
+        """Zonas horarias del hopper con la ventana de llamada abierta ahora"""
+        schedule = self.active_campaigns.get(campaign_id, {}).get('schedule')
+        zones = await self.get_hopper(campaign_id).zones()
+        if schedule is None:
+            return zones
+        return schedule.open_zones(zones)
 
     async def _is_dnc_blocked(self, phone: str) -> bool:
         """
-        Verifica si el número está en la lista negra (Redis cache de DNC).
-        Cache TTL = 5 minutos para no golpear la DB en cada llamada.
+        Verifica si el número está en la lista negra o tiene opt-out.
+        Consulta el filtro DNC en memoria (snapshot + deltas por Redis).
         """
         if not phone:
             return False
-        phone_clean = phone.replace('+', '').replace(' ', '').replace('-', '')
-        cache_key = f'dnc:{phone_clean[-10:]}'
-        cached = await self.redis_client.get(cache_key)
-        if cached is not None:
-            return cached == '1'
-
-        # Verificar en la DB via HTTP al backend (evita importar Django en el dialer)
-        try:
-            import aiohttp
-            backend_url = os.getenv('BACKEND_URL', 'http://backend:8000')
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f'{backend_url}/api/cc/dnc-check/',
-                    json={'phone': phone},
-                    headers={'Authorization': f"Bearer {os.getenv('DIALER_API_TOKEN', '')}"},
-                    timeout=aiohttp.ClientTimeout(total=3),
-                ) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        blocked = data.get('blocked', False)
-                        await self.redis_client.setex(cache_key, 300, '1' if blocked else '0')
-                        return blocked
-        except Exception as e:
-            logger.warning(f"DNC check failed for {phone}: {e}")
-        # En caso de error, no bloquear
-        await self.redis_client.setex(cache_key, 60, '0')
-        return False
+        if not self.dnc.loaded:
+            # Snapshot aún no disponible: no bloquear
+            return False
+        return phone in self.dnc
 
     async def _mark_contact_dnc(self, contact: Dict, campaign_id: int):
         """Publicar evento de contacto bloqueado por DNC."""
@@ -624,37 +1008,19 @@ class DialerEngine:
             'phone': contact.get('phone'),
         }))
 
-    def _is_callable_now(self, timezone_str: str) -> bool:
-        """
-        Verifica si es horario de llamada válido para la zona horaria dada.
-        Horas permitidas: 8:00 AM – 8:00 PM de lunes a sábado.
-        """
-        try:
-            tz = ZoneInfo(timezone_str) if timezone_str else ZoneInfo('America/Bogota')
-        except (ZoneInfoNotFoundError, Exception):
-            try:
-                tz = pytz.timezone(timezone_str)
-            except Exception:
-                tz = pytz.timezone('America/Bogota')
-
-        now_local = datetime.now(tz)
-        hour = now_local.hour
-        weekday = now_local.weekday()  # 0=Lunes, 6=Domingo
-
-        # No llamar domingos (6) ni fuera de 8-20
-        if weekday == 6:
-            return False
-        return 8 <= hour < 20
-        
-    async def get_all_contacts(self, campaign_id: int) -> List[Dict]:
-        """Obtener todos los contactos de la campaña (para call blasting)"""
-        contact_list = await self.redis_client.lrange(f'campaign:{campaign_id}:contacts:pending', 0, -1)
-        return [json.loads(c) for c in contact_list]
-        
     # Event Handlers
     async def on_new_channel(self, manager, event):
-        """Manejar evento de nuevo canal"""
-        logger.debug(f"Nuevo canal: {event.get('Channel')}")
+        """Asociar nombre de canal y linkedid a la llamada originada (Uniqueid = ChannelId)"""
+        uniqueid = event.get('Uniqueid')
+        call_id = self.call_index.by_uniqueid(uniqueid)
+        if call_id is None:
+            return
+        channel = event.get('Channel')
+        self.call_index.bind(call_id, channel=channel, linkedid=event.get('Linkedid'))
+        call_data = self.active_calls.get(call_id)
+        if call_data is not None:
+            call_data['channel'] = channel
+        logger.debug(f"Nuevo canal: {channel} ({call_id})")
         
     async def on_hangup(self, manager, event):
         """Manejar evento de cuelgue"""
@@ -663,19 +1029,27 @@ class DialerEngine:
         cause = event.get('Cause')
         cause_txt = event.get('Cause-txt', '')
         
-        logger.info(f"Hangup: {channel} - Causa: {cause} ({cause_txt})")
-        
-        # Buscar call_id por uniqueid o channel
-        call_id = await self.redis_client.get(f'channel:{channel}:call_id')
+        # Sólo el canal originado cierra la llamada; canales de agentes o de
+        # otras instancias no están en el índice
+        call_id = self.call_index.lookup(uniqueid, channel)
         if not call_id:
-            call_id = await self.redis_client.get(f'uniqueid:{uniqueid}:call_id')
+            logger.debug(f"Hangup sin llamada asociada: {channel} ({uniqueid})")
+            return
         
-        if not call_id:
-            logger.warning(f"No call_id found for channel {channel} or uniqueid {uniqueid}")
+        call_data = self.active_calls.get(call_id)
+        if call_data is not None and not call_data.get('uniqueid'):
+            # Sin OriginateResponse todavía: la originación falló y la cierra
+            # _track_originate_response con el motivo real
             return
         
+        logger.info(f"Hangup: {channel} - Causa: {cause} ({cause_txt})")
+        
+        self.dispatcher.release(call_id)
+        self._finish_call(call_id)
+        self.call_index.forget(call_id)
+        
         if call_id not in self.active_calls:
-            logger.warning(f"Call {call_id} not in active_calls")
+            logger.debug(f"Call {call_id} not in active_calls")
             return
         
         call_data = self.active_calls[call_id]
@@ -688,19 +1062,30 @@ class DialerEngine:
         
         campaign = self.active_campaigns[campaign_id]
         
+        if (call_data.get('agent') and call_data.get('status') == CallStatus.DIALING.value
+                and 'dial_status' not in call_data and cause == '16'):
+            # Progresivo/preview sin DialEnd (filtrado en AMI): el canal del
+            # agente contestó (OriginateResponse) y cerró con Normal Clearing
+            call_data['status'] = CallStatus.ANSWERED.value
+            
         # Actualizar estadísticas según la causa del hangup
         # Causas normales: 16 (Normal Clearing), 17 (User busy)
         # Causas de no respuesta: 19 (No answer), 21 (Call rejected)
+        pacer = self.pacing.get(campaign_id, campaign['config'])
         if cause in ['16', '17']:  # Normal clearing o busy
             if call_data.get('status') == CallStatus.ANSWERED.value:
                 campaign['calls_answered'] += 1
+                pacer.record_end(call_id, answered=True)
                 logger.info(f"Call {call_id} answered and completed normally")
             else:
                 campaign['calls_abandoned'] += 1
+                pacer.record_end(call_id, answered=False, abandoned=True)
                 logger.info(f"Call {call_id} abandoned (cause: {cause})")
         elif cause in ['19', '21']:  # No answer o rejected
+            pacer.record_end(call_id, answered=False)
             logger.info(f"Call {call_id} not answered (cause: {cause})")
         else:
+            pacer.record_end(call_id, answered=False)
             logger.info(f"Call {call_id} ended with cause: {cause}")
         
         # Guardar registro de llamada en Redis para procesamiento posterior
@@ -718,26 +1103,20 @@ class DialerEngine:
             'uniqueid': uniqueid
         }
         
-        # Guardar en cola de procesamiento
-        await self.redis_client.rpush(
-            'calls:completed',
-            json.dumps(call_record, default=str)
-        )
-        
-        # Actualizar estadísticas en Redis
-        await self.redis_client.hset(
-            f'campaign:{campaign_id}:stats',
-            mapping={
+        # Cola de procesamiento, estadísticas y limpieza: se escriben en el
+        # próximo lote (un pipeline para todos los hangups del intervalo)
+        self.completions.complete(
+            call_record,
+            stats_key=f'campaign:{campaign_id}:stats',
+            stats={
                 'calls_made': campaign['calls_made'],
                 'calls_answered': campaign['calls_answered'],
-                'calls_abandoned': campaign['calls_abandoned']
-            }
+                'calls_abandoned': campaign['calls_abandoned'],
+                **pacer.snapshot()
+            },
+            delete=[f'call:{call_id}'],
         )
         
-        # Limpiar referencias
-        await self.redis_client.delete(f'channel:{channel}:call_id')
-        await self.redis_client.delete(f'uniqueid:{uniqueid}:call_id')
-        
         # Remover de llamadas activas
         del self.active_calls[call_id]
         
@@ -748,6 +1127,33 @@ class DialerEngine:
         agent = event.get('Agent')
         logger.info(f"Agente conectado: {agent}")
         
+        # La llamada contestada llegó a un agente: cuenta como atendida
+        call_id = self.call_index.lookup_linked(event.get('Uniqueid'), event.get('Linkedid'))
+        call_data = self.active_calls.get(call_id) if call_id else None
+        if not call_data:
+            return
+        call_data['status'] = CallStatus.ANSWERED.value
+        campaign = self.active_campaigns.get(call_data['campaign_id'])
+        if campaign:
+            self.pacing.get(call_data['campaign_id'], campaign['config']).record_connect(call_id)
+        
+    async def on_dial_end(self, manager, event):
+        """
+        Fin del Dial() al contacto en progresivo/preview: el agente es el canal
+        originado y el contacto lo marca el dialplan, sin cola ni AgentConnect.
+        """
+        call_id = self.call_index.lookup_linked(event.get('Uniqueid'), event.get('Linkedid'))
+        call_data = self.active_calls.get(call_id) if call_id else None
+        if not call_data or not call_data.get('agent'):
+            return
+        dial_status = event.get('DialStatus', '')
+        call_data['dial_status'] = dial_status
+        if dial_status == 'ANSWER' and call_data.get('status') != CallStatus.ANSWERED.value:
+            call_data['status'] = CallStatus.ANSWERED.value
+            campaign = self.active_campaigns.get(call_data['campaign_id'])
+            if campaign:
+                self.pacing.get(call_data['campaign_id'], campaign['config']).record_connect(call_id)
+        
     async def on_agent_complete(self, manager, event):
         """Agente completó llamada"""
         agent = event.get('Agent')
@@ -755,17 +1161,41 @@ class DialerEngine:
         logger.info(f"Agente {agent} completó - Razón: {reason}")
 
 async def main():
-    """Función principal con reconexión automática"""
+    """
+    Función principal con reconexión automática.
+    El estado del dialer (campañas, llamadas en curso) sobrevive a una caída
+    de Redis: sólo se reinician las tareas de fondo. Si la caída dura más que
+    el TTL de los leases, otras instancias retoman las campañas.
+    """
     retry_delay = 5  # segundos entre reintentos
     max_retry_delay = 60
     attempt = 0
+    dialer = DialerEngine()
 
     while True:
-        dialer = DialerEngine()
         try:
             await dialer.initialize()
-            logger.info("Dialer Engine iniciado y listo")
-            attempt = 0  # reiniciar contador de intentos al conectar exitosamente
+            break
+        except KeyboardInterrupt:
+            logger.info("Deteniendo Dialer Engine...")
+            return
+        except Exception as e:
+            attempt += 1
+            logger.error(f"Error en Dialer Engine (intento {attempt}): {e}")
+            retry_delay = min(retry_delay * 2, max_retry_delay)
+            logger.info(f"Reintentando en {retry_delay}s...")
+            await asyncio.sleep(retry_delay)
+
+    logger.info("Dialer Engine iniciado y listo")
+    try:
+        while True:
+            tasks = [
+                asyncio.create_task(dialer.listen_commands()),
+                asyncio.create_task(dialer.dnc.run()),
+                asyncio.create_task(dialer.roster.run()),
+                asyncio.create_task(dialer.coordinate()),
+                asyncio.create_task(dialer.completions.run()),
+            ]
             retry_delay = 5
 
             # Mantener el proceso corriendo, reiniciar si se cae la conexión
@@ -776,17 +1206,22 @@ async def main():
                     await dialer.redis_client.ping()
                 except Exception:
                     logger.error("Redis ping falló — reconectando...")
+                    for task in tasks:
+                        task.cancel()
                     break
 
-        except KeyboardInterrupt:
-            logger.info("Deteniendo Dialer Engine...")
-            return
-        except Exception as e:
-            attempt += 1
-            logger.error(f"Error en Dialer Engine (intento {attempt}): {e}")
-            retry_delay = min(retry_delay * 2, max_retry_delay)
-            logger.info(f"Reintentando en {retry_delay}s...")
-            await asyncio.sleep(retry_delay)
+            while True:
+                await asyncio.sleep(retry_delay)
+                try:
+                    await dialer.redis_client.ping()
+                    logger.info("Redis disponible nuevamente, reanudando")
+                    break
+                except Exception:
+                    retry_delay = min(retry_delay * 2, max_retry_delay)
+                    logger.info(f"Reintentando en {retry_delay}s...")
+    except KeyboardInterrupt:
+        logger.info("Deteniendo Dialer Engine...")
+        await dialer.leases.leave()
 
 if __name__ == '__main__':
     asyncio.run(main())
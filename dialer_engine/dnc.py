@@ -0,0 +1,209 @@
+"""
+Filtro DNC (No Llamar) en memoria del Dialer Engine
+
+- Snapshot completo desde GET /api/cc/dnc-snapshot/ (un número por línea),
+  guardado como array ordenado de enteros de 64 bits (~8 bytes por número)
+- Deltas incrementales por Redis pub/sub en 'dnc:updates'
+  ({op: add|remove, number, version}), ver backend apps/contacts/dnc.py
+- Si se detecta un salto de versión o pasa el intervalo de resync, se vuelve
+  a cargar el snapshot completo
+
+Consultar un número cuesta una búsqueda binaria: nunca bloquea un discado
+esperando al backend.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DNC_UPDATES_CHANNEL = 'dnc:updates'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_number(phone: Optional[str]) -> str:
+    """Últimos 10 dígitos del número (misma regla que el backend)"""
+    return _NON_DIGITS.sub('', phone or '')[-10:]
+
+
+def number_key(number: str) -> int:
+    """Entero que representa el número normalizado conservando ceros a la izquierda"""
+    return int('1' + number)
+
+
+class DNCFilter:
+    """Conjunto de números bloqueados: snapshot ordenado + deltas en sets"""
+
+    def __init__(self, redis_client=None, backend_url: str = None, api_token: str = None,
+                 resync_interval: float = None, compact_threshold: int = None):
+        self.redis = redis_client
+        self.backend_url = backend_url or os.getenv('BACKEND_URL', 'http://backend:8000')
+        self.api_token = api_token if api_token is not None else os.getenv('DIALER_API_TOKEN', '')
+        self.resync_interval = resync_interval or float(os.getenv('DIALER_DNC_RESYNC_INTERVAL', 3600))
+        self.compact_threshold = compact_threshold or int(os.getenv('DIALER_DNC_COMPACT_THRESHOLD', 10000))
+
+        self._numbers = array('Q')
+        self._added = set()
+        self._removed = set()
+        self.version = 0
+        self.loaded = False
+        self.loaded_at = 0.0
+
+        self._loading = False
+        self._buffer: List[Tuple[str, str, int]] = []
+        self._resync_requested = asyncio.Event()
+
+    # ---------- consultas ----------
+
+    def __contains__(self, phone: str) -> bool:
+        number = normalize_number(phone)
+        if not number:
+            return False
+        key = number_key(number)
+        if key in self._removed:
+            return False
+        if key in self._added:
+            return True
+        i = bisect_left(self._numbers, key)
+        return i < len(self._numbers) and self._numbers[i] == key
+
+    def __len__(self) -> int:
+        return len(self._numbers) + len(self._added) - len(self._removed)
+
+    # ---------- snapshot y deltas ----------
+
+    def replace(self, numbers: Iterable[str], version: int):
+        """Reemplazar el contenido completo con un snapshot"""
+        keys = sorted({number_key(n) for n in (normalize_number(x) for x in numbers) if n})
+        self._numbers = array('Q', keys)
+        self._added.clear()
+        self._removed.clear()
+        self.version = version
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def apply(self, op: str, number: str, version: int = 0):
+        """Aplicar un delta add/remove"""
+        number = normalize_number(number)
+        if not number:
+            return
+        key = number_key(number)
+        if op == 'add':
+            self._removed.discard(key)
+            self._added.add(key)
+        elif op == 'remove':
+            self._added.discard(key)
+            self._removed.add(key)
+        else:
+            return
+        if version > self.version:
+            self.version = version
+        if len(self._added) + len(self._removed) >= self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """Fusionar los deltas en el array ordenado"""
+        if not self._added and not self._removed:
+            return
+        removed = self._removed
+        merged = sorted(
+            {k for k in self._numbers if k not in removed}.union(self._added)
+        )
+        self._numbers = array('Q', merged)
+        self._added = set()
+        self._removed = set()
+
+    def on_message(self, data: str):
+        """Procesar un mensaje de 'dnc:updates'"""
+        try:
+            delta = json.loads(data)
+            op, number, version = delta['op'], delta['number'], int(delta.get('version') or 0)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Delta DNC inválido: {e}")
+            return
+        if self._loading:
+            self._buffer.append((op, number, version))
+            return
+        if self.loaded and version and version > self.version + 1:
+            # Se perdieron mensajes (pub/sub no es durable): pedir snapshot completo
+            logger.warning(f"DNC: salto de versión {self.version} -> {version}, resincronizando")
+            self._resync_requested.set()
+        self.apply(op, number, version)
+
+    async def fetch_snapshot(self) -> Tuple[List[str], int]:
+        """Descargar el snapshot del backend"""
+        import aiohttp
+
+        numbers = []
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                f'{self.backend_url}/api/cc/dnc-snapshot/',
+                headers={'Authorization': f'Bearer {self.api_token}'},
+                timeout=aiohttp.ClientTimeout(total=300),
+            ) as resp:
+                resp.raise_for_status()
+                version = int(resp.headers.get('X-DNC-Version') or 0)
+                async for line in resp.content:
+                    line = line.strip()
+                    if line:
+                        numbers.append(line.decode())
+        return numbers, version
+
+    async def load(self) -> bool:
+        """Cargar el snapshot y aplicar los deltas recibidos durante la descarga"""
+        self._loading = True
+        self._buffer = []
+        try:
+            numbers, version = await self.fetch_snapshot()
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el snapshot DNC: {e}")
+            return False
+        finally:
+            self._loading = False
+
+        self.replace(numbers, version)
+        buffered, self._buffer = self._buffer, []
+        for op, number, delta_version in buffered:
+            if delta_version > version:
+                self.apply(op, number, delta_version)
+        logger.info(f"DNC: {len(self)} números cargados (versión {self.version})")
+        return True
+
+    # ---------- ejecución ----------
+
+    async def run(self):
+        """Suscribirse a deltas, cargar el snapshot y resincronizar periódicamente"""
+        pubsub = self.redis.pubsub()
+        # Suscribirse antes de descargar para no perder deltas intermedios
+        await pubsub.subscribe(DNC_UPDATES_CHANNEL)
+        listener = asyncio.create_task(self._listen(pubsub))
+        try:
+            while True:
+                if await self.load():
+                    timeout = self.resync_interval
+                else:
+                    timeout = 30
+                self._resync_requested.clear()
+                try:
+                    await asyncio.wait_for(self._resync_requested.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listener.cancel()
+            try:
+                await pubsub.unsubscribe(DNC_UPDATES_CHANNEL)
+            except Exception:
+                pass
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get('type') == 'message':
+                self.on_message(message['data'])
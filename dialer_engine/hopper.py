@@ -0,0 +1,230 @@
+"""
+Hopper de contactos por campaña sobre Redis sorted sets
+
+Estructura por campaña:
+    campaign:{id}:hopper:ready:{tz}  ZSET  contactos elegibles de la zona horaria, score = rank
+    campaign:{id}:hopper:zones       SET   zonas horarias con bucket ready
+    campaign:{id}:hopper:scheduled   ZSET  contactos aún no elegibles, score = epoch elegible
+    campaign:{id}:hopper:data        HASH  contact_id -> JSON del contacto
+    campaign:{id}:hopper:rank        HASH  contact_id -> rank (para promover scheduled -> ready)
+    campaign:{id}:hopper:zone        HASH  contact_id -> zona horaria del contacto
+
+El rank combina prioridad (con boost VIP) y momento de elegibilidad:
+    rank = -prioridad * 1e10 + epoch_elegible
+de modo que mayor prioridad sale primero y, a igual prioridad, el más antiguo.
+
+Un script Lua promueve los contactos vencidos a su bucket y reclama N contactos
+de los buckets indicados (las zonas con horario abierto, ver schedule.py) en un
+solo round trip, de forma atómica entre múltiples instancias del dialer. Los
+contactos de zonas cerradas no se leen hasta que su ventana abre.
+
+Todas las claves que toca el script (incluidos los buckets de todas las zonas
+conocidas, destino de la promoción) se declaran en KEYS. Aun así las claves de
+una campaña no comparten hash tag, de modo que el hopper requiere Redis de una
+sola instancia (o Sentinel); en Redis Cluster el script fallaría con CROSSSLOT.
+"""
+
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+RANK_PRIORITY_FACTOR = 1e10
+
+# KEYS: scheduled, data, rank, zone, ready:{zona}...
+# ARGV: now, count, promote_limit, n, zona...
+# ARGV[i] es la zona de KEYS[i]; se reclama de los primeros n buckets y los
+# demás sólo reciben contactos promovidos. Un contacto vencido cuya zona no
+# llegó en KEYS sigue en scheduled hasta el próximo claim.
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local count = tonumber(ARGV[2])
+local bucket = {}
+for i = 5, #KEYS do
+    bucket[ARGV[i]] = KEYS[i]
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[3]))
+for _, member in ipairs(due) do
+    local zone = redis.call('HGET', KEYS[4], member)
+    local key = zone and bucket[zone]
+    if key then
+        local rank = redis.call('HGET', KEYS[3], member) or now
+        redis.call('ZADD', key, rank, member)
+        redis.call('ZREM', KEYS[1], member)
+    end
+end
+local candidates = {}
+for i = 5, 4 + tonumber(ARGV[4]) do
+    local head = redis.call('ZRANGE', KEYS[i], 0, count - 1, 'WITHSCORES')
+    for j = 1, #head, 2 do
+        table.insert(candidates, {tonumber(head[j + 1]), head[j], i})
+    end
+end
+table.sort(candidates, function(a, b) return a[1] < b[1] end)
+local out = {}
+for n = 1, math.min(count, #candidates) do
+    local member = candidates[n][2]
+    local index = candidates[n][3]
+    redis.call('ZREM', KEYS[index], member)
+    -- Ignorar entradas de un bucket anterior si el contacto cambió de zona
+    local zone = redis.call('HGET', KEYS[4], member)
+    if zone == false or zone == ARGV[index] then
+        local payload = redis.call('HGET', KEYS[2], member)
+        if payload then
+            table.insert(out, payload)
+        end
+        redis.call('HDEL', KEYS[2], member)
+        redis.call('HDEL', KEYS[3], member)
+        redis.call('HDEL', KEYS[4], member)
+    end
+end
+return out
+"""
+
+
+def hopper_keys(campaign_id) -> Dict[str, str]:
+    base = f'campaign:{campaign_id}:hopper'
+    return {
+        'ready': f'{base}:ready',
+        'zones': f'{base}:zones',
+        'scheduled': f'{base}:scheduled',
+        'data': f'{base}:data',
+        'rank': f'{base}:rank',
+        'zone': f'{base}:zone',
+    }
+
+
+def ready_key(campaign_id, zone: str) -> str:
+    """Bucket de contactos elegibles de una zona horaria"""
+    return f'campaign:{campaign_id}:hopper:ready:{zone}'
+
+
+def contact_rank(contact: Dict, eligible_at: float, vip_boost: int = 0) -> float:
+    """Rank de un contacto: mayor prioridad primero, luego FIFO por elegibilidad"""
+    priority = contact.get('priority', 0) or 0
+    if contact.get('is_vip'):
+        priority += vip_boost
+    return -priority * RANK_PRIORITY_FACTOR + eligible_at
+
+
+class ContactHopper:
+    """Cliente asíncrono del hopper de una campaña"""
+
+    def __init__(self, redis_client, campaign_id, default_zone: str = 'America/Bogota',
+                 promote_limit: int = 500, zones_ttl: float = 30.0):
+        self.redis = redis_client
+        self.campaign_id = campaign_id
+        self.keys = hopper_keys(campaign_id)
+        self.default_zone = default_zone
+        self.promote_limit = promote_limit
+        self.zones_ttl = zones_ttl
+        self._zones = set()
+        self._zones_loaded_at = None
+        self._claim = redis_client.register_script(CLAIM_SCRIPT)
+
+    def zone_of(self, contact: Dict) -> str:
+        return contact.get('timezone') or self.default_zone
+
+    async def zones(self, refresh: bool = False) -> List[str]:
+        """Zonas horarias con bucket (cacheadas; el feeder puede agregar nuevas)"""
+        now = time.monotonic()
+        if (refresh or self._zones_loaded_at is None
+                or now - self._zones_loaded_at >= self.zones_ttl):
+            self._zones = set(await self.redis.smembers(self.keys['zones']))
+            self._zones_loaded_at = now
+        return sorted(self._zones)
+
+    async def claim(self, count: int, zones: Optional[Iterable[str]] = None,
+                    now: Optional[float] = None) -> List[Dict]:
+        """
+        Reclamar hasta `count` contactos elegibles en un round trip.
+        Sólo se leen los buckets de `zones` (por defecto, todas las zonas).
+        """
+        if count <= 0:
+            return []
+        now = time.time() if now is None else now
+        known = await self.zones()
+        zones = list(known if zones is None else zones)
+        # Las zonas cerradas van después: sólo reciben promociones
+        buckets = zones + [zone for zone in known if zone not in zones]
+        payloads = await self._claim(
+            keys=[self.keys['scheduled'], self.keys['data'], self.keys['rank'], self.keys['zone']]
+                 + [ready_key(self.campaign_id, zone) for zone in buckets],
+            args=[now, count, self.promote_limit, len(zones)] + buckets,
+        )
+        return [json.loads(p) for p in payloads]
+
+    async def add(self, contacts: Iterable[Dict], vip_boost: int = 0,
+                  eligible_at: Optional[float] = None, now: Optional[float] = None) -> int:
+        """
+        Agregar (o reemplazar) contactos en el hopper con un solo pipeline.
+        Cada contacto puede traer '_eligible_at' (epoch) para programarlo.
+        """
+        now = time.time() if now is None else now
+        pipe = self.redis.pipeline(transaction=False)
+        added = 0
+        new_zones = set()
+        for contact in contacts:
+            member = str(contact['id'])
+            zone = self.zone_of(contact)
+            when = contact.get('_eligible_at') or eligible_at or now
+            rank = contact_rank(contact, when, vip_boost)
+            pipe.hset(self.keys['data'], member, json.dumps(contact, default=str))
+            pipe.hset(self.keys['rank'], member, rank)
+            pipe.hset(self.keys['zone'], member, zone)
+            if when > now:
+                pipe.zrem(ready_key(self.campaign_id, zone), member)
+                pipe.zadd(self.keys['scheduled'], {member: when})
+            else:
+                pipe.zrem(self.keys['scheduled'], member)
+                pipe.zadd(ready_key(self.campaign_id, zone), {member: rank})
+            if zone not in self._zones:
+                new_zones.add(zone)
+            added += 1
+        if new_zones:
+            pipe.sadd(self.keys['zones'], *new_zones)
+            self._zones.update(new_zones)
+        if added:
+            await pipe.execute()
+        return added
+
+    async def reschedule(self, contact: Dict, eligible_at: float, vip_boost: int = 0):
+        """Devolver un contacto al hopper hasta que vuelva a ser elegible"""
+        await self.add([contact], vip_boost=vip_boost, eligible_at=eligible_at)
+
+    async def size(self, zones: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Contactos en el hopper; 'ready' cuenta sólo las zonas indicadas"""
+        all_zones = await self.zones(refresh=True)
+        zones = all_zones if zones is None else list(zones)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(self.keys['scheduled'])
+        pipe.hlen(self.keys['data'])
+        for zone in zones:
+            pipe.zcard(ready_key(self.campaign_id, zone))
+        scheduled, total, *ready = await pipe.execute()
+        return {'ready': sum(ready), 'scheduled': scheduled, 'total': total}
+
+    async def import_legacy_list(self, list_key: str, vip_boost: int = 0,
+                                 chunk: int = 1000) -> int:
+        """
+        Migrar contactos cargados en la lista legacy campaign:{id}:contacts:pending.
+        Se consume por bloques para no cargar la lista completa en memoria.
+        """
+        moved = 0
+        while True:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.lrange(list_key, 0, chunk - 1)
+            pipe.ltrim(list_key, chunk, -1)
+            items, _ = await pipe.execute()
+            if not items:
+                break
+            moved += await self.add((json.loads(i) for i in items), vip_boost=vip_boost)
+        return moved
+
+    async def clear(self):
+        zones = await self.zones(refresh=True)
+        await self.redis.delete(
+            *(v for k, v in self.keys.items() if k != 'ready'),
+            *(ready_key(self.campaign_id, zone) for zone in zones)
+        )
+        self._zones.clear()
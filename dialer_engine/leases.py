@@ -0,0 +1,172 @@
+"""
+Reparto de campañas entre instancias del Dialer Engine
+
+Claves en Redis:
+    dialer:campaigns             HASH  campañas que deben discar: id -> tipo
+                                       (lo escribe el backend junto con el comando start/stop)
+    dialer:instances             ZSET  instancias vivas, score = último heartbeat (epoch)
+    dialer:lease:{campaign_id}   STRING  instancia dueña de la campaña, con TTL
+    campaign:{id}:checkpoint     HASH  contadores, ratio y llamadas en curso de la campaña
+
+Cada instancia renueva sus leases en cada heartbeat. Si una instancia muere,
+sus leases vencen y las demás toman las campañas en el siguiente rebalanceo,
+retomando desde el último checkpoint. El reparto apunta a ceil(campañas /
+instancias) por instancia; una instancia por encima de su cuota libera una
+campaña por ciclo para que otra la tome.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGNS_KEY = 'dialer:campaigns'
+INSTANCES_KEY = 'dialer:instances'
+CHECKPOINT_TTL = 86400
+
+# KEYS: leases...  ARGV: instance_id, ttl_ms
+# Retorna los índices (1-based) de los leases que ya no pertenecen a la instancia
+RENEW_SCRIPT = """
+local lost = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+    else
+        table.insert(lost, i)
+    end
+end
+return lost
+"""
+
+# KEYS: lease  ARGV: instance_id
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(campaign_id) -> str:
+    return f'dialer:lease:{campaign_id}'
+
+
+def checkpoint_key(campaign_id) -> str:
+    return f'campaign:{campaign_id}:checkpoint'
+
+
+def default_instance_id() -> str:
+    return os.getenv('DIALER_INSTANCE_ID') or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+
+
+class CampaignLeases:
+    """Leases de campañas de una instancia del dialer"""
+
+    def __init__(self, redis_client=None, instance_id: Optional[str] = None,
+                 ttl: float = None, clock=time.time):
+        self.redis = redis_client
+        self.instance_id = instance_id or default_instance_id()
+        self.ttl = ttl or float(os.getenv('DIALER_LEASE_TTL', 15))
+        self._clock = clock
+        self.owned: Set[int] = set()
+
+    def bind(self, redis_client):
+        self.redis = redis_client
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    @property
+    def heartbeat_interval(self) -> float:
+        return self.ttl / 3
+
+    # ---------- instancias ----------
+
+    async def heartbeat(self) -> int:
+        """Registrar la instancia como viva y purgar las caídas. Retorna instancias vivas."""
+        now = self._clock()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(INSTANCES_KEY, {self.instance_id: now})
+        pipe.zremrangebyscore(INSTANCES_KEY, '-inf', now - self.ttl)
+        pipe.zcard(INSTANCES_KEY)
+        _, _, alive = await pipe.execute()
+        return max(1, alive)
+
+    async def leave(self):
+        """Salida ordenada: liberar leases y quitar la instancia"""
+        for campaign_id in list(self.owned):
+            await self.release(campaign_id)
+        await self.redis.zrem(INSTANCES_KEY, self.instance_id)
+
+    # ---------- campañas ----------
+
+    async def wanted(self) -> Dict[int, str]:
+        """Campañas que deben estar discando: id -> tipo"""
+        raw = await self.redis.hgetall(CAMPAIGNS_KEY)
+        return {int(campaign_id): campaign_type for campaign_id, campaign_type in raw.items()}
+
+    async def want(self, campaign_id: int, campaign_type: str):
+        await self.redis.hset(CAMPAIGNS_KEY, campaign_id, campaign_type)
+
+    async def unwant(self, campaign_id: int):
+        await self.redis.hdel(CAMPAIGNS_KEY, campaign_id)
+
+    async def acquire(self, campaign_id: int) -> bool:
+        ok = await self.redis.set(
+            lease_key(campaign_id), self.instance_id, nx=True, px=int(self.ttl * 1000)
+        )
+        if ok:
+            self.owned.add(campaign_id)
+        return bool(ok)
+
+    async def renew(self) -> List[int]:
+        """Renovar los leases propios. Retorna las campañas cuyo lease se perdió."""
+        owned = sorted(self.owned)
+        if not owned:
+            return []
+        lost_indexes = await self._renew(
+            keys=[lease_key(c) for c in owned],
+            args=[self.instance_id, int(self.ttl * 1000)],
+        )
+        lost = [owned[int(i) - 1] for i in lost_indexes]
+        self.owned.difference_update(lost)
+        return lost
+
+    async def release(self, campaign_id: int):
+        self.owned.discard(campaign_id)
+        await self._release(keys=[lease_key(campaign_id)], args=[self.instance_id])
+
+    def quota(self, campaigns: int, instances: int) -> int:
+        return math.ceil(campaigns / max(1, instances)) if campaigns else 0
+
+    # ---------- checkpoints ----------
+
+    async def save_checkpoints(self, checkpoints: Dict[int, Dict]):
+        """Guardar checkpoints de varias campañas en un solo round trip"""
+        if not checkpoints:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for campaign_id, data in checkpoints.items():
+            key = checkpoint_key(campaign_id)
+            pipe.hset(key, mapping={
+                k: v if isinstance(v, (str, int, float)) else json.dumps(v, default=str)
+                for k, v in data.items()
+            })
+            pipe.expire(key, CHECKPOINT_TTL)
+        await pipe.execute()
+
+    async def load_checkpoint(self, campaign_id: int) -> Dict:
+        data = await self.redis.hgetall(checkpoint_key(campaign_id))
+        if data.get('calls'):
+            data['calls'] = json.loads(data['calls'])
+        return data
+
+    async def drop_checkpoints(self, campaign_ids: Iterable[int]):
+        keys = [checkpoint_key(c) for c in campaign_ids]
+        if keys:
+            await self.redis.delete(*keys)
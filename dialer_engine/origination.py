@@ -0,0 +1,191 @@
+"""
+Despachador concurrente de Originate vía AMI
+
+- Cada Originate lleva un ActionID propio; el resultado real de la llamada
+  llega después en el evento OriginateResponse y se correlaciona por ese ID.
+  El mismo ID va como ChannelId, que Asterisk usa de Uniqueid del canal.
+- Un semáforo acota las originaciones en vuelo (enviadas y aún sin
+  OriginateResponse) para no saturar Asterisk.
+- Límite de canales simultáneos por troncal y token bucket de llamadas por
+  segundo configurables por campaña.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Códigos Reason de OriginateResponse
+ORIGINATE_REASONS = {
+    '0': 'failed',
+    '1': 'failed',
+    '3': 'no_answer',
+    '4': 'answered',
+    '5': 'busy',
+    '8': 'congestion',
+}
+
+
+class OriginationRejected(Exception):
+    """Asterisk rechazó el Originate o no hay capacidad para enviarlo"""
+    pass
+
+
+class TrunkCapacityError(OriginationRejected):
+    """La troncal alcanzó su límite de canales simultáneos"""
+    pass
+
+
+class TokenBucket:
+    """Token bucket asíncrono para limitar llamadas por segundo"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OriginationDispatcher:
+    """Envía Originates concurrentes y resuelve su resultado por ActionID"""
+
+    def __init__(self, ami_client, max_in_flight: int = 100, response_timeout: float = 60.0):
+        self.ami = ami_client
+        self.response_timeout = response_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._trunk_calls: Dict[str, Set[str]] = {}
+        self._call_trunk: Dict[str, str] = {}
+        self._buckets: Dict[object, TokenBucket] = {}
+
+    def bind(self):
+        """Registrar el handler de OriginateResponse en el cliente AMI"""
+        self.ami.register_event('OriginateResponse', self.on_originate_response)
+
+    # ---------- capacidad por troncal ----------
+
+    def trunk_capacity(self, trunk: str, max_channels: Optional[int]) -> int:
+        """Canales libres en la troncal (ilimitado si no hay tope configurado)"""
+        if not max_channels:
+            return 1 << 30
+        return max(0, int(max_channels) - len(self._trunk_calls.get(trunk, ())))
+
+    def _reserve(self, action_id: str, trunk: str, max_channels: Optional[int]):
+        if self.trunk_capacity(trunk, max_channels) <= 0:
+            raise TrunkCapacityError(f"Troncal {trunk} sin canales libres ({max_channels})")
+        self._trunk_calls.setdefault(trunk, set()).add(action_id)
+        self._call_trunk[action_id] = trunk
+
+    def release(self, action_id: str):
+        """Liberar el canal de troncal ocupado por la llamada"""
+        trunk = self._call_trunk.pop(action_id, None)
+        if trunk is not None:
+            calls = self._trunk_calls.get(trunk)
+            if calls is not None:
+                calls.discard(action_id)
+
+    def bucket(self, key, cps: Optional[float]) -> Optional[TokenBucket]:
+        if not cps:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.rate != float(cps):
+            bucket = TokenBucket(float(cps))
+            self._buckets[key] = bucket
+        return bucket
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    # ---------- originación ----------
+
+    async def originate(self, action: Dict, trunk: str, max_channels: Optional[int] = None,
+                        cps: Optional[float] = None, bucket_key=None) -> Tuple[str, asyncio.Future]:
+        """
+        Enviar un Originate asíncrono.
+
+        Retorna en cuanto Asterisk confirma que la originación fue encolada,
+        junto con un future que se resuelve con el evento OriginateResponse.
+
+        Raises:
+            TrunkCapacityError: La troncal no tiene canales libres
+            OriginationRejected: Asterisk respondió con error
+        """
+        action_id = f'dialer-{uuid.uuid4().hex}'
+        action = dict(action, ActionID=action_id, ChannelId=action_id, Async='true')
+        self._reserve(action_id, trunk, max_channels)
+
+        try:
+            bucket = self.bucket(bucket_key if bucket_key is not None else trunk, cps)
+            if bucket:
+                await bucket.acquire()
+            await self._semaphore.acquire()
+        except BaseException:
+            self.release(action_id)
+            raise
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _f: self._semaphore.release())
+        self._pending[action_id] = future
+
+        try:
+            # as_list=False: completar con el ack "successfully queued" sin esperar
+            # al OriginateResponse, que llega después como evento
+            response = await self.ami.send_action(action, as_list=False)
+        except Exception as e:
+            self._fail(action_id, e)
+            raise OriginationRejected(f"Error enviando Originate: {e}")
+
+        ami_response = str(getattr(response, 'Response', '') or '').lower()
+        if ami_response != 'success':
+            self._fail(action_id, OriginationRejected(str(response)))
+            raise OriginationRejected(f"AMI originate failed: {response}")
+
+        asyncio.get_running_loop().call_later(
+            self.response_timeout, self._expire, action_id
+        )
+        return action_id, future
+
+    def _fail(self, action_id: str, error: BaseException):
+        self.release(action_id)
+        future = self._pending.pop(action_id, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+            # Evitar "exception was never retrieved" si nadie espera el future
+            future.exception()
+
+    def _expire(self, action_id: str):
+        if action_id in self._pending:
+            logger.warning(f"OriginateResponse no recibido para {action_id}")
+            self._fail(action_id, asyncio.TimeoutError(action_id))
+
+    async def on_originate_response(self, manager, event):
+        action_id = event.get('ActionID')
+        future = self._pending.pop(action_id, None) if action_id else None
+        if future is None or future.done():
+            return
+        if str(event.get('Response', '')).lower() != 'success':
+            # La llamada nunca se estableció: no ocupa canal de troncal
+            self.release(action_id)
+        future.set_result(event)
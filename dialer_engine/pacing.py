@@ -0,0 +1,279 @@
+"""
+Motor de pacing predictivo por campaña
+Mantiene estadísticas de ventana deslizante (tasa de contestación, abandono,
+tiempo medio de atención) y pronostica cuántos agentes quedarán libres para
+calcular cuántas líneas marcar en cada ciclo.
+
+Los límites por defecto usan las mismas variables de entorno que
+backend/config/dialer_config.py (DIALER_CONFIG) para que backend y dialer
+compartan una sola fuente de configuración.
+"""
+
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class PacingLimits:
+    """Límites de pacing (espejo de DIALER_CONFIG en config/dialer_config.py)"""
+    initial_ratio: float = 1.5
+    abandon_target: float = 0.03
+    max_ratio: float = 3.0
+    min_ratio: float = 1.0
+    ratio_step: float = 0.1
+    window_seconds: float = 300.0
+    min_samples: int = 20
+    default_answer_rate: float = 0.3
+    default_handle_time: float = 180.0
+    forecast_horizon: float = 5.0
+    # Una llamada conectada sin Hangup tras este múltiplo del AHT se da por
+    # perdida (evento no recibido) y deja de contar para el pronóstico
+    connected_ttl_aht: float = 4.0
+    # Segundos mínimos entre ajustes del ratio (los loops despiertan por eventos)
+    adjust_interval: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> 'PacingLimits':
+        return cls(
+            initial_ratio=_env_float('DIALER_PREDICTIVE_RATIO', 1.5),
+            abandon_target=_env_float('DIALER_ABANDON_TARGET', 0.03),
+            max_ratio=_env_float('DIALER_MAX_RATIO', 3.0),
+            min_ratio=_env_float('DIALER_MIN_RATIO', 1.0),
+            ratio_step=_env_float('DIALER_RATIO_STEP', 0.1),
+            window_seconds=_env_float('DIALER_PACING_WINDOW', 300.0),
+            min_samples=int(_env_float('DIALER_PACING_MIN_SAMPLES', 20)),
+            adjust_interval=_env_float('DIALER_RATIO_ADJUST_INTERVAL', 1.0),
+        )
+
+    def override(self, config: Optional[Dict]) -> 'PacingLimits':
+        """Aplicar overrides definidos en la configuración de la campaña"""
+        if not config:
+            return self
+        mapping = {
+            'predictive_ratio': 'initial_ratio',
+            'abandon_rate_target': 'abandon_target',
+            'max_ratio': 'max_ratio',
+            'min_ratio': 'min_ratio',
+            'ratio_step': 'ratio_step',
+            'pacing_window': 'window_seconds',
+            'pacing_min_samples': 'min_samples',
+            'pacing_forecast_horizon': 'forecast_horizon',
+            'pacing_default_handle_time': 'default_handle_time',
+            'ratio_adjust_interval': 'adjust_interval',
+        }
+        values = dict(self.__dict__)
+        for key, attr in mapping.items():
+            if config.get(key) is not None:
+                try:
+                    values[attr] = type(values[attr])(config[key])
+                except (TypeError, ValueError):
+                    pass
+        return PacingLimits(**values)
+
+
+class CampaignPacer:
+    """
+    Estado de pacing de una campaña.
+
+    Cada resultado de llamada se guarda con su timestamp en una ventana
+    deslizante; las métricas sólo consideran los últimos `window_seconds`,
+    de modo que el dialer reacciona en minutos a cambios de contactabilidad.
+    """
+
+    def __init__(self, limits: PacingLimits, clock=time.monotonic):
+        self.limits = limits
+        self.ratio = limits.initial_ratio
+        self._clock = clock
+        self._adjusted_at = None
+        # Resultados registrados en total y al momento del último ajuste
+        self._recorded = 0
+        self._recorded_at_adjust = 0
+        # (ts, answered, abandoned)
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        # (ts, handle_time)
+        self._handle_times: Deque[Tuple[float, float]] = deque()
+        # call_id -> ts de marcado, llamadas que aún no contestan ni terminan
+        self._in_flight: Dict[str, float] = {}
+        # call_id -> ts de conexión con el agente
+        self._connected: Dict[str, float] = {}
+
+    # ---------- registro de eventos ----------
+
+    def record_dial(self, call_id: str):
+        self._in_flight[call_id] = self._clock()
+
+    def record_connect(self, call_id: str):
+        """La llamada contestada fue entregada a un agente"""
+        self._in_flight.pop(call_id, None)
+        self._connected[call_id] = self._clock()
+
+    def record_end(self, call_id: str, answered: bool, abandoned: bool = False):
+        """Registrar fin de llamada (contestada, abandonada o no contestada)"""
+        now = self._clock()
+        self._in_flight.pop(call_id, None)
+        connected_at = self._connected.pop(call_id, None)
+        if connected_at is not None:
+            self._handle_times.append((now, now - connected_at))
+        self._outcomes.append((now, answered or abandoned, abandoned))
+        self._recorded += 1
+        self._trim(now)
+
+    def forget(self, call_id: str):
+        """Descartar una llamada que falló al originarse"""
+        self._in_flight.pop(call_id, None)
+        self._connected.pop(call_id, None)
+
+    # ---------- estadísticas ----------
+
+    def _trim(self, now: float):
+        horizon = now - self.limits.window_seconds
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+        while self._handle_times and self._handle_times[0][0] < horizon:
+            self._handle_times.popleft()
+
+    @property
+    def samples(self) -> int:
+        self._trim(self._clock())
+        return len(self._outcomes)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def answer_rate(self) -> float:
+        self._trim(self._clock())
+        if len(self._outcomes) < self.limits.min_samples:
+            return self.limits.default_answer_rate
+        answered = sum(1 for _, ans, _ in self._outcomes if ans)
+        # Nunca dividir por cero al estimar líneas
+        return max(answered / len(self._outcomes), 0.01)
+
+    @property
+    def abandon_rate(self) -> float:
+        self._trim(self._clock())
+        answered = sum(1 for _, ans, _ in self._outcomes if ans)
+        if answered == 0:
+            return 0.0
+        abandoned = sum(1 for _, _, ab in self._outcomes if ab)
+        return abandoned / answered
+
+    @property
+    def avg_handle_time(self) -> float:
+        self._trim(self._clock())
+        if not self._handle_times:
+            return self.limits.default_handle_time
+        return sum(ht for _, ht in self._handle_times) / len(self._handle_times)
+
+    def _expire_connected(self, now: float, aht: float):
+        """Descartar llamadas conectadas cuyo Hangup nunca llegó"""
+        horizon = now - self.limits.connected_ttl_aht * aht
+        for call_id in [cid for cid, ts in self._connected.items() if ts < horizon]:
+            del self._connected[call_id]
+
+    def forecast_free_agents(self, horizon: Optional[float] = None) -> float:
+        """
+        Agentes en llamada que se espera queden libres en el horizonte dado.
+        Modelo exponencial del tiempo de atención: P(libre) = 1 - e^(-h/AHT).
+        """
+        if not self._connected:
+            return 0.0
+        horizon = self.limits.forecast_horizon if horizon is None else horizon
+        aht = max(self.avg_handle_time, 1.0)
+        self._expire_connected(self._clock(), aht)
+        return len(self._connected) * (1 - math.exp(-horizon / aht))
+
+    # ---------- cálculo de líneas ----------
+
+    def adjust_ratio(self) -> float:
+        """
+        Ajustar el ratio según el abandono de la ventana actual.
+
+        A lo sumo un paso por intervalo y sólo con MIN_SAMPLES resultados nuevos
+        desde el paso anterior: el abandono de la ventana reacciona lento y
+        sin esa espera el ratio oscila entre MIN_RATIO y MAX_RATIO.
+        """
+        limits = self.limits
+        now = self._clock()
+        if self._adjusted_at is not None and now - self._adjusted_at < limits.adjust_interval:
+            return self.ratio
+        if self._recorded - self._recorded_at_adjust < limits.min_samples:
+            return self.ratio
+        self._adjusted_at = now
+        self._recorded_at_adjust = self._recorded
+        if self.samples >= limits.min_samples:
+            abandon = self.abandon_rate
+            if abandon > limits.abandon_target:
+                self.ratio -= limits.ratio_step
+            elif abandon < limits.abandon_target * 0.5:
+                self.ratio += limits.ratio_step
+        self.ratio = min(limits.max_ratio, max(limits.min_ratio, self.ratio))
+        return self.ratio
+
+    def lines_to_dial(self, available_agents: int) -> int:
+        """
+        Líneas a marcar en este ciclo.
+
+        Se estima la demanda de agentes (disponibles + pronóstico de liberados).
+        El ratio ajustado por abandono es el tope duro de líneas en vuelo por
+        agente de la demanda: con MIN_RATIO=1 se marca a lo sumo una línea por
+        agente. Con estadísticas suficientes se pide demanda / tasa de
+        contestación sin pasar ese tope; el piso es MIN_RATIO por agente
+        disponible. Se restan las llamadas que ya están marcando.
+        """
+        ratio = self.adjust_ratio()
+        demand = available_agents + self.forecast_free_agents()
+        if demand <= 0:
+            return 0
+
+        limits = self.limits
+        ceiling = demand * ratio
+        if self.samples < limits.min_samples:
+            # Arranque en frío: sin estadísticas confiables usar el ratio inicial
+            wanted = ceiling
+        else:
+            wanted = min(ceiling, demand / self.answer_rate)
+        wanted = max(wanted, available_agents * min(limits.min_ratio, ratio))
+
+        return max(0, int(math.floor(wanted)) - self.in_flight)
+
+    def snapshot(self) -> Dict:
+        return {
+            'ratio': round(self.ratio, 3),
+            'answer_rate': round(self.answer_rate, 4),
+            'abandon_rate': round(self.abandon_rate, 4),
+            'avg_handle_time': round(self.avg_handle_time, 1),
+            'in_flight': self.in_flight,
+            'connected': len(self._connected),
+            'samples': self.samples,
+        }
+
+
+class PacingEngine:
+    """Registro de pacers por campaña"""
+
+    def __init__(self, limits: Optional[PacingLimits] = None):
+        self.limits = limits or PacingLimits.from_env()
+        self._pacers: Dict[int, CampaignPacer] = {}
+
+    def get(self, campaign_id: int, config: Optional[Dict] = None) -> CampaignPacer:
+        pacer = self._pacers.get(campaign_id)
+        if pacer is None:
+            pacer = CampaignPacer(self.limits.override(config))
+            self._pacers[campaign_id] = pacer
+        return pacer
+
+    def remove(self, campaign_id: int):
+        self._pacers.pop(campaign_id, None)
@@ -0,0 +1,133 @@
+"""
+Roster local de agentes disponibles por campaña
+
+El backend publica los cambios de disponibilidad en 'dialer:agents'
+(ver backend apps/campaigns/hopper.py: CampaignHopperFeeder.sync_agent):
+    {"type": "agent", "agent_id": 7, "available": true,
+     "campaign_ids": [1, 2], "agent": {...}}
+    {"type": "roster", "campaign_id": 1}          (el set cambió: recargar)
+
+Los loops de discado esperan en `wait()` y se despiertan apenas un agente
+queda disponible o termina una llamada; la lectura completa desde Redis
+(SMEMBERS + MGET) queda como respaldo cada `poll_interval` segundos.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+AGENTS_CHANNEL = 'dialer:agents'
+
+
+class AgentRoster:
+    """Agentes disponibles por campaña con señal de despertar para los loops"""
+
+    def __init__(self, redis_client=None, poll_interval: float = None, clock=time.monotonic):
+        self.redis = redis_client
+        self.poll_interval = poll_interval or float(os.getenv('DIALER_SAFETY_POLL', 5))
+        self._clock = clock
+        self._agents: Dict[int, Dict[str, Dict]] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._events: Dict[int, asyncio.Event] = {}
+
+    # ---------- despertar ----------
+
+    def _event(self, campaign_id: int) -> asyncio.Event:
+        event = self._events.get(campaign_id)
+        if event is None:
+            event = self._events[campaign_id] = asyncio.Event()
+        return event
+
+    def wake(self, campaign_id: int):
+        """Despertar el loop de la campaña"""
+        self._event(campaign_id).set()
+
+    async def wait(self, campaign_id: int, timeout: float = None):
+        """Esperar un cambio relevante o, como respaldo, `timeout` segundos"""
+        event = self._event(campaign_id)
+        try:
+            await asyncio.wait_for(event.wait(), timeout or self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    # ---------- roster ----------
+
+    async def load(self, campaign_id: int) -> Dict[str, Dict]:
+        """Leer de Redis el set de agentes disponibles (2 round trips)"""
+        agent_ids = sorted(await self.redis.smembers(f'campaign:{campaign_id}:agents:available'))
+        agents = {}
+        if agent_ids:
+            payloads = await self.redis.mget([f'agent:{agent_id}' for agent_id in agent_ids])
+            for agent_id, payload in zip(agent_ids, payloads):
+                if payload:
+                    agents[str(agent_id)] = json.loads(payload)
+        self._agents[campaign_id] = agents
+        self._loaded_at[campaign_id] = self._clock()
+        return agents
+
+    async def available(self, campaign_id: int) -> List[Dict]:
+        """Agentes disponibles; recarga desde Redis sólo si el roster está vencido"""
+        loaded_at = self._loaded_at.get(campaign_id)
+        if loaded_at is None or self._clock() - loaded_at >= self.poll_interval:
+            await self.load(campaign_id)
+        return list(self._agents.get(campaign_id, {}).values())
+
+    def forget(self, campaign_id: int):
+        self._agents.pop(campaign_id, None)
+        self._loaded_at.pop(campaign_id, None)
+        self._events.pop(campaign_id, None)
+
+    def apply(self, agent_id, available: bool, campaign_ids: Iterable[int], agent: Dict = None):
+        """Aplicar un cambio de disponibilidad a las campañas cargadas"""
+        agent_id = str(agent_id)
+        for campaign_id in campaign_ids:
+            campaign_id = int(campaign_id)
+            roster = self._agents.get(campaign_id)
+            if roster is None:
+                continue
+            if available and agent:
+                roster[agent_id] = agent
+                self.wake(campaign_id)
+            else:
+                roster.pop(agent_id, None)
+
+    def on_message(self, data: str):
+        try:
+            message = json.loads(data)
+            if message.get('type') == 'roster':
+                campaign_id = int(message['campaign_id'])
+                # Forzar recarga en la próxima lectura
+                self._loaded_at.pop(campaign_id, None)
+                self.wake(campaign_id)
+            else:
+                self.apply(
+                    message['agent_id'],
+                    bool(message.get('available')),
+                    message.get('campaign_ids') or [],
+                    message.get('agent'),
+                )
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Evento de agente inválido en {AGENTS_CHANNEL}: {e}")
+
+    async def run(self):
+        """Escuchar cambios de disponibilidad publicados por el backend"""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(AGENTS_CHANNEL)
+        # Lo cargado antes de suscribirse pudo quedar desactualizado
+        self._loaded_at.clear()
+        logger.info(f"Escuchando disponibilidad de agentes en {AGENTS_CHANNEL}")
+        try:
+            async for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    self.on_message(message['data'])
+        finally:
+            try:
+                await pubsub.unsubscribe(AGENTS_CHANNEL)
+            except Exception:
+                pass
@@ -0,0 +1,153 @@
+"""
+Horarios de llamada por zona horaria
+
+Cada campaña define su ventana de llamada (hora inicio/fin y días de la semana)
+en campaign:{id}:config:
+    calling_start   "08:00"
+    calling_end     "20:00"
+    calling_days    [0, 1, 2, 3, 4, 5]   (0 = lunes)
+
+Los contactos se agrupan en el hopper por zona horaria (ver hopper.py). Para
+cada zona se precalcula si la ventana está abierta y el instante del próximo
+cambio (apertura o cierre); hasta ese instante la consulta es una comparación
+de floats, sin construir fechas locales por contacto.
+"""
+
+import logging
+import time
+from datetime import datetime, time as dtime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'America/Bogota'
+DEFAULT_START = '08:00'
+DEFAULT_END = '20:00'
+DEFAULT_DAYS = (0, 1, 2, 3, 4, 5)
+
+# Días revisados hacia adelante para encontrar la próxima apertura
+LOOKAHEAD_DAYS = 8
+
+
+def resolve_zone(name: Optional[str], fallback: str = DEFAULT_TIMEZONE):
+    """ZoneInfo de la zona (pytz si zoneinfo no la conoce; fallback si es inválida)"""
+    for candidate in (name, fallback, DEFAULT_TIMEZONE):
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+        try:
+            return pytz.timezone(candidate)
+        except Exception:
+            pass
+    return ZoneInfo('UTC')
+
+
+def _parse_time(value, default: str) -> dtime:
+    try:
+        return dtime.fromisoformat(str(value or default))
+    except ValueError:
+        logger.warning(f"Hora inválida en horario de campaña: {value!r}, usando {default}")
+        return dtime.fromisoformat(default)
+
+
+def _localize(tz, naive: datetime) -> datetime:
+    if hasattr(tz, 'localize'):
+        return tz.localize(naive)
+    return naive.replace(tzinfo=tz)
+
+
+class CallingWindow:
+    """Ventana diaria de llamada de una campaña"""
+
+    def __init__(self, start: str = DEFAULT_START, end: str = DEFAULT_END,
+                 days: Iterable[int] = DEFAULT_DAYS):
+        self.start = _parse_time(start, DEFAULT_START)
+        self.end = _parse_time(end, DEFAULT_END)
+        if self.end <= self.start:
+            logger.warning(f"Ventana {self.start}-{self.end} inválida, usando {DEFAULT_START}-{DEFAULT_END}")
+            self.start = _parse_time(DEFAULT_START, DEFAULT_START)
+            self.end = _parse_time(DEFAULT_END, DEFAULT_END)
+        self.days = frozenset(int(d) for d in days)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'CallingWindow':
+        days = config.get('calling_days')
+        return cls(
+            start=config.get('calling_start') or DEFAULT_START,
+            end=config.get('calling_end') or DEFAULT_END,
+            days=DEFAULT_DAYS if days is None else days,
+        )
+
+    def state(self, tz, now: float) -> Tuple[bool, float]:
+        """
+        Estado de la ventana en la zona dada.
+
+        Returns:
+            (abierta, epoch del próximo cambio de estado)
+        """
+        local_now = datetime.fromtimestamp(now, tz)
+        today = local_now.date()
+        for offset in range(LOOKAHEAD_DAYS):
+            day = today + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            opens = _localize(tz, datetime.combine(day, self.start)).timestamp()
+            closes = _localize(tz, datetime.combine(day, self.end)).timestamp()
+            if now < opens:
+                return False, opens
+            if now < closes:
+                return True, closes
+        # Sin días habilitados: revisar de nuevo en un día
+        return False, now + 86400
+
+
+class CallingSchedule:
+    """Estado abierto/cerrado por zona horaria, recalculado sólo al cambiar"""
+
+    def __init__(self, window: CallingWindow, default_zone: str = DEFAULT_TIMEZONE,
+                 clock=time.time):
+        self.window = window
+        self.default_zone = default_zone or DEFAULT_TIMEZONE
+        self._clock = clock
+        self._zones: Dict[str, object] = {}
+        self._states: Dict[str, Tuple[bool, float]] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'CallingSchedule':
+        return cls(
+            CallingWindow.from_config(config),
+            default_zone=config.get('timezone') or DEFAULT_TIMEZONE,
+        )
+
+    def _state(self, zone: str, now: float) -> Tuple[bool, float]:
+        state = self._states.get(zone)
+        if state is None or now >= state[1]:
+            tz = self._zones.get(zone)
+            if tz is None:
+                tz = self._zones[zone] = resolve_zone(zone, self.default_zone)
+            state = self._states[zone] = self.window.state(tz, now)
+        return state
+
+    def is_open(self, zone: Optional[str], now: Optional[float] = None) -> bool:
+        now = self._clock() if now is None else now
+        return self._state(zone or self.default_zone, now)[0]
+
+    def open_zones(self, zones: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """Zonas cuya ventana de llamada está abierta ahora"""
+        now = self._clock() if now is None else now
+        return [zone for zone in zones if self._state(zone, now)[0]]
+
+    def next_opening(self, zones: Iterable[str], now: Optional[float] = None) -> Optional[float]:
+        """Epoch de la próxima apertura entre las zonas cerradas"""
+        now = self._clock() if now is None else now
+        openings = [
+            until for opened, until in (self._state(zone, now) for zone in zones)
+            if not opened
+        ]
+        return min(openings) if openings else None
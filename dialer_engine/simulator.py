@@ -0,0 +1,506 @@
+"""
+Simulador y benchmark offline del Dialer Engine
+
+Ejecuta un DialerEngine real contra:
+- Un servidor AMI falso (TCP, mismo protocolo que Asterisk) que responde los
+  Originate y emite Newchannel, OriginateResponse, AgentConnect y Hangup según
+  distribuciones configurables de contestación, timbrado y duración.
+- Un Redis local (o fakeredis con --fakeredis, requiere `pip install fakeredis[lua]`)
+  donde el simulador hace el papel del backend: configuración de la campaña,
+  hopper y disponibilidad de agentes publicada en 'dialer:agents'.
+
+Al final reporta marcaciones/seg, latencia agente-libre -> Originate, ocupación
+de agentes y tasa de abandono. Con --max-abandon / --max-latency-ms /
+--min-dials-per-sec retorna código 1 si no se cumplen (para CI); la suite de
+pytest (tests/test_simulation.py) corre una simulación corta con semilla fija
+y esos mismos umbrales.
+
+Los tiempos simulados se comprimen con --speed: con --speed 60 un minuto de
+turno dura un segundo real (también se escala la ventana de pacing).
+
+Ejemplo:
+    python simulator.py --mode predictive --agents 20 --duration 60 --speed 30 --fakeredis
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('simulator')
+
+EOL = '\r\n'
+
+
+# ============= PERFIL DE LLAMADAS =============
+
+@dataclass
+class CallProfile:
+    """Distribuciones de la simulación (segundos simulados)"""
+    answer_rate: float = 0.35
+    busy_rate: float = 0.10
+    ring_time: float = 12.0
+    handle_time: float = 180.0
+    wrap_up: float = 10.0
+    # Tiempo que un contacto contestado espera agente antes de colgar (abandono)
+    patience: float = 2.0
+    # Latencia de Asterisk en responder el Originate (segundos reales)
+    ack_latency: float = 0.002
+    speed: float = 1.0
+
+    def scaled(self, seconds: float) -> float:
+        return seconds / self.speed
+
+    def exp(self, mean: float) -> float:
+        return self.scaled(random.expovariate(1.0 / mean)) if mean > 0 else 0.0
+
+
+@dataclass
+class SimStats:
+    started: float = field(default_factory=time.monotonic)
+    originates: int = 0
+    answered: int = 0
+    connected: int = 0
+    abandoned: int = 0
+    no_answer: int = 0
+    busy_seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    def report(self, agents: int, profile: CallProfile) -> Dict:
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        reached = self.connected + self.abandoned
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'simulated_s': round(elapsed * profile.speed, 1),
+            'originates': self.originates,
+            'dials_per_sec': round(self.originates / elapsed, 2) if elapsed else 0,
+            'answered': self.answered,
+            'connected': self.connected,
+            'abandoned': self.abandoned,
+            'no_answer': self.no_answer,
+            'abandon_rate': round(self.abandoned / reached, 4) if reached else 0.0,
+            'agent_occupancy': round(self.busy_seconds / (agents * elapsed), 4) if elapsed and agents else 0.0,
+            'agent_to_dial_ms_p50': pct(0.5),
+            'agent_to_dial_ms_p95': pct(0.95),
+            'agent_to_dial_samples': len(latencies),
+        }
+
+
+# ============= AGENTES (papel del backend) =============
+
+class AgentFloor:
+    """Agentes simulados; publica su disponibilidad como lo hace el backend"""
+
+    def __init__(self, redis_client, campaign_id: int, count: int, stats: SimStats):
+        self.redis = redis_client
+        self.campaign_id = campaign_id
+        self.stats = stats
+        self.agents = {str(i): {'id': i, 'agent_id': f'sim{i}', 'extension': f'{1000 + i}', 'name': f'Agente {i}'}
+                       for i in range(1, count + 1)}
+        self.free = set(self.agents)
+        # agent_id -> momento en que quedó libre (para latencia agente -> Originate)
+        self.free_since: Dict[str, float] = {}
+        self.busy_since: Dict[str, float] = {}
+
+    async def setup(self):
+        pipe = self.redis.pipeline(transaction=False)
+        for agent_id, agent in self.agents.items():
+            pipe.set(f'agent:{agent_id}', json.dumps(agent))
+            pipe.sadd(f'campaign:{self.campaign_id}:agents:available', agent_id)
+        await pipe.execute()
+        now = time.monotonic()
+        self.free_since = {agent_id: now for agent_id in self.agents}
+
+    async def _publish(self, agent_id: str, available: bool):
+        key = f'campaign:{self.campaign_id}:agents:available'
+        pipe = self.redis.pipeline(transaction=False)
+        if available:
+            pipe.sadd(key, agent_id)
+        else:
+            pipe.srem(key, agent_id)
+        pipe.publish('dialer:agents', json.dumps({
+            'type': 'agent',
+            'agent_id': agent_id,
+            'available': available,
+            'campaign_ids': [self.campaign_id],
+            'agent': self.agents[agent_id] if available else None,
+        }))
+        await pipe.execute()
+
+    async def take(self, agent_id: Optional[str] = None) -> Optional[str]:
+        """Ocupar un agente (el indicado o cualquiera libre)"""
+        if agent_id is None:
+            if not self.free:
+                return None
+            agent_id = min(self.free, key=lambda a: self.free_since.get(a, 0))
+        if agent_id not in self.free:
+            return None
+        self.free.discard(agent_id)
+        self.busy_since[agent_id] = time.monotonic()
+        await self._publish(agent_id, False)
+        return agent_id
+
+    async def release(self, agent_id: str, wrap_up: float = 0.0):
+        if wrap_up:
+            await asyncio.sleep(wrap_up)
+        started = self.busy_since.pop(agent_id, None)
+        now = time.monotonic()
+        if started is not None:
+            self.stats.busy_seconds += now - started
+        self.free.add(agent_id)
+        self.free_since[agent_id] = now
+        await self._publish(agent_id, True)
+
+    def dialed(self, agent_id: Optional[str]):
+        """Registrar la latencia desde que el/los agente(s) quedaron libres"""
+        now = time.monotonic()
+        if agent_id is not None:
+            since = self.free_since.pop(agent_id, None)
+            if since is not None:
+                self.stats.latencies.append(now - since)
+            return
+        # Predictivo: el Originate responde a todos los agentes libres pendientes
+        for free_agent in list(self.free_since):
+            if free_agent in self.free:
+                self.stats.latencies.append(now - self.free_since.pop(free_agent))
+
+    def settle(self):
+        """Cerrar el tiempo ocupado de los agentes al terminar la simulación"""
+        now = time.monotonic()
+        for agent_id, started in list(self.busy_since.items()):
+            self.stats.busy_seconds += now - started
+            self.busy_since[agent_id] = now
+
+
+# ============= SERVIDOR AMI FALSO =============
+
+def format_message(fields: Dict) -> bytes:
+    lines = []
+    for key, value in fields.items():
+        if isinstance(value, (list, tuple)):
+            lines.extend(f'{key}: {v}' for v in value)
+        else:
+            lines.append(f'{key}: {value}')
+    return (EOL.join(lines) + EOL + EOL).encode()
+
+
+def parse_message(block: str) -> Dict:
+    message = {}
+    for line in block.split(EOL):
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key, value = key.strip(), value.strip()
+        if key in message:
+            previous = message[key]
+            message[key] = (previous if isinstance(previous, list) else [previous]) + [value]
+        else:
+            message[key] = value
+    return message
+
+
+class FakeAMIServer:
+    """Servidor AMI que simula el resultado de cada Originate"""
+
+    def __init__(self, profile: CallProfile, floor: AgentFloor, stats: SimStats):
+        self.profile = profile
+        self.floor = floor
+        self.stats = stats
+        self.clients = set()
+        self.server = None
+        self._seq = 0
+        self._tasks = set()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for writer in list(self.clients):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def emit(self, fields: Dict):
+        data = format_message(fields)
+        for writer in list(self.clients):
+            if not writer.is_closing():
+                writer.write(data)
+
+    async def _handle(self, reader, writer):
+        writer.write(f'Asterisk Call Manager/5.0.1{EOL}'.encode())
+        self.clients.add(writer)
+        buffer = ''
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffer += data.decode('ascii', 'ignore')
+                *blocks, buffer = buffer.split(EOL + EOL)
+                for block in blocks:
+                    if block.strip():
+                        self._on_action(writer, parse_message(block.strip()))
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def _reply(self, writer, action_id: str, message: str, response: str = 'Success'):
+        writer.write(format_message({'Response': response, 'ActionID': action_id, 'Message': message}))
+
+    def _on_action(self, writer, action: Dict):
+        name = str(action.get('Action', '')).lower()
+        action_id = action.get('ActionID', '')
+        if name == 'login':
+            self._reply(writer, action_id, 'Authentication accepted')
+            self.emit({'Event': 'FullyBooted', 'Status': 'Fully Booted'})
+        elif name == 'originate':
+            self.stats.originates += 1
+            variables = action.get('Variable') or []
+            if isinstance(variables, str):
+                variables = [variables]
+            variables = dict(v.split('=', 1) for v in variables if '=' in v)
+            agent_id = variables.get('AGENT_ID')
+            self.floor.dialed(agent_id)
+            task = asyncio.ensure_future(self._call(writer, action_id, agent_id, action.get('ChannelId')))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._reply(writer, action_id, 'Pong' if name == 'ping' else 'OK')
+
+    async def _call(self, writer, action_id: str, agent_id: Optional[str],
+                    channel_id: Optional[str] = None):
+        profile = self.profile
+        await asyncio.sleep(profile.ack_latency)
+        self._reply(writer, action_id, 'Originate successfully queued')
+
+        if agent_id is not None:
+            # Progresivo/preview: el agente queda reservado mientras se marca
+            agent_id = await self.floor.take(agent_id)
+
+        await asyncio.sleep(profile.exp(profile.ring_time))
+        roll = random.random()
+        if roll >= profile.answer_rate:
+            self.stats.no_answer += 1
+            reason = '5' if roll < profile.answer_rate + profile.busy_rate else '3'
+            if channel_id:
+                # El canal alcanzó a existir: su Hangup llega antes del OriginateResponse
+                self.emit({'Event': 'Hangup', 'Channel': 'PJSIP/sim-failed', 'Uniqueid': channel_id,
+                           'Cause': '17' if reason == '5' else '19', 'Cause-txt': 'Failed'})
+            self.emit({'Event': 'OriginateResponse', 'ActionID': action_id,
+                       'Response': 'Failure', 'Reason': reason, 'Uniqueid': '<null>'})
+            if agent_id is not None:
+                await self.floor.release(agent_id)
+            return
+
+        self._seq += 1
+        # Como Asterisk: ChannelId del Originate pasa a ser el Uniqueid
+        uniqueid = channel_id or f'{int(time.time())}.{self._seq}'
+        channel = f'PJSIP/sim-{self._seq:08d}'
+        self.stats.answered += 1
+        self.emit({'Event': 'Newchannel', 'Channel': channel, 'Uniqueid': uniqueid, 'Linkedid': uniqueid})
+        self.emit({'Event': 'OriginateResponse', 'ActionID': action_id, 'Response': 'Success',
+                   'Reason': '4', 'Channel': channel, 'Uniqueid': uniqueid})
+        # Dar tiempo al dialer para registrar el uniqueid antes de los eventos siguientes
+        await asyncio.sleep(0.001)
+
+        if agent_id is None:
+            # Predictivo: esperar un agente libre hasta agotar la paciencia
+            deadline = time.monotonic() + profile.scaled(profile.patience)
+            while agent_id is None and time.monotonic() < deadline:
+                agent_id = await self.floor.take()
+                if agent_id is None:
+                    await asyncio.sleep(0.005)
+            if agent_id is None:
+                self.stats.abandoned += 1
+                self.emit({'Event': 'Hangup', 'Channel': channel, 'Uniqueid': uniqueid,
+                           'Cause': '16', 'Cause-txt': 'Normal Clearing'})
+                return
+
+        self.stats.connected += 1
+        self.emit({'Event': 'AgentConnect', 'Agent': agent_id, 'Uniqueid': uniqueid, 'Channel': channel})
+        await asyncio.sleep(profile.exp(profile.handle_time))
+        self.emit({'Event': 'Hangup', 'Channel': channel, 'Uniqueid': uniqueid,
+                   'Cause': '16', 'Cause-txt': 'Normal Clearing'})
+        await self.floor.release(agent_id, profile.exp(profile.wrap_up))
+
+
+# ============= EJECUCIÓN =============
+
+def campaign_config(args) -> Dict:
+    return {
+        'campaign_id': args.campaign_id,
+        'name': 'Simulación',
+        'dialer_type': args.mode,
+        'queue_name': 'sim',
+        'dnc_enabled': False,
+        'timezone': 'America/Bogota',
+        'calling_start': '00:00',
+        'calling_end': '23:59',
+        'calling_days': [0, 1, 2, 3, 4, 5, 6],
+        'max_concurrent_calls': args.agents * 3,
+        'calls_per_second': args.cps,
+        'trunk_max_channels': args.trunk_channels,
+        # Parámetros de pacing en tiempo comprimido
+        'pacing_window': max(5.0, 300.0 / args.speed),
+        'pacing_forecast_horizon': 5.0 / args.speed,
+        'pacing_default_handle_time': args.handle_time / args.speed,
+        'ratio_adjust_interval': 1.0 / args.speed,
+    }
+
+
+async def seed_campaign(redis_client, args):
+    from hopper import ContactHopper, hopper_keys
+
+    campaign_id = args.campaign_id
+    zones = await redis_client.smembers(hopper_keys(campaign_id)['zones'])
+    await redis_client.delete(
+        *hopper_keys(campaign_id).values(),
+        *(f'{hopper_keys(campaign_id)["ready"]}:{zone}' for zone in zones),
+        f'campaign:{campaign_id}:agents:available',
+        f'campaign:{campaign_id}:checkpoint',
+        f'campaign:{campaign_id}:stats',
+        f'dialer:lease:{campaign_id}',
+    )
+    await redis_client.set(f'campaign:{campaign_id}:config', json.dumps(campaign_config(args)))
+    hopper = ContactHopper(redis_client, campaign_id)
+    batch = 5000
+    for start in range(0, args.contacts, batch):
+        await hopper.add([
+            {'id': i, 'phone_number': f'3{i:09d}', 'name': f'Contacto {i}', 'priority': 0}
+            for i in range(start + 1, min(args.contacts, start + batch) + 1)
+        ])
+    await redis_client.hset('dialer:campaigns', campaign_id, args.mode)
+
+
+async def run(args) -> Dict:
+    if args.seed is not None:
+        random.seed(args.seed)
+    profile = CallProfile(
+        answer_rate=args.answer_rate, ring_time=args.ring_time, handle_time=args.handle_time,
+        wrap_up=args.wrap_up, patience=args.patience, speed=args.speed,
+    )
+    import redis.asyncio as aioredis
+    import dialer as dialer_module
+
+    if args.fakeredis:
+        import fakeredis
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        redis_client = aioredis.from_url(args.redis_url, decode_responses=True)
+
+    stats = SimStats()
+    floor = AgentFloor(redis_client, args.campaign_id, args.agents, stats)
+    server = FakeAMIServer(profile, floor, stats)
+    port = await server.start()
+
+    await seed_campaign(redis_client, args)
+    await floor.setup()
+
+    engine = dialer_module.DialerEngine()
+    engine.asterisk_host = '127.0.0.1'
+    engine.asterisk_ami_port = port
+    await engine.initialize(redis_client=redis_client)
+
+    tasks = [
+        asyncio.create_task(engine.roster.run()),
+        asyncio.create_task(engine.coordinate()),
+        asyncio.create_task(engine.completions.run()),
+    ]
+    stats.started = time.monotonic()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        floor.settle()
+        report = stats.report(args.agents, profile)
+        pacer = engine.pacing._pacers.get(args.campaign_id)
+        if pacer is not None:
+            report['pacing_ratio'] = round(pacer.ratio, 3)
+        await engine.stop_campaign(args.campaign_id)
+        for task in tasks:
+            task.cancel()
+        await engine.leases.leave()
+        await redis_client.hdel('dialer:campaigns', args.campaign_id)
+        engine.ami_client.close()
+        await server.stop()
+
+    report['mode'] = args.mode
+    report['agents'] = args.agents
+    return report
+
+
+def check_thresholds(report: Dict, args) -> List[str]:
+    failures = []
+    if args.max_abandon is not None and report['abandon_rate'] > args.max_abandon:
+        failures.append(f"abandon_rate {report['abandon_rate']} > {args.max_abandon}")
+    if args.min_dials_per_sec is not None and report['dials_per_sec'] < args.min_dials_per_sec:
+        failures.append(f"dials_per_sec {report['dials_per_sec']} < {args.min_dials_per_sec}")
+    p95 = report['agent_to_dial_ms_p95']
+    if args.max_latency_ms is not None and p95 is not None and p95 > args.max_latency_ms:
+        failures.append(f"agent_to_dial_ms_p95 {p95} > {args.max_latency_ms}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Simulación offline del Dialer Engine')
+    parser.add_argument('--mode', default='predictive', choices=['predictive', 'progressive'])
+    parser.add_argument('--agents', type=int, default=20)
+    parser.add_argument('--contacts', type=int, default=20000)
+    parser.add_argument('--duration', type=float, default=30.0, help='Segundos reales de simulación')
+    parser.add_argument('--speed', type=float, default=30.0, help='Segundos simulados por segundo real')
+    parser.add_argument('--answer-rate', type=float, default=0.35)
+    parser.add_argument('--ring-time', type=float, default=12.0)
+    parser.add_argument('--handle-time', type=float, default=180.0)
+    parser.add_argument('--wrap-up', type=float, default=10.0)
+    parser.add_argument('--patience', type=float, default=2.0)
+    parser.add_argument('--cps', type=float, default=0)
+    parser.add_argument('--trunk-channels', type=int, default=0)
+    parser.add_argument('--campaign-id', type=int, default=900001)
+    parser.add_argument('--redis-url', default=os.getenv('SIM_REDIS_URL', 'redis://localhost:6379/15'))
+    parser.add_argument('--fakeredis', action='store_true', help='Usar fakeredis en memoria')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='Imprimir el reporte como JSON')
+    parser.add_argument('--max-abandon', type=float, default=None)
+    parser.add_argument('--min-dials-per-sec', type=float, default=None)
+    parser.add_argument('--max-latency-ms', type=float, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('dialer').setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f'{key:>24}: {value}')
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f'FALLA: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Tests for the call blasting sliding window
+"""
+import asyncio
+import unittest
+
+import fakeredis
+
+from dialer import DialerEngine
+
+CAMPAIGN_ID = 9
+
+
+class CallBlastingLoopTest(unittest.IsolatedAsyncioTestCase):
+    """Test page claiming, the concurrency window and resume from progress"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.engine = DialerEngine()
+        self.engine.redis_client = self.redis
+        self.engine.leases.bind(self.redis)
+        self.config = {'max_concurrent_calls': 3, 'blast_page_size': 4}
+        # call_id -> future que el test resuelve como hangup
+        self.calls = {}
+        self.dialed = []
+        self.engine.originate_call_blasting = self.fake_originate
+        await self.engine.get_hopper(CAMPAIGN_ID).add(
+            [{'id': i, 'phone_number': f'300{i}'} for i in range(10)]
+        )
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def fake_originate(self, campaign_id, contact, config):
+        self.dialed.append(contact['id'])
+        done = asyncio.get_running_loop().create_future()
+        self.calls[contact['id']] = done
+        return done
+
+    def live(self):
+        return [f for f in self.calls.values() if not f.done()]
+
+    async def settle(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+    def start(self):
+        self.engine.active_campaigns[CAMPAIGN_ID] = {'config': self.config, 'calls_made': 0}
+        return asyncio.create_task(self.engine.call_blasting_loop(CAMPAIGN_ID))
+
+    async def hang_up(self, count=1):
+        for future in self.live()[:count]:
+            future.set_result(True)
+        await self.settle()
+
+    async def test_window_and_pages(self):
+        """Never more than max_concurrent_calls live; every contact is dialed once"""
+        loop = self.start()
+        await self.settle()
+        while not loop.done():
+            self.assertLessEqual(len(self.live()), 3)
+            await self.hang_up()
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(sorted(self.dialed), list(range(10)))
+        progress = await self.redis.hgetall(f'campaign:{CAMPAIGN_ID}:blast:progress')
+        self.assertEqual((progress['state'], progress['dialed']), ('completed', '10'))
+
+    async def test_resume_after_pause(self):
+        """Pausing returns the unread page to the hopper and a new start resumes the count"""
+        loop = self.start()
+        await self.settle()
+        await self.hang_up(2)
+        self.assertEqual(len(self.dialed), 5)
+
+        self.engine.active_campaigns[CAMPAIGN_ID]['stopped'] = True
+        await self.hang_up(3)
+        await asyncio.wait_for(loop, 1)
+        progress = await self.redis.hgetall(f'campaign:{CAMPAIGN_ID}:blast:progress')
+        self.assertEqual((progress['state'], progress['dialed']), ('paused', '5'))
+        self.assertEqual((await self.engine.get_hopper(CAMPAIGN_ID).size())['total'], 5)
+
+        loop = self.start()
+        while not loop.done():
+            await self.hang_up(3)
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(sorted(self.dialed), list(range(10)))
+        progress = await self.redis.hgetall(f'campaign:{CAMPAIGN_ID}:blast:progress')
+        self.assertEqual((progress['state'], progress['dialed']), ('completed', '10'))
@@ -0,0 +1,149 @@
+"""
+Tests for live call correlation and batched completion writes
+"""
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+
+from calls import COMPLETED_KEY, CompletionWriter, LiveCallIndex
+from dialer import DialerEngine
+from origination import OriginationDispatcher
+
+
+class LiveCallIndexTest(unittest.TestCase):
+    """Test uniqueid/channel/linkedid lookups"""
+
+    def test_lookups(self):
+        """Originated channels match by uniqueid or channel; linkedid only for linked lookups"""
+        index = LiveCallIndex(max_size=100)
+        index.bind('c1', uniqueid='u1', channel='PJSIP/trunk-1', linkedid='u1')
+
+        self.assertEqual(index.lookup('u1'), 'c1')
+        self.assertEqual(index.lookup('unknown', 'PJSIP/trunk-1'), 'c1')
+        # El canal del agente comparte linkedid pero no cierra la llamada
+        self.assertIsNone(index.lookup('u2', 'PJSIP/1001-1'))
+        self.assertEqual(index.lookup_linked('u2', 'u1'), 'c1')
+
+        index.forget('c1')
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.lookup_linked('u1', 'u1'))
+
+    def test_bounded_size(self):
+        """The oldest entries are evicted when a Hangup is lost"""
+        index = LiveCallIndex(max_size=4)
+        for i in range(4):
+            index.bind(f'c{i}', uniqueid=f'u{i}', channel=f'ch{i}')
+
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.lookup('u1'))
+        self.assertEqual(index.lookup('u3'), 'c3')
+
+
+class CompletionWriterTest(unittest.IsolatedAsyncioTestCase):
+    """Test batched writes of call completions"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.writer = CompletionWriter(self.redis, flush_interval=1, batch_size=3)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_flush_writes_one_batch(self):
+        """Records, latest stats per campaign and deletes go out in one flush"""
+        await self.redis.set('call:a', '{}')
+        self.writer.complete({'call_id': 'a'}, 'campaign:1:stats', {'calls_made': 1}, delete=['call:a'])
+        self.writer.complete({'call_id': 'b'}, 'campaign:1:stats', {'calls_made': 2})
+        self.assertEqual(await self.redis.llen(COMPLETED_KEY), 0)
+        self.assertFalse(self.writer._wakeup.is_set())
+
+        self.writer.complete({'call_id': 'c'})
+        self.assertTrue(self.writer._wakeup.is_set())
+        self.assertEqual(await self.writer.flush(), 3)
+
+        records = [json.loads(r) for r in await self.redis.lrange(COMPLETED_KEY, 0, -1)]
+        self.assertEqual([r['call_id'] for r in records], ['a', 'b', 'c'])
+        self.assertEqual(await self.redis.hget('campaign:1:stats', 'calls_made'), '2')
+        self.assertFalse(await self.redis.exists('call:a'))
+        self.assertEqual(await self.writer.flush(), 0)
+
+    async def test_failed_flush_is_retried_in_order(self):
+        """A failed write puts the batch back ahead of newer records"""
+        self.writer.complete({'call_id': 'a'})
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(side_effect=ConnectionError('redis down'))
+        with patch.object(self.redis, 'pipeline', return_value=pipe):
+            with self.assertRaises(ConnectionError):
+                await self.writer.flush()
+        self.writer.complete({'call_id': 'b'})
+
+        await self.writer.flush()
+        records = [json.loads(r)['call_id'] for r in await self.redis.lrange(COMPLETED_KEY, 0, -1)]
+        self.assertEqual(records, ['a', 'b'])
+
+
+class HangupCorrelationTest(unittest.IsolatedAsyncioTestCase):
+    """Test that only the originated channel's Hangup closes a call"""
+
+    async def test_hangup_closes_originated_call(self):
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.addAsyncCleanup(redis.aclose)
+        engine = DialerEngine()
+        engine.redis_client = redis
+        engine.completions.redis = redis
+        engine.dispatcher = OriginationDispatcher(None)
+        engine.active_campaigns[1] = {
+            'config': {}, 'calls_made': 1, 'calls_answered': 0, 'calls_abandoned': 0,
+        }
+        engine.active_calls['c1'] = {
+            'campaign_id': 1, 'contact': {'id': 4}, 'status': 'answered',
+            'uniqueid': 'u1', 'started_at': datetime.now(),
+        }
+        engine.call_index.bind('c1', uniqueid='u1', channel='PJSIP/trunk-1', linkedid='u1')
+
+        # Cuelga el agente: mismo linkedid, otro canal
+        await engine.on_hangup(None, {'Uniqueid': 'u2', 'Channel': 'PJSIP/1001-1', 'Linkedid': 'u1', 'Cause': '16'})
+        self.assertIn('c1', engine.active_calls)
+
+        await engine.on_hangup(None, {'Channel': 'PJSIP/trunk-1', 'Cause': '16'})
+        self.assertNotIn('c1', engine.active_calls)
+        self.assertEqual(engine.active_campaigns[1]['calls_answered'], 1)
+
+        await engine.completions.flush()
+        record = json.loads(await redis.lindex(COMPLETED_KEY, 0))
+        self.assertEqual((record['call_id'], record['contact'], record['status']), ('c1', {'id': 4}, 'answered'))
+        self.assertEqual(await redis.hget('campaign:1:stats', 'calls_answered'), '1')
+
+    async def test_progressive_completion_is_answered(self):
+        """Agent-first calls are answered by DialEnd, or by Normal Clearing without it"""
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.addAsyncCleanup(redis.aclose)
+        engine = DialerEngine()
+        engine.redis_client = redis
+        engine.completions.redis = redis
+        engine.dispatcher = OriginationDispatcher(None)
+        engine.active_campaigns[1] = {
+            'config': {}, 'calls_made': 3, 'calls_answered': 0, 'calls_abandoned': 0,
+        }
+        for n, dial_status in enumerate(['ANSWER', None, 'NOANSWER'], start=1):
+            engine.active_calls[f'c{n}'] = {
+                'campaign_id': 1, 'contact': {'id': n}, 'agent': {'id': 7, 'extension': '1001'},
+                'status': 'dialing', 'uniqueid': f'u{n}', 'started_at': datetime.now(),
+            }
+            engine.call_index.bind(f'c{n}', uniqueid=f'u{n}', channel=f'PJSIP/1001-{n}', linkedid=f'u{n}')
+            if dial_status:
+                await engine.on_dial_end(None, {
+                    'Uniqueid': f'u{n}', 'Linkedid': f'u{n}', 'DestUniqueid': f'd{n}', 'DialStatus': dial_status,
+                })
+            await engine.on_hangup(None, {'Uniqueid': f'u{n}', 'Channel': f'PJSIP/1001-{n}', 'Cause': '16'})
+
+        await engine.completions.flush()
+        records = [json.loads(r) for r in await redis.lrange(COMPLETED_KEY, 0, -1)]
+        self.assertEqual(
+            {r['contact']['id']: r['status'] for r in records},
+            {1: 'answered', 2: 'answered', 3: 'dialing'},
+        )
+        self.assertEqual(engine.active_campaigns[1]['calls_answered'], 2)
@@ -0,0 +1,95 @@
+"""
+Tests for the in-memory DNC filter
+"""
+import json
+import unittest
+from array import array
+
+from dnc import DNCFilter, number_key
+
+
+def delta(op, number, version):
+    return json.dumps({'op': op, 'number': number, 'version': version})
+
+
+class DNCFilterTest(unittest.IsolatedAsyncioTestCase):
+    """Test snapshot load, deltas, version gaps and compaction"""
+
+    def setUp(self):
+        self.dnc = DNCFilter(backend_url='http://backend', api_token='', compact_threshold=3)
+
+    async def test_snapshot_load_applies_deltas_received_meanwhile(self):
+        """Deltas buffered during the download are reapplied unless the snapshot has them"""
+        async def fetch_snapshot():
+            self.dnc.on_message(delta('add', '3000000001', 10))       # already in the snapshot
+            self.dnc.on_message(delta('remove', '+57 300 000 0002', 11))
+            self.dnc.on_message(delta('add', '0300000003', 12))
+            return ['3000000002', '57 (300) 000-0001', 'sin número'], 10
+
+        self.dnc.fetch_snapshot = fetch_snapshot
+        self.assertTrue(await self.dnc.load())
+
+        self.assertIn('3000000001', self.dnc)
+        self.assertNotIn('3000000002', self.dnc)
+        self.assertIn('0300000003', self.dnc)
+        self.assertNotIn('300000003', self.dnc)   # the leading zero is part of the key
+        self.assertEqual(self.dnc.version, 12)
+        self.assertEqual(list(self.dnc._numbers), sorted(self.dnc._numbers))
+
+    async def test_failed_snapshot_keeps_previous_list(self):
+        """A download error leaves the loaded numbers in place"""
+        self.dnc.replace(['3000000001'], version=4)
+
+        async def fetch_snapshot():
+            raise ConnectionError('backend down')
+
+        self.dnc.fetch_snapshot = fetch_snapshot
+        self.assertFalse(await self.dnc.load())
+        self.assertIn('3000000001', self.dnc)
+        self.assertEqual(self.dnc.version, 4)
+
+    def test_delta_add_and_remove(self):
+        """Deltas override the snapshot in both directions"""
+        self.dnc.replace(['3000000001', '3000000002'], version=1)
+        self.dnc.on_message(delta('remove', '3000000001', 2))
+        self.dnc.on_message(delta('add', '3000000009', 3))
+        self.dnc.on_message(delta('noop', '3000000002', 4))
+        self.dnc.on_message('{no json')
+
+        self.assertNotIn('3000000001', self.dnc)
+        self.assertIn('3000000002', self.dnc)
+        self.assertIn('3000000009', self.dnc)
+        self.assertNotIn('', self.dnc)
+        self.assertEqual(self.dnc.version, 3)
+
+    def test_version_gap_requests_resync(self):
+        """A skipped version asks for a new snapshot but still applies the delta"""
+        self.dnc.replace([], version=5)
+        self.dnc.on_message(delta('add', '3000000001', 6))
+        self.assertFalse(self.dnc._resync_requested.is_set())
+
+        self.dnc.on_message(delta('add', '3000000002', 9))
+        self.assertTrue(self.dnc._resync_requested.is_set())
+        self.assertIn('3000000002', self.dnc)
+        self.assertEqual(self.dnc.version, 9)
+
+    def test_compaction_merges_deltas_into_sorted_array(self):
+        """Reaching the threshold folds the delta sets into the sorted array"""
+        self.dnc.replace(['3000000005', '3000000001'], version=1)
+        self.dnc.apply('add', '3000000003', 2)
+        self.dnc.apply('remove', '3000000005', 3)
+        self.assertEqual(len(self.dnc._added) + len(self.dnc._removed), 2)
+
+        self.dnc.apply('add', '0000000007', 4)
+        self.assertEqual((self.dnc._added, self.dnc._removed), (set(), set()))
+        self.assertIsInstance(self.dnc._numbers, array)
+        self.assertEqual(self.dnc._numbers.typecode, 'Q')
+        self.assertEqual(
+            list(self.dnc._numbers),
+            sorted(number_key(n) for n in ['0000000007', '3000000001', '3000000003']),
+        )
+        for number in ['0000000007', '3000000001', '3000000003']:
+            self.assertIn(number, self.dnc)
+        self.assertNotIn('3000000005', self.dnc)
+        self.assertEqual(len(self.dnc), 3)
+
@@ -0,0 +1,75 @@
+"""
+Tests for the Redis contact hopper
+"""
+import time
+import unittest
+
+import fakeredis
+
+from hopper import ContactHopper, hopper_keys, ready_key
+
+NOW = 1_700_000_000.0
+
+
+class ContactHopperTest(unittest.IsolatedAsyncioTestCase):
+    """Test claiming, ranking and rescheduling against fakeredis"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.hopper = ContactHopper(self.redis, 7)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_claim_is_destructive(self):
+        """Claimed contacts leave every hopper structure and are not handed out twice"""
+        await self.hopper.add([{'id': i, 'phone': f'300{i}'} for i in range(5)], now=NOW)
+
+        first = await self.hopper.claim(3, now=NOW)
+        second = await self.hopper.claim(3, now=NOW)
+
+        self.assertEqual([c['id'] for c in first], [0, 1, 2])
+        self.assertEqual([c['id'] for c in second], [3, 4])
+        self.assertEqual(await self.hopper.claim(3, now=NOW), [])
+        self.assertEqual(await self.hopper.size(), {'ready': 0, 'scheduled': 0, 'total': 0})
+
+    async def test_priority_then_eligibility_order(self):
+        """Higher priority (with VIP boost) goes first; ties go oldest eligible first"""
+        await self.hopper.add([
+            {'id': 'late', 'priority': 1, '_eligible_at': NOW - 10},
+            {'id': 'early', 'priority': 1, '_eligible_at': NOW - 20},
+            {'id': 'vip', 'priority': 0, 'is_vip': True},
+            {'id': 'urgent', 'priority': 5},
+        ], vip_boost=3, now=NOW)
+
+        claimed = await self.hopper.claim(4, now=NOW)
+        self.assertEqual([c['id'] for c in claimed], ['urgent', 'vip', 'early', 'late'])
+
+    async def test_reschedule_until_eligible(self):
+        """A rescheduled contact stays out of claims until its time, then returns with its rank"""
+        now = time.time()
+        contact = {'id': 42, 'priority': 2, 'timezone': 'America/Lima'}
+        await self.hopper.reschedule(contact, eligible_at=now + 60)
+        await self.hopper.add([{'id': 1, 'timezone': 'America/Lima'}], now=now)
+
+        self.assertEqual([c['id'] for c in await self.hopper.claim(5, now=now)], [1])
+        self.assertEqual((await self.hopper.size())['scheduled'], 1)
+
+        claimed = await self.hopper.claim(5, now=now + 61)
+        self.assertEqual([c['id'] for c in claimed], [42])
+        self.assertEqual(await self.redis.zcard(hopper_keys(7)['scheduled']), 0)
+
+    async def test_promotion_into_closed_zone(self):
+        """Due contacts of a closed zone are promoted to their own bucket but not claimed"""
+        await self.hopper.add([
+            {'id': 'lima', 'timezone': 'America/Lima', '_eligible_at': NOW + 5},
+            {'id': 'madrid', 'timezone': 'Europe/Madrid', '_eligible_at': NOW + 5},
+        ], now=NOW)
+
+        claimed = await self.hopper.claim(5, zones=['America/Lima'], now=NOW + 10)
+        self.assertEqual([c['id'] for c in claimed], ['lima'])
+        self.assertEqual(await self.redis.zrange(ready_key(7, 'Europe/Madrid'), 0, -1), ['madrid'])
+        self.assertEqual(await self.redis.zcard(hopper_keys(7)['scheduled']), 0)
+
+        claimed = await self.hopper.claim(5, zones=['Europe/Madrid'], now=NOW + 10)
+        self.assertEqual([c['id'] for c in claimed], ['madrid'])
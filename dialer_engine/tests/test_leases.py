@@ -0,0 +1,71 @@
+"""
+Tests for campaign leases between dialer instances
+"""
+import asyncio
+import unittest
+
+import fakeredis
+
+from leases import CampaignLeases, lease_key
+
+
+class CampaignLeasesTest(unittest.IsolatedAsyncioTestCase):
+    """Test acquire, renew, expiry and takeover with two competing instances"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.now = 1000.0
+        self.a = self.instance('dialer-a')
+        self.b = self.instance('dialer-b')
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    def instance(self, name, ttl=0.2):
+        leases = CampaignLeases(instance_id=name, ttl=ttl, clock=lambda: self.now)
+        leases.bind(self.redis)
+        return leases
+
+    async def test_single_owner(self):
+        """Only one instance gets the lease and only the owner can release it"""
+        self.assertTrue(await self.a.acquire(5))
+        self.assertFalse(await self.b.acquire(5))
+        self.assertEqual((self.a.owned, self.b.owned), ({5}, set()))
+
+        await self.b.release(5)
+        self.assertEqual(await self.redis.get(lease_key(5)), 'dialer-a')
+
+        await self.a.release(5)
+        self.assertTrue(await self.b.acquire(5))
+
+    async def test_renew_keeps_lease(self):
+        """Renewing within the TTL keeps the lease past its original expiry"""
+        await self.a.acquire(5)
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            self.assertEqual(await self.a.renew(), [])
+        self.assertFalse(await self.b.acquire(5))
+
+    async def test_takeover_after_missed_heartbeat(self):
+        """An unrenewed lease expires, the other instance resumes from the checkpoint and the old owner drops it"""
+        await self.a.acquire(5)
+        await self.a.save_checkpoints({5: {'calls_made': 12, 'calls': [{'call_id': 'x'}]}})
+
+        await asyncio.sleep(0.25)
+        self.assertTrue(await self.b.acquire(5))
+        checkpoint = await self.b.load_checkpoint(5)
+        self.assertEqual((checkpoint['calls_made'], checkpoint['calls']), ('12', [{'call_id': 'x'}]))
+
+        self.assertEqual(await self.a.renew(), [5])
+        self.assertEqual(self.a.owned, set())
+        self.assertEqual(await self.redis.get(lease_key(5)), 'dialer-b')
+
+    async def test_heartbeat_purges_dead_instances(self):
+        """Instances without a heartbeat within the TTL stop counting for the quota"""
+        self.assertEqual(await self.a.heartbeat(), 1)
+        self.assertEqual(await self.b.heartbeat(), 2)
+        self.assertEqual(self.a.quota(3, 2), 2)
+
+        self.now += 1
+        self.assertEqual(await self.b.heartbeat(), 1)
+        self.assertEqual(self.b.quota(3, 1), 3)
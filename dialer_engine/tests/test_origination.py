@@ -0,0 +1,161 @@
+"""
+Tests for concurrent origination and rate limiting
+"""
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+
+import fakeredis
+
+from calls import COMPLETED_KEY
+from dialer import DialerEngine
+from hopper import hopper_keys
+from origination import OriginationDispatcher, OriginationRejected, TokenBucket, TrunkCapacityError
+
+
+class StubAMI:
+    """AMI manager that acks every action and records what was sent"""
+
+    def __init__(self, response='Success'):
+        self.response = response
+        self.actions = []
+        self.events = {}
+
+    def register_event(self, name, handler):
+        self.events[name] = handler
+
+    async def send_action(self, action, as_list=False):
+        self.actions.append(action)
+        return SimpleNamespace(Response=self.response, Message='Originate successfully queued')
+
+
+class OriginationDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    """Test ActionID correlation, timeouts and trunk capacity"""
+
+    async def asyncSetUp(self):
+        self.ami = StubAMI()
+        self.dispatcher = OriginationDispatcher(self.ami, max_in_flight=10, response_timeout=5)
+        self.dispatcher.bind()
+
+    async def respond(self, action_id, response='Success', reason='4'):
+        await self.ami.events['OriginateResponse'](
+            None, {'ActionID': action_id, 'Response': response, 'Reason': reason},
+        )
+
+    async def test_response_resolves_matching_future(self):
+        """OriginateResponse resolves only the future with the same ActionID"""
+        first, first_future = await self.dispatcher.originate({'Channel': 'PJSIP/1'}, trunk='t1')
+        second, second_future = await self.dispatcher.originate({'Channel': 'PJSIP/2'}, trunk='t1')
+        self.assertEqual([a['ChannelId'] for a in self.ami.actions], [first, second])
+        self.assertEqual(self.dispatcher.in_flight, 2)
+
+        await self.respond(second, response='Failure', reason='5')
+        await self.respond('someone-else')
+
+        self.assertFalse(first_future.done())
+        self.assertEqual(second_future.result()['Reason'], '5')
+        self.assertEqual(self.dispatcher.in_flight, 1)
+
+    async def test_trunk_channels(self):
+        """Answered calls hold a trunk channel until released; failed ones free it"""
+        answered, _ = await self.dispatcher.originate({}, trunk='t1', max_channels=2)
+        failed, _ = await self.dispatcher.originate({}, trunk='t1', max_channels=2)
+        with self.assertRaises(TrunkCapacityError):
+            await self.dispatcher.originate({}, trunk='t1', max_channels=2)
+        self.assertEqual(len(self.ami.actions), 2)
+
+        await self.respond(answered)
+        await self.respond(failed, response='Failure', reason='3')
+        self.assertEqual(self.dispatcher.trunk_capacity('t1', 2), 1)
+
+        self.dispatcher.release(answered)
+        self.assertEqual(self.dispatcher.trunk_capacity('t1', 2), 2)
+
+    async def test_missing_response_times_out(self):
+        """Without OriginateResponse the future fails and the channel is freed"""
+        self.dispatcher.response_timeout = 0.01
+        _, future = await self.dispatcher.originate({}, trunk='t1', max_channels=1)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(future, 1)
+        self.assertEqual(self.dispatcher.trunk_capacity('t1', 1), 1)
+        self.assertEqual(self.dispatcher.in_flight, 0)
+
+    async def test_rejected_originate(self):
+        """An AMI error response raises and frees the channel"""
+        self.ami.response = 'Error'
+        with self.assertRaises(OriginationRejected):
+            await self.dispatcher.originate({}, trunk='t1', max_channels=1)
+        self.assertEqual(self.dispatcher.trunk_capacity('t1', 1), 1)
+        self.assertEqual(self.dispatcher.in_flight, 0)
+
+
+class TrunkCapacityRescheduleTest(unittest.IsolatedAsyncioTestCase):
+    """Test that contacts without a free trunk channel go back to the hopper"""
+
+    async def test_originate_batch_reschedules(self):
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.addAsyncCleanup(redis.aclose)
+        engine = DialerEngine()
+        engine.redis_client = redis
+        engine.dispatcher = OriginationDispatcher(StubAMI())
+        engine.active_campaigns[5] = {
+            'config': {'trunk': 't1', 'trunk_max_channels': 1, 'queue_name': 'ventas'},
+            'calls_made': 0,
+        }
+        contacts = [{'id': i, 'phone_number': f'300{i}'} for i in range(3)]
+
+        originated = await engine.originate_batch(5, [(c, None) for c in contacts])
+
+        self.assertEqual(originated, 1)
+        self.assertEqual(await redis.hlen(hopper_keys(5)['data']), 2)
+
+
+class DroppedContactTest(unittest.IsolatedAsyncioTestCase):
+    """Test that claimed contacts that are never dialed get a completion record"""
+
+    async def test_drop_paths_write_completions(self):
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.addAsyncCleanup(redis.aclose)
+        engine = DialerEngine()
+        engine.redis_client = redis
+        engine.completions.redis = redis
+        engine.dispatcher = OriginationDispatcher(StubAMI(response='Error'))
+        engine.active_campaigns[5] = {'config': {'trunk': 't1', 'queue_name': 'ventas'}, 'calls_made': 0}
+        engine.dnc.replace(['3002'], version=1)
+        await engine.get_hopper(5).add([
+            {'id': 1, 'phone_number': ' '},
+            {'id': 2, 'phone_number': '3002'},
+            {'id': 3, 'phone_number': '3003'},
+        ])
+
+        contacts = await engine.get_next_contacts(5, 3)
+        self.assertEqual([c['id'] for c in contacts], [3])
+        self.assertEqual(await engine.originate_batch(5, [(c, None) for c in contacts]), 0)
+
+        await engine.completions.flush()
+        records = [json.loads(r) for r in await redis.lrange(COMPLETED_KEY, 0, -1)]
+        self.assertEqual(
+            {r['contact']['id']: r['status'] for r in records},
+            {1: 'no_phone', 2: 'dnc', 3: 'failed'},
+        )
+        self.assertEqual({r['campaign_id'] for r in records}, {5})
+
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+    """Test token bucket pacing"""
+
+    async def test_rate_after_burst(self):
+        """The burst goes out at once, then tokens come at `rate` per second"""
+        bucket = TokenBucket(rate=100, burst=5)
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        for _ in range(5):
+            await bucket.acquire()
+        self.assertLess(loop.time() - started, 0.01)
+
+        for _ in range(20):
+            await bucket.acquire()
+        self.assertAlmostEqual(loop.time() - started, 0.2, delta=0.08)
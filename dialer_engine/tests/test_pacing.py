@@ -0,0 +1,96 @@
+"""
+Tests for the predictive pacer
+"""
+import unittest
+
+from pacing import CampaignPacer, PacingLimits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CampaignPacerTest(unittest.TestCase):
+    """Test that the abandon-driven ratio bounds the lines in flight"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limits = PacingLimits(min_samples=20, adjust_interval=1.0, default_handle_time=60.0)
+        self.pacer = CampaignPacer(self.limits, clock=self.clock)
+        self.calls = 0
+
+    def record(self, answered=0, abandoned=0, unanswered=0):
+        """Record finished calls one second apart"""
+        for kind in ['answered'] * answered + ['abandoned'] * abandoned + ['unanswered'] * unanswered:
+            self.calls += 1
+            self.clock.now += 1
+            self.pacer.record_dial(f'c{self.calls}')
+            self.pacer.record_end(
+                f'c{self.calls}', answered=kind == 'answered', abandoned=kind == 'abandoned',
+            )
+
+    def test_ratio_caps_lines_in_flight(self):
+        """A low answer rate never pushes past ratio x agents, including calls already ringing"""
+        self.record(answered=5, unanswered=45)
+        self.pacer.adjust_ratio()
+        self.pacer.ratio = 1.0
+
+        self.assertEqual(self.pacer.answer_rate, 0.1)
+        self.assertEqual(self.pacer.lines_to_dial(10), 10)
+
+        for i in range(4):
+            self.pacer.record_dial(f'ringing{i}')
+        self.assertEqual(self.pacer.lines_to_dial(10), 6)
+
+    def test_answer_rate_below_ceiling(self):
+        """With a high answer rate the pacer dials demand / answer rate, above the floor"""
+        self.record(answered=40)
+        self.pacer.ratio = 3.0
+        self.assertEqual(self.pacer.lines_to_dial(10), 10)
+
+        # Piso: MIN_RATIO por agente disponible aunque el ratio esté por debajo
+        limits = PacingLimits(min_ratio=0.8, max_ratio=3.0, min_samples=20)
+        pacer = CampaignPacer(limits, clock=self.clock)
+        pacer.ratio = 0.8
+        self.assertEqual(pacer.lines_to_dial(10), 8)
+
+    def test_ratio_converges_on_abandon_target(self):
+        """Abandons above target walk the ratio down to the floor; a clean window walks it up to the ceiling"""
+        self.record(answered=15, abandoned=5)
+        for _ in range(20):
+            self.clock.now += 1
+            self.pacer.adjust_ratio()
+            self.record(answered=15, abandoned=5)
+        self.assertEqual(self.pacer.ratio, self.limits.min_ratio)
+        self.assertEqual(self.pacer.lines_to_dial(10), 10)
+
+        self.clock.now += self.limits.window_seconds
+        for _ in range(30):
+            self.record(answered=20)
+            self.clock.now += 1
+            self.pacer.adjust_ratio()
+        self.assertEqual(self.pacer.ratio, self.limits.max_ratio)
+
+    def test_ratio_waits_for_new_outcomes(self):
+        """Only one step is taken per MIN_SAMPLES new outcomes"""
+        self.record(answered=15, abandoned=5)
+        self.pacer.adjust_ratio()
+        self.assertAlmostEqual(self.pacer.ratio, 1.4)
+        for _ in range(5):
+            self.clock.now += 5
+            self.pacer.adjust_ratio()
+        self.assertAlmostEqual(self.pacer.ratio, 1.4)
+
+    def test_lost_hangups_expire_from_forecast(self):
+        """Connected calls whose Hangup never arrived stop counting as agents about to free up"""
+        self.pacer.record_dial('lost')
+        self.pacer.record_connect('lost')
+        self.assertGreater(self.pacer.forecast_free_agents(), 0)
+
+        self.clock.now += self.limits.connected_ttl_aht * self.limits.default_handle_time + 1
+        self.assertEqual(self.pacer.forecast_free_agents(), 0)
+        self.assertEqual(self.pacer.snapshot()['connected'], 0)
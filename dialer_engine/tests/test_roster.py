@@ -0,0 +1,73 @@
+"""
+Tests for the local agent roster
+"""
+import asyncio
+import json
+import unittest
+
+import fakeredis
+
+from roster import AGENTS_CHANNEL, AgentRoster
+
+
+class AgentRosterTest(unittest.IsolatedAsyncioTestCase):
+    """Test that published availability changes wake waiting dial loops"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.roster = AgentRoster(self.redis, poll_interval=5)
+        await self.redis.sadd('campaign:1:agents:available', 7)
+        await self.redis.set('agent:7', json.dumps({'id': 7, 'extension': '1007'}))
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_wait_times_out_without_events(self):
+        """Without changes wait() returns after the fallback timeout"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await self.roster.wait(1, timeout=0.05)
+        self.assertGreaterEqual(loop.time() - started, 0.04)
+
+    async def test_published_agent_wakes_wait(self):
+        """An agent published on dialer:agents joins the roster and wakes the loop"""
+        listener = asyncio.create_task(self.roster.run())
+        self.addAsyncCleanup(self._stop, listener)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(await self.roster.available(1)), 1)
+        waiter = asyncio.create_task(self.roster.wait(1, timeout=5))
+
+        await self.redis.publish(AGENTS_CHANNEL, json.dumps({
+            'type': 'agent', 'agent_id': 8, 'available': True, 'campaign_ids': [1],
+            'agent': {'id': 8, 'extension': '1008'},
+        }))
+
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(
+            sorted(a['extension'] for a in await self.roster.available(1)), ['1007', '1008']
+        )
+
+    async def test_roster_message_forces_reload(self):
+        """A 'roster' message wakes the loop and the next read goes back to Redis"""
+        await self.roster.available(1)
+        await self.redis.srem('campaign:1:agents:available', 7)
+        waiter = asyncio.create_task(self.roster.wait(1, timeout=5))
+        await asyncio.sleep(0)
+
+        self.roster.on_message(json.dumps({'type': 'roster', 'campaign_id': 1}))
+
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(await self.roster.available(1), [])
+
+    async def test_unavailable_agent_does_not_wake(self):
+        """Agents leaving are removed without waking the loop"""
+        await self.roster.available(1)
+        self.roster.on_message(json.dumps({
+            'type': 'agent', 'agent_id': 7, 'available': False, 'campaign_ids': [1],
+        }))
+        self.assertEqual(await self.roster.available(1), [])
+        self.assertFalse(self.roster._event(1).is_set())
+
+    async def _stop(self, task):
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,87 @@
+"""
+Tests for per-timezone calling windows
+"""
+import unittest
+from datetime import datetime, timezone
+
+import fakeredis
+
+from dialer import DialerEngine
+from schedule import CallingSchedule, CallingWindow
+
+
+def utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+class CallingScheduleTest(unittest.TestCase):
+    """Test open zones across day and DST boundaries"""
+
+    def setUp(self):
+        self.clock = utc(2026, 3, 2, 14, 0)  # lunes
+        self.schedule = CallingSchedule(CallingWindow('08:00', '20:00', days=range(6)),
+                                        clock=lambda: self.clock)
+
+    def test_open_zones_by_local_time(self):
+        """Each zone is judged by its own local time"""
+        zones = ['America/Bogota', 'Europe/Madrid', 'Asia/Tokyo']
+        # 09:00 Bogotá, 15:00 Madrid, 23:00 Tokio
+        self.assertEqual(self.schedule.open_zones(zones), ['America/Bogota', 'Europe/Madrid'])
+        self.assertEqual(self.schedule.next_opening(zones), utc(2026, 3, 2, 23, 0))
+
+    def test_day_boundaries(self):
+        """The cached state flips at closing time and skips disabled days"""
+        saturday_close = utc(2026, 3, 8, 1, 0)  # sábado 20:00 en Bogotá
+        self.assertTrue(self.schedule.is_open('America/Bogota', saturday_close - 1))
+        self.assertFalse(self.schedule.is_open('America/Bogota', saturday_close))
+        # Domingo no está habilitado: la próxima apertura es el lunes 08:00
+        self.assertEqual(
+            self.schedule.next_opening(['America/Bogota'], saturday_close),
+            utc(2026, 3, 9, 13, 0),
+        )
+
+    def test_dst_transitions(self):
+        """Openings after a DST change use the new UTC offset"""
+        saturday_night = utc(2026, 3, 8, 2, 0)  # sábado 21:00 EST
+        self.assertEqual(
+            self.schedule.next_opening(['America/New_York'], saturday_night),
+            utc(2026, 3, 9, 12, 0),  # lunes 08:00 EDT
+        )
+        self.assertFalse(self.schedule.is_open('America/New_York', utc(2026, 3, 9, 11, 59)))
+        self.assertTrue(self.schedule.is_open('America/New_York', utc(2026, 3, 9, 12, 0)))
+
+        # Fin del horario de verano en Europa (25 de octubre)
+        self.assertEqual(
+            self.schedule.next_opening(['Europe/Madrid'], utc(2026, 10, 24, 19, 0)),
+            utc(2026, 10, 26, 7, 0),  # lunes 08:00 CET
+        )
+
+    def test_unknown_zone_uses_campaign_zone(self):
+        """Invalid zone names fall back to the campaign's timezone"""
+        schedule = CallingSchedule(CallingWindow(), default_zone='Asia/Tokyo')
+        self.assertFalse(schedule.is_open('Nowhere/City', self.clock))
+
+
+class OpenBucketClaimTest(unittest.IsolatedAsyncioTestCase):
+    """Test that the dialer only claims from buckets whose window is open"""
+
+    async def test_closed_zone_stays_in_hopper(self):
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.addAsyncCleanup(redis.aclose)
+        engine = DialerEngine()
+        engine.redis_client = redis
+        clock = utc(2026, 3, 2, 14, 0)
+        engine.active_campaigns[3] = {
+            'config': {'dnc_enabled': False},
+            'schedule': CallingSchedule(CallingWindow(), clock=lambda: clock),
+        }
+        await engine.get_hopper(3).add([
+            {'id': 1, 'phone_number': '3001', 'timezone': 'America/Bogota'},
+            {'id': 2, 'phone_number': '3002', 'timezone': 'Asia/Tokyo'},
+            {'id': 3, 'phone_number': '3003', 'timezone': 'Europe/Madrid'},
+        ])
+
+        claimed = await engine.get_next_contacts(3, 10)
+
+        self.assertEqual(sorted(c['id'] for c in claimed), [1, 3])
+        self.assertEqual(await engine.get_hopper(3).size(), {'ready': 1, 'scheduled': 0, 'total': 1})
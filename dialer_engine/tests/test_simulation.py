@@ -0,0 +1,27 @@
+"""
+Short end-to-end simulation of the predictive dialer with pass/fail thresholds
+"""
+import asyncio
+import unittest
+
+import simulator
+
+# Semilla fija y umbrales holgados: la simulación corre en tiempo real
+# comprimido y el scheduler de asyncio agrega algo de ruido entre corridas
+ARGV = [
+    '--fakeredis', '--mode', 'predictive', '--agents', '20', '--seed', '7',
+    '--contacts', '2000', '--duration', '10', '--speed', '60',
+    '--max-abandon', '0.10', '--min-dials-per-sec', '10', '--max-latency-ms', '250',
+]
+
+
+class PredictiveSimulationTest(unittest.TestCase):
+    """Test the whole dialer against the fake AMI server and agent floor"""
+
+    def test_thresholds(self):
+        """Ten simulated minutes stay within abandon, throughput and latency budgets"""
+        args = simulator.parse_args(ARGV)
+        report = asyncio.run(simulator.run(args))
+
+        self.assertEqual(simulator.check_thresholds(report, args), [], report)
+        self.assertGreater(report['agent_occupancy'], 0.6, report)
@@ -32,6 +32,47 @@ for conf in pjsip_extensions.conf pjsip_wizard.conf extensions_dynamic.conf \
     fi
 done
 
+# -------------------------------------------------------
+# 1b. Provisión PJSIP: archivos (por defecto) o Realtime
+#     En modo realtime, endpoints/auths/AORs de agentes y extensiones se leen
+#     de las tablas ps_* de PostgreSQL que mantiene Django (sin reloads).
+#     sorcery.conf, extconfig.conf y res_pgsql.conf incluyen estos archivos.
+# -------------------------------------------------------
+if [ "${PJSIP_PROVISIONING}" = "realtime" ]; then
+    cat > "${DYNAMIC_DIR}/sorcery_realtime.conf" <<EOF
+; Auto-generado por entrypoint.sh (PJSIP_PROVISIONING=realtime)
+; pjsip.conf primero (troncales, kamailio-endpoint), luego PostgreSQL.
+[res_pjsip]
+endpoint=config,pjsip.conf,criteria=type=endpoint
+endpoint=realtime,ps_endpoints
+auth=config,pjsip.conf,criteria=type=auth
+auth=realtime,ps_auths
+aor=config,pjsip.conf,criteria=type=aor
+aor=realtime,ps_aors
+EOF
+    cat > "${DYNAMIC_DIR}/extconfig_realtime.conf" <<EOF
+ps_endpoints => pgsql,general
+ps_auths => pgsql,general
+ps_aors => pgsql,general
+EOF
+    cat > "${DYNAMIC_DIR}/res_pgsql_general.conf" <<EOF
+[general]
+dbhost=${POSTGRES_HOST:-postgres}
+dbport=${POSTGRES_PORT:-5432}
+dbname=${POSTGRES_DB:-vozipomni}
+dbuser=${POSTGRES_USER:-vozipomni_user}
+dbpass=${POSTGRES_PASSWORD}
+dbappname=asterisk
+requirements=warn
+EOF
+    echo "  [entrypoint] ✓ PJSIP Realtime: ps_endpoints/ps_auths/ps_aors vía ${POSTGRES_HOST:-postgres}"
+else
+    for conf in sorcery_realtime.conf extconfig_realtime.conf res_pgsql_general.conf; do
+        echo "; PJSIP_PROVISIONING=files — sin Realtime" > "${DYNAMIC_DIR}/${conf}"
+    done
+    echo "  [entrypoint] PJSIP por archivos (pjsip_agents.conf / pjsip_extensions.conf)"
+fi
+
 # -------------------------------------------------------
 # 2. Detectar y validar VOZIPOMNI_IPV4
 # -------------------------------------------------------
@@ -158,6 +199,8 @@ chown asterisk:asterisk /var/lib/asterisk          2>/dev/null || true
 chown -R asterisk:asterisk "${CONFIG_DIR}"         2>/dev/null || true
 chown -R asterisk:asterisk "${DYNAMIC_DIR}"        2>/dev/null || true
 chmod -R 777 "${DYNAMIC_DIR}"                      2>/dev/null || true
+# Contiene la contraseña de PostgreSQL: sólo legible por asterisk
+chmod 600 "${DYNAMIC_DIR}/res_pgsql_general.conf"  2>/dev/null || true
 chown -R asterisk:asterisk /var/log/asterisk       2>/dev/null || true
 chown -R asterisk:asterisk /var/run/asterisk       2>/dev/null || true
 chown -R asterisk:asterisk /var/spool/asterisk     2>/dev/null || true